@@ -0,0 +1,4 @@
+import time
+
+# reference point for the import and startup time reports of the api and worker processes
+IMPORT_STARTED_AT = time.perf_counter()
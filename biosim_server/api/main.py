@@ -1,29 +1,50 @@
+import asyncio
 import logging
 import os
+import time
 import uuid
 from contextlib import asynccontextmanager
 from datetime import datetime, UTC, timedelta
-from typing import AsyncGenerator, Optional
+from typing import Any, AsyncGenerator, Awaitable, Callable, Optional
 
 import dotenv
 import uvicorn
-from fastapi import FastAPI, File, UploadFile, Query, APIRouter, Depends, HTTPException
+from fastapi import FastAPI, File, UploadFile, Query, APIRouter, Depends, HTTPException, Request, Response
+from opentelemetry import trace
+from opentelemetry.propagate import extract
+from opentelemetry.trace import SpanKind
+from prometheus_client import CONTENT_TYPE_LATEST
+from starlette.responses import StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
+from starlette.routing import Match
 
-from biosim_server.biosim_omex import OmexFile, get_cached_omex_file_from_upload
+from biosim_server import IMPORT_STARTED_AT
+from biosim_server.api.status_stream import WorkflowStatusBroadcaster
+from biosim_server.biosim_omex import OmexFile, OmexArchiveTooLarge, extract_omex_archives_async, \
+    get_cached_omex_file_from_raw, \
+    get_cached_omex_file_from_upload, hash_bytes_md5, list_omex_archives
 from biosim_server.biosim_runs import BiosimulatorVersion
 from biosim_server.biosim_verify import CompareSettings
-from biosim_server.biosim_verify.models import VerifyWorkflowOutput, VerifyWorkflowStatus
+from biosim_server.biosim_verify.models import RegressionSweepOutput, VerifyBatchWorkflowOutput, VerifyWorkflowOutput, \
+    VerifyWorkflowStatus
+from biosim_server.biosim_verify.omex_verify_batch_workflow import OmexVerifyBatchArchive, OmexVerifyBatchWorkflow, \
+    OmexVerifyBatchWorkflowInput, new_batch_output
 from biosim_server.biosim_verify.omex_verify_workflow import OmexVerifyWorkflow, OmexVerifyWorkflowInput
+from biosim_server.biosim_verify.regression_sweep_workflow import RegressionSweepWorkflow, RegressionSweepWorkflowInput
 from biosim_server.biosim_verify.runs_verify_workflow import RunsVerifyWorkflowInput, RunsVerifyWorkflow
-from biosim_server.config import get_local_cache_dir
+from biosim_server.common.timing import StageTiming
+from biosim_server.config import get_local_cache_dir, get_settings
 from biosim_server.dependencies import get_file_service, get_temporal_client, init_standalone, shutdown_standalone, \
-    get_biosim_service, get_omex_database_service
+    get_biosim_service, get_database_service, get_omex_database_service
 from biosim_server.log_config import setup_logging
+from biosim_server.metrics import HTTP_REQUEST_DURATION, UPLOAD_BYTES, latest_metrics
+from biosim_server.profiling import PROFILE_HEADER, is_profiled, profile, profile_requested, profile_workflow
+from biosim_server.tracing import init_tracing, shutdown_tracing, tracer
 from biosim_server.version import __version__
 
 logger = logging.getLogger(__name__)
 setup_logging(logger)
+logger.info(f"imported api modules in {time.perf_counter() - IMPORT_STARTED_AT:.2f}s")
 
 # -- load dev env -- #
 REPO_ROOT = os.path.dirname(os.path.dirname(__file__))
@@ -76,9 +97,12 @@ router = APIRouter()
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
+    init_tracing(service_name="biosim-api")
     await init_standalone()
+    logger.info(f"api ready {time.perf_counter() - IMPORT_STARTED_AT:.2f}s after the first import")
     yield
     await shutdown_standalone()
+    shutdown_tracing()
 
 
 app = FastAPI(title=APP_TITLE, version=APP_VERSION, servers=APP_SERVERS, lifespan=lifespan)
@@ -92,6 +116,60 @@ app.add_middleware(
     allow_headers=["*"])
 
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+    # continues a trace started by the caller (traceparent header), the temporal interceptor carries it on
+    with tracer.start_as_current_span(f"{request.method} {request.url.path}", context=extract(request.headers),
+                                      kind=SpanKind.SERVER) as span:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if route is not None:
+            span.update_name(f"{request.method} {route.path}")
+            span.set_attribute("http.route", route.path)
+        span.set_attribute("http.request.method", request.method)
+        span.set_attribute("http.response.status_code", response.status_code)
+        return response
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request,
+                                 call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        # labelled by route template (e.g. /verify/{workflow_id}) to keep the number of series bounded
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.labels(method=request.method, route=getattr(route, "path", "unmatched"),
+                                     status=str(status_code)).observe(time.perf_counter() - start)
+
+
+def _matched_route_path(request: Request) -> str | None:
+    # the route is only resolved (request.scope["route"]) after the middleware hands over the request
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return str(getattr(route, "path", None))
+    return None
+
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+    # on demand with the profiling header, or every request to a route listed in profiling_targets
+    profiled = profile_requested(request.headers.get(PROFILE_HEADER))
+    route_path = None
+    if not profiled and get_settings().profiling_targets:
+        route_path = _matched_route_path(request)
+        profiled = route_path is not None and is_profiled(route_path)
+    if not profiled:
+        return await call_next(request)
+    async with profile(target=route_path or _matched_route_path(request) or request.url.path):
+        return await call_next(request)
+
+
 # -- endpoint logic -- #
 
 @app.get("/")
@@ -107,6 +185,53 @@ def get_version() -> str:
     return APP_VERSION
 
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics() -> Response:
+    return Response(content=latest_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
+def _batch_simulations() -> bool:
+    """ whether the workflows submit their simulations as one batch, the api and the workers share the
+    biosim_service_backend setting """
+    biosim_service = get_biosim_service()
+    return biosim_service is not None and biosim_service.supports_batch
+
+
+def _check_batch_limits(num_archives: int, total_bytes: int) -> None:
+    settings = get_settings()
+    if num_archives > settings.verify_batch_max_archives:
+        raise HTTPException(status_code=413, detail=f"A batch is limited to {settings.verify_batch_max_archives} "
+                                                    f"archives.")
+    if total_bytes > settings.verify_batch_max_total_bytes:
+        raise HTTPException(status_code=413, detail=f"A batch is limited to {settings.verify_batch_max_total_bytes} "
+                                                    f"bytes of archives.")
+
+
+async def _get_simulator_versions(simulators: list[str]) -> list[BiosimulatorVersion]:
+    """ simulators by 'name' (the latest version) or 'name:version', 400 if one is not found """
+    simulator_versions: list[BiosimulatorVersion] = []
+    biosim_service = get_biosim_service()
+    assert biosim_service is not None
+    all_simulator_versions = await biosim_service.get_simulator_versions()
+    for simulator in simulators:
+        simulator_version: Optional[BiosimulatorVersion] = None
+        if ":" in simulator:
+            name, version = simulator.split(":")
+            for sv in all_simulator_versions:
+                if sv.id == name and sv.version == version:
+                    simulator_version = sv
+                    break
+        else:
+            for sv in all_simulator_versions:
+                if sv.id == simulator:
+                    simulator_version = sv  # don't break, we want the last one in the list
+        if simulator_version is not None:
+            simulator_versions.append(simulator_version)
+        else:
+            raise HTTPException(status_code=400, detail=f"Simulator {simulator} not found.")
+    return simulator_versions
+
+
 @app.post(
     "/verify/omex",
     response_model=VerifyWorkflowOutput,
@@ -134,37 +259,28 @@ async def verify_omex(
     assert file_service is not None
     omex_database = get_omex_database_service()
     assert omex_database is not None
+    stage_timings: list[StageTiming] = []
     omex_file: OmexFile = await get_cached_omex_file_from_upload(file_service=file_service, omex_database=omex_database,
-                                                                 uploaded_file=uploaded_file)
+                                                                 uploaded_file=uploaded_file, stage_timings=stage_timings)
 
     # ---- create workflow input ---- #
-    simulator_versions: list[BiosimulatorVersion] = []
-    biosim_service = get_biosim_service()
-    assert biosim_service is not None
-    all_simulator_versions = await biosim_service.get_simulator_versions()
-    for simulator in simulators:
-        simulator_version: Optional[BiosimulatorVersion] = None
-        if ":" in simulator:
-            name, version = simulator.split(":")
-            for sv in all_simulator_versions:
-                if sv.id == name and sv.version == version:
-                    simulator_version = sv
-                    break
-        else:
-            for sv in all_simulator_versions:
-                if sv.id == simulator:
-                    simulator_version = sv  # don't break, we want the last one in the list
-        if simulator_version is not None:
-            simulator_versions.append(simulator_version)
-        else:
-            raise HTTPException(status_code=400, detail=f"Simulator {simulator} not found.")
+    simulator_versions = await _get_simulator_versions(simulators)
 
     workflow_id = f"{workflow_id_prefix}{uuid.uuid4()}"
     compare_settings = CompareSettings(user_description=user_description, include_outputs=include_outputs,
                                        rel_tol=rel_tol, abs_tol_min=abs_tol_min, abs_tol_scale=abs_tol_scale,
                                        observables=observables)
     omex_verify_workflow_input = OmexVerifyWorkflowInput(omex_file=omex_file, requested_simulators=simulator_versions,
-                                                         compare_settings=compare_settings, cache_buster=cache_buster)
+                                                         compare_settings=compare_settings, cache_buster=cache_buster,
+                                                         stage_timings=stage_timings,
+                                                         profile=profile_workflow(workflow_id),
+                                                         compute_task_queue=get_settings().temporal_compute_task_queue,
+                                                         batch_simulations=_batch_simulations())
+
+    span = trace.get_current_span()
+    span.set_attribute("omex.hash_md5", omex_file.file_hash_md5)
+    span.set_attribute("simulators", [f"{sv.id}:{sv.version}" for sv in simulator_versions])
+    span.set_attribute("workflow.id", workflow_id)
 
     # ---- invoke workflow ---- #
     logger.info(f"starting workflow for {omex_file}")
@@ -173,7 +289,7 @@ async def verify_omex(
     workflow_handle = await temporal_client.start_workflow(
         OmexVerifyWorkflow.run,
         args=[omex_verify_workflow_input],
-        task_queue="verification_tasks",
+        task_queue=get_settings().temporal_task_queue,
         id=workflow_id,
     )
     logger.info(f"started workflow with id {workflow_id}")
@@ -185,11 +301,272 @@ async def verify_omex(
         workflow_status=VerifyWorkflowStatus.PENDING,
         timestamp=str(datetime.now(UTC)),
         workflow_id=workflow_id,
-        workflow_run_id=workflow_handle.run_id
+        workflow_run_id=workflow_handle.run_id,
+        stage_timings=stage_timings
     )
     return omex_verify_workflow_output
 
 
+@app.post(
+    "/verify/omex/batch",
+    response_model=VerifyBatchWorkflowOutput,
+    operation_id="verify-omex-batch",
+    tags=["Verification"],
+    dependencies=[Depends(get_temporal_client), Depends(get_file_service), Depends(get_local_cache_dir), Depends(get_omex_database_service)],
+    summary="Request verification reports for many OMEX/COMBINE archives across simulators")
+async def verify_omex_batch(
+        uploaded_files: list[UploadFile] = File(..., description="OMEX/COMBINE archives and/or zip files of OMEX/COMBINE archives"),
+        workflow_id_prefix: str = Query(default="omex-batch-verification-", description="Prefix for the workflow id."),
+        simulators: list[str] = Query(default=["amici", "copasi", "pysces", "tellurium", "vcell"],
+                                      description="List of simulators 'name' or 'name:version' to compare."),
+        include_outputs: bool = Query(default=False,
+                                      description="Whether to include the output data on which the comparison is based."),
+        user_description: str = Query(default="my-omex-batch-compare", description="User description of the verification run."),
+        rel_tol: float = Query(default=0.0001, description="Relative tolerance for proximity comparison."),
+        abs_tol_min: float = Query(default=0.001, description="Min absolute tolerance, where atol = max(atol_min, max(arr1,arr2)*atol_scale."),
+        abs_tol_scale: float = Query(default=0.00001, description="Scale for absolute tolerance, where atol = max(atol_min, max(arr1,arr2)*atol_scale."),
+        cache_buster: str = Query(default="0", description="Optional unique id for cache busting (unique string to force new simulation runs)."),
+        observables: Optional[list[str]] = Query(default=None,
+                                                 description="List of observables to include in the return data."),
+        max_concurrency: int = Query(default=0, description="Archives verified at the same time, 0 (and the upper limit) is the server setting.")
+) -> VerifyBatchWorkflowOutput:
+    settings = get_settings()
+    file_service = get_file_service()
+    assert file_service is not None
+    omex_database = get_omex_database_service()
+    assert omex_database is not None
+    simulator_versions = await _get_simulator_versions(simulators)
+
+    # ---- check the limits before any archive is stored, so a rejected batch leaves nothing behind ---- #
+    _check_batch_limits(num_archives=0, total_bytes=sum(uploaded_file.size or 0 for uploaded_file in uploaded_files))
+    num_archives = 0
+    total_bytes = 0
+    for uploaded_file in uploaded_files:
+        contents = await uploaded_file.read()
+        for filename, archive_bytes in await asyncio.to_thread(list_omex_archives, contents, uploaded_file.filename):
+            if archive_bytes > settings.verify_batch_max_archive_bytes:
+                raise HTTPException(status_code=413, detail=f"{filename} is larger than "
+                                                            f"{settings.verify_batch_max_archive_bytes} bytes")
+            num_archives += 1
+            total_bytes += archive_bytes
+            _check_batch_limits(num_archives=num_archives, total_bytes=total_bytes)
+        await uploaded_file.seek(0)
+
+    # ---- expand zip files and dedupe the archives by hash, each distinct archive is stored once ---- #
+    archives: dict[str, OmexVerifyBatchArchive] = {}
+    num_archives = 0
+    total_bytes = 0
+    for uploaded_file in uploaded_files:
+        contents = await uploaded_file.read()
+        UPLOAD_BYTES.observe(len(contents))
+        # each archive is decompressed, hashed and stored before the next one, only one is held in memory
+        archives_iterator = extract_omex_archives_async(contents, uploaded_file.filename,
+                                                        max_archive_bytes=settings.verify_batch_max_archive_bytes)
+        try:
+            async for filename, omex_contents in archives_iterator:
+                num_archives += 1
+                total_bytes += len(omex_contents)
+                # only exceeded by zip files declaring smaller archives than they contain, the archives stored so
+                # far are then left behind (they are deduplicated by hash if uploaded again)
+                _check_batch_limits(num_archives=num_archives, total_bytes=total_bytes)
+                file_hash_md5 = await hash_bytes_md5(omex_contents)
+                if file_hash_md5 in archives:
+                    archives[file_hash_md5].filenames.append(filename)
+                    continue
+                omex_file = await get_cached_omex_file_from_raw(file_service=file_service, omex_database=omex_database,
+                                                                omex_file_contents=omex_contents, filename=filename)
+                archives[file_hash_md5] = OmexVerifyBatchArchive(omex_file=omex_file, filenames=[filename])
+        except OmexArchiveTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        finally:
+            await archives_iterator.aclose()
+    if len(archives) == 0:
+        raise HTTPException(status_code=400, detail="No OMEX/COMBINE archives were uploaded.")
+
+    workflow_id = f"{workflow_id_prefix}{uuid.uuid4()}"
+    compare_settings = CompareSettings(user_description=user_description, include_outputs=include_outputs,
+                                       rel_tol=rel_tol, abs_tol_min=abs_tol_min, abs_tol_scale=abs_tol_scale,
+                                       observables=observables)
+    batch_input = OmexVerifyBatchWorkflowInput(
+        archives=list(archives.values()), requested_simulators=simulator_versions, cache_buster=cache_buster,
+        compare_settings=compare_settings, profile=profile_workflow(workflow_id),
+        max_concurrency=min(max_concurrency or settings.verify_batch_max_concurrency,
+                            settings.verify_batch_max_concurrency),
+        compute_task_queue=settings.temporal_compute_task_queue, batch_simulations=_batch_simulations())
+
+    span = trace.get_current_span()
+    span.set_attribute("omex.num_archives", num_archives)
+    span.set_attribute("omex.num_distinct_archives", len(archives))
+    span.set_attribute("simulators", [f"{sv.id}:{sv.version}" for sv in simulator_versions])
+    span.set_attribute("workflow.id", workflow_id)
+
+    # ---- invoke workflow ---- #
+    logger.info(f"starting batch workflow for {len(archives)} distinct of {num_archives} archives")
+    temporal_client = get_temporal_client()
+    assert temporal_client is not None
+    workflow_handle = await temporal_client.start_workflow(
+        OmexVerifyBatchWorkflow.run,
+        args=[batch_input],
+        task_queue=settings.temporal_task_queue,
+        id=workflow_id,
+    )
+    logger.info(f"started workflow with id {workflow_id}")
+    assert workflow_handle.id == workflow_id
+
+    # ---- return initial workflow output, including the ids of the per archive workflows ---- #
+    return new_batch_output(workflow_id=workflow_id, batch_input=batch_input,
+                            workflow_status=VerifyWorkflowStatus.PENDING, timestamp=str(datetime.now(UTC)),
+                            workflow_run_id=workflow_handle.run_id)
+
+
+@app.get(
+    "/verify/omex/batch/{workflow_id}",
+    response_model=VerifyBatchWorkflowOutput,
+    operation_id='get-verify-omex-batch-output',
+    name="Retrieve batch verification progress",
+    tags=["Verification"],
+    dependencies=[Depends(get_temporal_client)],
+    summary='Retrieve the progress and per archive workflow ids of a batch verification')
+async def get_verify_omex_batch_output(workflow_id: str) -> VerifyBatchWorkflowOutput:
+    profile_workflow(workflow_id)
+    try:
+        temporal_client = get_temporal_client()
+        assert temporal_client is not None
+        workflow_handle = temporal_client.get_workflow_handle(workflow_id=workflow_id,
+                                                              result_type=VerifyBatchWorkflowOutput)
+        batch_output: VerifyBatchWorkflowOutput = await workflow_handle.query("get_output",
+                                                                              result_type=VerifyBatchWorkflowOutput,
+                                                                              rpc_timeout=timedelta(seconds=60))
+        return batch_output
+    except Exception as e:
+        msg = f"error retrieving batch verification output with id: {workflow_id}: {str(e)}"
+        logger.error(msg, exc_info=e)
+        raise HTTPException(status_code=404, detail=msg)
+
+
+@app.post(
+    "/verify/regression_sweep",
+    response_model=RegressionSweepOutput,
+    operation_id="verify-regression-sweep",
+    tags=["Verification"],
+    dependencies=[Depends(get_temporal_client)],
+    summary="Verify a new simulator version against the cached runs of a previous version for all stored archives")
+async def verify_regression_sweep(
+        new_simulator: str = Query(..., description="New simulator 'name:version' (or 'name' for the latest version)."),
+        previous_simulator: str = Query(..., description="Previous simulator 'name:version' whose cached runs are compared."),
+        workflow_id_prefix: str = Query(default="regression-sweep-", description="Prefix for the workflow id."),
+        user_description: str = Query(default="my-regression-sweep", description="User description of the sweep."),
+        rel_tol: float = Query(default=0.0001, description="Relative tolerance for proximity comparison."),
+        abs_tol_min: float = Query(default=0.001, description="Min absolute tolerance, where atol = max(atol_min, max(arr1,arr2)*atol_scale."),
+        abs_tol_scale: float = Query(default=0.00001, description="Scale for absolute tolerance, where atol = max(atol_min, max(arr1,arr2)*atol_scale."),
+        cache_buster: str = Query(default="0", description="Cache buster of the new version's runs (a repeated sweep with the same value reuses them)."),
+        max_concurrent_simulations: int = Query(default=5, gt=0, description="Runs of the new version in flight at the same time."),
+        page_size: int = Query(default=20, gt=0, description="Archives per page of the corpus.")
+) -> RegressionSweepOutput:
+    new_simulator_version, previous_simulator_version = await _get_simulator_versions([new_simulator,
+                                                                                       previous_simulator])
+    workflow_id = f"{workflow_id_prefix}{uuid.uuid4()}"
+    compare_settings = CompareSettings(user_description=user_description, include_outputs=False, rel_tol=rel_tol,
+                                       abs_tol_min=abs_tol_min, abs_tol_scale=abs_tol_scale)
+    sweep_input = RegressionSweepWorkflowInput(new_simulator_version=new_simulator_version,
+                                               previous_simulator_version=previous_simulator_version,
+                                               compare_settings=compare_settings, cache_buster=cache_buster,
+                                               max_concurrent_simulations=max_concurrent_simulations,
+                                               page_size=page_size,
+                                               compute_task_queue=get_settings().temporal_compute_task_queue,
+                                               batch_simulations=_batch_simulations())
+
+    span = trace.get_current_span()
+    span.set_attribute("simulators", [f"{sv.id}:{sv.version}" for sv in (new_simulator_version,
+                                                                          previous_simulator_version)])
+    span.set_attribute("workflow.id", workflow_id)
+
+    logger.info(f"starting regression sweep of {new_simulator} against {previous_simulator}")
+    temporal_client = get_temporal_client()
+    assert temporal_client is not None
+    workflow_handle = await temporal_client.start_workflow(
+        RegressionSweepWorkflow.run,
+        args=[sweep_input],
+        task_queue=get_settings().temporal_task_queue,
+        id=workflow_id,
+    )
+    logger.info(f"started workflow with id {workflow_id}")
+    assert workflow_handle.id == workflow_id
+
+    return RegressionSweepOutput(
+        workflow_id=workflow_id,
+        new_simulator_version=f"{new_simulator_version.id}:{new_simulator_version.version}",
+        previous_simulator_version=f"{previous_simulator_version.id}:{previous_simulator_version.version}",
+        workflow_status=VerifyWorkflowStatus.PENDING,
+        timestamp=str(datetime.now(UTC)))
+
+
+@app.get(
+    "/verify/regression_sweep/{workflow_id}",
+    response_model=RegressionSweepOutput,
+    operation_id='get-verify-regression-sweep-output',
+    name="Retrieve regression sweep progress",
+    tags=["Verification"],
+    dependencies=[Depends(get_temporal_client), Depends(get_database_service)],
+    summary='Retrieve the progress, regressions and failures of a regression sweep')
+async def get_verify_regression_sweep_output(workflow_id: str) -> RegressionSweepOutput:
+    profile_workflow(workflow_id)
+    try:
+        temporal_client = get_temporal_client()
+        assert temporal_client is not None
+        # the latest run of the workflow, the sweep continues as new
+        workflow_handle = temporal_client.get_workflow_handle(workflow_id=workflow_id,
+                                                              result_type=RegressionSweepOutput)
+        sweep_output: RegressionSweepOutput = await workflow_handle.query("get_output",
+                                                                          result_type=RegressionSweepOutput,
+                                                                          rpc_timeout=timedelta(seconds=60))
+        # the workflow only counts the regressions and failures, they are stored page by page
+        database_service = get_database_service()
+        assert database_service is not None
+        for result in await database_service.get_regression_sweep_results(workflow_id):
+            (sweep_output.failures if result.error_message is not None else sweep_output.regressions).append(result)
+        return sweep_output
+    except Exception as e:
+        msg = f"error retrieving regression sweep output with id: {workflow_id}: {str(e)}"
+        logger.error(msg, exc_info=e)
+        raise HTTPException(status_code=404, detail=msg)
+
+
+async def _query_workflow_output(workflow_id: str) -> dict[str, Any]:
+    temporal_client = get_temporal_client()
+    assert temporal_client is not None
+    # json of any verification workflow output (single, batch or regression sweep)
+    workflow_output: dict[str, Any] = await temporal_client.get_workflow_handle(workflow_id=workflow_id) \
+        .query("get_output", rpc_timeout=timedelta(seconds=60))
+    return workflow_output
+
+
+status_broadcaster = WorkflowStatusBroadcaster(query_output=_query_workflow_output,
+                                               poll_interval_s=get_settings().status_stream_poll_interval_s,
+                                               max_poll_interval_s=get_settings().status_stream_max_poll_interval_s)
+
+
+@app.get(
+    "/verify/{workflow_id}/events",
+    response_class=StreamingResponse,
+    operation_id='stream-verify-output',
+    name="Stream verification status",
+    tags=["Verification"],
+    dependencies=[Depends(get_temporal_client)],
+    summary='Stream the status and progress of a verification, batch or regression sweep as server-sent events')
+async def stream_verify_output(workflow_id: str) -> StreamingResponse:
+    # "status" events carry the output (as from the GET endpoints) each time it changed, the stream ends after the
+    # output of a finished workflow or an "error" event, all clients of a workflow share one query loop
+    keepalive_s = get_settings().status_stream_keepalive_s
+
+    async def sse_events() -> AsyncGenerator[str, None]:
+        async for event in status_broadcaster.subscribe(workflow_id, keepalive_s=keepalive_s):
+            yield ": keepalive\n\n" if event is None else event.to_sse()
+
+    return StreamingResponse(sse_events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.get(
     "/verify/{workflow_id}",
     response_model=VerifyWorkflowOutput,
@@ -200,6 +577,7 @@ async def verify_omex(
     summary='Retrieve verification report for OMEX/COMBINE archive')
 async def get_verify_output(workflow_id: str) -> VerifyWorkflowOutput:
     logger.info(f"in get /verify/{workflow_id}")
+    profile_workflow(workflow_id)
 
     try:
         # query temporal for the workflow output
@@ -245,7 +623,13 @@ async def verify_runs(
                                        rel_tol=rel_tol, abs_tol_min=abs_tol_min, abs_tol_scale=abs_tol_scale,
                                        observables=observables)
     runs_verify_workflow_input = RunsVerifyWorkflowInput(biosimulations_run_ids=biosimulations_run_ids,
-                                                         compare_settings=compare_settings)
+                                                         compare_settings=compare_settings,
+                                                         profile=profile_workflow(workflow_id),
+                                                         compute_task_queue=get_settings().temporal_compute_task_queue)
+
+    span = trace.get_current_span()
+    span.set_attribute("biosim.run_ids", biosimulations_run_ids)
+    span.set_attribute("workflow.id", workflow_id)
 
     # ---- invoke workflow ---- #
     logger.info(f"starting verify workflow for biosim run IDs {biosimulations_run_ids}")
@@ -254,7 +638,7 @@ async def verify_runs(
     workflow_handle = await temporal_client.start_workflow(
         RunsVerifyWorkflow.run,
         args=[runs_verify_workflow_input],
-        task_queue="verification_tasks",
+        task_queue=get_settings().temporal_task_queue,
         id=workflow_id,
     )
     logger.info(f"started workflow with id {workflow_id}")
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import logging
+from typing import Any, AsyncGenerator, Awaitable, Callable, Optional
+
+from pydantic import BaseModel
+from temporalio.service import RPCError, RPCStatusCode
+
+from biosim_server.biosim_verify.models import VerifyWorkflowStatus
+from biosim_server.metrics import STATUS_STREAM_EVENTS, STATUS_STREAM_QUERIES
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+QueryOutput = Callable[[str], Awaitable[dict[str, Any]]]  # workflow_id -> "get_output" query result as json
+
+
+class StatusEvent(BaseModel):
+    event: str  # "status" (data is the workflow output) or "error" (data has the error detail)
+    data: dict[str, Any]
+    done: bool  # the last event of the stream
+
+    def to_sse(self) -> str:
+        return f"event: {self.event}\ndata: {json.dumps(self.data)}\n\n"
+
+
+def _is_not_found(e: Exception) -> bool:
+    """ the workflow does not exist (any other query error is treated as transient and retried) """
+    if isinstance(e, RPCError):
+        return e.status == RPCStatusCode.NOT_FOUND
+    return "not found" in str(e).lower()
+
+
+def _is_done(output: dict[str, Any]) -> bool:
+    try:
+        return VerifyWorkflowStatus(str(output.get("workflow_status"))).is_done
+    except ValueError:
+        return False
+
+
+class WorkflowStatusBroadcaster:
+    """ fans the output of a verification workflow out to all its stream subscribers of this api process,
+    one query loop per workflow (not per client) which only publishes an output when it changed and backs off
+    while it does not """
+    query_output: QueryOutput
+    poll_interval_s: float
+    max_poll_interval_s: float
+    subscribers: dict[str, list[asyncio.Queue[StatusEvent]]]
+    latest_events: dict[str, StatusEvent]
+    watchers: dict[str, asyncio.Task[None]]
+
+    def __init__(self, query_output: QueryOutput, poll_interval_s: float, max_poll_interval_s: float) -> None:
+        self.query_output = query_output
+        self.poll_interval_s = poll_interval_s
+        self.max_poll_interval_s = max(poll_interval_s, max_poll_interval_s)
+        self.subscribers = {}
+        self.latest_events = {}
+        self.watchers = {}
+
+    async def subscribe(self, workflow_id: str, keepalive_s: float) -> AsyncGenerator[Optional[StatusEvent], None]:
+        """ yields the latest output and then each change until the workflow is done,
+        None after keepalive_s without a change """
+        queue: asyncio.Queue[StatusEvent] = asyncio.Queue()
+        self.subscribers.setdefault(workflow_id, []).append(queue)
+        latest_event = self.latest_events.get(workflow_id)
+        if latest_event is not None:
+            queue.put_nowait(latest_event)
+        if workflow_id not in self.watchers:
+            self.watchers[workflow_id] = asyncio.create_task(self._watch(workflow_id))
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=keepalive_s)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event.done:
+                    return
+        finally:
+            self._unsubscribe(workflow_id, queue)
+
+    def _unsubscribe(self, workflow_id: str, queue: asyncio.Queue[StatusEvent]) -> None:
+        subscribers = self.subscribers.get(workflow_id, [])
+        if queue in subscribers:
+            subscribers.remove(queue)
+        if len(subscribers) == 0:
+            # the last subscriber stops the query loop, a later subscriber starts a new one
+            self.subscribers.pop(workflow_id, None)
+            self.latest_events.pop(workflow_id, None)
+            watcher = self.watchers.pop(workflow_id, None)
+            if watcher is not None:
+                watcher.cancel()
+
+    def _publish(self, workflow_id: str, event: StatusEvent) -> None:
+        self.latest_events[workflow_id] = event
+        subscribers = self.subscribers.get(workflow_id, [])
+        for queue in subscribers:
+            queue.put_nowait(event)
+        STATUS_STREAM_EVENTS.inc(len(subscribers))
+
+    async def _watch(self, workflow_id: str) -> None:
+        poll_interval_s = self.poll_interval_s
+        while True:
+            STATUS_STREAM_QUERIES.inc()
+            try:
+                output = await self.query_output(workflow_id)
+                event = StatusEvent(event="status", data=output, done=_is_done(output))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"status stream query of workflow {workflow_id} failed: {e}")
+                if not _is_not_found(e):
+                    # e.g. a temporal frontend restart, the subscribers keep their latest event and keepalives
+                    poll_interval_s = min(2 * poll_interval_s, self.max_poll_interval_s)
+                    await asyncio.sleep(poll_interval_s)
+                    continue
+                event = StatusEvent(event="error", data={"detail": f"error retrieving output with id: "
+                                                                   f"{workflow_id}: {str(e)}"}, done=True)
+
+            if event != self.latest_events.get(workflow_id):
+                self._publish(workflow_id, event)
+                poll_interval_s = self.poll_interval_s
+            else:
+                poll_interval_s = min(2 * poll_interval_s, self.max_poll_interval_s)
+            if event.done:
+                # subscribers stay until they received the last event, the next subscriber starts over
+                self.watchers.pop(workflow_id, None)
+                self.latest_events.pop(workflow_id, None)
+                return
+            await asyncio.sleep(poll_interval_s)
@@ -1,7 +1,8 @@
-from biosim_server.biosim_omex.database import OmexDatabaseService, OmexDatabaseServiceMongo
+from biosim_server.biosim_omex.database import OmexDatabaseService, OmexDatabaseServiceMongo, OmexDatabaseServiceCached
 from biosim_server.biosim_omex.models import OmexFile
 from biosim_server.biosim_omex.omex_storage import hash_file_md5, hash_bytes_md5, get_cached_omex_file_from_local, \
-    get_cached_omex_file_from_raw, get_cached_omex_file_from_upload
+    get_cached_omex_file_from_raw, get_cached_omex_file_from_upload, get_cached_omex_file_from_biosim_run, \
+    extract_omex_archives, extract_omex_archives_async, list_omex_archives, OmexArchiveTooLarge
 
 __all__ = [
     "hash_file_md5",
@@ -9,7 +10,13 @@ __all__ = [
     "get_cached_omex_file_from_local",
     "get_cached_omex_file_from_raw",
     "get_cached_omex_file_from_upload",
+    "get_cached_omex_file_from_biosim_run",
+    "extract_omex_archives",
+    "extract_omex_archives_async",
+    "list_omex_archives",
+    "OmexArchiveTooLarge",
     "OmexFile",
     "OmexDatabaseService",
-    "OmexDatabaseServiceMongo"
+    "OmexDatabaseServiceMongo",
+    "OmexDatabaseServiceCached"
 ]
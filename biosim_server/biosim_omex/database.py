@@ -1,5 +1,7 @@
+import asyncio
 import logging
 from abc import abstractmethod, ABC
+from collections import OrderedDict
 
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
@@ -8,6 +10,7 @@ from typing_extensions import override
 
 from biosim_server.config import get_settings
 from biosim_server.biosim_omex.models import OmexFile
+from biosim_server.tracing import traced
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +36,11 @@ class OmexDatabaseService(ABC):
     async def list_omex_files(self) -> list[OmexFile]:
         pass
 
+    @abstractmethod
+    async def list_omex_files_page(self, after_database_id: str | None, limit: int) -> list[OmexFile]:
+        """ up to limit files in insertion order, starting after the file with after_database_id """
+        pass
+
     @abstractmethod
     async def close(self) -> None:
         pass
@@ -48,6 +56,7 @@ class OmexDatabaseServiceMongo(OmexDatabaseService):
         self._omex_file_col = database.get_collection(get_settings().mongodb_collection_omex)
 
     @override
+    @traced("mongo.insert_omex_file")
     async def insert_omex_file(self, omex_file: OmexFile) -> OmexFile:
         if omex_file.database_id is not None:
             raise Exception("Cannot insert document that already has a database id")
@@ -60,8 +69,8 @@ class OmexDatabaseServiceMongo(OmexDatabaseService):
         else:
             raise Exception("Insert failed")
 
-    # @lru_cache
     @override
+    @traced("mongo.get_omex_file", file_hash_md5="omex.hash_md5")
     async def get_omex_file(self, file_hash_md5: str) -> OmexFile | None:
         logger.info(f"Getting OMEX file with hash {file_hash_md5}")
         document = await self._omex_file_col.find_one({"file_hash_md5": file_hash_md5})
@@ -74,6 +83,7 @@ class OmexDatabaseServiceMongo(OmexDatabaseService):
             return None
 
     @override
+    @traced("mongo.delete_omex_file")
     async def delete_omex_file(self, database_id: str) -> None:
         logger.info(f"Deleting OMEX file with database_id {database_id}")
         result = await self._omex_file_col.delete_one({"_id": ObjectId(database_id)})
@@ -90,6 +100,7 @@ class OmexDatabaseServiceMongo(OmexDatabaseService):
             raise Exception("Delete failed")
 
     @override
+    @traced("mongo.list_omex_files")
     async def list_omex_files(self) -> list[OmexFile]:
         logger.info(f"listing OMEX files")
         omex_files: list[OmexFile] = []
@@ -100,6 +111,117 @@ class OmexDatabaseServiceMongo(OmexDatabaseService):
             omex_files.append(OmexFile.model_validate(doc_dict))
         return omex_files
 
+    @override
+    @traced("mongo.list_omex_files_page")
+    async def list_omex_files_page(self, after_database_id: str | None, limit: int) -> list[OmexFile]:
+        query = {"_id": {"$gt": ObjectId(after_database_id)}} if after_database_id is not None else {}
+        omex_files: list[OmexFile] = []
+        for document in await self._omex_file_col.find(query).sort("_id", 1).to_list(length=limit):
+            doc_dict = dict(document)
+            doc_dict["database_id"] = str(document["_id"])
+            del doc_dict["_id"]
+            omex_files.append(OmexFile.model_validate(doc_dict))
+        return omex_files
+
     @override
     async def close(self) -> None:
         self._db_client.close()
+
+
+class OmexDatabaseServiceCached(OmexDatabaseService):
+    """ bounded LRU read-through cache in front of another OmexDatabaseService
+
+    OmexFile records are content addressed (keyed by file_hash_md5) and never updated in place,
+    so cached entries only need to be invalidated when records are deleted.
+    Concurrent lookups of the same uncached hash share a single backend query.
+    """
+    _omex_database: OmexDatabaseService
+    _max_entries: int
+    _cache: OrderedDict[str, OmexFile]
+    _pending: dict[str, asyncio.Task[OmexFile | None]]
+    _generation: int
+    hits: int
+    misses: int
+
+    def __init__(self, omex_database: OmexDatabaseService, max_entries: int = 1000) -> None:
+        self._omex_database = omex_database
+        self._max_entries = max_entries
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @override
+    async def insert_omex_file(self, omex_file: OmexFile) -> OmexFile:
+        inserted_omex_file = await self._omex_database.insert_omex_file(omex_file=omex_file)
+        self._put(inserted_omex_file)
+        return inserted_omex_file
+
+    @override
+    async def get_omex_file(self, file_hash_md5: str) -> OmexFile | None:
+        cached_omex_file = self._cache.get(file_hash_md5)
+        if cached_omex_file is not None:
+            self._cache.move_to_end(file_hash_md5)
+            self.hits += 1
+            logger.debug(f"OMEX file cache hit for hash {file_hash_md5}")
+            return cached_omex_file.model_copy(deep=True)
+
+        self.misses += 1
+        fetch_task = self._pending.get(file_hash_md5)
+        if fetch_task is None:
+            fetch_task = asyncio.create_task(self._fetch(file_hash_md5=file_hash_md5))
+            self._pending[file_hash_md5] = fetch_task
+            fetch_task.add_done_callback(lambda _task: self._pending.pop(file_hash_md5, None))
+        omex_file = await asyncio.shield(fetch_task)
+        return omex_file.model_copy(deep=True) if omex_file is not None else None
+
+    @override
+    async def delete_omex_file(self, database_id: str) -> None:
+        try:
+            await self._omex_database.delete_omex_file(database_id=database_id)
+        finally:
+            self._invalidate(database_id=database_id)
+
+    @override
+    async def delete_all_omex_files(self) -> None:
+        try:
+            await self._omex_database.delete_all_omex_files()
+        finally:
+            self._invalidate()
+
+    @override
+    async def list_omex_files(self) -> list[OmexFile]:
+        return await self._omex_database.list_omex_files()
+
+    @override
+    async def list_omex_files_page(self, after_database_id: str | None, limit: int) -> list[OmexFile]:
+        return await self._omex_database.list_omex_files_page(after_database_id=after_database_id, limit=limit)
+
+    @override
+    async def close(self) -> None:
+        self._invalidate()
+        await self._omex_database.close()
+
+    async def _fetch(self, file_hash_md5: str) -> OmexFile | None:
+        generation = self._generation
+        omex_file = await self._omex_database.get_omex_file(file_hash_md5=file_hash_md5)
+        # don't repopulate the cache if records were deleted while the query was in flight
+        if omex_file is not None and generation == self._generation:
+            self._put(omex_file)
+        return omex_file
+
+    def _put(self, omex_file: OmexFile) -> None:
+        self._cache[omex_file.file_hash_md5] = omex_file.model_copy(deep=True)
+        self._cache.move_to_end(omex_file.file_hash_md5)
+        while len(self._cache) > self._max_entries:
+            self._cache.popitem(last=False)
+
+    def _invalidate(self, database_id: str | None = None) -> None:
+        self._generation += 1
+        if database_id is None:
+            self._cache.clear()
+            return
+        for file_hash_md5, omex_file in list(self._cache.items()):
+            if omex_file.database_id == database_id:
+                del self._cache[file_hash_md5]
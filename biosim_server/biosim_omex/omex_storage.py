@@ -1,7 +1,13 @@
+import asyncio
 import hashlib
+import io
 import logging
+import time
 import uuid
+import zipfile
+from collections import OrderedDict
 from pathlib import Path
+from typing import AsyncGenerator, Iterator
 
 import aiofiles
 from aiofiles import open as aiofiles_open
@@ -11,9 +17,29 @@ from biosim_server.common.storage import FileService
 from biosim_server.config import get_local_cache_dir, get_settings
 from biosim_server.biosim_omex import OmexDatabaseService
 from biosim_server.biosim_omex.models import OmexFile
+from biosim_server.common.timing import StageTiming
+from biosim_server.metrics import UPLOAD_BYTES, record_cache_lookup
 
 logger = logging.getLogger(__name__)
 
+# biosimulations run id -> md5 of its archive.omex, archives are immutable once a run is published,
+# bounded LRU (on a miss the hash comes from the object metadata, see get_cached_omex_file_from_biosim_run)
+_biosim_run_omex_hash_index: OrderedDict[str, str] = OrderedDict()
+
+
+def _get_biosim_run_omex_hash(biosim_run_id: str) -> str | None:
+    file_hash_md5 = _biosim_run_omex_hash_index.get(biosim_run_id)
+    if file_hash_md5 is not None:
+        _biosim_run_omex_hash_index.move_to_end(biosim_run_id)
+    return file_hash_md5
+
+
+def _set_biosim_run_omex_hash(biosim_run_id: str, file_hash_md5: str) -> None:
+    _biosim_run_omex_hash_index[biosim_run_id] = file_hash_md5
+    _biosim_run_omex_hash_index.move_to_end(biosim_run_id)
+    while len(_biosim_run_omex_hash_index) > get_settings().omex_biosim_run_hash_index_max_entries:
+        _biosim_run_omex_hash_index.popitem(last=False)
+
 
 async def hash_file_md5(file_path: Path) -> str:
     hash_func = hashlib.md5()
@@ -29,9 +55,81 @@ async def hash_bytes_md5(file_contents: bytes) -> str:
     return hash_func.hexdigest()
 
 
-async def get_cached_omex_file_from_upload(file_service: FileService, omex_database: OmexDatabaseService, uploaded_file: UploadFile) -> OmexFile:
+class OmexArchiveTooLarge(Exception):
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
+
+
+def _open_omex_zip(contents: bytes) -> tuple[zipfile.ZipFile | None, list[zipfile.ZipInfo]]:
+    """ the zip file and its OMEX archives if the upload is a zip file of OMEX archives, else no archives """
+    try:
+        zip_file = zipfile.ZipFile(io.BytesIO(contents))
+    except zipfile.BadZipFile:
+        return None, []
+    infos = zip_file.infolist()
+    if any(info.filename == "manifest.xml" for info in infos):
+        return zip_file, []
+    return zip_file, [info for info in infos
+                      if info.filename.lower().endswith(".omex") and not info.filename.startswith("__MACOSX/")]
+
+
+def list_omex_archives(contents: bytes, filename: str | None) -> list[tuple[str, int]]:
+    """ the (name, size) of the OMEX archives extract_omex_archives would return, without decompressing them (the
+    size of an archive within a zip file is the one declared by the zip file) """
+    zip_file, omex_infos = _open_omex_zip(contents)
+    if zip_file is not None:
+        zip_file.close()
+    if len(omex_infos) == 0:
+        return [(filename or "upload.omex", len(contents))]
+    return [(info.filename, info.file_size) for info in omex_infos]
+
+
+def extract_omex_archives(contents: bytes, filename: str | None,
+                          max_archive_bytes: int) -> Iterator[tuple[str, bytes]]:
+    """ the (name, contents) of the OMEX archives in an upload, which is either an OMEX archive (a zip file with a
+    manifest.xml) or a zip file of OMEX archives. archives are decompressed one at a time as the iterator advances
+    (blocking, see extract_omex_archives_async), raises OmexArchiveTooLarge for an archive above max_archive_bytes """
+    name = filename or (uuid.uuid4().hex + ".omex")
+    zip_file, omex_infos = _open_omex_zip(contents)
+    if len(omex_infos) == 0:
+        if zip_file is not None:
+            zip_file.close()
+        if len(contents) > max_archive_bytes:
+            raise OmexArchiveTooLarge(f"{name} is larger than {max_archive_bytes} bytes")
+        yield name, contents
+        return
+    assert zip_file is not None
+    with zip_file:
+        for info in omex_infos:
+            # file_size is declared by the zip file, the decompressed size is checked as well
+            if info.file_size > max_archive_bytes:
+                raise OmexArchiveTooLarge(f"{info.filename} is larger than {max_archive_bytes} bytes")
+            with zip_file.open(info) as omex_file:
+                omex_contents = omex_file.read(max_archive_bytes + 1)
+            if len(omex_contents) > max_archive_bytes:
+                raise OmexArchiveTooLarge(f"{info.filename} is larger than {max_archive_bytes} bytes")
+            yield info.filename, omex_contents
+
+
+async def extract_omex_archives_async(contents: bytes, filename: str | None,
+                                      max_archive_bytes: int) -> AsyncGenerator[tuple[str, bytes], None]:
+    """ extract_omex_archives with the decompression in a thread, so it doesn't block the event loop """
+    archives = extract_omex_archives(contents, filename, max_archive_bytes)
+    while (archive := await asyncio.to_thread(next, archives, None)) is not None:
+        yield archive
+
+
+async def get_cached_omex_file_from_upload(file_service: FileService, omex_database: OmexDatabaseService, uploaded_file: UploadFile,
+                                           stage_timings: list[StageTiming] | None = None) -> OmexFile:
+    """ stage_timings (if given) receives the omex_upload and omex_dedup stages """
+    start = time.monotonic()
     contents = await uploaded_file.read()
-    return await get_cached_omex_file_from_raw(file_service, omex_database, contents, uploaded_file.filename)
+    UPLOAD_BYTES.observe(len(contents))
+    if stage_timings is not None:
+        stage_timings.append(StageTiming(stage="omex_upload", duration_s=time.monotonic() - start,
+                                         num_bytes=len(contents)))
+    return await get_cached_omex_file_from_raw(file_service, omex_database, contents, uploaded_file.filename,
+                                               stage_timings=stage_timings)
 
 
 async def get_cached_omex_file_from_local(file_service: FileService, omex_database: OmexDatabaseService, omex_file: Path, filename: str) -> OmexFile:
@@ -40,12 +138,15 @@ async def get_cached_omex_file_from_local(file_service: FileService, omex_databa
     return await get_cached_omex_file_from_raw(file_service, omex_database, contents, filename)
 
 
-async def get_cached_omex_file_from_raw(file_service: FileService, omex_database: OmexDatabaseService, omex_file_contents: bytes, filename: str | None) -> OmexFile:
-
+async def get_cached_omex_file_from_raw(file_service: FileService, omex_database: OmexDatabaseService, omex_file_contents: bytes, filename: str | None,
+                                        stage_timings: list[StageTiming] | None = None) -> OmexFile:
+    start = time.monotonic()
     file_hash_md5: str = hashlib.md5(omex_file_contents).hexdigest()
     logger.info(f"processing downloaded OMEX file with hash {file_hash_md5}")
 
     omex_file: OmexFile | None = await omex_database.get_omex_file(file_hash_md5=file_hash_md5)
+    cache_hit = omex_file is not None
+    record_cache_lookup(cache="omex", hit=cache_hit)
 
     if omex_file is None:
         logger.info(f"OMEX file with hash {file_hash_md5} does not exist in database, with upload to GCS and store in database")
@@ -67,6 +168,32 @@ async def get_cached_omex_file_from_raw(file_service: FileService, omex_database
     else:
         logger.info(f"OMEX file with hash {file_hash_md5} already exists in database {str(omex_file)}")
 
+    if stage_timings is not None:
+        # hashing plus the database lookup, and the storage upload and insert on a cache miss
+        stage_timings.append(StageTiming(stage="omex_dedup", duration_s=time.monotonic() - start,
+                                         num_bytes=len(omex_file_contents), cache_hit=cache_hit))
     return omex_file
 
 
+async def get_cached_omex_file_from_biosim_run(file_service: FileService, omex_database: OmexDatabaseService, biosim_run_id: str) -> OmexFile:
+    """ resolve the archive of a biosimulations run by hash (index or object metadata) before falling back to a download """
+    biosimulations_omex_path = f"simulations/{biosim_run_id}/archive.omex"
+
+    file_hash_md5: str | None = _get_biosim_run_omex_hash(biosim_run_id)
+    if file_hash_md5 is None:
+        file_hash_md5 = await file_service.get_object_hash(biosimulations_omex_path)
+    if file_hash_md5 is not None:
+        omex_file: OmexFile | None = await omex_database.get_omex_file(file_hash_md5=file_hash_md5)
+        if omex_file is not None:
+            logger.info(f"OMEX file for run_id {biosim_run_id} already exists with hash {file_hash_md5}, skipping download")
+            _set_biosim_run_omex_hash(biosim_run_id, file_hash_md5)
+            return omex_file
+
+    content: bytes | None = await file_service.get_file_contents(biosimulations_omex_path)
+    if content is None:
+        raise FileNotFoundError(f"Could not find file for run_id {biosim_run_id}")
+    omex_file = await get_cached_omex_file_from_raw(file_service=file_service, omex_database=omex_database,
+                                                    omex_file_contents=content,
+                                                    filename=biosimulations_omex_path.replace("/", "_"))
+    _set_biosim_run_omex_hash(biosim_run_id, omex_file.file_hash_md5)
+    return omex_file
@@ -1,15 +1,24 @@
 from biosim_server.biosim_runs.activities import get_existing_biosim_simulation_run_activity, \
     GetExistingBiosimSimulationRunActivityInput, submit_biosim_simulation_run_activity, \
-    SubmitBiosimSimulationRunActivityInput
+    SubmitBiosimSimulationRunActivityInput, submit_biosim_simulation_runs_activity, \
+    SubmitBiosimSimulationRunsActivityInput, list_omex_files_activity, ListOmexFilesActivityInput, \
+    get_cached_biosim_simulation_runs_activity, GetCachedBiosimSimulationRunsActivityInput, \
+    save_regression_sweep_results_activity, SaveRegressionSweepResultsActivityInput
 from biosim_server.biosim_runs.biosim_service import BiosimService, BiosimServiceRest
 from biosim_server.biosim_runs.database import DatabaseService, DocumentNotFoundError, DatabaseServiceMongo
 from biosim_server.biosim_runs.models import HDF5Attribute, HDF5Dataset, HDF5Group, HDF5File, Hdf5DataValues, \
-    BiosimulatorVersion, BiosimSimulationRun, BiosimSimulationRunStatus, BiosimulatorWorkflowRun
+    BiosimulatorVersion, BiosimSimulationRun, BiosimSimulationRunStatus, BiosimulatorWorkflowRun, \
+    RegressionSweepArchiveResult
 from biosim_server.biosim_runs.workflows import OmexSimWorkflow, OmexSimWorkflowInput, OmexSimWorkflowOutput, OmexSimWorkflowStatus
 
 __all__ = ['HDF5Attribute', 'HDF5Dataset', 'HDF5Group', 'HDF5File', 'Hdf5DataValues', 'BiosimulatorVersion',
-           'BiosimSimulationRun', 'BiosimSimulationRunStatus', 'BiosimulatorWorkflowRun', 'BiosimService',
+           'BiosimSimulationRun', 'BiosimSimulationRunStatus', 'BiosimulatorWorkflowRun',
+           'RegressionSweepArchiveResult', 'BiosimService',
            'BiosimServiceRest', 'DatabaseService', 'DocumentNotFoundError', 'DatabaseServiceMongo',
            'get_existing_biosim_simulation_run_activity', 'GetExistingBiosimSimulationRunActivityInput',
            'submit_biosim_simulation_run_activity', 'SubmitBiosimSimulationRunActivityInput',
+           'submit_biosim_simulation_runs_activity', 'SubmitBiosimSimulationRunsActivityInput',
+           'list_omex_files_activity', 'ListOmexFilesActivityInput',
+           'get_cached_biosim_simulation_runs_activity', 'GetCachedBiosimSimulationRunsActivityInput',
+           'save_regression_sweep_results_activity', 'SaveRegressionSweepResultsActivityInput',
            'OmexSimWorkflow', 'OmexSimWorkflowInput', 'OmexSimWorkflowOutput', 'OmexSimWorkflowStatus']
@@ -1,25 +1,41 @@
 import asyncio
 import logging
 import os
+import time
 from typing import Optional
 
 from aiohttp import ClientResponseError
 from pydantic import BaseModel
+from opentelemetry import trace
 from temporalio import activity
 
-from biosim_server.biosim_omex import OmexFile, get_cached_omex_file_from_raw
-from biosim_server.biosim_runs.biosim_service import BiosimService, BiosimServiceRest
+from biosim_server.biosim_omex import OmexFile, get_cached_omex_file_from_biosim_run
+from biosim_server.biosim_runs.biosim_service import BiosimService
 from biosim_server.biosim_runs.models import BiosimSimulationRun, BiosimulatorVersion, BiosimSimulationRunStatus, \
-    BiosimulatorWorkflowRun, HDF5File
+    BiosimulatorWorkflowRun, HDF5File, RegressionSweepArchiveResult
 from biosim_server.common.storage import FileService
+from biosim_server.common.timing import StageTiming
+from biosim_server.config import get_settings
 from biosim_server.dependencies import get_file_service, get_biosim_service, get_database_service, \
     get_omex_database_service
+from biosim_server.metrics import RUN_STATUS_POLLS, record_cache_lookup
+from biosim_server.profiling import profile_activity
+
+
+_QUEUED_STATUSES = [BiosimSimulationRunStatus.CREATED, BiosimSimulationRunStatus.QUEUED]
+_DONE_STATUSES = [BiosimSimulationRunStatus.SUCCEEDED, BiosimSimulationRunStatus.FAILED,
+                  BiosimSimulationRunStatus.RUN_ID_NOT_FOUND]
+
+
+def _simulator_name(simulator_version: BiosimulatorVersion) -> str:
+    return f"{simulator_version.id}:{simulator_version.version}"
 
 
 class GetExistingBiosimSimulationRunActivityInput(BaseModel):
     workflow_id: str
     biosim_run_id: str
     abort_on_not_found: Optional[bool] = False
+    profile: bool = False
 
 
 class GetExistingBiosimSimulationRunActivityOutput(BaseModel):
@@ -30,20 +46,30 @@ class GetExistingBiosimSimulationRunActivityOutput(BaseModel):
 
 @activity.defn
 async def get_existing_biosim_simulation_run_activity(input: GetExistingBiosimSimulationRunActivityInput) -> GetExistingBiosimSimulationRunActivityOutput:
+    async with profile_activity(requested=input.profile):
+        return await _get_existing_biosim_simulation_run(input)
+
+
+async def _get_existing_biosim_simulation_run(input: GetExistingBiosimSimulationRunActivityInput) -> GetExistingBiosimSimulationRunActivityOutput:
     try:
         activity.logger.setLevel(logging.INFO)
+        trace.get_current_span().set_attribute("biosim.run_id", input.biosim_run_id)
 
         # if already saved in the database, return the biosimulator workflow run
+        start = time.monotonic()
         database_service = get_database_service()
         assert database_service is not None
         biosim_workflow_runs: list[BiosimulatorWorkflowRun] = await database_service.get_biosimulator_workflow_runs_by_biosim_runid(biosim_run_id=input.biosim_run_id)
         if len(biosim_workflow_runs) > 0 and biosim_workflow_runs[0].biosim_run is not None:
             activity.logger.info(f"returning cached BiosimulatorWorkflowRun _id={biosim_workflow_runs[0].database_id}")
+            biosim_workflow_runs[0].stage_timings = [
+                StageTiming(stage="run_import", duration_s=time.monotonic() - start,
+                            simulator=_simulator_name(biosim_workflow_runs[0].simulator_version), cache_hit=True)]
             return GetExistingBiosimSimulationRunActivityOutput(
                 status=biosim_workflow_runs[0].biosim_run.status,
                 biosim_workflow_run=biosim_workflow_runs[0])
 
-        # not found in database, retrieve the simulation run from biosimulations.org
+        # not found in database, retrieve the simulation run from biosimulations.org (the slurm backend forwards it)
         biosim_service = get_biosim_service()
         if biosim_service is None:
             raise Exception("Biosim service is not initialized")
@@ -70,18 +96,19 @@ async def get_existing_biosim_simulation_run_activity(input: GetExistingBiosimSi
         omex_database_service = get_omex_database_service()
         if omex_database_service is None:
             raise Exception("Omex database service is not initialized")
-        biosimulations_omex_path = f"simulations/{simulation_run.id}/archive.omex"
-        content: bytes | None = await file_service.get_file_contents(biosimulations_omex_path)
-        if content is None:
-            raise FileNotFoundError(f"Could not find file for run_id {simulation_run.id}")
-        omex_file = await get_cached_omex_file_from_raw(file_service=file_service, omex_database=omex_database_service,
-                                                        omex_file_contents=content,
-                                                        filename=biosimulations_omex_path.replace("/", "_"))
+        omex_file = await get_cached_omex_file_from_biosim_run(file_service=file_service,
+                                                               omex_database=omex_database_service,
+                                                               biosim_run_id=simulation_run.id)
 
+        simulator = _simulator_name(simulation_run.simulator_version)
+        import_end = time.monotonic()
 
         # retrieve the HDF5File from the completed run
-        biosim_service = BiosimServiceRest()
         hdf5_file: HDF5File = await biosim_service.get_hdf5_metadata(simulation_run.id)
+        stage_timings = [
+            StageTiming(stage="run_import", duration_s=import_end - start, simulator=simulator,
+                        num_bytes=omex_file.file_size, cache_hit=False),
+            StageTiming(stage="metadata_fetch", duration_s=time.monotonic() - import_end, simulator=simulator)]
 
         # save the simulation run in the database
         cache_buster = f"imported biosimulations run_id {simulation_run.id}"
@@ -96,6 +123,7 @@ async def get_existing_biosim_simulation_run_activity(input: GetExistingBiosimSi
             hdf5_file=hdf5_file)
 
         save_biosimulator_workflow_run = await database_service.insert_biosimulator_workflow_run(sim_workflow_run=biosim_workflow_run)
+        save_biosimulator_workflow_run.stage_timings = stage_timings
         activity.logger.info(f"returning newly saved BiosimulatorWorkflowRun _id={save_biosimulator_workflow_run.database_id}")
         return GetExistingBiosimSimulationRunActivityOutput(biosim_workflow_run=save_biosimulator_workflow_run,
                                                             status=simulation_run.status, error_message=None)
@@ -109,23 +137,40 @@ class SubmitBiosimSimulationRunActivityInput(BaseModel):
     omex_file: OmexFile
     simulator_version: BiosimulatorVersion
     cache_buster: str
+    profile: bool = False
 
 
 @activity.defn
 async def submit_biosim_simulation_run_activity(input: SubmitBiosimSimulationRunActivityInput) -> BiosimulatorWorkflowRun:
+    async with profile_activity(requested=input.profile):
+        return await _submit_biosim_simulation_run(input)
+
+
+async def _submit_biosim_simulation_run(input: SubmitBiosimSimulationRunActivityInput) -> BiosimulatorWorkflowRun:
     try:
         activity.logger.setLevel(logging.INFO)
+        span = trace.get_current_span()
+        span.set_attribute("omex.hash_md5", input.omex_file.file_hash_md5)
+        simulator = _simulator_name(input.simulator_version)
+        span.set_attribute("simulator", simulator)
 
         # if already saved in the database, return the biosimulator workflow run
+        start = time.monotonic()
         database_service = get_database_service()
         assert database_service is not None
         biosim_workflow_runs: list[BiosimulatorWorkflowRun] = await database_service.get_biosimulator_workflow_runs(
             file_hash_md5=input.omex_file.file_hash_md5, image_digest=input.simulator_version.image_digest,
             cache_buster=input.cache_buster)
-        if (len(biosim_workflow_runs) > 0 and biosim_workflow_runs[0].biosim_run is not None
-                and biosim_workflow_runs[0].biosim_run.status == BiosimSimulationRunStatus.SUCCEEDED):
+        cache_hit = (len(biosim_workflow_runs) > 0 and biosim_workflow_runs[0].biosim_run is not None
+                     and biosim_workflow_runs[0].biosim_run.status == BiosimSimulationRunStatus.SUCCEEDED)
+        record_cache_lookup(cache="biosim_run", hit=cache_hit)
+        span.set_attribute("cache_hit", cache_hit)
+        if cache_hit:
             activity.logger.info(f"returning cached BiosimulatorWorkflowRun _id={biosim_workflow_runs[0].database_id}")
-            return biosim_workflow_runs[0]
+            cached_workflow_run = biosim_workflow_runs[0]
+            cached_workflow_run.stage_timings = [StageTiming(stage="simulation", duration_s=time.monotonic() - start,
+                                                             simulator=simulator, cache_hit=True)]
+            return cached_workflow_run
 
         # not found in database, submit the simulation to biosimulations.org
         biosim_service: BiosimService | None = get_biosim_service()
@@ -134,19 +179,39 @@ async def submit_biosim_simulation_run_activity(input: SubmitBiosimSimulationRun
         file_service: FileService | None = get_file_service()
         if file_service is None:
             raise Exception("File service is not initialized")
-        (_gcs_path, local_omex_path) = await file_service.download_file(gcs_path=input.omex_file.omex_gcs_path)
-        activity.logger.info(f"Downloaded OMEX file from gcs_path {input.omex_file.omex_gcs_path} to local path {local_omex_path}")
-        simulation_run = await biosim_service.run_biosim_sim(local_omex_path=local_omex_path, omex_name=input.omex_file.uploaded_filename,
-                                                             simulator_version=input.simulator_version)
-        os.remove(local_omex_path)
-        activity.logger.info(f"Deleted local OMEX file at {local_omex_path}")
-
-        # poll for the simulation run status until complete
-        while simulation_run.status not in [BiosimSimulationRunStatus.SUCCEEDED, BiosimSimulationRunStatus.FAILED,
-                                            BiosimSimulationRunStatus.RUN_ID_NOT_FOUND]:
+        if get_settings().biosimulations_submit_streaming:
+            # stream the archive from storage straight into the request body, no local copy
+            activity.logger.info(f"Streaming OMEX file from gcs_path {input.omex_file.omex_gcs_path} to biosimulations")
+            simulation_run = await biosim_service.run_biosim_sim_stream(
+                omex_stream=file_service.iter_file_contents(gcs_path=input.omex_file.omex_gcs_path),
+                omex_name=input.omex_file.uploaded_filename, simulator_version=input.simulator_version)
+        else:
+            (_gcs_path, local_omex_path) = await file_service.download_file(gcs_path=input.omex_file.omex_gcs_path,
+                                                                            file_hash_md5=input.omex_file.file_hash_md5)
+            activity.logger.info(f"Downloaded OMEX file from gcs_path {input.omex_file.omex_gcs_path} to local path {local_omex_path}")
+            simulation_run = await biosim_service.run_biosim_sim(local_omex_path=local_omex_path, omex_name=input.omex_file.uploaded_filename,
+                                                                 simulator_version=input.simulator_version)
+            os.remove(local_omex_path)
+            activity.logger.info(f"Deleted local OMEX file at {local_omex_path}")
+
+        submitted_at = time.monotonic()
+
+        # poll for the simulation run status until complete, the queue/run split is only as precise as the poll interval
+        num_polls = 0
+        started_at: float | None = None
+        while simulation_run.status not in _DONE_STATUSES:
+            if started_at is None and simulation_run.status not in _QUEUED_STATUSES:
+                started_at = time.monotonic()
             await asyncio.sleep(3)
             activity.heartbeat("Polling simulation run status")
             simulation_run = await biosim_service.get_sim_run(simulation_run.id)
+            num_polls += 1
+        completed_at = time.monotonic()
+        if started_at is None:
+            started_at = completed_at
+        RUN_STATUS_POLLS.observe(num_polls)
+        span.set_attribute("biosim.run_id", simulation_run.id)
+        span.set_attribute("biosim.status_polls", num_polls)
 
         hdf5_file: HDF5File | None = None
         try:
@@ -156,6 +221,12 @@ async def submit_biosim_simulation_run_activity(input: SubmitBiosimSimulationRun
             if e.status == 404:
                 activity.logger.exception(f"HDF5File for run id {simulation_run.id} not found.", exc_info=e)
             raise e
+        stage_timings = [
+            StageTiming(stage="simulation_submit", duration_s=submitted_at - start, simulator=simulator,
+                        num_bytes=input.omex_file.file_size, cache_hit=False),
+            StageTiming(stage="simulation_queue", duration_s=started_at - submitted_at, simulator=simulator),
+            StageTiming(stage="simulation_run", duration_s=completed_at - started_at, simulator=simulator),
+            StageTiming(stage="metadata_fetch", duration_s=time.monotonic() - completed_at, simulator=simulator)]
 
         # save the simulation run in the database
         biosim_workflow_run = BiosimulatorWorkflowRun(
@@ -169,8 +240,250 @@ async def submit_biosim_simulation_run_activity(input: SubmitBiosimSimulationRun
             hdf5_file=hdf5_file)
 
         save_biosimulator_workflow_run = await database_service.insert_biosimulator_workflow_run(sim_workflow_run=biosim_workflow_run)
+        save_biosimulator_workflow_run.stage_timings = stage_timings
         activity.logger.info(f"returning newly saved BiosimulatorWorkflowRun _id={save_biosimulator_workflow_run.database_id}")
         return save_biosimulator_workflow_run
     except Exception as e:
         activity.logger.exception(f"Failed to submit biosim simulation run: {str(e)}", exc_info=e)
-        raise e
\ No newline at end of file
+        raise e
+
+class SubmitBiosimSimulationRunsActivityInput(BaseModel):
+    workflow_id: str
+    simulations: list[tuple[OmexFile, BiosimulatorVersion]]
+    cache_buster: str
+    max_concurrent: Optional[int] = None  # simulations running at once, where the backend can limit it
+    profile: bool = False
+
+
+class SubmitBiosimSimulationRunsActivityOutput(BaseModel):
+    biosim_workflow_runs: list[BiosimulatorWorkflowRun]  # in the order of the simulations, failed runs without hdf5_file
+
+
+@activity.defn
+async def submit_biosim_simulation_runs_activity(input: SubmitBiosimSimulationRunsActivityInput) \
+        -> SubmitBiosimSimulationRunsActivityOutput:
+    """ submit_biosim_simulation_run_activity for many simulations at once (e.g. all simulators of a verification),
+    submitted in a single batch where the backend supports it (a Slurm job array) and polled together """
+    async with profile_activity(requested=input.profile):
+        return await _submit_biosim_simulation_runs(input)
+
+
+async def _submit_biosim_simulation_runs(input: SubmitBiosimSimulationRunsActivityInput) \
+        -> SubmitBiosimSimulationRunsActivityOutput:
+    try:
+        activity.logger.setLevel(logging.INFO)
+        span = trace.get_current_span()
+        span.set_attribute("simulation_count", len(input.simulations))
+
+        # simulations already saved in the database are not submitted again
+        start = time.monotonic()
+        database_service = get_database_service()
+        assert database_service is not None
+        workflow_runs: list[BiosimulatorWorkflowRun | None] = []
+        for omex_file, simulator_version in input.simulations:
+            biosim_workflow_runs = await database_service.get_biosimulator_workflow_runs(
+                file_hash_md5=omex_file.file_hash_md5, image_digest=simulator_version.image_digest,
+                cache_buster=input.cache_buster)
+            cache_hit = (len(biosim_workflow_runs) > 0 and biosim_workflow_runs[0].biosim_run is not None
+                         and biosim_workflow_runs[0].biosim_run.status == BiosimSimulationRunStatus.SUCCEEDED)
+            record_cache_lookup(cache="biosim_run", hit=cache_hit)
+            if cache_hit:
+                cached_workflow_run = biosim_workflow_runs[0]
+                cached_workflow_run.stage_timings = [StageTiming(stage="simulation",
+                                                                 duration_s=time.monotonic() - start,
+                                                                 simulator=_simulator_name(simulator_version),
+                                                                 cache_hit=True)]
+                workflow_runs.append(cached_workflow_run)
+            else:
+                workflow_runs.append(None)
+        submit_indices = [index for index, workflow_run in enumerate(workflow_runs) if workflow_run is None]
+        activity.logger.info(f"returning {len(input.simulations) - len(submit_indices)} cached "
+                             f"BiosimulatorWorkflowRuns, submitting {len(submit_indices)} simulations")
+        if len(submit_indices) == 0:
+            return SubmitBiosimSimulationRunsActivityOutput(
+                biosim_workflow_runs=[workflow_run for workflow_run in workflow_runs if workflow_run is not None])
+
+        biosim_service: BiosimService | None = get_biosim_service()
+        if biosim_service is None:
+            raise Exception("Biosim service is not initialized")
+        file_service: FileService | None = get_file_service()
+        if file_service is None:
+            raise Exception("File service is not initialized")
+        submissions = [input.simulations[index] for index in submit_indices]
+        if get_settings().biosimulations_submit_streaming:
+            # stream each archive from storage straight into its request body, no local copy
+            simulation_runs = [await biosim_service.run_biosim_sim_stream(
+                omex_stream=file_service.iter_file_contents(gcs_path=omex_file.omex_gcs_path),
+                omex_name=omex_file.uploaded_filename, simulator_version=simulator_version)
+                for omex_file, simulator_version in submissions]
+        else:
+            # each distinct archive is downloaded once
+            local_omex_paths: dict[str, str] = {}
+            try:
+                for omex_file, _ in submissions:
+                    if omex_file.file_hash_md5 not in local_omex_paths:
+                        (_gcs_path, local_omex_path) = await file_service.download_file(
+                            gcs_path=omex_file.omex_gcs_path, file_hash_md5=omex_file.file_hash_md5)
+                        local_omex_paths[omex_file.file_hash_md5] = local_omex_path
+                        activity.heartbeat("Downloading OMEX files")
+                simulation_runs = await biosim_service.run_biosim_sims(
+                    sims=[(local_omex_paths[omex_file.file_hash_md5], omex_file.uploaded_filename, simulator_version)
+                          for omex_file, simulator_version in submissions],
+                    max_concurrent=input.max_concurrent)
+            finally:
+                for local_omex_path in local_omex_paths.values():
+                    os.remove(local_omex_path)
+
+        submitted_at = time.monotonic()
+
+        # poll the unfinished runs together until all are complete, the queue/run split of each run is only as
+        # precise as the poll interval
+        num_polls = 0
+        started_at: list[float | None] = [None] * len(simulation_runs)
+        completed_at: list[float | None] = [None] * len(simulation_runs)
+        while True:
+            now = time.monotonic()
+            for index, simulation_run in enumerate(simulation_runs):
+                if started_at[index] is None and simulation_run.status not in _QUEUED_STATUSES:
+                    started_at[index] = now
+                if completed_at[index] is None and simulation_run.status in _DONE_STATUSES:
+                    completed_at[index] = now
+            if all(simulation_run.status in _DONE_STATUSES for simulation_run in simulation_runs):
+                break
+            await asyncio.sleep(3)
+            activity.heartbeat("Polling simulation run status")
+            polled_indices = [index for index, simulation_run in enumerate(simulation_runs)
+                              if simulation_run.status not in _DONE_STATUSES]
+            polled_runs = await asyncio.gather(*[biosim_service.get_sim_run(simulation_runs[index].id)
+                                                 for index in polled_indices], return_exceptions=True)
+            for index, polled_run in zip(polled_indices, polled_runs):
+                if isinstance(polled_run, BaseException):
+                    # a failed status query of one run doesn't fail the others, it is retried with the next poll
+                    activity.logger.warning(f"Failed to get the status of run {simulation_runs[index].id}: "
+                                            f"{polled_run}")
+                    continue
+                simulation_runs[index] = polled_run
+            num_polls += 1
+        RUN_STATUS_POLLS.observe(num_polls)
+        span.set_attribute("biosim.run_ids", [simulation_run.id for simulation_run in simulation_runs])
+        span.set_attribute("biosim.status_polls", num_polls)
+
+        # the results of the whole batch in one bulk transfer, a run whose results are still missing afterwards is
+        # retrieved (or fails) on its own by get_hdf5_metadata below
+        activity.heartbeat("Retrieving the results")
+        try:
+            await biosim_service.prefetch_results([simulation_run.id for simulation_run in simulation_runs
+                                                   if simulation_run.status == BiosimSimulationRunStatus.SUCCEEDED])
+        except Exception:
+            activity.logger.exception("Failed to prefetch the results of the batch, retrieving them one by one")
+
+        for run_index, (index, (omex_file, simulator_version), simulation_run) in enumerate(
+                zip(submit_indices, submissions, simulation_runs)):
+            simulator = _simulator_name(simulator_version)
+            run_completed_at = completed_at[run_index] or time.monotonic()
+            run_started_at = started_at[run_index] or run_completed_at
+            stage_timings = [
+                StageTiming(stage="simulation_submit", duration_s=submitted_at - start, simulator=simulator,
+                            num_bytes=omex_file.file_size, cache_hit=False),
+                StageTiming(stage="simulation_queue", duration_s=run_started_at - submitted_at, simulator=simulator),
+                StageTiming(stage="simulation_run", duration_s=run_completed_at - run_started_at, simulator=simulator)]
+            metadata_start = time.monotonic()
+            activity.heartbeat("Retrieving HDF5 metadata")
+            hdf5_file: HDF5File | None = None
+            if simulation_run.status == BiosimSimulationRunStatus.SUCCEEDED:
+                try:
+                    hdf5_file = await biosim_service.get_hdf5_metadata(simulation_run.id)
+                except Exception as e:
+                    # only this simulator fails, its run is not saved so that it is not reused as a cached run
+                    activity.logger.exception(f"Failed to get the HDF5 metadata of run {simulation_run.id}",
+                                              exc_info=e)
+                    workflow_runs[index] = BiosimulatorWorkflowRun(
+                        workflow_id=input.workflow_id, file_hash_md5=omex_file.file_hash_md5,
+                        image_digest=simulator_version.image_digest, cache_buster=input.cache_buster,
+                        omex_file=omex_file, simulator_version=simulator_version,
+                        biosim_run=simulation_run.model_copy(update={
+                            "status": BiosimSimulationRunStatus.FAILED,
+                            "error_message": f"HDF5 metadata of run {simulation_run.id} not available: {e}"}),
+                        stage_timings=stage_timings)
+                    continue
+            stage_timings.append(StageTiming(stage="metadata_fetch", duration_s=time.monotonic() - metadata_start,
+                                             simulator=simulator))
+            biosim_workflow_run = BiosimulatorWorkflowRun(
+                workflow_id=input.workflow_id,
+                file_hash_md5=omex_file.file_hash_md5,
+                image_digest=simulator_version.image_digest,
+                cache_buster=input.cache_buster,
+                omex_file=omex_file,
+                simulator_version=simulator_version,
+                biosim_run=simulation_run,
+                hdf5_file=hdf5_file)
+            saved_workflow_run = await database_service.insert_biosimulator_workflow_run(
+                sim_workflow_run=biosim_workflow_run)
+            saved_workflow_run.stage_timings = stage_timings
+            workflow_runs[index] = saved_workflow_run
+        activity.logger.info(f"returning {len(submit_indices)} newly saved BiosimulatorWorkflowRuns")
+        return SubmitBiosimSimulationRunsActivityOutput(
+            biosim_workflow_runs=[workflow_run for workflow_run in workflow_runs if workflow_run is not None])
+    except Exception as e:
+        activity.logger.exception(f"Failed to submit biosim simulation runs: {str(e)}", exc_info=e)
+        raise e
+
+
+class ListOmexFilesActivityInput(BaseModel):
+    after_database_id: Optional[str] = None
+    limit: int
+
+
+class ListOmexFilesActivityOutput(BaseModel):
+    omex_files: list[OmexFile]
+
+
+@activity.defn
+async def list_omex_files_activity(input: ListOmexFilesActivityInput) -> ListOmexFilesActivityOutput:
+    """ a page of the stored OMEX files, see OmexDatabaseService.list_omex_files_page """
+    omex_database_service = get_omex_database_service()
+    if omex_database_service is None:
+        raise Exception("Omex database service is not initialized")
+    omex_files = await omex_database_service.list_omex_files_page(after_database_id=input.after_database_id,
+                                                                  limit=input.limit)
+    return ListOmexFilesActivityOutput(omex_files=omex_files)
+
+
+class GetCachedBiosimSimulationRunsActivityInput(BaseModel):
+    file_hashes_md5: list[str]
+    simulator_version: BiosimulatorVersion
+
+
+class GetCachedBiosimSimulationRunsActivityOutput(BaseModel):
+    biosim_workflow_runs: dict[str, BiosimulatorWorkflowRun]  # by file_hash_md5, files without a cached run are absent
+
+
+@activity.defn
+async def get_cached_biosim_simulation_runs_activity(input: GetCachedBiosimSimulationRunsActivityInput) \
+        -> GetCachedBiosimSimulationRunsActivityOutput:
+    """ the most recent succeeded run of the simulator for each of the files (whatever its cache buster), without
+    submitting any simulations """
+    database_service = get_database_service()
+    assert database_service is not None
+    biosim_workflow_runs = await database_service.get_biosimulator_workflow_runs_for_files(
+        file_hashes_md5=input.file_hashes_md5, image_digest=input.simulator_version.image_digest)
+    cached_runs: dict[str, BiosimulatorWorkflowRun] = {}
+    for biosim_workflow_run in biosim_workflow_runs:
+        if (biosim_workflow_run.biosim_run is not None and biosim_workflow_run.hdf5_file is not None
+                and biosim_workflow_run.biosim_run.status == BiosimSimulationRunStatus.SUCCEEDED):
+            cached_runs[biosim_workflow_run.file_hash_md5] = biosim_workflow_run
+    activity.logger.info(f"found cached {_simulator_name(input.simulator_version)} runs for {len(cached_runs)} "
+                         f"of {len(input.file_hashes_md5)} OMEX files")
+    return GetCachedBiosimSimulationRunsActivityOutput(biosim_workflow_runs=cached_runs)
+
+
+class SaveRegressionSweepResultsActivityInput(BaseModel):
+    results: list[RegressionSweepArchiveResult]
+
+
+@activity.defn
+async def save_regression_sweep_results_activity(input: SaveRegressionSweepResultsActivityInput) -> None:
+    """ stores the regressions and failures of a page of a regression sweep, the workflow only keeps counts """
+    database_service = get_database_service()
+    assert database_service is not None
+    await database_service.save_regression_sweep_results(input.results)
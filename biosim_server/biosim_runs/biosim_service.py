@@ -1,24 +1,29 @@
+import json
 import logging
 import os
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, AsyncIterator, BinaryIO
 
 import aiofiles
 import aiohttp
 from aiocache import SimpleMemoryCache, cached  # type: ignore
 from aiohttp import FormData
+from opentelemetry import trace
 from typing_extensions import override
 
 from biosim_server.biosim_runs.models import BiosimulatorVersion, BiosimSimulationRun, \
     BiosimSimulationRunStatus, HDF5File, Hdf5DataValues, BiosimSimulationRunApiRequest
 from biosim_server.config import get_settings
+from biosim_server.metrics import SIMDATA_REQUEST_DURATION, SIMDATA_RESPONSE_BYTES
+from biosim_server.tracing import traced
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
 class BiosimService(ABC):
+    supports_batch: bool = False  # run_biosim_sims submits a batch at once and honors max_concurrent
 
     @abstractmethod
     async def get_sim_run(self, simulation_run_id: str) -> BiosimSimulationRun:
@@ -28,6 +33,21 @@ class BiosimService(ABC):
     async def run_biosim_sim(self, local_omex_path: str, omex_name: str, simulator_version: BiosimulatorVersion) -> BiosimSimulationRun:
         pass
 
+    async def run_biosim_sims(self, sims: list[tuple[str, str, BiosimulatorVersion]],
+                              max_concurrent: int | None = None) -> list[BiosimSimulationRun]:
+        """ submit many (local_omex_path, omex_name, simulator_version) simulations, one by one unless the backend
+        can batch them (e.g. as a Slurm job array which runs at most max_concurrent of them at once). without
+        supports_batch max_concurrent is not applied, the workflows then submit each simulation on its own """
+        return [await self.run_biosim_sim(local_omex_path=local_omex_path, omex_name=omex_name,
+                                          simulator_version=simulator_version)
+                for local_omex_path, omex_name, simulator_version in sims]
+
+    @abstractmethod
+    async def run_biosim_sim_stream(self, omex_stream: AsyncIterator[bytes], omex_name: str,
+                                    simulator_version: BiosimulatorVersion) -> BiosimSimulationRun:
+        """ submit an OMEX archive streamed in chunks (e.g. directly from storage) rather than from a local file """
+        pass
+
     @abstractmethod
     async def get_hdf5_metadata(self, simulation_run_id: str) -> HDF5File:
         pass
@@ -36,10 +56,19 @@ class BiosimService(ABC):
     async def get_hdf5_data(self, simulation_run_id: str, dataset_name: str) -> Hdf5DataValues:
         pass
 
+    async def prefetch_results(self, simulation_run_ids: list[str]) -> None:
+        """ retrieve the results of many finished runs at once ahead of get_hdf5_metadata/get_hdf5_data, where the
+        backend can do better than one download per run """
+        pass
+
     @abstractmethod
     async def get_simulator_versions(self) -> list[BiosimulatorVersion]:
         pass
 
+    def start(self) -> None:
+        """ start background tasks (e.g. job status polling), only in the workers running the simulation activities """
+        pass
+
     @abstractmethod
     async def close(self) -> None:
         pass
@@ -48,6 +77,7 @@ class BiosimService(ABC):
 
 class BiosimServiceRest(BiosimService):
     @override
+    @traced("biosimulations.get_sim_run", simulation_run_id="biosim.run_id")
     async def get_sim_run(self, simulation_run_id: str) -> BiosimSimulationRun:
         logger.info(f"Polling simulation with simulation run_id {simulation_run_id}")
 
@@ -72,24 +102,39 @@ class BiosimServiceRest(BiosimService):
 
 
     @override
+    @traced("biosimulations.run_biosim_sim", omex_name="omex.name")
     async def run_biosim_sim(self, local_omex_path: str, omex_name: str,
                              simulator_version: BiosimulatorVersion) -> BiosimSimulationRun:
         logger.info(f"Submitting simulation for {omex_name} with local path {local_omex_path} with simulator {simulator_version.id}")
+        with Path(local_omex_path).open('rb') as f:
+            return await self._submit_sim_run(omex_data=f, omex_name=omex_name, simulator_version=simulator_version)
 
+    @override
+    @traced("biosimulations.run_biosim_sim_stream", omex_name="omex.name")
+    async def run_biosim_sim_stream(self, omex_stream: AsyncIterator[bytes], omex_name: str,
+                                    simulator_version: BiosimulatorVersion) -> BiosimSimulationRun:
+        logger.info(f"Submitting streamed simulation for {omex_name} with simulator {simulator_version.id}")
+        return await self._submit_sim_run(omex_data=omex_stream, omex_name=omex_name,
+                                          simulator_version=simulator_version)
+
+    async def _submit_sim_run(self, omex_data: BinaryIO | AsyncIterator[bytes], omex_name: str,
+                              simulator_version: BiosimulatorVersion) -> BiosimSimulationRun:
+        """ aiohttp streams either payload type into the multipart body, the archive is never fully buffered """
+        span = trace.get_current_span()
+        span.set_attribute("simulator", f"{simulator_version.id}:{simulator_version.version}")
         simulation_run_request = BiosimSimulationRunApiRequest(name=omex_name, simulator=simulator_version.id,
                                                                simulatorVersion=simulator_version.version, maxTime=600)
 
         async with aiohttp.ClientSession() as session:
-            with Path(local_omex_path).open('rb') as f:
-                data = FormData()
-                data.add_field(name='file', value=f, filename='omex.omex', content_type='multipart/form-data')
-                data.add_field(name='simulationRun', value=simulation_run_request.model_dump_json(),
-                               content_type='multipart/form-data')
-
-                api_base_url = get_settings().biosimulations_api_base_url
-                async with session.post(url=api_base_url + '/runs', data=data) as resp:
-                    resp.raise_for_status()
-                    res = await resp.json()
+            data = FormData()
+            data.add_field(name='file', value=omex_data, filename='omex.omex', content_type='multipart/form-data')
+            data.add_field(name='simulationRun', value=simulation_run_request.model_dump_json(),
+                           content_type='multipart/form-data')
+
+            api_base_url = get_settings().biosimulations_api_base_url
+            async with session.post(url=api_base_url + '/runs', data=data) as resp:
+                resp.raise_for_status()
+                res: dict[str, Any] = await resp.json()
 
         sim_id: str = res['simulator']
         sim_ver: str = res['simulatorVersion']
@@ -101,6 +146,7 @@ class BiosimServiceRest(BiosimService):
         sim_status = BiosimSimulationRunStatus(res['status'])
         simulator_version = await self._get_simulator_version(sim_id=sim_id, sim_ver=sim_ver, sim_digest=sim_digest)
         sim_run = BiosimSimulationRun(id=res["id"], name=res["name"], simulator_version=simulator_version, status=sim_status)
+        span.set_attribute("biosim.run_id", sim_run.id)
 
         # logger.info("Submitted " + omex_name + " on biosimulations with simulation id: " + sim_run.id)
         # logger.info("View:", api_base_url + "/runs/" + sim_run.id)
@@ -116,31 +162,38 @@ class BiosimServiceRest(BiosimService):
 
 
     @override
+    @traced("simdata.get_hdf5_metadata", simulation_run_id="biosim.run_id")
     async def get_hdf5_metadata(self, simulation_run_id: str) -> HDF5File:
         api_base_url = get_settings().simdata_api_base_url
         assert (api_base_url is not None)
 
-        async with aiohttp.ClientSession() as session:
-            url = f"{api_base_url}/datasets/{simulation_run_id}/metadata"
-            async with session.get(url) as resp:
-                resp.raise_for_status()
-                hdf5_metadata_json = await resp.text()
-                hdf5_file: HDF5File = HDF5File.model_validate_json(hdf5_metadata_json)
-                return hdf5_file
+        with SIMDATA_REQUEST_DURATION.labels(operation="metadata").time():
+            async with aiohttp.ClientSession() as session:
+                url = f"{api_base_url}/datasets/{simulation_run_id}/metadata"
+                async with session.get(url) as resp:
+                    resp.raise_for_status()
+                    hdf5_metadata_json = await resp.read()
+        SIMDATA_RESPONSE_BYTES.labels(operation="metadata").inc(len(hdf5_metadata_json))
+        hdf5_file: HDF5File = HDF5File.model_validate_json(hdf5_metadata_json)
+        return hdf5_file
 
     @override
+    @traced("simdata.get_hdf5_data", simulation_run_id="biosim.run_id", dataset_name="simdata.dataset_name")
     async def get_hdf5_data(self, simulation_run_id: str, dataset_name: str) -> Hdf5DataValues:
         api_base_url = get_settings().simdata_api_base_url
         assert (api_base_url is not None)
 
-        async with aiohttp.ClientSession() as session:
-            url = f"{api_base_url}/datasets/{simulation_run_id}/data"
-            async with session.get(url, params={"dataset_name": dataset_name}) as resp:
-                resp.raise_for_status()
-                hdf5_data_dict = await resp.json()
-                logger.info(f"Got data for dataset: {dataset_name}")
-                hdf5_data_values = Hdf5DataValues(shape=hdf5_data_dict['shape'], values=hdf5_data_dict['values'])
-                return hdf5_data_values
+        with SIMDATA_REQUEST_DURATION.labels(operation="data").time():
+            async with aiohttp.ClientSession() as session:
+                url = f"{api_base_url}/datasets/{simulation_run_id}/data"
+                async with session.get(url, params={"dataset_name": dataset_name}) as resp:
+                    resp.raise_for_status()
+                    hdf5_data_json = await resp.read()
+        SIMDATA_RESPONSE_BYTES.labels(operation="data").inc(len(hdf5_data_json))
+        hdf5_data_dict = json.loads(hdf5_data_json)
+        logger.info(f"Got data for dataset: {dataset_name}")
+        hdf5_data_values = Hdf5DataValues(shape=hdf5_data_dict['shape'], values=hdf5_data_dict['values'])
+        return hdf5_data_values
 
     @override
     @cached(ttl=3600, cache=SimpleMemoryCache)  # type: ignore
@@ -0,0 +1,321 @@
+import asyncio
+import json
+import logging
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator
+
+import aiofiles
+from typing_extensions import override
+
+from biosim_server.biosim_runs.biosim_service import BiosimService, BiosimServiceRest
+from biosim_server.biosim_runs.hdf5_reports import read_hdf5_data, read_hdf5_file
+from biosim_server.biosim_runs.models import BiosimulatorVersion, BiosimSimulationRun, BiosimSimulationRunStatus, \
+    HDF5File, Hdf5DataValues
+from biosim_server.common.hpc.models import SlurmJob
+from biosim_server.common.hpc.slurm_service import SlurmService
+from biosim_server.common.hpc.slurm_status import SlurmStatusService
+from biosim_server.config import get_local_cache_dir, get_settings
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+SBATCH_HEADER = """#!/bin/bash
+#SBATCH --job-name=biosim_{run_name}
+#SBATCH --output={output_dir}/slurm.out
+#SBATCH --error={output_dir}/slurm.err
+#SBATCH --partition={partition}
+#SBATCH --qos={qos}
+#SBATCH --nodes=1
+#SBATCH --ntasks-per-node=1
+#SBATCH --cpus-per-task=1
+#SBATCH --time={time_limit}
+
+set -e
+"""
+
+SBATCH_TEMPLATE = SBATCH_HEADER + """singularity run --containall --bind {run_dir}:/root {image} -i /root/archive.omex -o /root/outputs
+"""
+
+# each array task runs one (archive, simulator) pair in its own task_N directory, archives are shared between tasks
+ARRAY_SBATCH_TEMPLATE = SBATCH_HEADER + """ARCHIVES=({archives})
+IMAGES=({images})
+TASK_ID=${{SLURM_ARRAY_TASK_ID}}
+singularity run --containall --bind {run_dir}:/root ${{IMAGES[$TASK_ID]}} -i /root/${{ARCHIVES[$TASK_ID]}} -o /root/task_$TASK_ID/outputs
+"""
+
+# {run_name}_{job_id} or {run_name}_{array_job_id}_{array_task_id}, biosimulations.org run ids have no underscores
+_SLURM_RUN_ID_PATTERN = re.compile(r"^[0-9a-f]{32}_\d+(_\d+)?$")
+
+_SLURM_STATE_TO_STATUS: dict[str, BiosimSimulationRunStatus] = {
+    "PENDING": BiosimSimulationRunStatus.QUEUED,
+    "CONFIGURING": BiosimSimulationRunStatus.QUEUED,
+    "REQUEUED": BiosimSimulationRunStatus.QUEUED,
+    "SUSPENDED": BiosimSimulationRunStatus.QUEUED,
+    "RUNNING": BiosimSimulationRunStatus.RUNNING,
+    "COMPLETING": BiosimSimulationRunStatus.PROCESSING,
+    "COMPLETED": BiosimSimulationRunStatus.SUCCEEDED,
+}
+
+
+def slurm_job_run_status(job: SlurmJob) -> BiosimSimulationRunStatus:
+    """ map squeue job_state (e.g. ["PENDING"], ["COMPLETED"]) onto a biosimulations run status """
+    for state in job.job_state:
+        if state == "COMPLETED" and job.exit_code is not None and job.exit_code.return_code.number not in (None, 0):
+            return BiosimSimulationRunStatus.FAILED
+        if state in _SLURM_STATE_TO_STATUS:
+            return _SLURM_STATE_TO_STATUS[state]
+    # FAILED, CANCELLED, TIMEOUT, NODE_FAIL, OUT_OF_MEMORY, PREEMPTED, BOOT_FAIL, DEADLINE ...
+    return BiosimSimulationRunStatus.FAILED
+
+
+def container_image(simulator_version: BiosimulatorVersion) -> str:
+    """ singularity image uri pinned to the simulator image digest, e.g. docker://ghcr.io/biosimulators/copasi@sha256:... """
+    repository = simulator_version.image_url
+    if ":" in repository.rsplit("/", 1)[-1]:
+        repository = repository.rsplit(":", 1)[0]
+    return f"docker://{repository}@{simulator_version.image_digest}"
+
+
+class BiosimServiceSlurm(BiosimService):
+    """ runs biosimulators containers as Slurm jobs on our own cluster instead of the biosimulations.org queue.
+    each submission gets a remote run_name directory holding the archives, runs.json, sbatch script and outputs.
+    runs imported from biosimulations.org (e.g. by /verify/runs) are still served by biosimulations.org """
+    supports_batch = True
+    slurm_service: SlurmService
+    slurm_status_service: SlurmStatusService
+    biosimulations_service: BiosimService
+    remote_work_dir: Path
+    sim_runs: dict[str, BiosimSimulationRun]
+    submitted_at: dict[str, float]  # simulation run id -> time.monotonic() once sbatch returned, for runs of this worker
+
+    def __init__(self, slurm_service: SlurmService, slurm_status_service: SlurmStatusService | None = None,
+                 biosimulations_service: BiosimService | None = None, remote_work_dir: Path | None = None):
+        self.slurm_service = slurm_service
+        self.slurm_status_service = slurm_status_service or SlurmStatusService(slurm_service=slurm_service)
+        # the catalog of simulator images and imported runs are public, keep using biosimulations.org for them
+        self.biosimulations_service = biosimulations_service or BiosimServiceRest()
+        self.remote_work_dir = remote_work_dir or Path(get_settings().slurm_biosim_work_dir)
+        self.sim_runs = {}
+        self.submitted_at = {}
+
+    @staticmethod
+    def _parse_run_id(simulation_run_id: str) -> tuple[str, int, int | None]:
+        """ {run_name}_{job_id} for single runs, {run_name}_{array_job_id}_{array_task_id} for array tasks """
+        parts = simulation_run_id.split("_")
+        return parts[0], int(parts[1]), int(parts[2]) if len(parts) > 2 else None
+
+    @staticmethod
+    def is_slurm_run_id(simulation_run_id: str) -> bool:
+        return _SLURM_RUN_ID_PATTERN.match(simulation_run_id) is not None
+
+    def _task_dir(self, simulation_run_id: str) -> Path:
+        """ remote directory holding the run.json and outputs of a run """
+        run_name, _, array_task_id = self._parse_run_id(simulation_run_id)
+        if array_task_id is None:
+            return self.remote_work_dir / run_name
+        return self.remote_work_dir / run_name / f"task_{array_task_id}"
+
+    async def _submit_script(self, run_name: str, script: str, runs: list[BiosimSimulationRun], array: bool,
+                             array_max_concurrent: int | None = None) -> int:
+        """ archives are already staged in the run directory, write the run metadata and sbatch script and submit
+        (as a job array with one task per run if array is set) """
+        run_dir = self.remote_work_dir / run_name
+        local_dir = get_local_cache_dir() / "slurm_staging" / run_name
+        local_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            local_sbatch_file = local_dir / "job.sbatch"
+            async with aiofiles.open(local_sbatch_file, "w") as f:
+                await f.write(script)
+            local_runs_file = local_dir / "runs.json"
+            async with aiofiles.open(local_runs_file, "w") as f:
+                await f.write(json.dumps([run.model_dump(mode="json") for run in runs]))
+            await self.slurm_service.ssh_service.scp_upload(local_file=local_runs_file, remote_path=run_dir / "runs.json")
+            return await self.slurm_service.submit_job(local_sbatch_file=local_sbatch_file,
+                                                       remote_sbatch_file=run_dir / "job.sbatch",
+                                                       array_size=len(runs) if array else None,
+                                                       array_max_concurrent=array_max_concurrent)
+        finally:
+            for file in local_dir.iterdir():
+                file.unlink()
+            local_dir.rmdir()
+
+    async def _submit(self, run_name: str, omex_name: str, simulator_version: BiosimulatorVersion) -> BiosimSimulationRun:
+        run_dir = self.remote_work_dir / run_name
+        settings = get_settings()
+        script = SBATCH_TEMPLATE.format(run_name=run_name, run_dir=run_dir, output_dir=run_dir,
+                                        partition=settings.slurm_partition, qos=settings.slurm_qos,
+                                        time_limit=settings.slurm_time_limit, image=container_image(simulator_version))
+        sim_run = BiosimSimulationRun(id=run_name, name=omex_name, simulator_version=simulator_version,
+                                      status=BiosimSimulationRunStatus.QUEUED)
+        job_id = await self._submit_script(run_name=run_name, script=script, runs=[sim_run], array=False)
+
+        sim_run = sim_run.model_copy(update={"id": f"{run_name}_{job_id}"})
+        self.sim_runs[sim_run.id] = sim_run
+        self.submitted_at[sim_run.id] = time.monotonic()
+        logger.info(f"Submitted {omex_name} as slurm job {job_id} with run id {sim_run.id}")
+        return sim_run
+
+    async def _make_run_dir(self, num_tasks: int = 0) -> str:
+        run_name = uuid.uuid4().hex
+        run_dir = self.remote_work_dir / run_name
+        # slurm doesn't create the directories for --output, so the task directories must exist before submission
+        dirs = [run_dir] + [run_dir / f"task_{task_id}" for task_id in range(num_tasks)]
+        await self.slurm_service.ssh_service.run_command(f"mkdir -p {' '.join(str(d) for d in dirs)}")
+        return run_name
+
+    @override
+    async def run_biosim_sims(self, sims: list[tuple[str, str, BiosimulatorVersion]],
+                              max_concurrent: int | None = None) -> list[BiosimSimulationRun]:
+        """ submit many (local_omex_path, omex_name, simulator_version) simulations as a single sbatch --array,
+        each distinct archive is uploaded once and shared by its tasks """
+        logger.info(f"Submitting {len(sims)} slurm simulations as a job array")
+        run_name = await self._make_run_dir(num_tasks=len(sims))
+        run_dir = self.remote_work_dir / run_name
+        archive_names: dict[str, str] = {}
+        for local_omex_path, _, _ in sims:
+            archive_names.setdefault(local_omex_path, f"archive_{len(archive_names)}.omex")
+        await asyncio.gather(*[self.slurm_service.ssh_service.scp_upload(local_file=Path(local_omex_path),
+                                                                         remote_path=run_dir / archive_name)
+                               for local_omex_path, archive_name in archive_names.items()])
+
+        settings = get_settings()
+        script = ARRAY_SBATCH_TEMPLATE.format(
+            run_name=run_name, run_dir=run_dir, output_dir=run_dir / "task_%a", partition=settings.slurm_partition,
+            qos=settings.slurm_qos, time_limit=settings.slurm_time_limit,
+            archives=" ".join(archive_names[local_omex_path] for local_omex_path, _, _ in sims),
+            images=" ".join(container_image(simulator_version) for _, _, simulator_version in sims))
+        runs = [BiosimSimulationRun(id=run_name, name=omex_name, simulator_version=simulator_version,
+                                    status=BiosimSimulationRunStatus.QUEUED)
+                for _, omex_name, simulator_version in sims]
+        array_job_id = await self._submit_script(run_name=run_name, script=script, runs=runs, array=True,
+                                                 array_max_concurrent=max_concurrent)
+
+        sim_runs = [run.model_copy(update={"id": f"{run_name}_{array_job_id}_{task_id}"})
+                    for task_id, run in enumerate(runs)]
+        submitted_at = time.monotonic()
+        for sim_run in sim_runs:
+            self.sim_runs[sim_run.id] = sim_run
+            self.submitted_at[sim_run.id] = submitted_at
+        logger.info(f"Submitted {len(sims)} simulations as slurm job array {array_job_id}")
+        return sim_runs
+
+    @override
+    async def run_biosim_sim(self, local_omex_path: str, omex_name: str,
+                             simulator_version: BiosimulatorVersion) -> BiosimSimulationRun:
+        logger.info(f"Submitting slurm simulation for {omex_name} with local path {local_omex_path} with simulator {simulator_version.id}")
+        run_name = await self._make_run_dir()
+        await self.slurm_service.ssh_service.scp_upload(local_file=Path(local_omex_path),
+                                                        remote_path=self.remote_work_dir / run_name / "archive.omex")
+        return await self._submit(run_name=run_name, omex_name=omex_name, simulator_version=simulator_version)
+
+    @override
+    async def run_biosim_sim_stream(self, omex_stream: AsyncIterator[bytes], omex_name: str,
+                                    simulator_version: BiosimulatorVersion) -> BiosimSimulationRun:
+        logger.info(f"Submitting streamed slurm simulation for {omex_name} with simulator {simulator_version.id}")
+        run_name = await self._make_run_dir()
+        await self.slurm_service.ssh_service.upload_stream(chunks=omex_stream,
+                                                           remote_path=self.remote_work_dir / run_name / "archive.omex")
+        return await self._submit(run_name=run_name, omex_name=omex_name, simulator_version=simulator_version)
+
+    @override
+    async def get_sim_run(self, simulation_run_id: str) -> BiosimSimulationRun:
+        if not self.is_slurm_run_id(simulation_run_id):
+            return await self.biosimulations_service.get_sim_run(simulation_run_id)
+        logger.info(f"Polling slurm simulation with simulation run_id {simulation_run_id}")
+        run_name, job_id, array_task_id = self._parse_run_id(simulation_run_id)
+        sim_run = self.sim_runs.get(simulation_run_id)
+        if sim_run is None:
+            # submitted by another worker
+            _, stdout, _ = await self.slurm_service.ssh_service.run_command(
+                f"cat {self.remote_work_dir / run_name / 'runs.json'}")
+            runs = json.loads(stdout)
+            sim_run = BiosimSimulationRun.model_validate(runs[array_task_id or 0]).model_copy(
+                update={"id": simulation_run_id})
+
+        submitted_at = self.submitted_at.get(simulation_run_id)
+        job = await self._get_job(job_id=job_id, array_task_id=array_task_id)
+        if job is None and submitted_at is None:
+            # submitted by another worker, only trust a snapshot taken now that the job is unknown to slurm
+            job = await self._get_job(job_id=job_id, array_task_id=array_task_id, force=True)
+        fetched_at = self.slurm_status_service.fetched_at
+        if job is not None:
+            # from squeue, or from sacct with its final state once it left the queue
+            status = slurm_job_run_status(job)
+        elif submitted_at is not None and (fetched_at is None or fetched_at <= submitted_at):
+            # the snapshot predates the submission
+            status = BiosimSimulationRunStatus.QUEUED
+        else:
+            # unknown to squeue and sacct (accounting disabled), the outcome is whether the container wrote its results
+            _, stdout, _ = await self.slurm_service.ssh_service.run_command(
+                f"test -f {self._task_dir(simulation_run_id) / 'outputs' / 'reports.h5'} && echo SUCCEEDED || echo FAILED")
+            status = BiosimSimulationRunStatus(stdout.strip())
+        sim_run = sim_run.model_copy(update={"status": status})
+        self.sim_runs[simulation_run_id] = sim_run
+        return sim_run
+
+    async def _get_job(self, job_id: int, array_task_id: int | None, force: bool = False) -> SlurmJob | None:
+        if array_task_id is None:
+            return await self.slurm_status_service.get_job(job_id, force=force)
+        return await self.slurm_status_service.get_array_task(array_job_id=job_id, array_task_id=array_task_id,
+                                                              force=force)
+
+    @staticmethod
+    def _local_reports_file(simulation_run_id: str) -> Path:
+        return get_local_cache_dir() / "slurm_results" / simulation_run_id / "reports.h5"
+
+    async def _get_reports_file(self, simulation_run_id: str) -> Path:
+        """ local copy of reports.h5, results of a finished run don't change so it is retrieved once """
+        local_path = self._local_reports_file(simulation_run_id)
+        if not local_path.exists():
+            await self.prefetch_results([simulation_run_id])
+        return local_path
+
+    @override
+    async def prefetch_results(self, simulation_run_ids: list[str]) -> None:
+        """ retrieve the reports.h5 of many finished runs (e.g. a whole job array) in one concurrent, checksummed
+        bulk transfer rather than one download per get_hdf5_metadata/get_hdf5_data call """
+        staging: list[tuple[str, Path, Path]] = []
+        for simulation_run_id in filter(self.is_slurm_run_id, simulation_run_ids):
+            local_path = self._local_reports_file(simulation_run_id)
+            if not local_path.exists():
+                temp_path = local_path.with_name(f".tmp_{uuid.uuid4().hex}")
+                staging.append((simulation_run_id, temp_path, local_path))
+        if len(staging) == 0:
+            return
+        await self.slurm_service.ssh_service.download_many(
+            transfers=[(self._task_dir(run_id) / "outputs" / "reports.h5", temp_path) for run_id, temp_path, _ in staging],
+            verify_md5=True)
+        for _, temp_path, local_path in staging:
+            temp_path.replace(local_path)
+
+    @override
+    async def get_hdf5_metadata(self, simulation_run_id: str) -> HDF5File:
+        if not self.is_slurm_run_id(simulation_run_id):
+            return await self.biosimulations_service.get_hdf5_metadata(simulation_run_id)
+        local_path = await self._get_reports_file(simulation_run_id)
+        uri = f"{self.slurm_service.ssh_service.hostname}:{self._task_dir(simulation_run_id) / 'outputs' / 'reports.h5'}"
+        return await asyncio.to_thread(read_hdf5_file, local_path, simulation_run_id, uri)
+
+    @override
+    async def get_hdf5_data(self, simulation_run_id: str, dataset_name: str) -> Hdf5DataValues:
+        if not self.is_slurm_run_id(simulation_run_id):
+            return await self.biosimulations_service.get_hdf5_data(simulation_run_id, dataset_name)
+        local_path = await self._get_reports_file(simulation_run_id)
+        return await asyncio.to_thread(read_hdf5_data, local_path, dataset_name)
+
+    @override
+    async def get_simulator_versions(self) -> list[BiosimulatorVersion]:
+        return await self.biosimulations_service.get_simulator_versions()
+
+    @override
+    def start(self) -> None:
+        self.slurm_status_service.start()
+
+    @override
+    async def close(self) -> None:
+        await self.slurm_status_service.close()
+        await self.biosimulations_service.close()
+        await self.slurm_service.ssh_service.close()
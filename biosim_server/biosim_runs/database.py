@@ -3,11 +3,13 @@ from abc import abstractmethod, ABC
 
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from pymongo import ReplaceOne
 from pymongo.results import InsertOneResult
 from typing_extensions import override
 
-from biosim_server.biosim_runs.models import BiosimulatorWorkflowRun
+from biosim_server.biosim_runs.models import BiosimulatorWorkflowRun, RegressionSweepArchiveResult
 from biosim_server.config import get_settings
+from biosim_server.tracing import traced
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +32,12 @@ class DatabaseService(ABC):
             -> list[BiosimulatorWorkflowRun]:
         pass
 
+    @abstractmethod
+    async def get_biosimulator_workflow_runs_for_files(self, file_hashes_md5: list[str], image_digest: str) \
+            -> list[BiosimulatorWorkflowRun]:
+        """ the runs of a simulator image for any of the files, regardless of cache buster, in insertion order """
+        pass
+
     @abstractmethod
     async def get_biosimulator_workflow_runs_by_biosim_runid(self, biosim_run_id: str) -> list[BiosimulatorWorkflowRun]:
         pass
@@ -42,6 +50,16 @@ class DatabaseService(ABC):
     async def delete_all_biosimulator_workflow_runs(self) -> None:
         pass
 
+    @abstractmethod
+    async def save_regression_sweep_results(self, results: list[RegressionSweepArchiveResult]) -> None:
+        """ replaces an earlier result of the same sweep and archive, a retried save is not stored twice """
+        pass
+
+    @abstractmethod
+    async def get_regression_sweep_results(self, sweep_workflow_id: str) -> list[RegressionSweepArchiveResult]:
+        """ the results of a sweep in the order they were first saved """
+        pass
+
     @abstractmethod
     async def close(self) -> None:
         pass
@@ -50,19 +68,22 @@ class DatabaseService(ABC):
 class DatabaseServiceMongo(DatabaseService):
     _db_client: AsyncIOMotorClient
     _sim_output_col: AsyncIOMotorCollection
+    _sweep_results_col: AsyncIOMotorCollection
 
     def __init__(self, db_client: AsyncIOMotorClient) -> None:
         self._db_client = db_client
         database = self._db_client.get_database(get_settings().mongodb_database)
         self._sim_output_col = database.get_collection(get_settings().mongodb_collection_sims)
+        self._sweep_results_col = database.get_collection(get_settings().mongodb_collection_sweep_results)
 
     @override
+    @traced("mongo.insert_biosimulator_workflow_run")
     async def insert_biosimulator_workflow_run(self, sim_workflow_run: BiosimulatorWorkflowRun) -> BiosimulatorWorkflowRun:
         if sim_workflow_run.database_id is not None:
             raise Exception("Cannot insert document that already has a database id")
         sim_ver_str = f"{sim_workflow_run.simulator_version.id}:{sim_workflow_run.simulator_version.version}"
         logger.info(f"Inserting OMEX sim output for {sim_ver_str} with OMEX hash {sim_workflow_run.file_hash_md5}")
-        result: InsertOneResult = await self._sim_output_col.insert_one(sim_workflow_run.model_dump())
+        result: InsertOneResult = await self._sim_output_col.insert_one(sim_workflow_run.model_dump(exclude={"stage_timings"}))
         if result.acknowledged:
             inserted_sim_output: BiosimulatorWorkflowRun = sim_workflow_run.model_copy(deep=True)
             inserted_sim_output.database_id = str(result.inserted_id)
@@ -71,6 +92,7 @@ class DatabaseServiceMongo(DatabaseService):
             raise Exception("Insert failed")
 
     @override
+    @traced("mongo.get_biosimulator_workflow_runs", file_hash_md5="omex.hash_md5", image_digest="simulator.image_digest")
     async def get_biosimulator_workflow_runs(self, file_hash_md5: str, image_digest: str, cache_buster: str) \
             -> list[BiosimulatorWorkflowRun]:
         logger.info(f"Getting OMEX sim workflow output with file hash {file_hash_md5} and sim digest {image_digest} and cache buster {cache_buster}")
@@ -88,6 +110,21 @@ class DatabaseServiceMongo(DatabaseService):
             return []
 
     @override
+    @traced("mongo.get_biosimulator_workflow_runs_for_files", image_digest="simulator.image_digest")
+    async def get_biosimulator_workflow_runs_for_files(self, file_hashes_md5: list[str], image_digest: str) \
+            -> list[BiosimulatorWorkflowRun]:
+        logger.info(f"Getting OMEX sim workflow outputs of {len(file_hashes_md5)} files with sim digest {image_digest}")
+        query = {"file_hash_md5": {"$in": file_hashes_md5}, "image_digest": image_digest}
+        workflow_runs: list[BiosimulatorWorkflowRun] = []
+        for doc in await self._sim_output_col.find(query).sort("_id", 1).to_list(length=None):
+            doc_dict = dict(doc)
+            doc_dict["database_id"] = str(doc["_id"])
+            del doc_dict["_id"]
+            workflow_runs.append(BiosimulatorWorkflowRun.model_validate(doc_dict))
+        return workflow_runs
+
+    @override
+    @traced("mongo.get_biosimulator_workflow_runs_by_biosim_runid", biosim_run_id="biosim.run_id")
     async def get_biosimulator_workflow_runs_by_biosim_runid(self, biosim_run_id: str) -> list[BiosimulatorWorkflowRun]:
         logger.info(f"Getting OMEX sim workflow output with biosim run id {biosim_run_id}")
         document = await self._sim_output_col.find({"biosim_run.id": biosim_run_id}).to_list(length=100)
@@ -103,6 +140,7 @@ class DatabaseServiceMongo(DatabaseService):
             return []
 
     @override
+    @traced("mongo.delete_biosimulator_workflow_run")
     async def delete_biosimulator_workflow_run(self, database_id: str) -> None:
         logger.info(f"Deleting OMEX sim workflow output with database_id {database_id}")
         result = await self._sim_output_col.delete_one({"_id": ObjectId(database_id)})
@@ -118,6 +156,26 @@ class DatabaseServiceMongo(DatabaseService):
         if not result.acknowledged:
             raise Exception("Delete failed")
 
+    @override
+    @traced("mongo.save_regression_sweep_results")
+    async def save_regression_sweep_results(self, results: list[RegressionSweepArchiveResult]) -> None:
+        if len(results) == 0:
+            return
+        logger.info(f"Saving {len(results)} regression sweep results of {results[0].sweep_workflow_id}")
+        result = await self._sweep_results_col.bulk_write([
+            ReplaceOne({"sweep_workflow_id": result.sweep_workflow_id, "file_hash_md5": result.file_hash_md5},
+                       result.model_dump(), upsert=True) for result in results])
+        if not result.acknowledged:
+            raise Exception("Save failed")
+
+    @override
+    @traced("mongo.get_regression_sweep_results")
+    async def get_regression_sweep_results(self, sweep_workflow_id: str) -> list[RegressionSweepArchiveResult]:
+        logger.info(f"Getting regression sweep results of {sweep_workflow_id}")
+        documents = await self._sweep_results_col.find({"sweep_workflow_id": sweep_workflow_id}) \
+            .sort("_id", 1).to_list(length=None)
+        return [RegressionSweepArchiveResult.model_validate({k: v for k, v in doc.items() if k != "_id"})
+                for doc in documents]
 
     @override
     async def close(self) -> None:
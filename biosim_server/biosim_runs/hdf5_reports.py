@@ -0,0 +1,48 @@
+from pathlib import Path
+from typing import Any
+
+import h5py  # type: ignore
+import numpy as np
+
+from biosim_server.biosim_runs.models import ATTRIBUTE_VALUE_TYPE, HDF5Attribute, HDF5Dataset, HDF5File, HDF5Group, \
+    Hdf5DataValues
+
+
+def _attribute_value(value: Any) -> ATTRIBUTE_VALUE_TYPE:
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    elif isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bytes):
+        return value.decode()
+    if isinstance(value, list):
+        return [v.decode() if isinstance(v, bytes) else v for v in value]
+    return value  # type: ignore
+
+
+def _attributes(node: h5py.HLObject) -> list[HDF5Attribute]:
+    return [HDF5Attribute(key=key, value=_attribute_value(value)) for key, value in node.attrs.items()]
+
+
+def read_hdf5_file(h5_path: Path, file_id: str, uri: str) -> HDF5File:
+    """ metadata of a SED-ML reports.h5 file in the same layout as the simdata api (one group per SED-ML document) """
+    groups: dict[str, HDF5Group] = {}
+
+    def visit(name: str, node: h5py.HLObject) -> None:
+        if isinstance(node, h5py.Dataset):
+            group_name = node.parent.name.lstrip("/")
+            if group_name not in groups:
+                groups[group_name] = HDF5Group(name=group_name, attributes=_attributes(node.parent), datasets=[])
+            groups[group_name].datasets.append(HDF5Dataset(name=name, shape=list(node.shape),
+                                                           attributes=_attributes(node)))
+
+    with h5py.File(h5_path, "r") as h5:
+        h5.visititems(visit)
+    return HDF5File(filename=h5_path.name, id=file_id, uri=uri, groups=list(groups.values()))
+
+
+def read_hdf5_data(h5_path: Path, dataset_name: str) -> Hdf5DataValues:
+    with h5py.File(h5_path, "r") as h5:
+        dataset = h5[dataset_name]
+        values = np.asarray(dataset[()], dtype=np.float64)
+    return Hdf5DataValues(shape=list(values.shape), values=values.flatten().tolist())
@@ -4,6 +4,7 @@ from typing import Optional
 from pydantic import BaseModel, field_validator
 
 from biosim_server.biosim_omex import OmexFile
+from biosim_server.common.timing import StageTiming
 
 ATTRIBUTE_VALUE_TYPE = int | float | str | bool | list[str] | list[int] | list[float] | list[bool]
 
@@ -113,6 +114,17 @@ class BiosimulatorWorkflowRun(BaseModel):
     biosim_run: BiosimSimulationRun | None = None
     hdf5_file: HDF5File | None = None
     database_id: Optional[str] = None
+    stage_timings: Optional[list[StageTiming]] = None  # timings of the activity which returned this run, not stored
+
+
+class RegressionSweepArchiveResult(BaseModel):
+    sweep_workflow_id: str  # of the regression sweep, the same for all its workflow runs
+    file_hash_md5: str
+    uploaded_filename: str
+    previous_run_id: Optional[str] = None
+    new_run_id: Optional[str] = None
+    mismatched_datasets: list[str] = []  # datasets not close (or not comparable) between the two versions
+    error_message: Optional[str] = None
 
 
 class BiosimSimulationRunApiRequest(BaseModel):
@@ -9,14 +9,19 @@ from temporalio.exceptions import ActivityError
 
 from biosim_server.biosim_omex import OmexFile
 from biosim_server.biosim_runs.activities import submit_biosim_simulation_run_activity, \
-    SubmitBiosimSimulationRunActivityInput
+    SubmitBiosimSimulationRunActivityInput, submit_biosim_simulation_runs_activity, \
+    SubmitBiosimSimulationRunsActivityInput, SubmitBiosimSimulationRunsActivityOutput
 from biosim_server.biosim_runs.models import BiosimulatorVersion, BiosimSimulationRunStatus, BiosimulatorWorkflowRun
 
+# workflows started before submit_biosim_simulation_runs existed replay their per simulation child workflows
+BATCH_SUBMIT_PATCH_ID = "submit-biosim-simulation-runs"
+
 
 class OmexSimWorkflowInput(BaseModel):
     omex_file: OmexFile
     simulator_version: BiosimulatorVersion
     cache_buster: str
+    profile: bool = False
 
 
 class OmexSimWorkflowStatus(StrEnum):
@@ -57,7 +62,8 @@ class OmexSimWorkflow:
 
         saved_biosimulator_workflow_run: BiosimulatorWorkflowRun = await submit_biosim_simulation_run(
             workflow_id=self.sim_output.workflow_id, omex_file=self.sim_input.omex_file,
-            simulator_version=self.sim_input.simulator_version, cache_buster=self.sim_input.cache_buster)
+            simulator_version=self.sim_input.simulator_version, cache_buster=self.sim_input.cache_buster,
+            profile=self.sim_input.profile)
 
         if saved_biosimulator_workflow_run is None or saved_biosimulator_workflow_run.biosim_run is None:
             self.sim_output.workflow_status = OmexSimWorkflowStatus.FAILED
@@ -77,16 +83,50 @@ class OmexSimWorkflow:
 async def submit_biosim_simulation_run(workflow_id: str,
                                        omex_file: OmexFile,
                                        simulator_version: BiosimulatorVersion,
-                                       cache_buster: str) -> BiosimulatorWorkflowRun:
+                                       cache_buster: str,
+                                       profile: bool = False) -> BiosimulatorWorkflowRun:
     try:
         return await workflow.execute_activity(
             submit_biosim_simulation_run_activity,
             args=[SubmitBiosimSimulationRunActivityInput(workflow_id=workflow_id,
                                                          omex_file=omex_file,
                                                          simulator_version=simulator_version,
-                                                         cache_buster=cache_buster)],
+                                                         cache_buster=cache_buster,
+                                                         profile=profile)],
             start_to_close_timeout=timedelta(seconds=60*20),  # Activity timeout
             retry_policy=RetryPolicy(maximum_attempts=1), )
     except ActivityError as e:
         workflow.logger.exception(f"Failed to submit biosim simulation run: {str(e)}", exc_info=e)
-        raise e
\ No newline at end of file
+        raise e
+
+
+def use_batch_submission(batch_simulations: bool) -> bool:
+    """ whether a workflow submits its simulations with submit_biosim_simulation_runs, only where the backend runs
+    them as a batch (see BiosimService.supports_batch, batch_simulations is set by the api) """
+    return batch_simulations and workflow.patched(BATCH_SUBMIT_PATCH_ID)
+
+
+async def submit_biosim_simulation_runs(workflow_id: str,
+                                        simulations: list[tuple[OmexFile, BiosimulatorVersion]],
+                                        cache_buster: str,
+                                        max_concurrent: int | None = None,
+                                        profile: bool = False) -> list[BiosimulatorWorkflowRun]:
+    """ the runs of many simulations submitted as one batch (a single job array on the slurm backend), in the order
+    of the simulations, runs which did not succeed have no hdf5_file """
+    # the batch runs in waves of max_concurrent simulations, each allowed as long as a single simulation
+    num_waves = -(-len(simulations) // max_concurrent) if max_concurrent else 1
+    try:
+        output: SubmitBiosimSimulationRunsActivityOutput = await workflow.execute_activity(
+            submit_biosim_simulation_runs_activity,
+            args=[SubmitBiosimSimulationRunsActivityInput(workflow_id=workflow_id,
+                                                          simulations=simulations,
+                                                          cache_buster=cache_buster,
+                                                          max_concurrent=max_concurrent,
+                                                          profile=profile)],
+            start_to_close_timeout=timedelta(seconds=60*20*max(1, num_waves)),
+            heartbeat_timeout=timedelta(minutes=5),  # a lost worker fails the batch long before its timeout
+            retry_policy=RetryPolicy(maximum_attempts=1), )
+        return output.biosim_workflow_runs
+    except ActivityError as e:
+        workflow.logger.exception(f"Failed to submit {len(simulations)} biosim simulation runs: {str(e)}", exc_info=e)
+        raise e
@@ -1,13 +1,23 @@
+import time
 from typing import TypeAlias
 
 import numpy as np
 from numpy.typing import NDArray
-from pydantic import BaseModel
+from opentelemetry import trace
 from temporalio import activity
-
-from biosim_server.biosim_runs import Hdf5DataValues, BiosimServiceRest
-from biosim_server.biosim_verify import CompareSettings, ComparisonStatistics
-from biosim_server.biosim_verify.models import SimulationRunInfo, GenerateStatisticsActivityOutput, RunData
+from temporalio.exceptions import ApplicationError
+
+from biosim_server.biosim_runs import Hdf5DataValues
+from biosim_server.biosim_verify import ComparisonStatistics
+from biosim_server.biosim_verify.memory_admission import estimate_statistics_memory_bytes, get_memory_budget, \
+    MemoryBudgetExceeded
+from biosim_server.biosim_verify.models import GenerateStatisticsActivityInput, GenerateStatisticsActivityOutput, \
+    RunData
+from biosim_server.common.timing import StageTiming
+from biosim_server.config import get_settings
+from biosim_server.dependencies import get_biosim_service
+from biosim_server.metrics import CALC_STATS_DURATION
+from biosim_server.profiling import profile_activity
 
 NDArray1b: TypeAlias = np.ndarray[tuple[int], np.dtype[np.bool]]
 NDArray1f: TypeAlias = np.ndarray[tuple[int], np.dtype[np.float64]]
@@ -15,20 +25,44 @@ NDArray2f: TypeAlias = np.ndarray[tuple[int, int], np.dtype[np.float64]]
 NDArray3f: TypeAlias = np.ndarray[tuple[int, int, int], np.dtype[np.float64]]
 
 
-class GenerateStatisticsActivityInput(BaseModel):
-    sim_run_info_list: list[SimulationRunInfo]
-    compare_settings: CompareSettings
-
-
 @activity.defn
 async def generate_statistics_activity(gen_stats_input: GenerateStatisticsActivityInput) -> GenerateStatisticsActivityOutput:
+    async with profile_activity(requested=gen_stats_input.profile):
+        return await _admit_generate_statistics(gen_stats_input)
+
+
+async def _admit_generate_statistics(gen_stats_input: GenerateStatisticsActivityInput) -> GenerateStatisticsActivityOutput:
+    memory_budget = get_memory_budget()
+    if memory_budget is None:
+        return await _generate_statistics(gen_stats_input)
+
+    estimated_bytes = estimate_statistics_memory_bytes(gen_stats_input.sim_run_info_list,
+                                                       include_outputs=gen_stats_input.compare_settings.include_outputs)
+    trace.get_current_span().set_attribute("memory.estimated_bytes", estimated_bytes)
+    try:
+        async with memory_budget.reserve(estimated_bytes, timeout_s=get_settings().worker_memory_admission_wait_s):
+            activity.logger.info(f"admitted with an estimated {estimated_bytes / 2**20:.1f} MB")
+            return await _generate_statistics(gen_stats_input)
+    except MemoryBudgetExceeded as e:
+        # retryable, the retry may be picked up by a worker with more memory to spare
+        raise ApplicationError(f"Insufficient memory for generate_statistics_activity: {e}", type="InsufficientMemory")
+
+
+async def _generate_statistics(gen_stats_input: GenerateStatisticsActivityInput) -> GenerateStatisticsActivityOutput:
+    span = trace.get_current_span()
+    span.set_attribute("biosim.run_ids", [info.biosim_sim_run.id for info in gen_stats_input.sim_run_info_list])
+    span.set_attribute("simulators", [f"{info.biosim_sim_run.simulator_version.id}:"
+                                      f"{info.biosim_sim_run.simulator_version.version}"
+                                      for info in gen_stats_input.sim_run_info_list])
     try:
         # Gather the data from each run for each dataset
         num_runs = len(gen_stats_input.sim_run_info_list)
         datasets: dict[str, dict[str, Hdf5DataValues]] = {}
         sims_run_data: list[RunData] = []
+        stage_timings: list[StageTiming] = []
 
-        biosim_service = BiosimServiceRest()
+        # runs of the configured backend, imported biosimulations.org runs are forwarded by the slurm backend
+        biosim_service = get_biosim_service()
         if biosim_service is None:
             raise Exception("Biosim service is not initialized")
 
@@ -37,13 +71,20 @@ async def generate_statistics_activity(gen_stats_input: GenerateStatisticsActivi
             run_id_i = sim_run_info_i.biosim_sim_run.id
             datasets[run_id_i] = {}
             dataset_names_i = [dataset.name for group in sim_run_info_i.hdf5_file.groups for dataset in group.datasets]
+            fetch_start = time.monotonic()
+            num_values = 0
             for dataset_name in dataset_names_i:
                 data: Hdf5DataValues = await biosim_service.get_hdf5_data(simulation_run_id=run_id_i,
                                                                           dataset_name=dataset_name)
                 datasets[run_id_i][dataset_name] = data
+                num_values += len(data.values)
                 var_names = sim_run_info_i.hdf5_file.datasets[dataset_name].sedml_labels
                 run_data: RunData = RunData(run_id=run_id_i, dataset_name=dataset_name, var_names=var_names, data=data)
                 sims_run_data.append(run_data)
+            simulator_version = sim_run_info_i.biosim_sim_run.simulator_version
+            stage_timings.append(StageTiming(stage="data_fetch", duration_s=time.monotonic() - fetch_start,
+                                             simulator=f"{simulator_version.id}:{simulator_version.version}",
+                                             num_bytes=num_values * 8))  # as float64 values
 
         # collect the list of unique dataset names
         dataset_names: set[str] = set()
@@ -55,8 +96,10 @@ async def generate_statistics_activity(gen_stats_input: GenerateStatisticsActivi
         # get list of unique dataset_vars by reading the metadata within each dataset
 
         activity.logger.info(f"Found {len(dataset_names)} unique datasets")
+        span.set_attribute("dataset_count", len(dataset_names))
 
         # for each unique dataset name, compare the results from run_i with run_j (where i < j)
+        compare_start = time.monotonic()
         comparison_statistics: dict[
             str, list[list[ComparisonStatistics]]] = {}  # matrix of comparison statistics per dataset
         for dataset_name in dataset_names:
@@ -106,10 +149,11 @@ async def generate_statistics_activity(gen_stats_input: GenerateStatisticsActivi
                         continue
 
                     # compute statistics
-                    is_close, score = calc_stats(arr1=array_i, arr2=array_j,
-                                                 rel_tol=gen_stats_input.compare_settings.rel_tol,
-                                                 abs_tol_min=gen_stats_input.compare_settings.abs_tol_min,
-                                                 atol_scale=gen_stats_input.compare_settings.abs_tol_scale)
+                    with CALC_STATS_DURATION.time():
+                        is_close, score = calc_stats(arr1=array_i, arr2=array_j,
+                                                     rel_tol=gen_stats_input.compare_settings.rel_tol,
+                                                     abs_tol_min=gen_stats_input.compare_settings.abs_tol_min,
+                                                     atol_scale=gen_stats_input.compare_settings.abs_tol_scale)
                     is_close_list: list[bool] = is_close.tolist()
                     score_list: list[float] = score.tolist()
 
@@ -123,8 +167,11 @@ async def generate_statistics_activity(gen_stats_input: GenerateStatisticsActivi
                 ds_comparison.append(ds_comparison_i)
             comparison_statistics[dataset_name] = ds_comparison
 
+        stage_timings.append(StageTiming(stage="compare", duration_s=time.monotonic() - compare_start))
+
         gen_stats_output = GenerateStatisticsActivityOutput(sims_run_info=gen_stats_input.sim_run_info_list,
-                                                            comparison_statistics=comparison_statistics)
+                                                            comparison_statistics=comparison_statistics,
+                                                            stage_timings=stage_timings)
         if gen_stats_input.compare_settings.include_outputs:
             gen_stats_output.sim_run_data = sims_run_data
 
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import math
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from biosim_server.biosim_verify.models import SimulationRunInfo
+from biosim_server.config import get_settings
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Hdf5DataValues.values is a list of python floats (8 byte pointer + 24 byte float object per value)
+_BYTES_PER_FETCHED_VALUE = 32
+# the comparison of one dataset holds both runs as float64 arrays plus about four temporaries of the same size
+_BYTES_PER_COMPARED_VALUE = 6 * 8
+# the json encoding of returned outputs takes roughly another 24 bytes per value
+_BYTES_PER_SERIALIZED_VALUE = 24
+
+
+def estimate_statistics_memory_bytes(sim_run_info_list: list[SimulationRunInfo], include_outputs: bool) -> int:
+    """ peak memory of generate_statistics_activity estimated from the dataset shapes in the hdf5 metadata,
+    all datasets of all runs are held at once while the comparisons are computed one dataset at a time """
+    total_values = 0
+    largest_dataset_values = 0
+    for sim_run_info in sim_run_info_list:
+        for dataset in sim_run_info.hdf5_file.datasets.values():
+            num_values = math.prod(dataset.shape)
+            total_values += num_values
+            largest_dataset_values = max(largest_dataset_values, num_values)
+    estimate = total_values * _BYTES_PER_FETCHED_VALUE + largest_dataset_values * _BYTES_PER_COMPARED_VALUE
+    if include_outputs:
+        estimate += total_values * _BYTES_PER_SERIALIZED_VALUE
+    return estimate
+
+
+class MemoryBudgetExceeded(Exception):
+    pass
+
+
+class MemoryBudget:
+    """ admission control for memory heavy activities within one worker process, a reservation waits until its
+    estimated bytes fit in the remaining budget (a reservation larger than the whole budget is admitted alone) """
+    capacity_bytes: int
+    reserved_bytes: int
+    num_reservations: int
+    _condition: asyncio.Condition
+
+    def __init__(self, capacity_bytes: int):
+        self.capacity_bytes = capacity_bytes
+        self.reserved_bytes = 0
+        self.num_reservations = 0
+        self._condition = asyncio.Condition()
+
+    def _fits(self, nbytes: int) -> bool:
+        return self.num_reservations == 0 or self.reserved_bytes + nbytes <= self.capacity_bytes
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int, timeout_s: float) -> AsyncIterator[None]:
+        """ raises MemoryBudgetExceeded if the reservation could not be admitted within timeout_s """
+        async with self._condition:
+            try:
+                await asyncio.wait_for(self._condition.wait_for(lambda: self._fits(nbytes)), timeout=timeout_s)
+            except asyncio.TimeoutError:
+                raise MemoryBudgetExceeded(f"{nbytes / 2**20:.0f} MB not available within {timeout_s}s, "
+                                           f"{self.reserved_bytes / 2**20:.0f} of {self.capacity_bytes / 2**20:.0f} MB "
+                                           f"reserved by {self.num_reservations} tasks")
+            self.reserved_bytes += nbytes
+            self.num_reservations += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.reserved_bytes -= nbytes
+                self.num_reservations -= 1
+                self._condition.notify_all()
+
+
+_memory_budget: MemoryBudget | None = None
+
+
+def get_memory_budget() -> MemoryBudget | None:
+    """ the budget of this worker process, None if admission control is disabled (worker_compute_memory_budget_mb=0) """
+    global _memory_budget
+    budget_mb = get_settings().worker_compute_memory_budget_mb
+    if budget_mb <= 0:
+        return None
+    if _memory_budget is None:
+        _memory_budget = MemoryBudget(capacity_bytes=budget_mb * 2**20)
+    return _memory_budget
@@ -4,6 +4,8 @@ from typing import Optional
 from pydantic import BaseModel
 
 from biosim_server.biosim_runs import BiosimSimulationRun, HDF5File, Hdf5DataValues
+from biosim_server.biosim_runs.models import RegressionSweepArchiveResult
+from biosim_server.common.timing import StageTiming
 
 
 class ComparisonStatistics(BaseModel):
@@ -42,6 +44,12 @@ class SimulationRunInfo(BaseModel):
 
 
 
+class GenerateStatisticsActivityInput(BaseModel):
+    sim_run_info_list: list[SimulationRunInfo]
+    compare_settings: CompareSettings
+    profile: bool = False
+
+
 class RunData(BaseModel):
     run_id: str
     dataset_name: str
@@ -54,6 +62,7 @@ class GenerateStatisticsActivityOutput(BaseModel):
     sims_run_info: list[SimulationRunInfo]
     comparison_statistics: dict[str, list[list[ComparisonStatistics]]]  # matrix of comparison statistics per dataset
     sim_run_data: Optional[list[RunData]] = None
+    stage_timings: Optional[list[StageTiming]] = None  # moved to VerifyWorkflowOutput.stage_timings by the workflows
 
 
 class VerifyWorkflowStatus(StrEnum):
@@ -77,3 +86,59 @@ class VerifyWorkflowOutput(BaseModel):
     workflow_run_id: Optional[str] = None
     workflow_error: Optional[str] = None
     workflow_results: Optional[GenerateStatisticsActivityOutput] = None
+    stage_timings: Optional[list[StageTiming]] = None  # durations of the stages completed so far
+
+
+class BatchArchiveResult(BaseModel):
+    file_hash_md5: str
+    filenames: list[str]  # of the uploaded archives with this content
+    workflow_id: str  # of the OmexVerifyWorkflow, its report is at /verify/{workflow_id}
+    workflow_status: VerifyWorkflowStatus = VerifyWorkflowStatus.PENDING
+    workflow_error: Optional[str] = None
+
+
+class BatchProgress(BaseModel):
+    total: int
+    pending: int
+    in_progress: int
+    completed: int
+    failed: int
+
+
+class VerifyBatchWorkflowOutput(BaseModel):
+    workflow_id: str
+    compare_settings: CompareSettings
+    workflow_status: VerifyWorkflowStatus
+    timestamp: str
+    progress: BatchProgress
+    archive_results: list[BatchArchiveResult]  # one per distinct archive, in upload order
+    workflow_run_id: Optional[str] = None
+    workflow_error: Optional[str] = None
+
+    def update_progress(self) -> None:
+        statuses = [result.workflow_status for result in self.archive_results]
+        self.progress = BatchProgress(
+            total=len(statuses),
+            pending=statuses.count(VerifyWorkflowStatus.PENDING),
+            in_progress=statuses.count(VerifyWorkflowStatus.IN_PROGRESS),
+            completed=statuses.count(VerifyWorkflowStatus.COMPLETED),
+            failed=len([status for status in statuses if status.is_done
+                        and status != VerifyWorkflowStatus.COMPLETED]))
+
+
+class RegressionSweepOutput(BaseModel):
+    workflow_id: str
+    new_simulator_version: str  # <simulator_name>:<version>
+    previous_simulator_version: str  # <simulator_name>:<version>
+    workflow_status: VerifyWorkflowStatus
+    timestamp: str
+    last_database_id: Optional[str] = None  # of the last swept OMEX file, the sweep resumes after it
+    num_workflow_runs: int = 1  # the sweep continues as new to bound its history
+    archives_swept: int = 0
+    archives_without_previous_run: int = 0  # skipped, there is no cached run of the previous version
+    archives_equivalent: int = 0
+    num_regressions: int = 0
+    num_failures: int = 0  # the new version or the comparison failed
+    # the stored results (see DatabaseService.get_regression_sweep_results), filled in by the api, not the workflow
+    regressions: list[RegressionSweepArchiveResult] = []
+    failures: list[RegressionSweepArchiveResult] = []
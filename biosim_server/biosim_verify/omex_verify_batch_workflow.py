@@ -0,0 +1,104 @@
+import asyncio
+import logging
+from typing import Optional
+
+from pydantic import BaseModel
+from temporalio import workflow
+from temporalio.exceptions import ChildWorkflowError
+
+from biosim_server.biosim_omex import OmexFile
+from biosim_server.biosim_runs import BiosimulatorVersion
+from biosim_server.biosim_verify import CompareSettings
+from biosim_server.biosim_verify.models import BatchArchiveResult, BatchProgress, VerifyBatchWorkflowOutput, \
+    VerifyWorkflowOutput, VerifyWorkflowStatus
+from biosim_server.biosim_verify.omex_verify_workflow import OmexVerifyWorkflow, OmexVerifyWorkflowInput
+
+
+class OmexVerifyBatchArchive(BaseModel):
+    omex_file: OmexFile
+    filenames: list[str]  # of the uploaded archives with this content
+
+
+class OmexVerifyBatchWorkflowInput(BaseModel):
+    archives: list[OmexVerifyBatchArchive]  # distinct by file_hash_md5
+    requested_simulators: list[BiosimulatorVersion]
+    cache_buster: str
+    compare_settings: CompareSettings
+    max_concurrency: int  # OmexVerifyWorkflow children running at the same time
+    profile: bool = False  # profile the activities, see biosim_server.profiling
+    compute_task_queue: Optional[str] = None  # of generate_statistics_activity (set by the api), default the workflow's queue
+    batch_simulations: bool = False  # see OmexVerifyWorkflowInput.batch_simulations
+
+
+def new_batch_output(workflow_id: str, batch_input: OmexVerifyBatchWorkflowInput, workflow_status: VerifyWorkflowStatus,
+                     timestamp: str, workflow_run_id: str | None = None) -> VerifyBatchWorkflowOutput:
+    """ the output before any archive was verified, the child workflow ids are derived from the batch workflow id """
+    output = VerifyBatchWorkflowOutput(
+        workflow_id=workflow_id, compare_settings=batch_input.compare_settings, workflow_status=workflow_status,
+        timestamp=timestamp, workflow_run_id=workflow_run_id,
+        progress=BatchProgress(total=0, pending=0, in_progress=0, completed=0, failed=0),
+        archive_results=[BatchArchiveResult(file_hash_md5=archive.omex_file.file_hash_md5, filenames=archive.filenames,
+                                            workflow_id=f"{workflow_id}-{archive.omex_file.file_hash_md5}")
+                         for archive in batch_input.archives])
+    output.update_progress()
+    return output
+
+
+@workflow.defn
+class OmexVerifyBatchWorkflow:
+    batch_input: OmexVerifyBatchWorkflowInput
+    batch_output: VerifyBatchWorkflowOutput
+    num_running: int
+
+    @workflow.init
+    def __init__(self, batch_input: OmexVerifyBatchWorkflowInput) -> None:
+        self.batch_input = batch_input
+        self.batch_output = new_batch_output(workflow_id=workflow.info().workflow_id, batch_input=batch_input,
+                                             workflow_status=VerifyWorkflowStatus.IN_PROGRESS,
+                                             timestamp=str(workflow.now()), workflow_run_id=workflow.info().run_id)
+        self.num_running = 0
+
+    @workflow.query(name="get_output")
+    def get_batch_workflow_output(self) -> VerifyBatchWorkflowOutput:
+        return self.batch_output
+
+    @workflow.run
+    async def run(self, batch_input: OmexVerifyBatchWorkflowInput) -> VerifyBatchWorkflowOutput:
+        workflow.logger.setLevel(level=logging.INFO)
+        workflow.logger.info(f"Batch workflow started for {len(batch_input.archives)} archives.")
+
+        # one OmexVerifyWorkflow per archive, at most max_concurrency at a time
+        max_concurrency = max(1, batch_input.max_concurrency)
+        verify_tasks: list[asyncio.Task[None]] = []
+        for archive, archive_result in zip(batch_input.archives, self.batch_output.archive_results):
+            await workflow.wait_condition(lambda: self.num_running < max_concurrency)
+            self.num_running += 1
+            verify_tasks.append(asyncio.create_task(self.verify_archive(archive, archive_result)))
+        await asyncio.gather(*verify_tasks)
+
+        self.batch_output.workflow_status = VerifyWorkflowStatus.COMPLETED
+        return self.batch_output
+
+    async def verify_archive(self, archive: OmexVerifyBatchArchive, archive_result: BatchArchiveResult) -> None:
+        archive_result.workflow_status = VerifyWorkflowStatus.IN_PROGRESS
+        self.batch_output.update_progress()
+        try:
+            child_input = OmexVerifyWorkflowInput(omex_file=archive.omex_file,
+                                                  requested_simulators=self.batch_input.requested_simulators,
+                                                  cache_buster=self.batch_input.cache_buster,
+                                                  compare_settings=self.batch_input.compare_settings,
+                                                  profile=self.batch_input.profile, summary_result=True,
+                                                  compute_task_queue=self.batch_input.compute_task_queue,
+                                                  batch_simulations=self.batch_input.batch_simulations)
+            # on the task queue of this workflow
+            child_output: VerifyWorkflowOutput = await workflow.execute_child_workflow(
+                OmexVerifyWorkflow.run, child_input, id=archive_result.workflow_id)
+            archive_result.workflow_status = child_output.workflow_status
+            archive_result.workflow_error = child_output.workflow_error
+        except ChildWorkflowError as e:
+            workflow.logger.warning(f"verification of archive {archive_result.file_hash_md5} failed: {e.cause}")
+            archive_result.workflow_status = VerifyWorkflowStatus.FAILED
+            archive_result.workflow_error = str(e.cause or e)
+        finally:
+            self.num_running -= 1
+            self.batch_output.update_progress()
@@ -1,21 +1,20 @@
 import asyncio
 import logging
 from datetime import timedelta
-from typing import Any, Coroutine
+from typing import Any, Coroutine, Optional
 
 from pydantic import BaseModel
 from temporalio import workflow
-from temporalio.common import RetryPolicy
 from temporalio.workflow import ChildWorkflowHandle
 
 from biosim_server.biosim_omex import OmexFile
-from biosim_server.biosim_runs import BiosimulatorVersion, OmexSimWorkflow, OmexSimWorkflowInput, OmexSimWorkflowOutput, \
-    BiosimulatorWorkflowRun
+from biosim_server.biosim_runs import BiosimulatorVersion, BiosimSimulationRunStatus, BiosimulatorWorkflowRun, \
+    OmexSimWorkflow, OmexSimWorkflowInput, OmexSimWorkflowOutput
+from biosim_server.biosim_runs.workflows import submit_biosim_simulation_runs, use_batch_submission
 from biosim_server.biosim_verify import CompareSettings
-from biosim_server.biosim_verify.activities import generate_statistics_activity, GenerateStatisticsActivityInput
-from biosim_server.biosim_verify.models import GenerateStatisticsActivityOutput, SimulationRunInfo, \
-    VerifyWorkflowStatus, VerifyWorkflowOutput
+from biosim_server.biosim_verify.models import VerifyWorkflowStatus, VerifyWorkflowOutput
 from biosim_server.biosim_verify.runs_verify_workflow import generate_statistics
+from biosim_server.common.timing import StageTiming
 
 
 class OmexVerifyWorkflowInput(BaseModel):
@@ -23,6 +22,11 @@ class OmexVerifyWorkflowInput(BaseModel):
     requested_simulators: list[BiosimulatorVersion]
     cache_buster: str
     compare_settings: CompareSettings
+    stage_timings: list[StageTiming] = []  # stages completed before the workflow started, e.g. omex_upload
+    profile: bool = False  # profile the activities, see biosim_server.profiling
+    summary_result: bool = False  # return the output without workflow_results (still returned by get_output)
+    compute_task_queue: Optional[str] = None  # of generate_statistics_activity (set by the api), default the workflow's queue
+    batch_simulations: bool = False  # one submit activity for all simulators rather than a child workflow each (set by the api)
 
 
 @workflow.defn
@@ -39,7 +43,8 @@ class OmexVerifyWorkflow:
             compare_settings=verify_input.compare_settings,
             workflow_run_id=workflow.info().run_id,
             workflow_status=VerifyWorkflowStatus.IN_PROGRESS,
-            timestamp=str(workflow.now()))
+            timestamp=str(workflow.now()),
+            stage_timings=list(verify_input.stage_timings))
 
     @workflow.query(name="get_output")
     def get_omex_sim_workflow_output(self) -> VerifyWorkflowOutput:
@@ -50,17 +55,61 @@ class OmexVerifyWorkflow:
         workflow.logger.setLevel(level=logging.INFO)
         workflow.logger.info("Main workflow started.")
 
-        # Launch child workflows to run a simulation for each simulator (or retrieve from cache)
+        stage_timings: list[StageTiming] = self.verify_output.stage_timings or []
+        simulations_start = workflow.time()
+
+        # run a simulation for each simulator (or retrieve from cache)
+        if use_batch_submission(verify_input.batch_simulations):
+            simulator_workflow_runs = await self.run_simulations_batch(stage_timings)
+        else:
+            simulator_workflow_runs = await self.run_simulations_children(stage_timings)
+        stage_timings.append(StageTiming(stage="simulations", duration_s=workflow.time() - simulations_start))
+
+        # Generate comparison report within an activity
+        workflow.logger.info("calling activity to generate statistics");
+        stats = await generate_statistics(sim_workflow_runs=simulator_workflow_runs, compare_settings=self.verify_input.compare_settings,
+                                          stage_timings=stage_timings, profile=verify_input.profile,
+                                          compute_task_queue=verify_input.compute_task_queue)
+
+        self.verify_output.workflow_results = stats
+        self.verify_output.workflow_status = VerifyWorkflowStatus.COMPLETED
+        if verify_input.summary_result:
+            # keeps the history of a parent (e.g. OmexVerifyBatchWorkflow) small
+            return self.verify_output.model_copy(update={"workflow_results": None})
+        return self.verify_output
+
+    async def run_simulations_batch(self, stage_timings: list[StageTiming]) -> list[BiosimulatorWorkflowRun]:
+        """ the succeeded runs, all simulations submitted together as one batch (e.g. a Slurm job array) """
+        workflow.logger.info(f"submitting {len(self.verify_input.requested_simulators)} simulations.")
+        biosim_workflow_runs = await submit_biosim_simulation_runs(
+            workflow_id=workflow.info().workflow_id,
+            simulations=[(self.verify_input.omex_file, simulator_spec)
+                         for simulator_spec in self.verify_input.requested_simulators],
+            cache_buster=self.verify_input.cache_buster, profile=self.verify_input.profile)
+
+        simulator_workflow_runs: list[BiosimulatorWorkflowRun] = []
+        for biosim_workflow_run in biosim_workflow_runs:
+            stage_timings.extend(biosim_workflow_run.stage_timings or [])
+            if biosim_workflow_run.biosim_run is None or \
+                    biosim_workflow_run.biosim_run.status != BiosimSimulationRunStatus.SUCCEEDED:
+                continue
+            simulator_workflow_runs.append(biosim_workflow_run)
+        return simulator_workflow_runs
+
+    async def run_simulations_children(self, stage_timings: list[StageTiming]) -> list[BiosimulatorWorkflowRun]:
+        """ the succeeded runs, a child workflow per simulator """
         child_workflows: list[
             Coroutine[Any, Any, ChildWorkflowHandle[OmexSimWorkflowInput, OmexSimWorkflowOutput]]] = []
-        for simulator_spec in verify_input.requested_simulators:
+        for simulator_spec in self.verify_input.requested_simulators:
+            # on the task queue of this workflow
             child_workflows.append(
                 workflow.start_child_workflow(OmexSimWorkflow.run,  # type: ignore
-                                              args=[OmexSimWorkflowInput(omex_file=verify_input.omex_file,
+                                              args=[OmexSimWorkflowInput(omex_file=self.verify_input.omex_file,
                                                                          simulator_version=simulator_spec,
-                                                                         cache_buster=verify_input.cache_buster)],
+                                                                         cache_buster=self.verify_input.cache_buster,
+                                                                         profile=self.verify_input.profile)],
                                               result_type=OmexSimWorkflowOutput,
-                                              task_queue="verification_tasks", execution_timeout=timedelta(minutes=10), ))
+                                              execution_timeout=timedelta(minutes=10), ))
 
         workflow.logger.info(f"waiting for {len(child_workflows)} child simulation workflows.")
         # Wait for all child workflows to complete
@@ -77,11 +126,5 @@ class OmexVerifyWorkflow:
             if omex_sim_workflow_output.biosimulator_workflow_run is None:
                 continue
             simulator_workflow_runs.append(omex_sim_workflow_output.biosimulator_workflow_run)
-
-        # Generate comparison report within an activity
-        workflow.logger.info("calling activity to generate statistics");
-        stats = await generate_statistics(sim_workflow_runs=simulator_workflow_runs, compare_settings=self.verify_input.compare_settings)
-
-        self.verify_output.workflow_results = stats
-        self.verify_output.workflow_status = VerifyWorkflowStatus.COMPLETED
-        return self.verify_output
+            stage_timings.extend(omex_sim_workflow_output.biosimulator_workflow_run.stage_timings or [])
+        return simulator_workflow_runs
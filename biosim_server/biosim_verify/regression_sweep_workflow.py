@@ -0,0 +1,208 @@
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Optional
+
+from pydantic import BaseModel
+from temporalio import workflow
+from temporalio.common import RetryPolicy
+from temporalio.exceptions import ActivityError, ApplicationError, ChildWorkflowError
+
+from biosim_server.biosim_omex import OmexFile
+from biosim_server.biosim_runs import BiosimulatorVersion, BiosimSimulationRunStatus, BiosimulatorWorkflowRun, \
+    GetCachedBiosimSimulationRunsActivityInput, ListOmexFilesActivityInput, OmexSimWorkflow, OmexSimWorkflowInput, \
+    OmexSimWorkflowOutput, OmexSimWorkflowStatus, RegressionSweepArchiveResult, \
+    SaveRegressionSweepResultsActivityInput, get_cached_biosim_simulation_runs_activity, list_omex_files_activity, \
+    save_regression_sweep_results_activity
+from biosim_server.biosim_runs.activities import GetCachedBiosimSimulationRunsActivityOutput, \
+    ListOmexFilesActivityOutput
+from biosim_server.biosim_runs.workflows import submit_biosim_simulation_runs, use_batch_submission
+from biosim_server.biosim_verify import CompareSettings
+from biosim_server.biosim_verify.models import GenerateStatisticsActivityOutput, RegressionSweepOutput, \
+    VerifyWorkflowStatus
+from biosim_server.biosim_verify.runs_verify_workflow import generate_statistics
+
+
+class RegressionSweepWorkflowInput(BaseModel):
+    new_simulator_version: BiosimulatorVersion
+    previous_simulator_version: BiosimulatorVersion
+    compare_settings: CompareSettings
+    cache_buster: str = "0"  # of the runs of the new version, a repeated sweep reuses them
+    page_size: int = 20  # OMEX files per page of the corpus
+    max_concurrent_simulations: int = 5  # runs of the new version in flight
+    pages_per_workflow_run: int = 5  # then continue as new (sooner if the server suggests it)
+    progress: Optional[RegressionSweepOutput] = None  # counters and cursor carried over to the next workflow run
+    compute_task_queue: Optional[str] = None  # of generate_statistics_activity (set by the api), default the workflow's queue
+    batch_simulations: bool = False  # a page in one submit activity rather than a child workflow per archive (set by the api)
+
+
+def _simulator_name(simulator_version: BiosimulatorVersion) -> str:
+    return f"{simulator_version.id}:{simulator_version.version}"
+
+
+def mismatched_datasets(statistics: GenerateStatisticsActivityOutput) -> list[str]:
+    """ datasets with a comparison which is not close everywhere or could not be made """
+    return [dataset_name for dataset_name, matrix in statistics.comparison_statistics.items()
+            if any(stats.error_message is not None or stats.is_close is None or not all(stats.is_close)
+                   for row in matrix for stats in row)]
+
+
+@workflow.defn
+class RegressionSweepWorkflow:
+    """ verifies a new simulator version against the cached runs of a previous version for every stored OMEX file,
+    the previous version is never run (files without a succeeded cached run are skipped) """
+    sweep_input: RegressionSweepWorkflowInput
+    sweep_output: RegressionSweepOutput
+    num_running: int
+
+    @workflow.init
+    def __init__(self, sweep_input: RegressionSweepWorkflowInput) -> None:
+        self.sweep_input = sweep_input
+        self.sweep_output = sweep_input.progress or RegressionSweepOutput(
+            workflow_id=workflow.info().workflow_id,
+            new_simulator_version=_simulator_name(sweep_input.new_simulator_version),
+            previous_simulator_version=_simulator_name(sweep_input.previous_simulator_version),
+            workflow_status=VerifyWorkflowStatus.IN_PROGRESS,
+            timestamp=str(workflow.now()))
+        self.num_running = 0
+
+    @workflow.query(name="get_output")
+    def get_regression_sweep_output(self) -> RegressionSweepOutput:
+        return self.sweep_output
+
+    @workflow.run
+    async def run(self, sweep_input: RegressionSweepWorkflowInput) -> RegressionSweepOutput:
+        workflow.logger.setLevel(level=logging.INFO)
+        if sweep_input.page_size <= 0:
+            raise ApplicationError(f"page_size must be positive, got {sweep_input.page_size}", non_retryable=True)
+        workflow.logger.info(f"Regression sweep of {self.sweep_output.new_simulator_version} against "
+                             f"{self.sweep_output.previous_simulator_version} resumed after "
+                             f"{self.sweep_output.archives_swept} archives.")
+
+        for _ in range(max(1, sweep_input.pages_per_workflow_run)):
+            page: ListOmexFilesActivityOutput = await workflow.execute_activity(
+                list_omex_files_activity,
+                args=[ListOmexFilesActivityInput(after_database_id=self.sweep_output.last_database_id,
+                                                 limit=sweep_input.page_size)],
+                start_to_close_timeout=timedelta(seconds=60), retry_policy=RetryPolicy(maximum_attempts=30))
+            await self.sweep_page(page.omex_files)
+            if len(page.omex_files) > 0:
+                self.sweep_output.last_database_id = page.omex_files[-1].database_id
+            if len(page.omex_files) < sweep_input.page_size:
+                self.sweep_output.workflow_status = VerifyWorkflowStatus.COMPLETED
+                return self.sweep_output
+            if workflow.info().is_continue_as_new_suggested():
+                break
+
+        # all activities of this run are done, start over with a fresh history (the results are stored, the input
+        # only carries the counters and the cursor)
+        self.sweep_output.num_workflow_runs += 1
+        workflow.continue_as_new(sweep_input.model_copy(update={"progress": self.sweep_output}))
+
+    async def sweep_page(self, omex_files: list[OmexFile]) -> None:
+        if len(omex_files) == 0:
+            return
+        cached_runs: GetCachedBiosimSimulationRunsActivityOutput = await workflow.execute_activity(
+            get_cached_biosim_simulation_runs_activity,
+            args=[GetCachedBiosimSimulationRunsActivityInput(
+                file_hashes_md5=[omex_file.file_hash_md5 for omex_file in omex_files],
+                simulator_version=self.sweep_input.previous_simulator_version)],
+            start_to_close_timeout=timedelta(seconds=60), retry_policy=RetryPolicy(maximum_attempts=30))
+
+        max_concurrent_simulations = max(1, self.sweep_input.max_concurrent_simulations)
+        swept_archives: list[tuple[OmexFile, BiosimulatorWorkflowRun]] = []
+        for omex_file in omex_files:
+            self.sweep_output.archives_swept += 1
+            previous_run = cached_runs.biosim_workflow_runs.get(omex_file.file_hash_md5)
+            if previous_run is None:
+                self.sweep_output.archives_without_previous_run += 1
+                continue
+            swept_archives.append((omex_file, previous_run))
+        if len(swept_archives) == 0:
+            return
+
+        # a cached run of the new version (same cache buster) is reused
+        results: list[RegressionSweepArchiveResult] | None = None
+        new_runs: list[BiosimulatorWorkflowRun | None] = [None] * len(swept_archives)
+        if use_batch_submission(self.sweep_input.batch_simulations):
+            # the new version runs of the page are submitted as one batch (a single job array on the slurm backend
+            # which runs at most max_concurrent_simulations at once)
+            try:
+                new_runs = list(await submit_biosim_simulation_runs(
+                    workflow_id=workflow.info().workflow_id,
+                    simulations=[(omex_file, self.sweep_input.new_simulator_version)
+                                 for omex_file, _ in swept_archives],
+                    cache_buster=self.sweep_input.cache_buster, max_concurrent=max_concurrent_simulations))
+            except ActivityError as e:
+                workflow.logger.warning(f"regression sweep of {len(swept_archives)} archives failed: {e.cause}")
+                results = [self.archive_result(omex_file, previous_run) for omex_file, previous_run in swept_archives]
+                for result in results:
+                    result.error_message = str(e.cause or e)
+        if results is None:
+            # otherwise a child workflow runs the new version of each archive, at most max_concurrent_simulations
+            sweep_tasks: list[asyncio.Task[RegressionSweepArchiveResult]] = []
+            for (omex_file, previous_run), new_run in zip(swept_archives, new_runs):
+                await workflow.wait_condition(lambda: self.num_running < max_concurrent_simulations)
+                self.num_running += 1
+                sweep_tasks.append(asyncio.create_task(self.sweep_archive(omex_file, previous_run, new_run)))
+            results = list(await asyncio.gather(*sweep_tasks))
+
+        # only the regressions and failures are stored, an equivalent archive is just counted
+        stored_results: list[RegressionSweepArchiveResult] = []
+        for result in results:
+            if result.error_message is not None:
+                self.sweep_output.num_failures += 1
+            elif len(result.mismatched_datasets) > 0:
+                self.sweep_output.num_regressions += 1
+            else:
+                self.sweep_output.archives_equivalent += 1
+                continue
+            stored_results.append(result)
+        if len(stored_results) > 0:
+            await workflow.execute_activity(
+                save_regression_sweep_results_activity,
+                args=[SaveRegressionSweepResultsActivityInput(results=stored_results)],
+                start_to_close_timeout=timedelta(seconds=60), retry_policy=RetryPolicy(maximum_attempts=30))
+
+    @staticmethod
+    def archive_result(omex_file: OmexFile, previous_run: BiosimulatorWorkflowRun) -> RegressionSweepArchiveResult:
+        return RegressionSweepArchiveResult(
+            sweep_workflow_id=workflow.info().workflow_id, file_hash_md5=omex_file.file_hash_md5,
+            uploaded_filename=omex_file.uploaded_filename,
+            previous_run_id=previous_run.biosim_run.id if previous_run.biosim_run is not None else None)
+
+    async def sweep_archive(self, omex_file: OmexFile, previous_run: BiosimulatorWorkflowRun,
+                            new_run: BiosimulatorWorkflowRun | None) -> RegressionSweepArchiveResult:
+        """ the result of the archive, with an error_message if it failed. without a new_run (not submitted as a
+        batch) the new version is run by a child workflow """
+        result = self.archive_result(omex_file, previous_run)
+        try:
+            if new_run is None:
+                sim_output: OmexSimWorkflowOutput = await workflow.execute_child_workflow(
+                    OmexSimWorkflow.run,
+                    OmexSimWorkflowInput(omex_file=omex_file, simulator_version=self.sweep_input.new_simulator_version,
+                                         cache_buster=self.sweep_input.cache_buster),
+                    id=f"{workflow.info().workflow_id}-{omex_file.file_hash_md5}",
+                    execution_timeout=timedelta(minutes=10))
+                if sim_output.workflow_status != OmexSimWorkflowStatus.COMPLETED \
+                        or sim_output.biosimulator_workflow_run is None:
+                    result.error_message = sim_output.error_message or "simulation of the new version failed"
+                    return result
+                new_run = sim_output.biosimulator_workflow_run
+            result.new_run_id = new_run.biosim_run.id if new_run.biosim_run is not None else None
+            if new_run.biosim_run is None or new_run.biosim_run.status != BiosimSimulationRunStatus.SUCCEEDED:
+                result.error_message = (new_run.biosim_run.error_message if new_run.biosim_run is not None else None) \
+                                       or "simulation of the new version failed"
+                return result
+
+            statistics = await generate_statistics(sim_workflow_runs=[previous_run, new_run],
+                                                   compare_settings=self.sweep_input.compare_settings,
+                                                   stage_timings=[],
+                                                   compute_task_queue=self.sweep_input.compute_task_queue)
+            result.mismatched_datasets = mismatched_datasets(statistics)
+        except (ActivityError, ChildWorkflowError) as e:
+            workflow.logger.warning(f"regression sweep of archive {omex_file.file_hash_md5} failed: {e.cause}")
+            result.error_message = str(e.cause or e)
+        finally:
+            self.num_running -= 1
+        return result
@@ -1,5 +1,6 @@
 import logging
 from datetime import timedelta
+from typing import Optional
 
 from pydantic import BaseModel
 from temporalio import workflow
@@ -10,14 +11,16 @@ from biosim_server.biosim_runs import BiosimSimulationRunStatus, BiosimulatorWor
     GetExistingBiosimSimulationRunActivityInput, get_existing_biosim_simulation_run_activity
 from biosim_server.biosim_runs.activities import GetExistingBiosimSimulationRunActivityOutput
 from biosim_server.biosim_verify import CompareSettings
-from biosim_server.biosim_verify.activities import generate_statistics_activity, GenerateStatisticsActivityInput
-from biosim_server.biosim_verify.models import GenerateStatisticsActivityOutput, SimulationRunInfo, \
-    VerifyWorkflowOutput, VerifyWorkflowStatus
+from biosim_server.biosim_verify.models import GenerateStatisticsActivityInput, GenerateStatisticsActivityOutput, \
+    SimulationRunInfo, VerifyWorkflowOutput, VerifyWorkflowStatus
+from biosim_server.common.timing import StageTiming
 
 
 class RunsVerifyWorkflowInput(BaseModel):
     biosimulations_run_ids: list[str]
     compare_settings: CompareSettings
+    profile: bool = False  # profile the activities, see biosim_server.profiling
+    compute_task_queue: Optional[str] = None  # of generate_statistics_activity (set by the api), default the workflow's queue
 
 
 @workflow.defn
@@ -31,7 +34,7 @@ class RunsVerifyWorkflow:
         # assert verify_input.workflow_id == workflow.info().workflow_id
         self.verify_output = VerifyWorkflowOutput(workflow_id=workflow.info().workflow_id,
             compare_settings=verify_input.compare_settings, workflow_run_id=workflow.info().run_id,
-            workflow_status=VerifyWorkflowStatus.IN_PROGRESS, timestamp=str(workflow.now()))
+            workflow_status=VerifyWorkflowStatus.IN_PROGRESS, timestamp=str(workflow.now()), stage_timings=[])
 
     @workflow.query(name="get_output")
     def get_runs_sim_workflow_output(self) -> VerifyWorkflowOutput:
@@ -44,10 +47,13 @@ class RunsVerifyWorkflow:
 
         # get simulator workflow runs from biosimulations.org or database cache
         simulator_workflow_runs: list[BiosimulatorWorkflowRun] = []
+        stage_timings: list[StageTiming] = self.verify_output.stage_timings or []
         for biosimulation_run_id in verify_input.biosimulations_run_ids:
 
             output = await get_biosim_simulation_run(workflow_id=workflow.info().workflow_id,
-                                                     biosim_run_id=biosimulation_run_id)
+                                                     biosim_run_id=biosimulation_run_id, profile=verify_input.profile)
+            if output.biosim_workflow_run is not None:
+                stage_timings.extend(output.biosim_workflow_run.stage_timings or [])
 
             if output.status != BiosimSimulationRunStatus.SUCCEEDED or output.biosim_workflow_run is None or output.biosim_workflow_run.biosim_run is None:
 
@@ -63,25 +69,28 @@ class RunsVerifyWorkflow:
                 self.verify_output = VerifyWorkflowOutput(workflow_id=workflow.info().workflow_id,
                     compare_settings=verify_input.compare_settings, workflow_run_id=workflow.info().run_id,
                     workflow_status=status, timestamp=str(workflow.now()),
-                    workflow_error=error_message)
+                    workflow_error=error_message, stage_timings=stage_timings)
                 return self.verify_output
             else:
                 simulator_workflow_runs.append(output.biosim_workflow_run)
                 workflow.logger.info(f"verified access to completed run ids {verify_input.biosimulations_run_ids}.")
 
         # Generate comparison report
-        stats = await generate_statistics(sim_workflow_runs=simulator_workflow_runs, compare_settings=self.verify_input.compare_settings)
+        stats = await generate_statistics(sim_workflow_runs=simulator_workflow_runs, compare_settings=self.verify_input.compare_settings,
+                                          stage_timings=stage_timings, profile=verify_input.profile,
+                                          compute_task_queue=verify_input.compute_task_queue)
         self.verify_output.workflow_results = stats
         self.verify_output.workflow_status = VerifyWorkflowStatus.COMPLETED
         return self.verify_output
 
 
-async def get_biosim_simulation_run(workflow_id: str, biosim_run_id: str) -> GetExistingBiosimSimulationRunActivityOutput:
+async def get_biosim_simulation_run(workflow_id: str, biosim_run_id: str,
+                                    profile: bool = False) -> GetExistingBiosimSimulationRunActivityOutput:
     try:
         output = await workflow.execute_activity(
             get_existing_biosim_simulation_run_activity,
             args=[GetExistingBiosimSimulationRunActivityInput(workflow_id=workflow_id,biosim_run_id=biosim_run_id,
-                                                              abort_on_not_found=True)],
+                                                              abort_on_not_found=True, profile=profile)],
             start_to_close_timeout=timedelta(seconds=60),retry_policy=RetryPolicy(maximum_attempts=30))
         return output
     except ActivityError as e:
@@ -89,18 +98,30 @@ async def get_biosim_simulation_run(workflow_id: str, biosim_run_id: str) -> Get
         raise e
 
 
-async def generate_statistics(sim_workflow_runs: list[BiosimulatorWorkflowRun], compare_settings: CompareSettings) -> GenerateStatisticsActivityOutput:
+async def generate_statistics(sim_workflow_runs: list[BiosimulatorWorkflowRun], compare_settings: CompareSettings,
+                              stage_timings: list[StageTiming], profile: bool = False,
+                              compute_task_queue: Optional[str] = None) -> GenerateStatisticsActivityOutput:
+    """ appends the timings of the activity and its total duration (including scheduling) to stage_timings,
+    the activity runs on compute_task_queue (default the task queue of the workflow) """
     try:
+        start = workflow.time()
         run_data = [SimulationRunInfo(biosim_sim_run=a.biosim_run, hdf5_file=a.hdf5_file)
                     for a in sim_workflow_runs if a.biosim_run is not None and a.hdf5_file is not None]
-        generate_statistics_input = GenerateStatisticsActivityInput(sim_run_info_list=run_data, compare_settings=compare_settings)
+        generate_statistics_input = GenerateStatisticsActivityInput(sim_run_info_list=run_data, compare_settings=compare_settings,
+                                                                    profile=profile)
         # Generate comparison report
+        # referenced by name so that starting workflows (api) doesn't import numpy with the activity implementation
         generate_statistics_output: GenerateStatisticsActivityOutput = await workflow.execute_activity(
-            generate_statistics_activity,
+            "generate_statistics_activity",
             arg=generate_statistics_input,
+            result_type=GenerateStatisticsActivityOutput,
+            task_queue=compute_task_queue,
             start_to_close_timeout=timedelta(minutes=10),
             retry_policy=RetryPolicy(maximum_attempts=100, backoff_coefficient=2.0,
                                      maximum_interval=timedelta(seconds=10)))
+        stage_timings.extend(generate_statistics_output.stage_timings or [])
+        stage_timings.append(StageTiming(stage="generate_statistics", duration_s=workflow.time() - start))
+        generate_statistics_output.stage_timings = None
         return generate_statistics_output
     except ActivityError as e:
         workflow.logger.exception(f"Failed to generate statistics in workflow_id {workflow.info().workflow_id}.", exc_info=e)
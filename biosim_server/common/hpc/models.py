@@ -1,5 +1,5 @@
 import pprint
-from typing import Optional
+from typing import Any, Optional
 
 from pydantic import BaseModel, ConfigDict
 
@@ -29,6 +29,7 @@ class SlurmJob(BaseModel):
     array_job_id: Optional[NumericSlurmValue] = None
     array_task_id: Optional[NumericSlurmValue] = None
     array_max_tasks: Optional[NumericSlurmValue] = None
+    array_task_string: Optional[str] = None  # pending array tasks are reported as one record, e.g. "3-9%2"
 
     model_config = ConfigDict(
         populate_by_name=True,
@@ -36,10 +37,52 @@ class SlurmJob(BaseModel):
         protected_namespaces=(),
     )
 
+    @property
+    def array_task_ids(self) -> list[int]:
+        """ task ids covered by this record, a single task or the pending tasks listed in array_task_string """
+        if self.array_task_id is not None and self.array_task_id.set and self.array_task_id.number is not None:
+            return [self.array_task_id.number]
+        task_ids: list[int] = []
+        for task_range in (self.array_task_string or "").split("%")[0].split(","):
+            if "-" in task_range:
+                first, last = task_range.split("-")
+                task_ids.extend(range(int(first), int(last) + 1))
+            elif task_range.strip():
+                task_ids.append(int(task_range))
+        return task_ids
+
+    @classmethod
+    def from_sacct(cls, job: dict[str, Any]) -> "SlurmJob":
+        """ a job record of 'sacct --json', whose layout differs from squeue (and between slurm versions) """
+        state = job.get("state", {}).get("current", [])
+        exit_code = job.get("exit_code")
+        array = job.get("array") or {}
+        array_job_id = array.get("job_id")
+        return cls(job_id=job["job_id"], name=job.get("name", ""), account=job.get("account", ""), batch_flag=True,
+                   batch_host=job.get("nodes", ""), cluster=job.get("cluster", ""), command=job.get("submit_line", ""),
+                   user_name=job.get("user", ""), job_state=state if isinstance(state, list) else [state],
+                   exit_code=ExitCode(status=_as_list(exit_code.get("status")),
+                                      return_code=_as_numeric(exit_code.get("return_code"))) if exit_code else None,
+                   array_job_id=_as_numeric(array_job_id) if array_job_id else None,
+                   array_task_id=_as_numeric(array.get("task_id")) if array_job_id else None)
+
     def to_str(self) -> str:
         """Returns the string representation of the model using alias"""
         return pprint.pformat(self.model_dump(by_alias=True))
 
     def to_json(self) -> str:
         """Returns the JSON representation of the model using alias"""
-        return self.model_dump_json(by_alias=True, exclude_unset=True)
\ No newline at end of file
+        return self.model_dump_json(by_alias=True, exclude_unset=True)
+
+
+def _as_list(value: Any) -> list[str]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _as_numeric(value: Any) -> NumericSlurmValue:
+    """ newer slurm versions report numbers as {"set": .., "infinite": .., "number": ..}, older ones as plain ints """
+    if isinstance(value, dict):
+        return NumericSlurmValue.model_validate(value)
+    return NumericSlurmValue(set=value is not None, infinite=False, number=value)
@@ -16,10 +16,12 @@ class SlurmService:
     def __init__(self, ssh_service: SSHService):
         self.ssh_service = ssh_service
 
-    async def get_job_status(self, job_id: int | None = None) -> list[SlurmJob]:
+    async def get_job_status(self, job_id: int | None = None, user: str | None = None) -> list[SlurmJob]:
         command = f'squeue --json'
         if job_id is not None:
              command = command + f' -j {job_id}'
+        if user is not None:
+            command = command + f' --user={user}'
         return_code, stdout, stderr = await self.ssh_service.run_command(command=command)
         if return_code != 0:
             raise Exception(f"failed to get job status with command {command} return code {return_code} stderr {stderr[:100]}")
@@ -27,11 +29,31 @@ class SlurmService:
         job_dicts: list[dict[str, Any]] = result_json_obj['jobs']
         return [SlurmJob.model_validate(job_dict) for job_dict in job_dicts]
 
-    async def submit_job(self, local_sbatch_file: Path, remote_sbatch_file: Path) -> int:
-        await self.ssh_service.scp_upload(local_file=local_sbatch_file, remote_path=remote_sbatch_file)
-        command = f'sbatch --parsable {local_sbatch_file}'
+    async def get_job_accounting(self, job_ids: list[int]) -> list[SlurmJob]:
+        """ accounting records of jobs, including those which already left the queue (with their final state and
+        exit code), an array job id returns a record per task """
+        command = f'sacct --json -j {",".join(str(job_id) for job_id in job_ids)}'
         return_code, stdout, stderr = await self.ssh_service.run_command(command=command)
+        if return_code != 0:
+            raise Exception(f"failed to get job accounting with command {command} return code {return_code} stderr {stderr[:100]}")
+        job_dicts: list[dict[str, Any]] = json.loads(stdout)['jobs']
+        return [SlurmJob.from_sacct(job_dict) for job_dict in job_dicts]
+
+    async def submit_job(self, local_sbatch_file: Path, remote_sbatch_file: Path, array_size: int | None = None,
+                         array_max_concurrent: int | None = None) -> int:
+        """ returns the job id, or the array job id if array_size is given (tasks 0..array_size-1, selected in the
+        script by SLURM_ARRAY_TASK_ID, at most array_max_concurrent running at once) """
+        await self.ssh_service.scp_upload(local_file=local_sbatch_file, remote_path=remote_sbatch_file)
+        array_option = ''
+        if array_size is not None:
+            array_option = f' --array=0-{array_size - 1}'
+            if array_max_concurrent is not None:
+                array_option += f'%{array_max_concurrent}'
+        command = f'sbatch --parsable{array_option} {remote_sbatch_file}'
+        # not retried once sent, a lost connection may still have submitted the job
+        return_code, stdout, stderr = await self.ssh_service.run_command(command=command, idempotent=False)
         if return_code != 0:
             raise Exception(f"failed to get job status with command {command} return code {return_code} stderr {stderr[:100]}")
-        return int(stdout)
+        # --parsable prints "job_id" or "job_id;cluster_name"
+        return int(stdout.strip().split(";")[0])
 
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import time
+
+from biosim_server.common.hpc.models import SlurmJob
+from biosim_server.common.hpc.slurm_service import SlurmService
+from biosim_server.config import get_settings
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# states of jobs which have not finished yet (anything else reported by sacct is final)
+ACTIVE_JOB_STATES = {"PENDING", "CONFIGURING", "RUNNING", "COMPLETING", "SUSPENDED", "REQUEUED", "RESIZING"}
+# jobs missing from squeue are looked up with sacct while they are still being asked for
+WATCH_EXPIRY_S = 600.0
+
+
+def is_job_finished(job: SlurmJob) -> bool:
+    return len(job.job_state) > 0 and not (set(job.job_state) & ACTIVE_JOB_STATES)
+
+
+class SlurmStatusService:
+    """ serves per-job status from a periodic snapshot of all of our jobs (one squeue call per refresh),
+    so the load on the login node does not grow with the number of jobs being monitored
+
+    finished jobs drop out of squeue within minutes, so jobs which were asked for but are missing from squeue are
+    looked up with a single sacct call per refresh, which reports their final state (e.g. FAILED, TIMEOUT,
+    OUT_OF_MEMORY) """
+    slurm_service: SlurmService
+    max_staleness_s: float
+    refresh_interval_s: float
+    jobs: dict[int, SlurmJob]
+    array_tasks: dict[tuple[int, int], SlurmJob]
+    accounted_jobs: dict[int, SlurmJob]  # sacct records of jobs missing from squeue
+    accounted_array_tasks: dict[tuple[int, int], SlurmJob]
+    fetched_at: float | None
+    refresh_count: int
+    _lock: asyncio.Lock
+    _refresh_task: asyncio.Task[None] | None
+    _watched_jobs: dict[int, float]  # job id -> last asked for (time.monotonic)
+    _watched_array_tasks: dict[tuple[int, int], float]
+
+    def __init__(self, slurm_service: SlurmService, max_staleness_s: float | None = None,
+                 refresh_interval_s: float | None = None):
+        self.slurm_service = slurm_service
+        self.max_staleness_s = max_staleness_s or get_settings().slurm_status_max_staleness_s
+        self.refresh_interval_s = refresh_interval_s or get_settings().slurm_status_refresh_interval_s
+        self.jobs = {}
+        self.array_tasks = {}
+        self.accounted_jobs = {}
+        self.accounted_array_tasks = {}
+        self.fetched_at = None
+        self.refresh_count = 0
+        self._lock = asyncio.Lock()
+        self._refresh_task = None
+        self._watched_jobs = {}
+        self._watched_array_tasks = {}
+
+    def _is_stale(self) -> bool:
+        return self.fetched_at is None or time.monotonic() - self.fetched_at > self.max_staleness_s
+
+    async def refresh(self, force: bool = True) -> None:
+        """ replace the snapshot, concurrent callers share a single squeue call """
+        requested_at = time.monotonic()
+        async with self._lock:
+            # another caller refreshed while we were waiting for the lock
+            if self.fetched_at is not None and (self.fetched_at >= requested_at or (not force and not self._is_stale())):
+                return
+            # the snapshot is as old as the squeue call, not its reply
+            started_at = time.monotonic()
+            jobs = await self.slurm_service.get_job_status(user=self.slurm_service.ssh_service.username)
+            self.jobs = {job.job_id: job for job in jobs}
+            self.array_tasks = {(job.array_job_id.number, task_id): job
+                                for job in jobs if job.array_job_id is not None and job.array_job_id.number
+                                for task_id in job.array_task_ids}
+            await self._refresh_accounting()
+            self.fetched_at = started_at
+            self.refresh_count += 1
+
+    async def _refresh_accounting(self) -> None:
+        """ sacct records of the watched jobs which are missing from squeue and not known to be finished """
+        expired = time.monotonic() - WATCH_EXPIRY_S
+        self._watched_jobs = {job_id: t for job_id, t in self._watched_jobs.items() if t > expired}
+        self._watched_array_tasks = {key: t for key, t in self._watched_array_tasks.items() if t > expired}
+        self.accounted_jobs = {job_id: job for job_id, job in self.accounted_jobs.items()
+                               if job_id in self._watched_jobs}
+        self.accounted_array_tasks = {key: job for key, job in self.accounted_array_tasks.items()
+                                      if key in self._watched_array_tasks}
+
+        def needs_accounting(job: SlurmJob | None, active: SlurmJob | None) -> bool:
+            return active is None and (job is None or not is_job_finished(job))
+        job_ids = {job_id for job_id in self._watched_jobs
+                   if needs_accounting(self.accounted_jobs.get(job_id), self.jobs.get(job_id))}
+        job_ids |= {array_job_id for (array_job_id, task_id) in self._watched_array_tasks
+                    if needs_accounting(self.accounted_array_tasks.get((array_job_id, task_id)),
+                                        self.array_tasks.get((array_job_id, task_id)))}
+        if len(job_ids) == 0:
+            return
+        try:
+            jobs = await self.slurm_service.get_job_accounting(job_ids=sorted(job_ids))
+        except Exception as e:
+            logger.warning(f"failed to get slurm accounting of {len(job_ids)} jobs: {e}")
+            return
+        for job in jobs:
+            if job.array_job_id is not None and job.array_job_id.number and job.array_task_id is not None \
+                    and job.array_task_id.number is not None:
+                self.accounted_array_tasks[(job.array_job_id.number, job.array_task_id.number)] = job
+            else:
+                self.accounted_jobs[job.job_id] = job
+
+    def _watch(self, job_ids: list[int]) -> None:
+        now = time.monotonic()
+        for job_id in job_ids:
+            self._watched_jobs[job_id] = now
+
+    async def get_job(self, job_id: int, force: bool = False) -> SlurmJob | None:
+        """ job status at most max_staleness_s old (from squeue, or sacct once it left the queue), None if the job is
+        not known to either (yet), force refreshes the snapshot first """
+        self._watch([job_id])
+        if force or self._is_stale():
+            await self.refresh(force=force)
+        return self.jobs.get(job_id) or self.accounted_jobs.get(job_id)
+
+    async def get_jobs(self, job_ids: list[int]) -> dict[int, SlurmJob | None]:
+        self._watch(job_ids)
+        if self._is_stale():
+            await self.refresh(force=False)
+        return {job_id: self.jobs.get(job_id) or self.accounted_jobs.get(job_id) for job_id in job_ids}
+
+    async def get_array_task(self, array_job_id: int, array_task_id: int, force: bool = False) -> SlurmJob | None:
+        """ status of one task of a job array (pending tasks share the record of the whole pending range) """
+        self._watched_array_tasks[(array_job_id, array_task_id)] = time.monotonic()
+        if force or self._is_stale():
+            await self.refresh(force=force)
+        key = (array_job_id, array_task_id)
+        return self.array_tasks.get(key) or self.accounted_array_tasks.get(key)
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"failed to refresh slurm job status snapshot: {e}")
+            await asyncio.sleep(self.refresh_interval_s)
+
+    def start(self) -> None:
+        """ refresh the snapshot in the background every refresh_interval_s """
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
@@ -1,25 +1,175 @@
+import asyncio
+import hashlib
 import logging
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, TypeVar
 
 import asyncssh
-from asyncssh import SSHCompletedProcess
+from asyncssh import SSHClientConnection, SSHCompletedProcess
+
+from biosim_server.config import get_settings
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+T = TypeVar("T")
+
+# errors which indicate the pooled connection itself is unusable (rather than the remote command failing)
+_CONNECTION_ERRORS = (asyncssh.DisconnectError, asyncssh.ChannelOpenError, ConnectionError)
+
+
+class _PooledConnection:
+    conn: SSHClientConnection
+    channels_in_use: int
+    last_used: float
+
+    def __init__(self, conn: SSHClientConnection):
+        self.conn = conn
+        self.channels_in_use = 0
+        self.last_used = time.monotonic()
+
 
 class SSHService:
+    """ commands and file transfers are multiplexed as channels over a small pool of long-lived connections """
     hostname: str
     username: str
     key_path: Path
+    max_connections: int
+    max_channels_per_connection: int
+    idle_timeout_s: float
+    keepalive_interval_s: float
+    compression: bool
+    _connections: list[_PooledConnection]
+    _connecting: int
+    _condition: asyncio.Condition
+    _reaper_task: asyncio.Task[None] | None
 
-    def __init__(self, hostname: str, username: str, key_path: Path):
+    def __init__(self, hostname: str, username: str, key_path: Path,
+                 max_connections: int | None = None, max_channels_per_connection: int | None = None,
+                 idle_timeout_s: float | None = None, keepalive_interval_s: float | None = None,
+                 compression: bool | None = None):
+        settings = get_settings()
         self.hostname = hostname
         self.username = username
         self.key_path = key_path
+        self.max_connections = settings.slurm_ssh_max_connections if max_connections is None else max_connections
+        self.max_channels_per_connection = settings.slurm_ssh_max_channels_per_connection \
+            if max_channels_per_connection is None else max_channels_per_connection
+        self.idle_timeout_s = settings.slurm_ssh_idle_timeout_s if idle_timeout_s is None else idle_timeout_s
+        self.keepalive_interval_s = settings.slurm_ssh_keepalive_interval_s \
+            if keepalive_interval_s is None else keepalive_interval_s
+        self.compression = settings.slurm_ssh_compression if compression is None else compression
+        if self.max_connections < 1 or self.max_channels_per_connection < 1:
+            raise ValueError(f"an ssh connection pool needs at least one connection and channel, got "
+                             f"max_connections={self.max_connections} and "
+                             f"max_channels_per_connection={self.max_channels_per_connection}")
+        self._connections = []
+        self._connecting = 0
+        self._condition = asyncio.Condition()
+        self._reaper_task = None
+
+    def _connect_options(self) -> dict[str, Any]:
+        options: dict[str, Any] = dict(host=self.hostname, username=self.username, client_keys=[self.key_path],
+                                       keepalive_interval=self.keepalive_interval_s, keepalive_count_max=3)
+        if self.compression:
+            # compresses everything on the connection, worthwhile for bulk result transfers over slow links
+            options["compression_algs"] = ["zlib@openssh.com", "zlib"]
+        return options
+
+    async def _connect(self) -> SSHClientConnection:
+        logger.info(msg=f"opening ssh connection to {self.username}@{self.hostname}")
+        return await asyncssh.connect(**self._connect_options())
+
+    def _prune(self) -> None:
+        """ drop connections which were closed by the peer or have been idle for longer than idle_timeout_s """
+        now = time.monotonic()
+        for pooled in list(self._connections):
+            idle = pooled.channels_in_use == 0 and now - pooled.last_used > self.idle_timeout_s
+            if pooled.conn.is_closed() or idle:
+                self._connections.remove(pooled)
+                pooled.conn.close()
+
+    async def _reap_idle(self) -> None:
+        """ close idle connections in the background rather than on the next acquire, which may never come, until
+        the pool is empty (the next connection starts it again) """
+        while True:
+            await asyncio.sleep(self.idle_timeout_s / 2)
+            async with self._condition:
+                self._prune()
+                if len(self._connections) == 0:
+                    self._reaper_task = None
+                    return
+
+    async def _acquire(self) -> _PooledConnection:
+        async with self._condition:
+            while True:
+                self._prune()
+                available = [p for p in self._connections if p.channels_in_use < self.max_channels_per_connection]
+                if available:
+                    pooled = min(available, key=lambda p: p.channels_in_use)
+                    pooled.channels_in_use += 1
+                    return pooled
+                if len(self._connections) + self._connecting < self.max_connections:
+                    self._connecting += 1
+                    break
+                await self._condition.wait()
+        try:
+            pooled = _PooledConnection(await self._connect())
+        finally:
+            async with self._condition:
+                self._connecting -= 1
+                self._condition.notify_all()
+        async with self._condition:
+            pooled.channels_in_use += 1
+            self._connections.append(pooled)
+            if self._reaper_task is None and self.idle_timeout_s > 0:
+                self._reaper_task = asyncio.create_task(self._reap_idle())
+            return pooled
+
+    async def _release(self, pooled: _PooledConnection, broken: bool) -> None:
+        async with self._condition:
+            pooled.channels_in_use -= 1
+            pooled.last_used = time.monotonic()
+            # without an idle timeout connections are not kept once unused
+            unused = pooled.channels_in_use == 0 and self.idle_timeout_s <= 0
+            if (broken or unused) and pooled in self._connections:
+                self._connections.remove(pooled)
+                pooled.conn.close()
+            self._condition.notify_all()
 
-    async def run_command(self, command: str) -> tuple[int, str, str]:
-        async with asyncssh.connect(host=self.hostname, username=self.username, client_keys=[self.key_path]) as conn:
+    @asynccontextmanager
+    async def _connection(self) -> AsyncIterator[SSHClientConnection]:
+        pooled = await self._acquire()
+        broken = False
+        try:
+            yield pooled.conn
+        except _CONNECTION_ERRORS:
+            broken = True
+            raise
+        finally:
+            await self._release(pooled, broken=broken)
+
+    async def _with_connection(self, operation: Callable[[SSHClientConnection], Awaitable[T]],
+                               idempotent: bool = True) -> T:
+        """ run operation on a pooled connection, reconnecting and retrying once if the connection was lost,
+        an operation which is not idempotent is only retried if it can't have reached the remote host (no
+        connection or the channel was refused), e.g. a lost sbatch could otherwise submit a job twice """
+        started = False
+        try:
+            async with self._connection() as conn:
+                started = True
+                return await operation(conn)
+        except _CONNECTION_ERRORS as exc:
+            if started and not idempotent and not isinstance(exc, asyncssh.ChannelOpenError):
+                raise exc
+            logger.warning(msg=f"ssh connection to {self.hostname} failed ({exc}), reconnecting")
+            async with self._connection() as conn:
+                return await operation(conn)
+
+    async def run_command(self, command: str, idempotent: bool = True) -> tuple[int, str, str]:
+        async def run(conn: SSHClientConnection) -> tuple[int, str, str]:
             try:
                 result: SSHCompletedProcess = await conn.run(command, check=True)
                 assert isinstance(result.stdout, str)
@@ -29,29 +179,96 @@ class SSHService:
                                 f"stdout={result.stdout[:100]} stderr={result.stderr[:100]}")
                 return result.returncode, result.stdout, result.stderr
             except asyncssh.ProcessError as exc:
-                logger.error(msg=f"failed to send command {command}, stderr {str(result.stderr)[:100]}", exc_info=exc)
+                logger.error(msg=f"failed to send command {command}, stderr {str(exc.stderr)[:100]}", exc_info=exc)
                 raise exc
             except (OSError, asyncssh.Error) as exc:
-                logger.error(msg=f"failed to send command {command}, stderr {str(result.stderr)[:100]}", exc_info=exc)
+                logger.error(msg=f"failed to send command {command}", exc_info=exc)
                 raise exc
+        return await self._with_connection(run, idempotent=idempotent)
 
     async def scp_upload(self, local_file: Path, remote_path: Path) -> None:
-        async with asyncssh.connect(host=self.hostname, username=self.username, client_keys=[self.key_path]) as conn:
+        async def upload(conn: SSHClientConnection) -> None:
             try:
                 await asyncssh.scp(srcpaths=local_file, dstpath=(conn, remote_path))
                 logger.info(msg=f"sent file {local_file} to {remote_path}")
             except asyncssh.Error as exc:
                 logger.error(msg=f"failed to send file {local_file} to {remote_path}", exc_info=exc)
                 raise exc
+        await self._with_connection(upload)
 
     async def scp_download(self, local_file: Path, remote_path: Path) -> None:
-        async with asyncssh.connect(host=self.hostname, username=self.username, client_keys=[self.key_path]) as conn:
+        async def download(conn: SSHClientConnection) -> None:
             try:
                 await asyncssh.scp(srcpaths=(conn, remote_path), dstpath=local_file)
                 logger.info(msg=f"retrieved remote file {remote_path} to {local_file}")
             except asyncssh.Error as exc:
                 logger.error(msg=f"failed to retrieve remote file {remote_path} to {local_file}", exc_info=exc)
                 raise exc
+        await self._with_connection(download)
+
+    async def download_many(self, transfers: list[tuple[Path, Path]], verify_md5: bool = False,
+                            max_concurrency: int | None = None) -> None:
+        """ fetch many (remote_path, local_path) files or directories (recursively) concurrently, each over its own
+        sftp channel on the pooled connections with pipelined block reads, optionally checking md5 sums afterwards """
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_connections * self.max_channels_per_connection)
+
+        async def fetch(remote_path: Path, local_path: Path) -> None:
+            async def get(conn: SSHClientConnection) -> None:
+                try:
+                    async with conn.start_sftp_client() as sftp:
+                        await sftp.get(str(remote_path), str(local_path), recurse=True)
+                except asyncssh.Error as exc:
+                    logger.error(msg=f"failed to retrieve remote path {remote_path} to {local_path}", exc_info=exc)
+                    raise exc
+            local_path.parent.mkdir(parents=True, exist_ok=True)
+            async with semaphore:
+                await self._with_connection(get)
+
+        await asyncio.gather(*[fetch(remote_path, local_path) for remote_path, local_path in transfers])
+        logger.info(msg=f"retrieved {len(transfers)} remote paths")
+        if verify_md5:
+            await self._verify_md5(transfers)
+
+    async def _verify_md5(self, transfers: list[tuple[Path, Path]]) -> None:
+        """ compare local md5 sums with those of all remote files, computed by a single remote command """
+        remote_paths = " ".join(f"'{remote_path}'" for remote_path, _ in transfers)
+        _, stdout, _ = await self.run_command(f"find {remote_paths} -type f -exec md5sum {{}} +")
+        for line in stdout.splitlines():
+            remote_md5, remote_file = line.split(maxsplit=1)
+            local_file = self._local_file(Path(remote_file), transfers)
+            local_md5 = await asyncio.to_thread(lambda: hashlib.md5(local_file.read_bytes()).hexdigest())
+            if local_md5 != remote_md5:
+                raise IOError(f"md5 mismatch for {local_file} retrieved from {remote_file}: {local_md5} != {remote_md5}")
+
+    @staticmethod
+    def _local_file(remote_file: Path, transfers: list[tuple[Path, Path]]) -> Path:
+        for remote_path, local_path in transfers:
+            if remote_file == remote_path:
+                return local_path
+            if remote_file.is_relative_to(remote_path):
+                return local_path / remote_file.relative_to(remote_path)
+        raise IOError(f"unexpected remote file {remote_file}")
+
+    async def upload_stream(self, chunks: AsyncIterator[bytes], remote_path: Path) -> None:
+        """ write chunks to remote_path over sftp without a local copy (not retried, the stream can't be replayed) """
+        async with self._connection() as conn:
+            try:
+                async with conn.start_sftp_client() as sftp:
+                    async with sftp.open(str(remote_path), "wb") as f:
+                        async for chunk in chunks:
+                            await f.write(chunk)
+                logger.info(msg=f"streamed file to {remote_path}")
+            except asyncssh.Error as exc:
+                logger.error(msg=f"failed to stream file to {remote_path}", exc_info=exc)
+                raise exc
 
     async def close(self) -> None:
-        pass  # nothing to do here because we don't yet keep the connection around.
+        async with self._condition:
+            connections, self._connections = self._connections, []
+            reaper_task, self._reaper_task = self._reaper_task, None
+        if reaper_task is not None:
+            reaper_task.cancel()
+        for pooled in connections:
+            pooled.conn.close()
+        for pooled in connections:
+            await pooled.conn.wait_closed()
@@ -1,12 +1,17 @@
 from biosim_server.common.storage.file_service import FileService, ListingItem
 from biosim_server.common.storage.file_service_gcs import FileServiceGCS
+from biosim_server.common.storage.local_cache import LocalFileCache
 from biosim_server.common.storage.gcs_aio import get_listing_of_gcs_path, download_gcs_file, upload_file_to_gcs, \
-    get_gcs_modified_date, get_gcs_file_contents, upload_bytes_to_gcs, create_token, close_token
+    get_gcs_modified_date, get_gcs_file_contents, upload_bytes_to_gcs, create_token, close_token, \
+    create_storage_client, close_storage_client, download_gcs_file_parallel, upload_file_to_gcs_parallel, \
+    iter_listing_of_gcs_path, iter_gcs_objects_with_prefix, iter_gcs_file_contents, \
+    get_gcs_md5_hash
 
 __all__ = [
     "FileService",
     "ListingItem",
     "FileServiceGCS",
+    "LocalFileCache",
     "get_listing_of_gcs_path",
     "download_gcs_file",
     "upload_file_to_gcs",
@@ -15,4 +20,12 @@ __all__ = [
     "upload_bytes_to_gcs",
     "create_token",
     "close_token",
+    "create_storage_client",
+    "close_storage_client",
+    "download_gcs_file_parallel",
+    "upload_file_to_gcs_parallel",
+    "iter_listing_of_gcs_path",
+    "iter_gcs_objects_with_prefix",
+    "iter_gcs_file_contents",
+    "get_gcs_md5_hash",
 ]
\ No newline at end of file
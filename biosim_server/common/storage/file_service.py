@@ -6,7 +6,7 @@ from temporalio import workflow
 with workflow.unsafe.imports_passed_through():
     from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Optional
 
 
 class ListingItem(BaseModel):
@@ -19,7 +19,9 @@ class ListingItem(BaseModel):
 class FileService(ABC):
 
     @abstractmethod
-    async def download_file(self, gcs_path: str, file_path: Optional[Path] = None) -> tuple[str, str]:
+    async def download_file(self, gcs_path: str, file_path: Optional[Path] = None,
+                            file_hash_md5: Optional[str] = None) -> tuple[str, str]:
+        """ file_hash_md5 (if known) allows content addressed local caching of the download """
         pass
 
     @abstractmethod
@@ -34,14 +36,33 @@ class FileService(ABC):
     async def get_modified_date(self, gcs_path: str) -> datetime:
         pass
 
+    @abstractmethod
+    async def get_object_hash(self, gcs_path: str) -> str | None:
+        """ hex md5 of the stored object from metadata if available (None if missing), avoids downloading it """
+        pass
+
     @abstractmethod
     async def get_listing(self, gcs_path: str) -> list[ListingItem]:
         pass
 
+    @abstractmethod
+    def iter_listing(self, gcs_path: str) -> AsyncIterator[ListingItem]:
+        """ lazily pages through the listing, use instead of get_listing() for large prefixes """
+        pass
+
     @abstractmethod
     async def get_file_contents(self, gcs_path: str) -> bytes | None:
         pass
 
+    @abstractmethod
+    def iter_file_contents(self, gcs_path: str) -> AsyncIterator[bytes]:
+        """ streams the file contents in chunks, without holding the whole file in memory or on disk """
+        pass
+
+    async def connect(self) -> None:
+        """ optionally establish connections or credentials ahead of the first request """
+        pass
+
     @abstractmethod
     async def close(self) -> None:
         pass
\ No newline at end of file
@@ -1,21 +1,27 @@
+import asyncio
 import logging
 import uuid
 
 from temporalio import workflow
 
 from biosim_server.common.storage.gcs_aio import create_token, close_token, download_gcs_file, upload_file_to_gcs, \
-    upload_bytes_to_gcs, get_gcs_modified_date, get_listing_of_gcs_path, get_gcs_file_contents
-from biosim_server.config import get_local_cache_dir
+    upload_bytes_to_gcs, get_gcs_modified_date, get_listing_of_gcs_path, get_gcs_file_contents, \
+    create_storage_client, close_storage_client, download_gcs_file_parallel, upload_file_to_gcs_parallel, \
+    iter_listing_of_gcs_path, iter_gcs_file_contents, get_gcs_md5_hash
+from biosim_server.config import get_local_cache_dir, get_settings
 
 with workflow.unsafe.imports_passed_through():
     from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Optional
 from gcloud.aio.auth import Token
+from gcloud.aio.storage import Storage
 
 from typing_extensions import override
 
 from biosim_server.common.storage.file_service import FileService, ListingItem
+from biosim_server.common.storage.local_cache import LocalFileCache
+from biosim_server.tracing import traced
 
 
 logger = logging.getLogger(__name__)
@@ -23,43 +29,106 @@ logger.setLevel(logging.INFO)
 
 class FileServiceGCS(FileService):
     token: Token
+    local_cache: LocalFileCache | None
+    _client: Storage | None
 
     def __init__(self) -> None:
         self.token = create_token()
+        self._client = None
+        self.local_cache = None
+        if get_settings().storage_local_omex_cache_enabled:
+            self.local_cache = LocalFileCache(cache_dir=get_local_cache_dir() / "omex_cache",
+                                              max_bytes=get_settings().storage_local_omex_cache_max_bytes)
+
+    @property
+    def client(self) -> Storage:
+        # created lazily so that the pooled session is bound to the running event loop
+        if self._client is None:
+            self._client = create_storage_client(token=self.token)
+        return self._client
 
     @override
-    async def download_file(self, gcs_path: str, file_path: Optional[Path]=None) -> tuple[str, str]:
+    @traced("gcs.download_file", gcs_path="gcs.path", file_hash_md5="omex.hash_md5")
+    async def download_file(self, gcs_path: str, file_path: Optional[Path]=None,
+                            file_hash_md5: Optional[str]=None) -> tuple[str, str]:
         logger.info(f"Downloading {gcs_path} to {file_path}")
         if file_path is None:
             file_path = get_local_cache_dir() / ("temp_file_"+uuid.uuid4().hex)
-        full_gcs_path = await download_gcs_file(gcs_path=gcs_path, file_path=file_path, token=self.token)
+        if file_hash_md5 is not None and self.local_cache is not None:
+            async def fetch(temp_path: Path) -> None:
+                await self._download(gcs_path=gcs_path, file_path=temp_path)
+            await self.local_cache.copy_to(file_hash_md5=file_hash_md5, fetch=fetch, dest_path=file_path)
+            return gcs_path, str(file_path)
+        full_gcs_path = await self._download(gcs_path=gcs_path, file_path=file_path)
         return full_gcs_path, str(file_path)
 
+    async def _download(self, gcs_path: str, file_path: Path) -> str:
+        if get_settings().storage_parallel_transfers:
+            return await download_gcs_file_parallel(gcs_path=gcs_path, file_path=file_path, token=self.token,
+                                                    client=self.client)
+        return await download_gcs_file(gcs_path=gcs_path, file_path=file_path, token=self.token, client=self.client)
+
     @override
+    @traced("gcs.upload_file", gcs_path="gcs.path")
     async def upload_file(self, file_path: Path, gcs_path: str) -> str:
         logger.info(f"Uploading {file_path} to {gcs_path}")
-        return await upload_file_to_gcs(file_path=file_path, gcs_path=gcs_path, token=self.token)
+        if get_settings().storage_parallel_transfers:
+            return await upload_file_to_gcs_parallel(file_path=file_path, gcs_path=gcs_path, token=self.token,
+                                                     client=self.client)
+        return await upload_file_to_gcs(file_path=file_path, gcs_path=gcs_path, token=self.token, client=self.client)
 
     @override
+    @traced("gcs.upload_bytes", gcs_path="gcs.path")
     async def upload_bytes(self, file_contents: bytes, gcs_path: str) -> str:
         logger.info(f"Uploading {len(file_contents)} bytes to {gcs_path}")
-        return await upload_bytes_to_gcs(file_contents=file_contents, gcs_path=gcs_path, token=self.token)
+        return await upload_bytes_to_gcs(file_contents=file_contents, gcs_path=gcs_path, token=self.token, client=self.client)
 
     @override
+    @traced("gcs.get_modified_date", gcs_path="gcs.path")
     async def get_modified_date(self, gcs_path: str) -> datetime:
         logger.info(f"Getting modified date of {gcs_path}")
-        return await get_gcs_modified_date(gcs_path=gcs_path, token=self.token)
+        return await get_gcs_modified_date(gcs_path=gcs_path, token=self.token, client=self.client)
+
+    @override
+    @traced("gcs.get_object_hash", gcs_path="gcs.path")
+    async def get_object_hash(self, gcs_path: str) -> str | None:
+        logger.info(f"Getting md5 hash of {gcs_path}")
+        return await get_gcs_md5_hash(gcs_path=gcs_path, token=self.token, client=self.client)
 
     @override
+    @traced("gcs.get_listing", gcs_path="gcs.path")
     async def get_listing(self, gcs_path: str) -> list[ListingItem]:
         logger.info(f"Getting listing of {gcs_path}")
-        return await get_listing_of_gcs_path(gcs_path, token=self.token)
+        return await get_listing_of_gcs_path(gcs_path, token=self.token, client=self.client)
+
+    @override
+    async def iter_listing(self, gcs_path: str) -> AsyncIterator[ListingItem]:
+        logger.info(f"Streaming listing of {gcs_path}")
+        async for item in iter_listing_of_gcs_path(gcs_path=gcs_path, token=self.token, client=self.client):
+            yield item
 
     @override
+    @traced("gcs.get_file_contents", gcs_path="gcs.path")
     async def get_file_contents(self, gcs_path: str) -> bytes | None:
         logger.info(f"Getting contents of {gcs_path}")
-        return await get_gcs_file_contents(gcs_path=gcs_path, token=self.token)
+        return await get_gcs_file_contents(gcs_path=gcs_path, token=self.token, client=self.client)
+
+    @override
+    async def iter_file_contents(self, gcs_path: str) -> AsyncIterator[bytes]:
+        logger.info(f"Streaming contents of {gcs_path}")
+        async for chunk in iter_gcs_file_contents(gcs_path=gcs_path, token=self.token, client=self.client):
+            yield chunk
+
+    @override
+    async def connect(self) -> None:
+        try:
+            await asyncio.wait_for(self.token.get(), timeout=get_settings().startup_connect_timeout_s)
+        except Exception as e:
+            logger.warning(f"could not fetch a GCS access token at startup, will retry on first use: {e}")
 
     @override
     async def close(self) -> None:
+        if self._client is not None:
+            await close_storage_client(self._client)
+            self._client = None
         await close_token(self.token)
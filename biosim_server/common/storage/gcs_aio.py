@@ -1,10 +1,16 @@
 import asyncio
+import base64
+import hashlib
 import logging
+import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, AsyncIterator, Dict
 from urllib.parse import quote
 
+import aiofiles
+from aiohttp import ClientResponseError, ClientSession, TCPConnector
 from gcloud.aio.auth import Token
 from gcloud.aio.storage import Storage
 from gcloud.aio.storage.constants import DEFAULT_TIMEOUT
@@ -15,23 +21,58 @@ from biosim_server.config import get_settings
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# GCS compose accepts at most 32 source objects per request
+MAX_COMPOSE_SOURCES = 32
+
+# only request the object fields needed for a ListingItem (plus the page token) rather than full object resources
+LISTING_ITEM_FIELDS = "nextPageToken,items(id,updated,size,etag)"
+
+# custom metadata key with the base64 md5 of a composed upload (GCS only sets md5Hash on non-composite objects)
+COMPOSED_MD5_METADATA_KEY = "biosim-md5Hash"
+
 
 class _StorageWithListPrefix(Storage):
 
-    def __init__(self, token: Token):
-        super().__init__(token=token)
+    def __init__(self, token: Token, session: ClientSession | None = None):
+        super().__init__(token=token, session=session)  # type: ignore[arg-type]
 
-    async def list_objects_with_prefix(self, bucket: str, prefix: str) -> Dict[str, Any]:
-        encoded_prefix = quote(string=prefix, safe='')
-        url = f'{self._api_root_read}/{bucket}/o?prefix={encoded_prefix}/'
+    async def list_objects_with_prefix(self, bucket: str, prefix: str, page_token: str | None = None,
+                                       fields: str | None = None, page_size: int | None = None) -> Dict[str, Any]:
+        """ one page of objects under prefix, use 'nextPageToken' from the result to request the next page """
+        url = f'{self._api_root_read}/{bucket}/o'
+        params: dict[str, str] = {'prefix': f'{prefix}/'}
+        if page_token is not None:
+            params['pageToken'] = page_token
+        if fields is not None:
+            params['fields'] = fields
+        if page_size is not None:
+            params['maxResults'] = str(page_size)
         headers: dict[str, Any] = {}
         headers.update(await self._headers())
 
         s = self.session
-        resp = await s.get(url=url, headers=headers, params={}, timeout=DEFAULT_TIMEOUT)
+        resp = await s.get(url=url, headers=headers, params=params, timeout=DEFAULT_TIMEOUT)
+        # a failed page must not read as a page without items (which would silently end the listing)
+        resp.raise_for_status()
         data: Dict[str, Any] = await resp.json(content_type=None)
+        if "error" in data:
+            raise IOError(f"listing of gs://{bucket}/{prefix}/ failed: {data['error']}")
         return data
 
+    async def download_range(self, bucket: str, object_name: str, generation: str, start: int, end: int,
+                             timeout: int) -> bytes:
+        """ bytes start..end (inclusive) of one generation of the object, fails if it was overwritten since """
+        return await self._download(bucket, object_name, params={'alt': 'media', 'generation': generation},
+                                    headers={'Range': f'bytes={start}-{end}'}, timeout=timeout)
+
+
+def _file_md5_base64(file_path: Path) -> str:
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            md5.update(chunk)
+    return base64.b64encode(md5.digest()).decode()
+
 
 def create_token() -> Token:
     return Token(service_file=get_settings().storage_gcs_credentials_file,
@@ -43,64 +84,257 @@ async def close_token(token: Token) -> None:
         await token.close()
 
 
-async def download_gcs_file(gcs_path: str, file_path: Path, token: Token) -> str:
+def create_storage_client(token: Token) -> _StorageWithListPrefix:
+    """ long-lived client over a pooled keep-alive session, caller must call close_storage_client() """
+    connector = TCPConnector(limit=get_settings().storage_gcs_max_connections,
+                             keepalive_timeout=get_settings().storage_gcs_keepalive_timeout_s)
+    return _StorageWithListPrefix(token=token, session=ClientSession(connector=connector))
+
+
+async def close_storage_client(client: Storage) -> None:
+    # the session was supplied by create_storage_client(), so Storage.close() won't close it for us
+    session = client.session.session
+    await client.close()
+    if not session.closed:
+        await session.close()
+
+
+@asynccontextmanager
+async def _storage(token: Token, client: Storage | None) -> AsyncIterator[Storage]:
+    """ use the shared client if provided, else open a client for a single operation """
+    if client is not None:
+        yield client
+    else:
+        async with _StorageWithListPrefix(token=token) as new_client:
+            yield new_client
+
+
+async def download_gcs_file(gcs_path: str, file_path: Path, token: Token, client: Storage | None = None) -> str:
     logger.info(f"Downloading {file_path} to {gcs_path}")
-    async with Storage(token=token) as client:
+    async with _storage(token=token, client=client) as client:
         await client.download_to_filename(bucket=get_settings().storage_bucket, object_name=gcs_path, filename=str(file_path))
         return gcs_path
 
 
-async def upload_file_to_gcs(file_path: Path, gcs_path: str, token: Token) -> str:
+async def upload_file_to_gcs(file_path: Path, gcs_path: str, token: Token, client: Storage | None = None) -> str:
     logger.info(f"Uploading {file_path} to {gcs_path}")
-    async with Storage(token=token) as client:
+    async with _storage(token=token, client=client) as client:
         result: dict[str, Any] = await client.upload_from_filename(bucket=get_settings().storage_bucket, object_name=gcs_path, filename=str(file_path))
         logger.info(f"Upload result: {result}")
         return gcs_path
 
 
-async def upload_bytes_to_gcs(file_contents: bytes, gcs_path: str, token: Token) -> str:
+async def upload_bytes_to_gcs(file_contents: bytes, gcs_path: str, token: Token,
+                              client: Storage | None = None) -> str:
     logger.info(f"Uploading {len(file_contents)} bytes to {gcs_path}")
-    async with Storage(token=token) as client:
+    async with _storage(token=token, client=client) as client:
         await client.upload(bucket=get_settings().storage_bucket, file_data=file_contents, object_name=gcs_path)
         return gcs_path
 
 
-async def get_gcs_modified_date(gcs_path: str, token: Token) -> datetime:
+def chunk_ranges(size: int, chunk_size: int) -> list[tuple[int, int]]:
+    """ inclusive (start, end) byte ranges covering an object of the given size """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    return [(start, min(start + chunk_size, size) - 1) for start in range(0, size, chunk_size)]
+
+
+async def download_gcs_file_parallel(gcs_path: str, file_path: Path, token: Token, client: Storage | None = None,
+                                     threshold: int | None = None, chunk_size: int | None = None,
+                                     max_concurrency: int | None = None) -> str:
+    """ download with concurrent ranged GETs written in place, small objects use a single GET
+
+    all ranges are read from the generation seen in the metadata, so an object overwritten during the download
+    fails the download rather than producing a file mixing both versions.
+    """
+    settings = get_settings()
+    threshold = threshold if threshold is not None else settings.storage_parallel_threshold_bytes
+    chunk_size = chunk_size or settings.storage_parallel_chunk_size_bytes
+    max_concurrency = max_concurrency or settings.storage_parallel_max_concurrency
+    bucket = settings.storage_bucket
+    async with _storage(token=token, client=client) as client:
+        assert isinstance(client, _StorageWithListPrefix)  # to avoid mypy error
+        metadata: dict[str, Any] = await client.download_metadata(bucket=bucket, object_name=gcs_path)
+        size = int(metadata["size"])
+        generation = str(metadata["generation"])
+        if size < threshold:
+            await client.download_to_filename(bucket=bucket, object_name=gcs_path, filename=str(file_path))
+            return gcs_path
+
+        ranges = chunk_ranges(size=size, chunk_size=chunk_size)
+        logger.info(f"Downloading {gcs_path} ({size} bytes) to {file_path} as {len(ranges)} parallel ranged reads")
+        async with aiofiles.open(file_path, 'wb') as f:
+            await f.truncate(size)
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def download_range(start: int, end: int) -> None:
+            async with semaphore:
+                data = await client.download_range(bucket=bucket, object_name=gcs_path, generation=generation,
+                                                   start=start, end=end,
+                                                   timeout=settings.storage_parallel_chunk_timeout_s)
+            if len(data) != end - start + 1:
+                raise IOError(f"Short read of {gcs_path} range {start}-{end}, got {len(data)} bytes")
+            async with aiofiles.open(file_path, 'r+b') as f:
+                await f.seek(start)
+                await f.write(data)
+
+        await asyncio.gather(*[download_range(start, end) for start, end in ranges])
+        return gcs_path
+
+
+async def upload_file_to_gcs_parallel(file_path: Path, gcs_path: str, token: Token, client: Storage | None = None,
+                                      threshold: int | None = None, chunk_size: int | None = None,
+                                      max_concurrency: int | None = None) -> str:
+    """ upload chunks as temporary objects in parallel and compose them, small files use a single upload
+
+    composite objects carry a crc32c checksum but no md5Hash, the md5 of the file is recorded in the custom
+    metadata instead (see get_gcs_md5_hash).
+    """
+    settings = get_settings()
+    threshold = threshold if threshold is not None else settings.storage_parallel_threshold_bytes
+    chunk_size = chunk_size or settings.storage_parallel_chunk_size_bytes
+    max_concurrency = max_concurrency or settings.storage_parallel_max_concurrency
+    bucket = settings.storage_bucket
+    size = file_path.stat().st_size
+    async with _storage(token=token, client=client) as client:
+        if size < threshold:
+            await client.upload_from_filename(bucket=bucket, object_name=gcs_path, filename=str(file_path))
+            return gcs_path
+
+        ranges = chunk_ranges(size=size, chunk_size=chunk_size)
+        logger.info(f"Uploading {file_path} ({size} bytes) to {gcs_path} as {len(ranges)} parallel composed parts")
+        part_prefix = f"{gcs_path}.parts-{uuid.uuid4().hex}"
+        temp_objects: list[str] = []
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def upload_part(part_name: str, start: int, end: int) -> str:
+            async with semaphore:
+                async with aiofiles.open(file_path, 'rb') as f:
+                    await f.seek(start)
+                    data = await f.read(end - start + 1)
+                await client.upload(bucket=bucket, object_name=part_name, file_data=data,
+                                    timeout=settings.storage_parallel_chunk_timeout_s)
+            return part_name
+
+        try:
+            part_names = [f"{part_prefix}/{index:05d}" for index in range(len(ranges))]
+            temp_objects.extend(part_names)
+            # the md5 of the whole file is computed while the parts upload
+            part_uploads = asyncio.gather(*[upload_part(part_name, start, end)
+                                            for part_name, (start, end) in zip(part_names, ranges)])
+            md5_base64, _ = await asyncio.gather(asyncio.to_thread(_file_md5_base64, file_path), part_uploads)
+
+            # compose in rounds of at most MAX_COMPOSE_SOURCES until a single compose can produce the target
+            level = 0
+            while len(part_names) > MAX_COMPOSE_SOURCES:
+                groups = [part_names[i:i + MAX_COMPOSE_SOURCES] for i in range(0, len(part_names), MAX_COMPOSE_SOURCES)]
+                part_names = [f"{part_prefix}/compose-{level}-{index:05d}" for index in range(len(groups))]
+                temp_objects.extend(part_names)
+                await asyncio.gather(*[client.compose(bucket=bucket, object_name=name, source_object_names=group)
+                                       for name, group in zip(part_names, groups)])
+                level += 1
+            composed: dict[str, Any] = await client.compose(bucket=bucket, object_name=gcs_path,
+                                                            source_object_names=part_names)
+            await client.patch_metadata(bucket=bucket, object_name=gcs_path,
+                                        metadata={"metadata": {COMPOSED_MD5_METADATA_KEY: md5_base64}},
+                                        params={"ifGenerationMatch": str(composed["generation"])})
+        finally:
+            results = await asyncio.gather(*[client.delete(bucket=bucket, object_name=name) for name in temp_objects],
+                                           return_exceptions=True)
+            for name, result in zip(temp_objects, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"failed to delete temporary part {name}: {result}")
+        return gcs_path
+
+
+async def get_gcs_modified_date(gcs_path: str, token: Token, client: Storage | None = None) -> datetime:
     logger.info(f"Getting modified date for {gcs_path}")
-    async with Storage(token=token) as client:
+    async with _storage(token=token, client=client) as client:
         metadata: dict[str, Any] = await client.download_metadata(bucket=get_settings().storage_bucket, object_name=gcs_path)
         return datetime.fromisoformat(metadata["updated"])
 
 
-async def get_listing_of_gcs(token: Token) -> list[ListingItem]:
+async def get_gcs_md5_hash(gcs_path: str, token: Token, client: Storage | None = None) -> str | None:
+    """ hex md5 of the object from its metadata (no download), None if the object is missing or has no md5
+    (composite objects only carry a crc32c, unless uploaded by upload_file_to_gcs_parallel) """
+    logger.info(f"Getting md5 hash for {gcs_path}")
+    try:
+        async with _storage(token=token, client=client) as client:
+            metadata: dict[str, Any] = await client.download_metadata(bucket=get_settings().storage_bucket,
+                                                                       object_name=gcs_path)
+    except ClientResponseError as e:
+        if e.status == 404:
+            return None
+        raise e
+    md5_base64: str | None = metadata.get("md5Hash") or (metadata.get("metadata") or {}).get(COMPOSED_MD5_METADATA_KEY)
+    if md5_base64 is None:
+        return None
+    return base64.b64decode(md5_base64).hex()
+
+
+async def get_listing_of_gcs(token: Token, client: Storage | None = None) -> list[ListingItem]:
     logger.info(f"Retrieving file list from root of bucket")
-    async with Storage(token=token) as client:
+    async with _storage(token=token, client=client) as client:
         metadata: dict[str, Any] = await client.list_objects(bucket=get_settings().storage_bucket)
         files: list[ListingItem] = [ListingItem(Key=item["id"], LastModified=datetime.fromisoformat(item["updated"]),
                                                 Size=item["size"], ETag=item["etag"]) for item in metadata["items"]]
         return files
 
 
-async def get_listing_of_gcs_path(gcs_path: str, token: Token) -> list[ListingItem]:
-    logger.info(f"Retrieving file list from {gcs_path}")
-    async with _StorageWithListPrefix(token=token) as my_client:
+async def iter_gcs_objects_with_prefix(gcs_path: str, token: Token, client: Storage | None = None,
+                                       fields: str | None = None,
+                                       page_size: int | None = None) -> AsyncIterator[dict[str, Any]]:
+    """ lazily page through the raw object resources under gcs_path, fields is an optional GCS field projection
+    (e.g. "nextPageToken,items(name,md5Hash)", which must include nextPageToken to page beyond the first page) """
+    async with _storage(token=token, client=client) as my_client:
         assert isinstance(my_client, _StorageWithListPrefix)  # to avoid mypy error
-        metadata: dict[str, Any] = await my_client.list_objects_with_prefix(bucket=get_settings().storage_bucket,
-                                                                            prefix=gcs_path)
-        files: list[ListingItem] = [ListingItem(Key=item["id"], LastModified=datetime.fromisoformat(item["updated"]),
-                                                Size=item["size"], ETag=item["etag"]) for item in metadata["items"]]
-        return files
+        page_token: str | None = None
+        while True:
+            page: dict[str, Any] = await my_client.list_objects_with_prefix(bucket=get_settings().storage_bucket,
+                                                                            prefix=gcs_path, page_token=page_token,
+                                                                            fields=fields, page_size=page_size)
+            for item in page.get("items", []):
+                yield item
+            page_token = page.get("nextPageToken")
+            if page_token is None:
+                return
+
 
+async def iter_listing_of_gcs_path(gcs_path: str, token: Token, client: Storage | None = None,
+                                   page_size: int | None = None) -> AsyncIterator[ListingItem]:
+    logger.info(f"Streaming file list from {gcs_path}")
+    async for item in iter_gcs_objects_with_prefix(gcs_path=gcs_path, token=token, client=client,
+                                                   fields=LISTING_ITEM_FIELDS, page_size=page_size):
+        yield ListingItem(Key=item["id"], LastModified=datetime.fromisoformat(item["updated"]),
+                          Size=item["size"], ETag=item["etag"])
 
-async def get_gcs_file_contents(gcs_path: str, token: Token) -> bytes | None:
+
+async def get_listing_of_gcs_path(gcs_path: str, token: Token, client: Storage | None = None) -> list[ListingItem]:
+    logger.info(f"Retrieving file list from {gcs_path}")
+    return [item async for item in iter_listing_of_gcs_path(gcs_path=gcs_path, token=token, client=client)]
+
+
+async def get_gcs_file_contents(gcs_path: str, token: Token, client: Storage | None = None) -> bytes | None:
     logger.info(f"Getting file contents for {gcs_path}")
     try:
-        async with Storage(token=token) as client:
+        async with _storage(token=token, client=client) as client:
             return await client.download(bucket=get_settings().storage_bucket, object_name=gcs_path)
     except FileNotFoundError as e:
         logger.error(f"File not found: {e}")
         return None
 
+async def iter_gcs_file_contents(gcs_path: str, token: Token, client: Storage | None = None,
+                                 chunk_size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+    """ stream the object contents in chunks without buffering the whole object """
+    logger.info(f"Streaming file contents for {gcs_path}")
+    async with _storage(token=token, client=client) as client:
+        stream = await client.download_stream(bucket=get_settings().storage_bucket, object_name=gcs_path,
+                                              timeout=get_settings().storage_parallel_chunk_timeout_s)
+        async with stream:
+            while chunk := await stream.read(chunk_size):
+                yield chunk
+
 async def main() -> None:
     settings = get_settings()
     token = create_token()
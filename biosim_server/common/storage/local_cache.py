@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+TEMP_PREFIX = ".tmp_"
+
+
+def _md5_of_file(file_path: Path) -> str:
+    hash_func = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            hash_func.update(chunk)
+    return hash_func.hexdigest()
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class LocalFileCache:
+    """ content addressed cache of downloaded files keyed by md5 hash, with size based LRU eviction
+
+    Entries are written to a temp file and atomically renamed into place, so concurrent readers
+    (including other worker processes sharing the directory) never see partial files.
+    Within a process, concurrent requests for the same key share a single download.
+    Recency is tracked with the file mtime, which is refreshed on every hit.
+    """
+    cache_dir: Path
+    max_bytes: int
+    _locks: dict[str, asyncio.Lock]
+    _lock_users: dict[str, int]  # tasks holding or waiting for the lock of a key
+
+    def __init__(self, cache_dir: Path, max_bytes: int) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._locks = {}
+        self._lock_users = {}
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def entry_path(self, file_hash_md5: str) -> Path:
+        if not file_hash_md5.isalnum():
+            raise ValueError(f"invalid cache key {file_hash_md5}")
+        return self.cache_dir / file_hash_md5
+
+    async def get_or_fetch(self, file_hash_md5: str, fetch: Callable[[Path], Awaitable[None]]) -> Path:
+        """ return the path of the cached entry, calling fetch(temp_path) to download it on a miss """
+        entry_path = self.entry_path(file_hash_md5)
+        if self._touch(entry_path):
+            logger.info(f"local cache hit for {file_hash_md5}")
+            return entry_path
+
+        lock = self._locks.setdefault(file_hash_md5, asyncio.Lock())
+        self._lock_users[file_hash_md5] = self._lock_users.get(file_hash_md5, 0) + 1
+        try:
+            async with lock:
+                if self._touch(entry_path):
+                    logger.info(f"local cache hit for {file_hash_md5} after waiting for concurrent download")
+                    return entry_path
+
+                temp_path = self.cache_dir / f"{TEMP_PREFIX}{file_hash_md5}_{uuid.uuid4().hex}"
+                try:
+                    await fetch(temp_path)
+                    observed_md5 = await asyncio.to_thread(_md5_of_file, temp_path)
+                    if observed_md5 != file_hash_md5:
+                        raise IOError(f"downloaded file hash {observed_md5} does not match expected {file_hash_md5}")
+                    os.replace(temp_path, entry_path)
+                finally:
+                    if temp_path.exists():
+                        temp_path.unlink()
+                logger.info(f"local cache stored {file_hash_md5} ({entry_path.stat().st_size} bytes)")
+        finally:
+            # only the last user removes the lock, a waiter which has not acquired it yet still counts
+            self._lock_users[file_hash_md5] -= 1
+            if self._lock_users[file_hash_md5] == 0:
+                del self._lock_users[file_hash_md5]
+                del self._locks[file_hash_md5]
+
+        await asyncio.to_thread(self.evict, entry_path)
+        return entry_path
+
+    async def copy_to(self, file_hash_md5: str, fetch: Callable[[Path], Awaitable[None]], dest_path: Path) -> Path:
+        """ materialize the entry at dest_path (hard link when possible), which the caller is free to delete """
+        entry_path = await self.get_or_fetch(file_hash_md5=file_hash_md5, fetch=fetch)
+        await asyncio.to_thread(_link_or_copy, entry_path, dest_path)
+        return dest_path
+
+    def evict(self, keep: Path | None = None) -> None:
+        """ remove least recently used entries until the cache fits within max_bytes """
+        entries: list[tuple[float, int, Path]] = []
+        for path in self.cache_dir.iterdir():
+            if path.name.startswith(TEMP_PREFIX) or not path.is_file():
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # evicted concurrently by another process
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total_bytes -= size
+            logger.info(f"local cache evicted {path.name} ({size} bytes)")
+
+    @staticmethod
+    def _touch(entry_path: Path) -> bool:
+        try:
+            os.utime(entry_path)
+            return True
+        except FileNotFoundError:
+            return False
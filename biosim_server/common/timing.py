@@ -0,0 +1,12 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class StageTiming(BaseModel):
+    """ duration of one stage of a verify request, e.g. omex_upload, simulation_queue, data_fetch or compare """
+    stage: str
+    duration_s: float
+    simulator: Optional[str] = None  # <simulator_name>:<version> for per-simulator stages
+    num_bytes: Optional[int] = None
+    cache_hit: Optional[bool] = None
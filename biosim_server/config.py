@@ -29,24 +29,86 @@ class Settings(BaseSettings):
     storage_tensorstore_kvstore_driver: KV_DRIVER = "gcs"
 
     temporal_service_url: str = "localhost:7233"
+    startup_connect_timeout_s: float = 5.0  # for optional warm-up connections at startup (mongodb, storage)
+    temporal_task_queue: str = "verification_tasks"  # workflows and i/o bound activities
+    temporal_compute_task_queue: str = "verification_tasks"  # cpu bound activities, e.g. "verify-compute"
+
+    verify_batch_max_archives: int = 1000  # per /verify/omex/batch request, after expanding zip files
+    verify_batch_max_archive_bytes: int = 256 * 1024 * 1024  # per archive, after expanding zip files
+    verify_batch_max_total_bytes: int = 2 * 1024 * 1024 * 1024  # of all archives of a request, after expanding zip files
+    verify_batch_max_concurrency: int = 20  # archives of a batch verified at the same time
+
+    status_stream_poll_interval_s: float = 1.0  # one workflow query loop per streamed workflow, doubles while unchanged
+    status_stream_max_poll_interval_s: float = 10.0
+    status_stream_keepalive_s: float = 15.0  # sse comment sent to idle streams (keeps proxies from closing them)
+
+    worker_role: str = "all"  # "all", "verify-io" (workflows and i/o activities) or "verify-compute"
+    worker_max_concurrent_io_activities: int = 0  # 0 keeps the temporal default
+    worker_max_concurrent_compute_activities: int = 0
+    worker_max_concurrent_workflow_tasks: int = 0
+    worker_compute_memory_budget_mb: int = 0  # per process estimated memory of admitted comparisons, 0 disables
+    worker_memory_admission_wait_s: float = 60.0  # then fail the attempt so it can be retried on another worker
+    worker_compute_target_memory_usage: float = 0.0  # resource based activity slots for compute workers, 0 disables
+    worker_compute_target_cpu_usage: float = 0.9
+    worker_processes: int = 0  # worker processes per pod, 0 uses the number of available cpus
+    worker_graceful_shutdown_s: float = 30.0  # time given to running activities to finish on shutdown
+    worker_health_dir: str = ""  # per-process heartbeat files, defaults to <tmp>/biosim_worker_health
+    worker_health_interval_s: float = 10.0
+    worker_metrics_port: int = 9090  # prometheus metrics of all worker processes of a pod, 0 disables
+    worker_temporal_metrics_port: int = 9091  # temporal sdk metrics of process i on localhost:port+i, served on worker_metrics_port, 0 disables
+
+    tracing_exporter: str = ""  # "otlp" (to a collector), "file" (json lines) or "console", empty disables tracing
+    tracing_otlp_endpoint: str = "http://localhost:4318/v1/traces"
+    tracing_file: str = "./traces.jsonl"
+
+    profiling_targets: str = ""  # comma separated activity types and api route paths to always profile, "*" for all
+    profiling_header_token: str = ""  # api requests with header X-Biosim-Profile: <token> are profiled, empty disables
+    profiling_sample_interval_s: float = 0.005
+    profiling_storage: str = "local"  # "local" (profiling_local_dir) or "bucket" (profiles/<workflow_id>/ via storage)
+    profiling_local_dir: str = "./profiles"
 
     storage_local_cache_dir: str = "./local_cache"
+    storage_local_omex_cache_enabled: bool = True
+    storage_local_omex_cache_max_bytes: int = 2 * 1024 * 1024 * 1024
 
     storage_gcs_credentials_file: str = ""
+    storage_gcs_max_connections: int = 100
+    storage_gcs_keepalive_timeout_s: float = 60.0
+    storage_parallel_transfers: bool = True
+    storage_parallel_threshold_bytes: int = 64 * 1024 * 1024
+    storage_parallel_chunk_size_bytes: int = 16 * 1024 * 1024
+    storage_parallel_max_concurrency: int = 8
+    storage_parallel_chunk_timeout_s: int = 120
 
     mongodb_uri: str = "mongodb://localhost:27017"
     mongodb_database: str = "biosimulations"
     mongodb_collection_omex: str = "BiosimOmex"
     mongodb_collection_sims: str = "BiosimSims"
     mongodb_collection_compare: str = "BiosimCompare"
+    mongodb_collection_sweep_results: str = "BiosimSweepResults"  # regressions and failures of regression sweeps
+    mongodb_omex_cache_max_entries: int = 1000
+    omex_biosim_run_hash_index_max_entries: int = 10000  # biosimulations run id -> archive hash, per process
 
     simdata_api_base_url: str = "https://simdata.api.biosimulations.org"
     biosimulators_api_base_url: str = "https://api.biosimulators.org"
     biosimulations_api_base_url: str = "https://api.biosimulations.org"
+    biosimulations_submit_streaming: bool = False  # stream OMEX from storage into the submission, bypassing local disk
+    biosim_service_backend: str = "rest"  # "rest" (biosimulations.org) or "slurm" (on-prem cluster)
 
     slurm_submit_host: str = ""   # "mantis-sub-1.cam.uchc.edu"
     slurm_submit_user: str = ""   # "crbmapi"
     slurm_submit_key: str = ""    # "/Users/jimschaff/.ssh/crbmapi"
+    slurm_ssh_max_connections: int = 2
+    slurm_ssh_max_channels_per_connection: int = 8  # stay below the sshd MaxSessions default of 10
+    slurm_ssh_idle_timeout_s: float = 300.0  # idle connections are closed after this, 0 closes them once unused
+    slurm_ssh_keepalive_interval_s: float = 30.0
+    slurm_ssh_compression: bool = False
+    slurm_status_max_staleness_s: float = 30.0
+    slurm_status_refresh_interval_s: float = 15.0
+    slurm_biosim_work_dir: str = "biosim_runs"  # remote directory (relative to home) for staged archives and results
+    slurm_partition: str = "general"
+    slurm_qos: str = "general"
+    slurm_time_limit: str = "0-01:00:00"
 
 
 @lru_cache
@@ -1,11 +1,26 @@
+import asyncio
+import logging
+import time
+from pathlib import Path
+from typing import Awaitable, TypeVar
+
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
 from temporalio.client import Client as TemporalClient
+from temporalio.runtime import Runtime
 
-from biosim_server.biosim_omex.database import OmexDatabaseService, OmexDatabaseServiceMongo
+from biosim_server.biosim_omex.database import OmexDatabaseService, OmexDatabaseServiceMongo, \
+    OmexDatabaseServiceCached
 from biosim_server.biosim_runs.biosim_service import BiosimService, BiosimServiceRest
 from biosim_server.biosim_runs.database import DatabaseService, DatabaseServiceMongo
 from biosim_server.common.storage import FileService, FileServiceGCS
 from biosim_server.config import get_settings
+from biosim_server.tracing import temporal_interceptors
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+T = TypeVar("T")
 
 #------ file service (standalone or pytest) ------
 
@@ -69,15 +84,63 @@ def get_temporal_client() -> TemporalClient | None:
 
 #------ initialized standalone application (standalone) ------
 
-async def init_standalone() -> None:
+def create_biosim_service() -> BiosimService:
+    """ biosimulations.org (default) or our own Slurm cluster, selected per deployment by biosim_service_backend """
     settings = get_settings()
-    set_file_service(FileServiceGCS())
-    set_biosim_service(BiosimServiceRest())
-    set_temporal_client(await TemporalClient.connect(settings.temporal_service_url))
+    if settings.biosim_service_backend == "rest":
+        return BiosimServiceRest()
+    if settings.biosim_service_backend == "slurm":
+        # imported here so that deployments using the rest backend don't load the hpc/h5py stack
+        from biosim_server.biosim_runs.biosim_service_slurm import BiosimServiceSlurm
+        from biosim_server.common.hpc.slurm_service import SlurmService
+        from biosim_server.common.hpc.slurm_status import SlurmStatusService
+        from biosim_server.common.ssh.ssh_service import SSHService
+        ssh_service = SSHService(hostname=settings.slurm_submit_host, username=settings.slurm_submit_user,
+                                 key_path=Path(settings.slurm_submit_key))
+        slurm_service = SlurmService(ssh_service=ssh_service)
+        slurm_status_service = SlurmStatusService(slurm_service=slurm_service)
+        return BiosimServiceSlurm(slurm_service=slurm_service, slurm_status_service=slurm_status_service)
+    raise ValueError(f"unknown biosim_service_backend '{settings.biosim_service_backend}', expected 'rest' or 'slurm'")
+
+async def _timed(timings: dict[str, float], name: str, awaitable: Awaitable[T]) -> T:
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[name] = time.perf_counter() - start
+
+
+async def _ping_mongodb(motor_client: AsyncIOMotorClient) -> None:
+    """ open the first connection now rather than on the first request (mongodb may still be starting up) """
+    try:
+        await asyncio.wait_for(motor_client.admin.command("ping"), timeout=get_settings().startup_connect_timeout_s)
+    except (PyMongoError, asyncio.TimeoutError) as e:
+        logger.warning(f"mongodb not reachable at startup, will connect on first use: {e}")
+
+
+async def init_standalone(temporal_runtime: Runtime | None = None) -> None:
+    """ the backends are connected concurrently, a startup time report is logged """
+    settings = get_settings()
+    start = time.perf_counter()
+    timings: dict[str, float] = {}
 
+    file_service = FileServiceGCS()
+    set_file_service(file_service)
+    set_biosim_service(create_biosim_service())
     motor_client = AsyncIOMotorClient(get_settings().mongodb_uri)
     set_database_service(DatabaseServiceMongo(db_client=motor_client))
-    set_omex_database_service(OmexDatabaseServiceMongo(db_client=motor_client))
+    set_omex_database_service(OmexDatabaseServiceCached(omex_database=OmexDatabaseServiceMongo(db_client=motor_client),
+                                                        max_entries=settings.mongodb_omex_cache_max_entries))
+
+    temporal_client, _, _ = await asyncio.gather(
+        _timed(timings, "temporal", TemporalClient.connect(settings.temporal_service_url, runtime=temporal_runtime,
+                                                      interceptors=temporal_interceptors())),
+        _timed(timings, "mongodb", _ping_mongodb(motor_client)),
+        _timed(timings, "storage", file_service.connect()))
+    set_temporal_client(temporal_client)
+
+    logger.info(f"connected backends in {time.perf_counter() - start:.2f}s "
+                f"({', '.join(f'{name} {seconds:.2f}s' for name, seconds in timings.items())})")
 
 async def shutdown_standalone() -> None:
     db_service = get_database_service()
@@ -86,9 +149,9 @@ async def shutdown_standalone() -> None:
     file_service = get_file_service()
     if file_service:
         await file_service.close()
-    # biosim_service = get_biosim_service()
-    # if biosim_service:
-    #     await biosim_service.close()
+    biosim_service = get_biosim_service()
+    if biosim_service:
+        await biosim_service.close()
     # temporal_client = get_temporal_client()
     # if temporal_client:
     #     await temporal_client.close()
@@ -0,0 +1,93 @@
+import logging
+import os
+import urllib.request
+from typing import Iterable
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, multiprocess, \
+    start_http_server
+from prometheus_client.metrics_core import Metric
+from prometheus_client.parser import text_string_to_metric_families
+from prometheus_client.registry import Collector
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# prometheus metrics of the api and worker processes (the temporal sdk exports its own runtime metrics, see
+# worker_main.create_temporal_runtime, which are re-exported by the worker metrics server)
+
+HTTP_REQUEST_DURATION = Histogram("biosim_http_request_duration_seconds", "API request latency",
+                                  ["method", "route", "status"])
+UPLOAD_BYTES = Histogram("biosim_upload_bytes", "Size of uploaded OMEX archives",
+                         buckets=(1e4, 1e5, 1e6, 1e7, 5e7, 1e8, 5e8, 1e9))
+CACHE_REQUESTS = Counter("biosim_cache_requests_total", "Cache lookups by cache and result (hit or miss)",
+                         ["cache", "result"])
+SIMDATA_REQUEST_DURATION = Histogram("biosim_simdata_request_duration_seconds", "Latency of simdata api requests",
+                                     ["operation"])
+SIMDATA_RESPONSE_BYTES = Counter("biosim_simdata_response_bytes_total", "Bytes received from the simdata api",
+                                 ["operation"])
+CALC_STATS_DURATION = Histogram("biosim_calc_stats_duration_seconds", "Time to compare one dataset of two runs",
+                                buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0))
+RUN_STATUS_POLLS = Histogram("biosim_run_status_polls", "Status polls until a submitted simulation run completed",
+                             buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500))
+STATUS_STREAM_QUERIES = Counter("biosim_status_stream_queries_total",
+                                "Workflow output queries made on behalf of all status stream subscribers")
+STATUS_STREAM_EVENTS = Counter("biosim_status_stream_events_total", "Status events sent to stream subscribers")
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def is_multiprocess() -> bool:
+    """ set by the worker launcher, the worker processes then write their metrics to files in this directory """
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+
+def latest_metrics() -> bytes:
+    return generate_latest(REGISTRY)
+
+
+class LocalMetricsCollector(Collector):
+    """ the metrics served by other endpoints of this pod (the temporal sdk runtime of each worker process, on
+    127.0.0.1:port), collected at scrape time with a worker_process label so the pod is scraped on a single port """
+    ports: dict[int, int]  # worker process index -> port
+    timeout_s: float
+
+    def __init__(self, ports: dict[int, int], timeout_s: float = 2.0):
+        self.ports = ports
+        self.timeout_s = timeout_s
+
+    def _scrape(self, port: int) -> str | None:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=self.timeout_s) as response:
+                return str(response.read().decode())
+        except OSError as e:
+            # e.g. the worker process is still starting or being restarted
+            logger.debug(f"could not collect the metrics on port {port}: {e}")
+            return None
+
+    def collect(self) -> Iterable[Metric]:
+        # one family per metric name, with the samples of all worker processes
+        families: dict[str, Metric] = {}
+        for process_index, port in self.ports.items():
+            text = self._scrape(port)
+            if text is None:
+                continue
+            for family in text_string_to_metric_families(text):
+                merged = families.setdefault(family.name, Metric(family.name, family.documentation, family.type,
+                                                                 family.unit))
+                merged.samples.extend(sample._replace(labels={**sample.labels, "worker_process": str(process_index)})
+                                      for sample in family.samples)
+        return families.values()
+
+
+def start_metrics_server(port: int, local_metrics_ports: dict[int, int] | None = None) -> None:
+    """ serve /metrics on port in a background thread, aggregating all worker processes in multiprocess mode and
+    re-exporting the metrics served on local_metrics_ports (worker process index -> port) """
+    registry = REGISTRY
+    if is_multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)  # type: ignore[no-untyped-call]
+    if local_metrics_ports:
+        registry.register(LocalMetricsCollector(local_metrics_ports))
+    start_http_server(port, registry=registry)
@@ -0,0 +1,216 @@
+import asyncio
+import hmac
+import json
+import logging
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import AsyncIterator, Any
+
+import aiofiles
+from temporalio import activity
+
+from biosim_server.config import get_settings
+from biosim_server.dependencies import get_file_service
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# api requests with this header set to settings.profiling_header_token are profiled, as is the workflow they start
+PROFILE_HEADER = "X-Biosim-Profile"
+
+
+class SamplingProfiler:
+    """ samples the call stack of the thread which created it every interval_s from a background thread, in an event
+    loop thread the samples include every task interleaved with the profiled one """
+    interval_s: float
+    stack_counts: Counter[str]
+    num_samples: int
+
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+        self.stack_counts = Counter()
+        self.num_samples = 0
+        self._thread_id = threading.get_ident()
+        self._stop_event = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._sampler.join()
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval_s):
+            frame = sys._current_frames().get(self._thread_id)
+            stack: list[str] = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_qualname} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stack_counts[";".join(reversed(stack))] += 1
+                self.num_samples += 1
+
+    def folded_stacks(self) -> str:
+        """ one 'outer;...;inner count' line per stack, the input format of flamegraph.pl and speedscope """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stack_counts.most_common())
+
+    def top_functions(self, limit: int) -> list[dict[str, Any]]:
+        """ functions by number of samples in which they were executing (self time) """
+        leaf_counts: Counter[str] = Counter()
+        for stack, count in self.stack_counts.items():
+            leaf_counts[stack.rsplit(";", 1)[-1]] += count
+        return [{"function": function, "samples": count} for function, count in leaf_counts.most_common(limit)]
+
+
+class Profile:
+    """ a profiled activity or api request, the artifacts are stored under key (the workflow id) """
+    target: str
+    key: str
+    profiler: SamplingProfiler
+    tracemalloc_peak_bytes: int  # peak traced bytes while this profile was active, up to the last reset_peak()
+
+    def __init__(self, target: str, key: str):
+        self.target = target
+        self.key = key
+        self.profiler = SamplingProfiler(interval_s=get_settings().profiling_sample_interval_s)
+        self.tracemalloc_peak_bytes = 0
+
+
+_current_profile: ContextVar[Profile | None] = ContextVar("current_profile", default=None)
+
+# tracemalloc is process wide, it is traced while any profile is active. its single peak is reset when a profile
+# starts, so the peak so far is first recorded by every active profile
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_profiles: set[Profile] = set()
+
+
+def _record_tracemalloc_peak() -> None:
+    _current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+    for active_profile in _tracemalloc_profiles:
+        active_profile.tracemalloc_peak_bytes = max(active_profile.tracemalloc_peak_bytes, peak_bytes)
+
+
+def _start_tracemalloc(current_profile: Profile) -> None:
+    with _tracemalloc_lock:
+        if len(_tracemalloc_profiles) == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _record_tracemalloc_peak()
+        _tracemalloc_profiles.add(current_profile)
+        tracemalloc.reset_peak()
+
+
+def _stop_tracemalloc(current_profile: Profile) -> list[dict[str, Any]]:
+    """ record the peak of current_profile and return the top allocation sites, the snapshot takes a while with many
+    traced allocations so this runs in a thread """
+    with _tracemalloc_lock:
+        _record_tracemalloc_peak()
+        _tracemalloc_profiles.discard(current_profile)
+        snapshot = tracemalloc.take_snapshot()
+        if len(_tracemalloc_profiles) == 0:
+            tracemalloc.stop()
+    return [{"location": str(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:20]]
+
+
+def is_profiled(target: str) -> bool:
+    """ True if target (an activity type or api route path) is listed in settings.profiling_targets """
+    targets = [t.strip() for t in get_settings().profiling_targets.split(",") if t.strip()]
+    return "*" in targets or target in targets
+
+
+def profile_requested(header_value: str | None) -> bool:
+    token = get_settings().profiling_header_token
+    return bool(token) and header_value is not None and hmac.compare_digest(header_value, token)
+
+
+def profile_workflow(workflow_id: str) -> bool:
+    """ key the profile of the current api request by workflow_id, True if the request is profiled (the workflow
+    should then profile its activities as well) """
+    current_profile = _current_profile.get()
+    if current_profile is None:
+        return False
+    current_profile.key = workflow_id
+    return True
+
+
+@asynccontextmanager
+async def profile(target: str, key: str = "requests") -> AsyncIterator[Profile]:
+    """ sample the cpu and track the peak memory of the enclosed code, then write the artifacts (see write_artifacts),
+    the peak memory is process wide and includes any concurrent work (e.g. other profiled requests) """
+    current_profile = Profile(target=target, key=key)
+    token = _current_profile.set(current_profile)
+    await asyncio.to_thread(_start_tracemalloc, current_profile)
+    current_profile.profiler.start()
+    started_at = datetime.now(UTC)
+    start = time.perf_counter()
+    try:
+        yield current_profile
+    finally:
+        duration_s = time.perf_counter() - start
+        current_profile.profiler.stop()
+        top_allocations = await asyncio.to_thread(_stop_tracemalloc, current_profile)
+        _current_profile.reset(token)
+        summary = {
+            "target": target,
+            "key": current_profile.key,
+            "started_at": started_at.isoformat(),
+            "duration_s": duration_s,
+            "sample_interval_s": current_profile.profiler.interval_s,
+            "num_samples": current_profile.profiler.num_samples,
+            "tracemalloc_peak_bytes": current_profile.tracemalloc_peak_bytes,
+            "top_functions": current_profile.profiler.top_functions(limit=20),
+            "top_allocations": top_allocations,
+        }
+        name = f"{path_component(target)}-{started_at.strftime('%Y%m%dT%H%M%S%f')}"
+        await write_artifacts(key=current_profile.key, files={
+            f"{name}.json": json.dumps(summary, indent=2).encode(),
+            f"{name}.folded": current_profile.profiler.folded_stacks().encode()})
+
+
+def path_component(value: str) -> str:
+    """ value as a single file or directory name (e.g. a workflow id chosen by the client), without separators or
+    leading dots so it can't point outside of its parent directory """
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', value).strip('_.') or "_"
+
+
+async def write_artifacts(key: str, files: dict[str, bytes]) -> None:
+    """ write to <profiling_local_dir>/<key>/ or profiles/<key>/ in the storage bucket, failures are only logged """
+    settings = get_settings()
+    key = path_component(key)
+    try:
+        for filename, contents in files.items():
+            filename = path_component(filename)
+            if settings.profiling_storage == "bucket":
+                file_service = get_file_service()
+                assert file_service is not None
+                await file_service.upload_bytes(file_contents=contents, gcs_path=f"profiles/{key}/{filename}")
+            else:
+                local_path = Path(settings.profiling_local_dir) / key / filename
+                local_path.parent.mkdir(parents=True, exist_ok=True)
+                async with aiofiles.open(local_path, "wb") as f:
+                    await f.write(contents)
+        logger.info(f"wrote profile {list(files)} for {key} to {settings.profiling_storage}")
+    except Exception as e:
+        logger.exception(f"failed to write profile for {key}", exc_info=e)
+
+
+@asynccontextmanager
+async def profile_activity(requested: bool = False) -> AsyncIterator[None]:
+    """ profile the current activity if requested by its workflow or listed in settings.profiling_targets """
+    info = activity.info()
+    if requested or is_profiled(info.activity_type):
+        async with profile(target=info.activity_type, key=info.workflow_id or info.activity_id):
+            yield
+    else:
+        yield
@@ -0,0 +1,85 @@
+import functools
+import inspect
+import logging
+from typing import Any, Callable, Coroutine, ParamSpec, TypeVar
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SpanExporter
+from temporalio.client import Interceptor
+from temporalio.contrib.opentelemetry import TracingInterceptor
+
+from biosim_server.config import get_settings
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# spans are no-ops until init_tracing() installs a tracer provider
+tracer = trace.get_tracer("biosim_server")
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+
+def _create_exporter(exporter: str) -> SpanExporter:
+    settings = get_settings()
+    if exporter == "otlp":
+        # imported here, the otlp exporter pulls in protobuf
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(endpoint=settings.tracing_otlp_endpoint)
+    if exporter == "file":
+        trace_file = open(settings.tracing_file, "a")
+        return ConsoleSpanExporter(out=trace_file, formatter=lambda span: span.to_json(indent=None) + "\n")
+    if exporter == "console":
+        return ConsoleSpanExporter()
+    raise ValueError(f"unknown tracing_exporter '{exporter}', expected 'otlp', 'file' or 'console'")
+
+
+def init_tracing(service_name: str, exporter: SpanExporter | None = None) -> bool:
+    """ install the tracer provider for this process, False if tracing is disabled (tracing_exporter is empty) """
+    if exporter is None:
+        if not get_settings().tracing_exporter:
+            return False
+        exporter = _create_exporter(get_settings().tracing_exporter)
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    logger.info(f"tracing enabled for {service_name} with {type(exporter).__name__}")
+    return True
+
+
+def shutdown_tracing() -> None:
+    """ flush pending spans """
+    provider = trace.get_tracer_provider()
+    if isinstance(provider, TracerProvider):
+        provider.shutdown()
+
+
+def temporal_interceptors() -> list[Interceptor]:
+    """ propagates the trace context from the client through workflows, child workflows and activities """
+    if not get_settings().tracing_exporter:
+        return []
+    return [TracingInterceptor()]
+
+
+def traced(span_name: str, **arg_attributes: str) -> Callable[[Callable[P, Coroutine[Any, Any, T]]],
+                                                             Callable[P, Coroutine[Any, Any, T]]]:
+    """ run an async function in a span, arg_attributes maps parameter names to span attribute names,
+    e.g. @traced("gcs.download_file", gcs_path="gcs.path") """
+    def decorator(func: Callable[P, Coroutine[Any, Any, T]]) -> Callable[P, Coroutine[Any, Any, T]]:
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+            with tracer.start_as_current_span(span_name) as span:
+                if arg_attributes and span.is_recording():
+                    arguments = signature.bind_partial(*args, **kwargs).arguments
+                    for arg_name, attribute_name in arg_attributes.items():
+                        value = arguments.get(arg_name)
+                        if value is not None:
+                            span.set_attribute(attribute_name,
+                                               value if isinstance(value, (str, bool, int, float)) else str(value))
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
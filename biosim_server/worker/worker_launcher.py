@@ -0,0 +1,125 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import time
+from multiprocessing.process import BaseProcess
+from types import FrameType
+
+from biosim_server.config import get_settings
+from biosim_server.metrics import start_metrics_server
+from biosim_server.worker.worker_main import get_health_file, main as worker_main, temporal_metrics_ports
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+_RESTART_DELAY_S = 5.0
+
+
+def default_num_processes() -> int:
+    settings = get_settings()
+    if settings.worker_processes > 0:
+        return settings.worker_processes
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _run_worker_process(process_index: int) -> None:
+    # each process has its own event loop, temporal client and backend connections
+    asyncio.run(worker_main(process_index))
+
+
+def check_health(num_processes: int, max_age_s: float) -> list[str]:
+    """ problems reported by (or about) the worker processes, empty if every process has a recent heartbeat """
+    problems = []
+    for process_index in range(num_processes):
+        health_file = get_health_file(process_index)
+        try:
+            health = json.loads(health_file.read_text())
+        except (OSError, ValueError) as e:
+            problems.append(f"worker {process_index}: no health report ({e})")
+            continue
+        age_s = time.time() - health["updated_at"]
+        if health["status"] != "running" or not health["running"]:
+            problems.append(f"worker {process_index} (pid {health['pid']}): status {health['status']}, "
+                            f"running={health['running']}")
+        elif age_s > max_age_s:
+            problems.append(f"worker {process_index} (pid {health['pid']}): last report {age_s:.0f}s ago")
+    return problems
+
+
+def launch(num_processes: int | None = None) -> int:
+    """ run num_processes worker processes (default: one per available cpu) until SIGINT/SIGTERM, restarting processes
+    which exit unexpectedly; the signal is forwarded so every process shuts down its workers gracefully """
+    num_processes = num_processes or default_num_processes()
+    context = multiprocessing.get_context("spawn")
+    processes: dict[int, BaseProcess] = {}
+    exited_at: dict[int, float] = {}
+    stopping = False
+
+    def start(process_index: int) -> None:
+        process = context.Process(target=_run_worker_process, args=(process_index,), name=f"worker-{process_index}")
+        process.start()
+        processes[process_index] = process
+        logger.info(f"started worker process {process_index} (pid {process.pid})")
+
+    def stop(signum: int, frame: FrameType | None) -> None:
+        nonlocal stopping
+        stopping = True
+        for process in processes.values():
+            if process.is_alive() and process.pid is not None:
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    # the worker processes (inheriting the environment) write their metrics to files aggregated by our server, which
+    # also re-exports the temporal sdk metrics of each process
+    if get_settings().worker_metrics_port > 0:
+        os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="biosim_metrics_"))
+        start_metrics_server(get_settings().worker_metrics_port,
+                             local_metrics_ports=temporal_metrics_ports(range(num_processes)))
+
+    for process_index in range(num_processes):
+        start(process_index)
+
+    while not stopping:
+        for process_index, process in processes.items():
+            if process.is_alive():
+                continue
+            if process_index not in exited_at:
+                logger.warning(f"worker process {process_index} (pid {process.pid}) exited with {process.exitcode}")
+                exited_at[process_index] = time.monotonic()
+            elif time.monotonic() - exited_at[process_index] > _RESTART_DELAY_S and not stopping:
+                del exited_at[process_index]
+                start(process_index)
+        time.sleep(1.0)
+
+    join_timeout_s = get_settings().worker_graceful_shutdown_s + 10.0
+    deadline = time.monotonic() + join_timeout_s
+    exit_code = 0
+    for process_index, process in processes.items():
+        process.join(timeout=max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            logger.warning(f"worker process {process_index} did not stop within {join_timeout_s}s, killing it")
+            process.kill()
+            process.join()
+            exit_code = 1
+    logger.info(f"stopped {len(processes)} worker processes")
+    return exit_code
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) > 1 and sys.argv[1] == "health":
+        # e.g. a kubernetes exec liveness probe: python -m biosim_server.worker.worker_launcher health
+        health_problems = check_health(default_num_processes(), max_age_s=3 * get_settings().worker_health_interval_s)
+        for problem in health_problems:
+            print(problem)
+        sys.exit(1 if health_problems else 0)
+    sys.exit(launch())
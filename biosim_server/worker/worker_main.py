@@ -1,50 +1,200 @@
 import asyncio
+import json
 import logging
+import os
 import random
+import signal
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Callable, Iterable
 
-from temporalio.worker import Worker, UnsandboxedWorkflowRunner
+from temporalio.client import Client
+from temporalio.runtime import PrometheusConfig, Runtime, TelemetryConfig
+from temporalio.worker import Worker, UnsandboxedWorkflowRunner, WorkerTuner, ResourceBasedSlotConfig
 
+from biosim_server import IMPORT_STARTED_AT
 from biosim_server.biosim_runs import get_existing_biosim_simulation_run_activity, \
-    submit_biosim_simulation_run_activity, OmexSimWorkflow
+    submit_biosim_simulation_run_activity, submit_biosim_simulation_runs_activity, OmexSimWorkflow, \
+    list_omex_files_activity, get_cached_biosim_simulation_runs_activity, save_regression_sweep_results_activity
 from biosim_server.biosim_verify.activities import generate_statistics_activity
+from biosim_server.biosim_verify.omex_verify_batch_workflow import OmexVerifyBatchWorkflow
 from biosim_server.biosim_verify.omex_verify_workflow import OmexVerifyWorkflow
+from biosim_server.biosim_verify.regression_sweep_workflow import RegressionSweepWorkflow
 from biosim_server.biosim_verify.runs_verify_workflow import RunsVerifyWorkflow
-from biosim_server.dependencies import get_temporal_client, init_standalone
+from biosim_server.config import get_settings
+from biosim_server.dependencies import get_biosim_service, get_temporal_client, init_standalone, \
+    shutdown_standalone
+from biosim_server.metrics import is_multiprocess, start_metrics_server
+from biosim_server.tracing import init_tracing, shutdown_tracing
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
 
 interrupt_event = asyncio.Event()
 
+WORKFLOWS: list[type] = [OmexVerifyWorkflow, OmexSimWorkflow, RunsVerifyWorkflow, OmexVerifyBatchWorkflow,
+                         RegressionSweepWorkflow]
+# activities which mostly wait on the network (biosim api, GCS, mongodb) and can run with high concurrency
+IO_ACTIVITIES: list[Callable[..., Any]] = [get_existing_biosim_simulation_run_activity,
+                                            submit_biosim_simulation_run_activity,
+                                            submit_biosim_simulation_runs_activity, list_omex_files_activity,
+                                            get_cached_biosim_simulation_runs_activity,
+                                            save_regression_sweep_results_activity]
+# activities which hold a cpu (hdf5 decoding and numpy comparisons) and should be limited to about one per core
+COMPUTE_ACTIVITIES: list[Callable[..., Any]] = [generate_statistics_activity]
+
+WORKER_ROLES = ("all", "verify-io", "verify-compute")
+
+
+def _compute_slot_options() -> dict[str, Any]:
+    """ compute activity slots are either resource based (a new slot is only handed out while the process stays below
+    the target memory and cpu usage) or a fixed number, see also biosim_verify.memory_admission """
+    settings = get_settings()
+    compute_limit = settings.worker_max_concurrent_compute_activities or None
+    if settings.worker_compute_target_memory_usage > 0:
+        # comparisons fetch their data before the memory is used, so wait a while before judging the next slot
+        activity_config = ResourceBasedSlotConfig(minimum_slots=1, maximum_slots=compute_limit,
+                                                  ramp_throttle=timedelta(seconds=5))
+        return dict(tuner=WorkerTuner.create_resource_based(
+            target_memory_usage=settings.worker_compute_target_memory_usage,
+            target_cpu_usage=settings.worker_compute_target_cpu_usage,
+            activity_config=activity_config))
+    return dict(max_concurrent_activities=compute_limit)
+
+
+def create_workers(client: Client, worker_role: str | None = None) -> list[Worker]:
+    """ workers for the given role, the workflows and i/o bound activities poll temporal_task_queue while the
+    cpu bound activities poll temporal_compute_task_queue (the same queue unless configured otherwise) """
+    settings = get_settings()
+    worker_role = worker_role or settings.worker_role
+    if worker_role not in WORKER_ROLES:
+        raise ValueError(f"unknown worker role '{worker_role}', expected one of {WORKER_ROLES}")
+
+    io_limit = settings.worker_max_concurrent_io_activities or None
+    workflow_limit = settings.worker_max_concurrent_workflow_tasks or None
+    graceful_shutdown_timeout = timedelta(seconds=settings.worker_graceful_shutdown_s)
+
+    workers: list[Worker] = []
+    if worker_role == "all" and settings.temporal_task_queue == settings.temporal_compute_task_queue:
+        workers.append(Worker(client, task_queue=settings.temporal_task_queue, workflows=WORKFLOWS,
+                              activities=IO_ACTIVITIES + COMPUTE_ACTIVITIES,
+                              max_concurrent_activities=io_limit, max_concurrent_workflow_tasks=workflow_limit,
+                              graceful_shutdown_timeout=graceful_shutdown_timeout,
+                              workflow_runner=UnsandboxedWorkflowRunner()))
+        return workers
+    if worker_role in ("all", "verify-io"):
+        workers.append(Worker(client, task_queue=settings.temporal_task_queue, workflows=WORKFLOWS,
+                              activities=IO_ACTIVITIES,
+                              max_concurrent_activities=io_limit, max_concurrent_workflow_tasks=workflow_limit,
+                              graceful_shutdown_timeout=graceful_shutdown_timeout,
+                              workflow_runner=UnsandboxedWorkflowRunner()))
+    if worker_role in ("all", "verify-compute"):
+        workers.append(Worker(client, task_queue=settings.temporal_compute_task_queue,
+                              activities=COMPUTE_ACTIVITIES, graceful_shutdown_timeout=graceful_shutdown_timeout,
+                              **_compute_slot_options()))
+    return workers
+
+
+def temporal_metrics_ports(process_indices: Iterable[int]) -> dict[int, int]:
+    """ the local ports of the temporal sdk metrics of the worker processes, re-exported on worker_metrics_port """
+    settings = get_settings()
+    port = settings.worker_temporal_metrics_port
+    if port <= 0 or settings.worker_metrics_port <= 0:
+        return {}
+    return {process_index: port + process_index for process_index in process_indices}
+
+
+def create_temporal_runtime(process_index: int) -> Runtime | None:
+    """ runtime exporting the temporal sdk metrics (task latencies, slots, polls) for prometheus, only on localhost
+    since they are scraped through the worker metrics server """
+    port = temporal_metrics_ports([process_index]).get(process_index)
+    if port is None:
+        return None
+    return Runtime(telemetry=TelemetryConfig(metrics=PrometheusConfig(bind_address=f"127.0.0.1:{port}")))
 
-async def main() -> None:
+
+def get_health_file(process_index: int) -> Path:
+    settings = get_settings()
+    # not under the local cache dir, which may be a volume shared by several pods
+    health_dir = Path(settings.worker_health_dir or Path(tempfile.gettempdir()) / "biosim_worker_health")
+    health_dir.mkdir(parents=True, exist_ok=True)
+    return health_dir / f"worker-{process_index}.json"
+
+
+def write_health(health_file: Path, process_index: int, workers: list[Worker], status: str) -> None:
+    """ heartbeat read by the launcher health check (replaced atomically so readers never see a partial file) """
+    health = dict(process_index=process_index, pid=os.getpid(), status=status, updated_at=time.time(),
+                  task_queues=[worker.task_queue for worker in workers],
+                  running=all(worker.is_running for worker in workers))
+    tmp_file = health_file.with_suffix(".tmp")
+    tmp_file.write_text(json.dumps(health))
+    tmp_file.replace(health_file)
+
+
+async def report_health(health_file: Path, process_index: int, workers: list[Worker]) -> None:
+    while True:
+        try:
+            write_health(health_file, process_index, workers, status="running")
+        except OSError as e:
+            logger.warning(f"failed to write worker health file {health_file}: {e}")
+        await asyncio.sleep(get_settings().worker_health_interval_s)
+
+
+async def run_workers(workers: list[Worker], stop_event: asyncio.Event) -> None:
+    """ run the workers until one of them fails or stop_event is set, then shut all of them down gracefully
+    (no new tasks are polled and running activities get worker_graceful_shutdown_s to complete) """
+    run_task: asyncio.Future[Any] = asyncio.gather(*[worker.run() for worker in workers])
+    stop_task: asyncio.Future[Any] = asyncio.ensure_future(stop_event.wait())
+    await asyncio.wait([run_task, stop_task], return_when=asyncio.FIRST_COMPLETED)
+    stop_task.cancel()
+    logger.info("shutting down workers")
+    await asyncio.gather(*[worker.shutdown() for worker in workers if not worker.is_shutdown])
+    await run_task
+
+
+async def main(process_index: int = 0) -> None:
     logging.basicConfig(level=logging.INFO)
+    init_tracing(service_name="biosim-worker")
 
     random.seed(667)
 
-    await init_standalone()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, interrupt_event.set)
+
+    logger.info(f"imported worker modules in {time.perf_counter() - IMPORT_STARTED_AT:.2f}s")
+    # with the launcher, the metrics of all worker processes are served by the launcher
+    if not is_multiprocess() and get_settings().worker_metrics_port > 0:
+        start_metrics_server(get_settings().worker_metrics_port,
+                             local_metrics_ports=temporal_metrics_ports([process_index]))
+    await init_standalone(temporal_runtime=create_temporal_runtime(process_index))
 
     client = get_temporal_client()
     if client is None:
         raise Exception("Could not connect to Temporal service")
 
-    run_futures = []
-    handle = Worker(
-        client,
-        task_queue="verification_tasks",
-        workflows=[OmexVerifyWorkflow, OmexSimWorkflow, RunsVerifyWorkflow],
-        activities=[get_existing_biosim_simulation_run_activity, submit_biosim_simulation_run_activity,
-                    generate_statistics_activity],
-        workflow_runner=UnsandboxedWorkflowRunner(),
-    )
-    run_futures.append(handle.run())
-    print("Started worker for verification_tasks, ctrl+c to exit")
+    workers = create_workers(client)
+    # e.g. the slurm job status poller, only needed where the simulation activities run (not in the api)
+    biosim_service = get_biosim_service()
+    if biosim_service is not None and get_settings().worker_role in ("all", "verify-io"):
+        biosim_service.start()
+    health_file = get_health_file(process_index)
+    health_task = asyncio.create_task(report_health(health_file, process_index, workers))
+    logger.info(f"worker ready {time.perf_counter() - IMPORT_STARTED_AT:.2f}s after the first import")
+    print(f"Started workers for {', '.join(worker.task_queue for worker in workers)} "
+          f"in process {process_index} (pid {os.getpid()}), ctrl+c to exit")
 
-    await asyncio.gather(*run_futures)
+    try:
+        await run_workers(workers, interrupt_event)
+    finally:
+        health_task.cancel()
+        write_health(health_file, process_index, workers, status="stopped")
+        await shutdown_standalone()
+        shutdown_tracing()
+        print(f"\nShut down workers in process {process_index}")
 
 
 if __name__ == "__main__":
-    loop = asyncio.get_event_loop()
-    try:
-        loop.run_until_complete(main())
-    except KeyboardInterrupt:
-        interrupt_event.set()
-        loop.run_until_complete(loop.shutdown_asyncgens())
-        print("\nShutting down workers")
+    asyncio.run(main())
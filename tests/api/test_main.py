@@ -1,5 +1,10 @@
 import asyncio
+import io
+import json
 import logging
+import subprocess
+import sys
+import zipfile
 from pathlib import Path
 
 import pytest
@@ -8,15 +13,26 @@ from biosim_server.biosim_omex import OmexDatabaseServiceMongo
 from biosim_server.biosim_runs import BiosimServiceRest, DatabaseServiceMongo
 from biosim_server.biosim_verify.omex_verify_workflow import OmexVerifyWorkflowInput
 from biosim_server.biosim_verify.runs_verify_workflow import RunsVerifyWorkflowInput
-from biosim_server.biosim_verify.models import VerifyWorkflowOutput, VerifyWorkflowStatus
+from biosim_server.biosim_verify.models import VerifyBatchWorkflowOutput, VerifyWorkflowOutput, VerifyWorkflowStatus
 from biosim_server.common.storage import FileServiceGCS
 from biosim_server.config import get_settings
+from biosim_server.dependencies import get_omex_database_service, set_omex_database_service
+from biosim_server.profiling import PROFILE_HEADER, path_component, profile, write_artifacts
 from biosim_server.version import __version__
+from biosim_server.tracing import init_tracing, traced
 from httpx import ASGITransport, AsyncClient
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
 from temporalio.client import Client
-from temporalio.worker import Worker
+from temporalio.worker import UnsandboxedWorkflowRunner, Worker
+from biosim_server.worker.worker_main import WORKFLOWS
 from tests.biosim_verify.test_omex_verify_workflows import assert_omex_verify_results
 from tests.biosim_verify.test_runs_verify_workflow import assert_runs_verify_results
+from tests.fixtures.biosim_service_mock import BiosimServiceMock
+from tests.fixtures.file_service_local import FileServiceLocal
+from tests.fixtures.omex_database_memory import OmexDatabaseServiceMemory
+from tests.fixtures.verify_activities_mock import VerifyActivitiesMock
 
 
 @pytest.mark.asyncio
@@ -27,6 +43,98 @@ async def test_root() -> None:
         assert response.json() == {'docs': 'https://biosim.biosimulations.org/docs', 'version': __version__ }
 
 
+@pytest.mark.asyncio
+async def test_metrics() -> None:
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as test_client:
+        assert (await test_client.get("/version")).status_code == 200
+        response = await test_client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'biosim_http_request_duration_seconds_count{method="GET",route="/version",status="200"}' in response.text
+
+
+@pytest.mark.asyncio
+async def test_profiling(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(get_settings(), "profiling_local_dir", str(tmp_path))
+    monkeypatch.setattr(get_settings(), "profiling_header_token", "secret")
+    monkeypatch.setattr(get_settings(), "profiling_targets", "/version")
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as test_client:
+        assert (await test_client.get("/")).status_code == 200
+        assert (await test_client.get("/verify/wf-unprofiled", headers={PROFILE_HEADER: "wrong"})).status_code == 404
+        assert list(tmp_path.iterdir()) == []
+
+        # profiled on demand with the header, keyed by workflow id
+        assert (await test_client.get("/verify/wf-profiled", headers={PROFILE_HEADER: "secret"})).status_code == 404
+        # profiled by profiling_targets, no workflow id
+        assert (await test_client.get("/version")).status_code == 200
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["requests", "wf-profiled"]
+    summary_files = list((tmp_path / "wf-profiled").glob("*.json"))
+    assert len(summary_files) == 1
+    summary = json.loads(summary_files[0].read_text())
+    assert summary["target"] == "/verify/{workflow_id}"
+    assert summary["tracemalloc_peak_bytes"] > 0
+    assert len(list((tmp_path / "wf-profiled").glob("verify_workflow_id-*.folded"))) == 1
+    assert len(list((tmp_path / "requests").glob("version-*.json"))) == 1
+
+
+@pytest.mark.asyncio
+async def test_profiling_concurrent_peaks(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(get_settings(), "profiling_local_dir", str(tmp_path))
+    block_bytes = 20 * 1024 * 1024
+
+    # a profile starting later resets the process wide peak, the earlier profile keeps its own
+    async with profile(target="outer", key="outer") as outer:
+        block = bytearray(block_bytes)
+        del block
+        async with profile(target="inner", key="inner") as inner:
+            pass
+    assert outer.tracemalloc_peak_bytes >= block_bytes
+    assert inner.tracemalloc_peak_bytes < block_bytes
+    summary = json.loads(next((tmp_path / "outer").glob("outer-*.json")).read_text())
+    assert summary["tracemalloc_peak_bytes"] == outer.tracemalloc_peak_bytes
+
+
+@pytest.mark.asyncio
+async def test_profiling_key_stays_in_profile_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(get_settings(), "profiling_local_dir", str(tmp_path / "profiles"))
+    await write_artifacts(key="../../escaped", files={"../profile.json": b"{}"})
+    assert [str(path.relative_to(tmp_path)) for path in tmp_path.rglob("*") if path.is_file()] == \
+           ["profiles/escaped/profile.json"]
+    assert path_component("..") == "_" and path_component("wf-1.2") == "wf-1.2"
+
+
+@pytest.mark.asyncio
+async def test_tracing() -> None:
+    exporter = InMemorySpanExporter()
+    assert init_tracing(service_name="biosim-api-test", exporter=exporter)
+
+    @traced("test.lookup", file_hash_md5="omex.hash_md5")
+    async def lookup(file_hash_md5: str) -> str:
+        return file_hash_md5
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as test_client:
+        assert (await test_client.get("/version")).status_code == 200
+    assert await lookup(file_hash_md5="abc") == "abc"
+
+    provider = trace.get_tracer_provider()
+    assert isinstance(provider, TracerProvider)
+    provider.force_flush()
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert spans["GET /version"].attributes is not None
+    assert spans["GET /version"].attributes["http.route"] == "/version"
+    assert spans["GET /version"].attributes["http.response.status_code"] == 200
+    assert spans["test.lookup"].attributes == {"omex.hash_md5": "abc"}
+
+
+def test_api_import_is_light() -> None:
+    # the api only starts workflows, the scientific stack is loaded by the workers which run the activities
+    code = "import sys, biosim_server.api.main; print(sorted({'numpy', 'h5py'} & set(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "[]"
+
+
 @pytest.mark.asyncio
 async def test_version() -> None:
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as test_client:
@@ -35,6 +143,15 @@ async def test_version() -> None:
         assert response.json() == __version__
 
 
+@pytest.mark.asyncio
+async def test_regression_sweep_rejects_empty_pages() -> None:
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as test_client:
+        for param in ("page_size", "max_concurrent_simulations"):
+            response = await test_client.post("/verify/regression_sweep", params={
+                "new_simulator": "copasi:2", "previous_simulator": "copasi:1", param: 0})
+            assert response.status_code == 422
+
+
 @pytest.mark.asyncio
 async def test_get_output_not_found(omex_verify_workflow_input: OmexVerifyWorkflowInput,
                                     omex_verify_workflow_output: VerifyWorkflowOutput) -> None:
@@ -172,3 +289,84 @@ async def test_runs_verify_not_found(runs_verify_workflow_input: RunsVerifyWorkf
         assert output.workflow_status == VerifyWorkflowStatus.RUN_ID_NOT_FOUND
         assert output.workflow_error in [ "Simulation run with id bad_run_id_1 not found.",
                                           "Simulation run with id bad_run_id_2 not found."]
+
+
+@pytest.mark.asyncio
+async def test_omex_batch_verify_limits(omex_test_file: Path, file_service_local: FileServiceLocal,
+                                        biosim_service_mock: BiosimServiceMock,
+                                        monkeypatch: pytest.MonkeyPatch) -> None:
+    saved_omex_database = get_omex_database_service()
+    omex_database = OmexDatabaseServiceMemory()
+    set_omex_database_service(omex_database)
+    omex_file_contents = omex_test_file.read_bytes()
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w") as zip_file:
+        zip_file.writestr("a.omex", omex_file_contents)
+        zip_file.writestr("b.omex", b"second archive")
+    files = [("uploaded_files", ("model.omex", omex_file_contents, "application/zip")),
+             ("uploaded_files", ("models.zip", zip_buffer.getvalue(), "application/zip"))]
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as test_client:
+            # the last archive exceeds each limit, the batch is rejected before any archive is stored
+            for setting, limit in [("verify_batch_max_archives", 2),
+                                   ("verify_batch_max_total_bytes", 2 * len(omex_file_contents)),
+                                   ("verify_batch_max_archive_bytes", len(omex_file_contents) - 1)]:
+                with monkeypatch.context() as settings_patch:
+                    settings_patch.setattr(get_settings(), setting, limit)
+                    response = await test_client.post("/verify/omex/batch", files=files,
+                                                      params={"simulators": ["copasi"]})
+                assert response.status_code == 413, setting
+            # the upload sizes alone exceed the limit, nothing is extracted
+            monkeypatch.setattr(get_settings(), "verify_batch_max_total_bytes", len(omex_file_contents))
+            response = await test_client.post("/verify/omex/batch", files=files, params={"simulators": ["copasi"]})
+            assert response.status_code == 413
+        assert omex_database.omex_files == {}
+        assert list(file_service_local.BASE_DIR.iterdir()) == []
+    finally:
+        set_omex_database_service(saved_omex_database)
+
+
+@pytest.mark.asyncio
+async def test_omex_batch_verify_and_get_output(omex_test_file: Path, file_service_local: FileServiceLocal,
+                                                biosim_service_mock: BiosimServiceMock,
+                                                temporal_client: Client) -> None:
+    saved_omex_database = get_omex_database_service()
+    set_omex_database_service(OmexDatabaseServiceMemory())
+    activities_mock = VerifyActivitiesMock()
+    omex_file_contents = omex_test_file.read_bytes()
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w") as zip_file:
+        zip_file.writestr("copy.omex", omex_file_contents)
+        zip_file.writestr("other.omex", b"other archive")
+    try:
+        async with Worker(temporal_client, task_queue=get_settings().temporal_task_queue, workflows=WORKFLOWS,
+                          activities=[activities_mock.submit_biosim_simulation_run,
+                                      activities_mock.submit_biosim_simulation_runs,
+                                      activities_mock.get_existing_biosim_simulation_run,
+                                      activities_mock.generate_statistics],
+                          workflow_runner=UnsandboxedWorkflowRunner()):
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as test_client:
+                files = [("uploaded_files", ("model.omex", omex_file_contents, "application/zip")),
+                         ("uploaded_files", ("models.zip", zip_buffer.getvalue(), "application/zip"))]
+                response = await test_client.post("/verify/omex/batch", files=files,
+                                                  params={"simulators": ["copasi", "tellurium"]})
+                assert response.status_code == 200
+                output = VerifyBatchWorkflowOutput.model_validate(response.json())
+
+                # duplicate archives are verified once
+                assert [result.filenames for result in output.archive_results] == [["model.omex", "copy.omex"],
+                                                                                    ["other.omex"]]
+                assert output.progress.total == 2 and output.progress.pending == 2
+
+                while not output.workflow_status.is_done:
+                    await asyncio.sleep(1)
+                    response = await test_client.get(f"/verify/omex/batch/{output.workflow_id}")
+                    assert response.status_code == 200
+                    output = VerifyBatchWorkflowOutput.model_validate(response.json())
+
+                assert output.workflow_status == VerifyWorkflowStatus.COMPLETED
+                assert output.progress.completed == 2
+                response = await test_client.get(f"/verify/{output.archive_results[0].workflow_id}")
+                assert VerifyWorkflowOutput.model_validate(response.json()).workflow_results is not None
+    finally:
+        set_omex_database_service(saved_omex_database)
@@ -0,0 +1,116 @@
+import asyncio
+import json
+from contextlib import aclosing
+from typing import Any, Optional
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from temporalio.service import RPCError, RPCStatusCode
+
+import biosim_server.api.main
+from biosim_server.api.main import app
+from biosim_server.api.status_stream import StatusEvent, WorkflowStatusBroadcaster
+
+
+class _WorkflowOutputs:
+    """ stands in for the "get_output" queries, the workflow advances one output per advance() """
+    outputs: list[dict[str, Any]]
+    position: int
+    num_queries: int
+    num_transient_errors: int  # the next queries fail as if the temporal frontend was unavailable
+
+    def __init__(self, statuses: list[str], num_transient_errors: int = 0) -> None:
+        self.outputs = [{"workflow_id": "wf-1", "workflow_status": status} for status in statuses]
+        self.position = 0
+        self.num_queries = 0
+        self.num_transient_errors = num_transient_errors
+
+    def advance(self) -> None:
+        self.position = min(self.position + 1, len(self.outputs) - 1)
+
+    async def query_output(self, workflow_id: str) -> dict[str, Any]:
+        self.num_queries += 1
+        if self.num_transient_errors > 0:
+            self.num_transient_errors -= 1
+            raise RPCError("connection refused", RPCStatusCode.UNAVAILABLE, b"")
+        if workflow_id != "wf-1":
+            raise Exception(f"workflow not found for ID: {workflow_id}")
+        return self.outputs[self.position]
+
+
+async def _collect(broadcaster: WorkflowStatusBroadcaster, workflow_id: str) -> list[StatusEvent]:
+    return [event async for event in broadcaster.subscribe(workflow_id, keepalive_s=10.0) if event is not None]
+
+
+@pytest.mark.asyncio
+async def test_broadcaster_fans_out_changes() -> None:
+    workflow_outputs = _WorkflowOutputs(["PENDING", "IN_PROGRESS", "COMPLETED"])
+    broadcaster = WorkflowStatusBroadcaster(query_output=workflow_outputs.query_output,
+                                            poll_interval_s=0.01, max_poll_interval_s=0.02)
+    subscribers = [asyncio.create_task(_collect(broadcaster, "wf-1")) for _ in range(3)]
+    for _ in range(2):
+        await asyncio.sleep(0.1)
+        workflow_outputs.advance()
+    all_events = await asyncio.gather(*subscribers)
+
+    # every subscriber sees each distinct output once, from a single query loop
+    for events in all_events:
+        assert [event.data["workflow_status"] for event in events] == ["PENDING", "IN_PROGRESS", "COMPLETED"]
+        assert [event.done for event in events] == [False, False, True]
+    assert workflow_outputs.num_queries < 3 * 0.2 / 0.01
+    assert broadcaster.watchers == {} and broadcaster.subscribers == {}
+
+
+@pytest.mark.asyncio
+async def test_broadcaster_retries_transient_errors() -> None:
+    workflow_outputs = _WorkflowOutputs(["COMPLETED"], num_transient_errors=3)
+    broadcaster = WorkflowStatusBroadcaster(query_output=workflow_outputs.query_output,
+                                            poll_interval_s=0.01, max_poll_interval_s=0.02)
+    events = await asyncio.wait_for(_collect(broadcaster, "wf-1"), timeout=1.0)
+
+    # only the output is published, the failed queries are retried
+    assert [(event.event, event.data["workflow_status"]) for event in events] == [("status", "COMPLETED")]
+    assert workflow_outputs.num_queries == 4
+
+    # an unknown workflow ends the stream with an error
+    events = await asyncio.wait_for(_collect(broadcaster, "wf-unknown"), timeout=1.0)
+    assert [(event.event, event.done) for event in events] == [("error", True)]
+
+
+@pytest.mark.asyncio
+async def test_broadcaster_keepalive_and_unsubscribe() -> None:
+    workflow_outputs = _WorkflowOutputs(["IN_PROGRESS"])
+    broadcaster = WorkflowStatusBroadcaster(query_output=workflow_outputs.query_output,
+                                            poll_interval_s=0.01, max_poll_interval_s=0.01)
+    events: list[Optional[StatusEvent]] = []
+    async with aclosing(broadcaster.subscribe("wf-1", keepalive_s=0.05)) as stream:
+        async for event in stream:
+            events.append(event)
+            if len(events) == 3:
+                break
+    assert events[0] is not None and events[0].data["workflow_status"] == "IN_PROGRESS"
+    assert events[1:] == [None, None]
+
+    # the last subscriber leaving stops the query loop
+    await asyncio.sleep(0.05)
+    num_queries = workflow_outputs.num_queries
+    await asyncio.sleep(0.05)
+    assert workflow_outputs.num_queries == num_queries
+    assert broadcaster.watchers == {} and broadcaster.subscribers == {}
+
+
+@pytest.mark.asyncio
+async def test_stream_verify_output(monkeypatch: pytest.MonkeyPatch) -> None:
+    workflow_outputs = _WorkflowOutputs(["COMPLETED"])
+    monkeypatch.setattr(biosim_server.api.main, "status_broadcaster", WorkflowStatusBroadcaster(
+        query_output=workflow_outputs.query_output, poll_interval_s=0.01, max_poll_interval_s=0.01))
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as test_client:
+        response = await test_client.get("/verify/wf-1/events")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.text == f"event: status\ndata: {json.dumps(workflow_outputs.outputs[0])}\n\n"
+
+        response = await test_client.get("/verify/non-existent-id/events")
+        event_line, data_line = response.text.strip().split("\n")
+        assert event_line == "event: error"
+        assert "non-existent-id" in json.loads(data_line.removeprefix("data: "))["detail"]
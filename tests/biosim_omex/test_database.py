@@ -1,6 +1,20 @@
+import asyncio
+import io
+import uuid
+import zipfile
+from pathlib import Path
+
 import pytest
 
-from biosim_server.biosim_omex import OmexFile, OmexDatabaseServiceMongo
+from biosim_server.biosim_omex import OmexFile, OmexDatabaseServiceMongo, OmexDatabaseServiceCached, \
+    get_cached_omex_file_from_biosim_run, get_cached_omex_file_from_raw, hash_file_md5, extract_omex_archives, \
+    extract_omex_archives_async, list_omex_archives, OmexArchiveTooLarge
+from biosim_server.biosim_omex.omex_storage import _biosim_run_omex_hash_index, _get_biosim_run_omex_hash, \
+    _set_biosim_run_omex_hash
+from biosim_server.common.timing import StageTiming
+from biosim_server.config import get_settings
+from tests.fixtures.file_service_local import FileServiceLocal
+from tests.fixtures.omex_database_memory import OmexDatabaseServiceMemory
 
 
 @pytest.mark.asyncio
@@ -24,3 +38,139 @@ async def test_omex_file(omex_database_service_mongo: OmexDatabaseServiceMongo)
     with pytest.raises(Exception):
         await omex_database_service_mongo.delete_omex_file(database_id=database_id)
 
+
+
+@pytest.mark.asyncio
+async def test_omex_file_cached() -> None:
+    omex_database_memory = OmexDatabaseServiceMemory(latency_s=0.01)
+    omex_database_cached = OmexDatabaseServiceCached(omex_database=omex_database_memory, max_entries=2)
+    omex_files = [OmexFile(file_hash_md5=f"hash{i}", bucket_name="test_bucket", uploaded_filename=f"model{i}.omex",
+                           omex_gcs_path=f"path/to/omex{i}", file_size=100000) for i in range(3)]
+    inserted_omex_files = [await omex_database_memory.insert_omex_file(omex_file=f) for f in omex_files]
+
+    # concurrent lookups of the same hash share one backend query
+    results = await asyncio.gather(*[omex_database_cached.get_omex_file(file_hash_md5="hash0") for _ in range(5)])
+    assert results == [inserted_omex_files[0]] * 5
+    assert omex_database_memory.get_count == 1
+
+    # cached entries are copies, mutating a result doesn't corrupt the cache
+    assert results[0] is not None
+    results[0].database_id = None
+    assert await omex_database_cached.get_omex_file(file_hash_md5="hash0") == inserted_omex_files[0]
+    assert omex_database_memory.get_count == 1
+
+    # least recently used entry is evicted once max_entries is exceeded
+    await omex_database_cached.get_omex_file(file_hash_md5="hash1")
+    await omex_database_cached.get_omex_file(file_hash_md5="hash0")
+    await omex_database_cached.get_omex_file(file_hash_md5="hash2")
+    assert omex_database_memory.get_count == 3
+    await omex_database_cached.get_omex_file(file_hash_md5="hash0")
+    assert omex_database_memory.get_count == 3
+    await omex_database_cached.get_omex_file(file_hash_md5="hash1")
+    assert omex_database_memory.get_count == 4
+
+    # misses are not cached, and deletes invalidate
+    assert await omex_database_cached.get_omex_file(file_hash_md5="missing") is None
+    database_id = inserted_omex_files[1].database_id
+    assert database_id is not None
+    await omex_database_cached.delete_omex_file(database_id=database_id)
+    assert await omex_database_cached.get_omex_file(file_hash_md5="hash1") is None
+
+
+@pytest.mark.asyncio
+async def test_omex_file_from_biosim_run(file_service_local: FileServiceLocal, omex_test_file: Path) -> None:
+    omex_database_memory = OmexDatabaseServiceMemory()
+    run_id_1 = uuid.uuid4().hex
+    run_id_2 = uuid.uuid4().hex
+    for run_id in [run_id_1, run_id_2]:
+        await file_service_local.upload_file(file_path=omex_test_file, gcs_path=f"simulations/{run_id}/archive.omex")
+    assert await file_service_local.get_object_hash(f"simulations/{run_id_1}/archive.omex") == await hash_file_md5(omex_test_file)
+    assert await file_service_local.get_object_hash("simulations/missing/archive.omex") is None
+
+    # first import of an unknown archive downloads it
+    omex_file = await get_cached_omex_file_from_biosim_run(file_service=file_service_local,
+                                                           omex_database=omex_database_memory, biosim_run_id=run_id_1)
+    assert omex_file.file_hash_md5 == await hash_file_md5(omex_test_file)
+
+    # archives with a known hash are resolved from metadata without downloading
+    async def no_download(gcs_path: str) -> bytes | None:
+        raise AssertionError(f"unexpected download of {gcs_path}")
+    file_service_local.get_file_contents = no_download  # type: ignore[method-assign]
+    for run_id in [run_id_2, run_id_1]:
+        cached_omex_file = await get_cached_omex_file_from_biosim_run(file_service=file_service_local,
+                                                                      omex_database=omex_database_memory,
+                                                                      biosim_run_id=run_id)
+        assert cached_omex_file.file_hash_md5 == omex_file.file_hash_md5
+        assert cached_omex_file.omex_gcs_path == omex_file.omex_gcs_path
+    assert len(await omex_database_memory.list_omex_files()) == 1
+
+
+def test_biosim_run_omex_hash_index_is_bounded(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(get_settings(), "omex_biosim_run_hash_index_max_entries", 2)
+    _biosim_run_omex_hash_index.clear()
+    _set_biosim_run_omex_hash("run1", "hash1")
+    _set_biosim_run_omex_hash("run2", "hash2")
+    assert _get_biosim_run_omex_hash("run1") == "hash1"
+    # the least recently used run is evicted
+    _set_biosim_run_omex_hash("run3", "hash3")
+    assert list(_biosim_run_omex_hash_index.items()) == [("run1", "hash1"), ("run3", "hash3")]
+    assert _get_biosim_run_omex_hash("run2") is None
+    _biosim_run_omex_hash_index.clear()
+
+
+@pytest.mark.asyncio
+async def test_omex_file_dedup_timing(file_service_local: FileServiceLocal, omex_test_file: Path) -> None:
+    omex_database_memory = OmexDatabaseServiceMemory()
+    omex_file_contents = omex_test_file.read_bytes()
+    stage_timings: list[StageTiming] = []
+    for _ in range(2):
+        await get_cached_omex_file_from_raw(file_service=file_service_local, omex_database=omex_database_memory,
+                                            omex_file_contents=omex_file_contents, filename=omex_test_file.name,
+                                            stage_timings=stage_timings)
+    assert [(t.stage, t.cache_hit, t.num_bytes) for t in stage_timings] == [
+        ("omex_dedup", False, len(omex_file_contents)), ("omex_dedup", True, len(omex_file_contents))]
+    assert all(t.duration_s >= 0 for t in stage_timings)
+
+
+def test_extract_omex_archives(omex_test_file: Path) -> None:
+    omex_file_contents = omex_test_file.read_bytes()
+    max_archive_bytes = len(omex_file_contents)
+
+    # an omex archive (with a manifest.xml) is not expanded, nor is anything which is not a zip file
+    assert list(extract_omex_archives(omex_file_contents, "model.omex", max_archive_bytes)) == [
+        ("model.omex", omex_file_contents)]
+    assert list(extract_omex_archives(b"not a zip file", "model.omex", max_archive_bytes)) == [
+        ("model.omex", b"not a zip file")]
+
+    # a zip file of omex archives is
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("a.omex", omex_file_contents)
+        zip_file.writestr("models/b.OMEX", omex_file_contents)
+        zip_file.writestr("README.md", "two archives")
+        zip_file.writestr("__MACOSX/._a.omex", b"resource fork")
+    assert list(extract_omex_archives(zip_buffer.getvalue(), "models.zip", max_archive_bytes)) == [
+        ("a.omex", omex_file_contents), ("models/b.OMEX", omex_file_contents)]
+    # and listed with their sizes without being decompressed
+    assert list_omex_archives(zip_buffer.getvalue(), "models.zip") == [
+        ("a.omex", len(omex_file_contents)), ("models/b.OMEX", len(omex_file_contents))]
+    assert list_omex_archives(omex_file_contents, "model.omex") == [("model.omex", len(omex_file_contents))]
+
+    # archives above the limit are rejected, whether uploaded directly or in a zip file
+    with pytest.raises(OmexArchiveTooLarge):
+        list(extract_omex_archives(omex_file_contents, "model.omex", max_archive_bytes - 1))
+    archives = extract_omex_archives(zip_buffer.getvalue(), "models.zip", max_archive_bytes - 1)
+    with pytest.raises(OmexArchiveTooLarge):
+        next(archives)
+
+
+@pytest.mark.asyncio
+async def test_extract_omex_archives_async(omex_test_file: Path) -> None:
+    omex_file_contents = omex_test_file.read_bytes()
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w") as zip_file:
+        zip_file.writestr("a.omex", omex_file_contents)
+        zip_file.writestr("b.omex", b"second archive")
+    archives = [archive async for archive in extract_omex_archives_async(zip_buffer.getvalue(), "models.zip",
+                                                                          len(omex_file_contents))]
+    assert archives == [("a.omex", omex_file_contents), ("b.omex", b"second archive")]
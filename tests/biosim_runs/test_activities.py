@@ -0,0 +1,124 @@
+from pathlib import Path
+from typing import AsyncGenerator
+
+import pytest
+import pytest_asyncio
+from temporalio.testing import ActivityEnvironment
+from typing_extensions import override
+
+from biosim_server.biosim_omex import OmexFile
+from biosim_server.biosim_runs import BiosimulatorVersion, BiosimSimulationRun, BiosimSimulationRunStatus, \
+    SubmitBiosimSimulationRunsActivityInput, submit_biosim_simulation_runs_activity
+from biosim_server.biosim_runs.activities import SubmitBiosimSimulationRunsActivityOutput
+from biosim_server.dependencies import get_biosim_service, get_database_service, set_biosim_service, \
+    set_database_service
+from tests.fixtures.biosim_service_mock import BiosimServiceMock
+from tests.fixtures.database_memory import DatabaseServiceMemory
+from tests.fixtures.file_service_local import FileServiceLocal
+from tests.fixtures.verify_activities_mock import VerifyActivitiesMock
+
+
+class _BatchBiosimService(BiosimServiceMock):
+    """ records the batches of simulations, which succeed right away """
+    batches: list[list[tuple[str, str, BiosimulatorVersion]]]
+    missing_results: set[str]  # run ids without hdf5 metadata
+    prefetched: list[list[str]]
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.sim_runs = {}
+        self.hdf5_files = {}
+        self.batches = []
+        self.missing_results = set()
+        self.prefetched = []
+
+    @override
+    async def run_biosim_sims(self, sims: list[tuple[str, str, BiosimulatorVersion]],
+                              max_concurrent: int | None = None) -> list[BiosimSimulationRun]:
+        self.batches.append(sims)
+        template = VerifyActivitiesMock().statistics.sims_run_info[0]
+        sim_runs: list[BiosimSimulationRun] = []
+        for task_id, (local_omex_path, omex_name, simulator_version) in enumerate(sims):
+            assert Path(local_omex_path).exists()
+            sim_run = BiosimSimulationRun(id=f"batch{len(self.batches)}_{task_id}", name=omex_name,
+                                          simulator_version=simulator_version,
+                                          status=BiosimSimulationRunStatus.SUCCEEDED)
+            self.sim_runs[sim_run.id] = sim_run
+            if sim_run.id not in self.missing_results:
+                self.hdf5_files[sim_run.id] = template.hdf5_file.model_copy(update={"id": sim_run.id})
+            sim_runs.append(sim_run)
+        return sim_runs
+
+    @override
+    async def prefetch_results(self, simulation_run_ids: list[str]) -> None:
+        self.prefetched.append(simulation_run_ids)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def batch_biosim_service() -> AsyncGenerator[_BatchBiosimService, None]:
+    saved_biosim_service, saved_database_service = get_biosim_service(), get_database_service()
+    biosim_service = _BatchBiosimService()
+    set_biosim_service(biosim_service)
+    set_database_service(DatabaseServiceMemory())
+
+    yield biosim_service
+
+    set_biosim_service(saved_biosim_service)
+    set_database_service(saved_database_service)
+
+
+@pytest.mark.asyncio
+async def test_submit_biosim_simulation_runs_activity(batch_biosim_service: _BatchBiosimService,
+                                                      file_service_local: FileServiceLocal, omex_test_file: Path,
+                                                      simulator_version_copasi: BiosimulatorVersion,
+                                                      simulator_version_tellurium: BiosimulatorVersion) -> None:
+    await file_service_local.upload_file(file_path=omex_test_file, gcs_path="verify/omex/test.omex")
+    omex_file = OmexFile(file_hash_md5="hash", uploaded_filename="test.omex", bucket_name="bucket",
+                         omex_gcs_path="verify/omex/test.omex", file_size=omex_test_file.stat().st_size)
+    activity_environment = ActivityEnvironment()
+
+    # all simulations of the archive are submitted as one batch, the runs are returned in their order
+    submit_input = SubmitBiosimSimulationRunsActivityInput(
+        workflow_id="workflow", simulations=[(omex_file, simulator_version_copasi)], cache_buster="0")
+    output: SubmitBiosimSimulationRunsActivityOutput = await activity_environment.run(
+        submit_biosim_simulation_runs_activity, submit_input)
+    assert len(batch_biosim_service.batches) == 1
+    assert batch_biosim_service.prefetched == [["batch1_0"]]
+    assert output.biosim_workflow_runs[0].hdf5_file is not None
+    # the queue and run times of each simulation, not of the batch as a whole
+    assert [stage_timing.stage for stage_timing in output.biosim_workflow_runs[0].stage_timings or []] == \
+           ["simulation_submit", "simulation_queue", "simulation_run", "metadata_fetch"]
+
+    # the cached copasi run is reused, only the tellurium simulation is submitted
+    submit_input.simulations = [(omex_file, simulator_version_copasi), (omex_file, simulator_version_tellurium)]
+    output = await activity_environment.run(submit_biosim_simulation_runs_activity, submit_input)
+    assert [[simulator_version for _, _, simulator_version in batch] for batch in batch_biosim_service.batches] == \
+           [[simulator_version_copasi], [simulator_version_tellurium]]
+    assert [run.simulator_version for run in output.biosim_workflow_runs] == [simulator_version_copasi,
+                                                                              simulator_version_tellurium]
+    assert all(run.biosim_run is not None and run.biosim_run.status == BiosimSimulationRunStatus.SUCCEEDED
+               and run.database_id is not None for run in output.biosim_workflow_runs)
+
+
+@pytest.mark.asyncio
+async def test_submit_biosim_simulation_runs_activity_partial_failure(
+        batch_biosim_service: _BatchBiosimService, file_service_local: FileServiceLocal, omex_test_file: Path,
+        simulator_version_copasi: BiosimulatorVersion, simulator_version_tellurium: BiosimulatorVersion) -> None:
+    await file_service_local.upload_file(file_path=omex_test_file, gcs_path="verify/omex/test.omex")
+    omex_file = OmexFile(file_hash_md5="hash", uploaded_filename="test.omex", bucket_name="bucket",
+                         omex_gcs_path="verify/omex/test.omex", file_size=omex_test_file.stat().st_size)
+    # the results of the tellurium run are not available
+    batch_biosim_service.missing_results = {"batch1_1"}
+
+    submit_input = SubmitBiosimSimulationRunsActivityInput(
+        workflow_id="workflow", simulations=[(omex_file, simulator_version_copasi),
+                                             (omex_file, simulator_version_tellurium)], cache_buster="0")
+    output: SubmitBiosimSimulationRunsActivityOutput = await ActivityEnvironment().run(
+        submit_biosim_simulation_runs_activity, submit_input)
+
+    # only that simulator fails, and its run is not saved as a cached run
+    copasi_run, tellurium_run = output.biosim_workflow_runs
+    assert copasi_run.biosim_run is not None and copasi_run.biosim_run.status == BiosimSimulationRunStatus.SUCCEEDED
+    assert copasi_run.database_id is not None and copasi_run.hdf5_file is not None
+    assert tellurium_run.biosim_run is not None and tellurium_run.biosim_run.status == BiosimSimulationRunStatus.FAILED
+    assert tellurium_run.database_id is None and tellurium_run.hdf5_file is None
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import zipfile
+from pathlib import Path
+from typing import Any
+
+import pytest
+from typing_extensions import override
+
+from biosim_server.biosim_runs import BiosimulatorVersion, BiosimSimulationRun, BiosimSimulationRunStatus, HDF5File
+from biosim_server.biosim_runs.biosim_service_slurm import BiosimServiceSlurm, slurm_job_run_status, container_image
+from biosim_server.biosim_runs.hdf5_reports import read_hdf5_file, read_hdf5_data
+from biosim_server.common.hpc.models import ExitCode, NumericSlurmValue, SlurmJob
+from biosim_server.common.hpc.slurm_service import SlurmService
+from biosim_server.common.ssh.ssh_service import SSHService
+from biosim_server.config import get_settings
+from biosim_server.dependencies import create_biosim_service
+from tests.fixtures.biosim_service_mock import BiosimServiceMock
+
+
+def _slurm_job(job_id: int, state: str, array_job_id: int | None = None, array_task_id: int | None = None,
+               array_task_string: str | None = None) -> SlurmJob:
+    return SlurmJob(job_id=job_id, name="job", account="acct", batch_flag=True, batch_host="node1", cluster="cluster",
+                    command="job.sbatch", user_name="user", job_state=[state],
+                    array_job_id=NumericSlurmValue(set=True, number=array_job_id or 0),
+                    array_task_id=NumericSlurmValue(set=array_task_id is not None, number=array_task_id),
+                    array_task_string=array_task_string)
+
+
+class _ClusterSSHService(SSHService):
+    """ records staged files and answers sbatch/squeue/sacct/test as a cluster would, without connecting anywhere """
+    uploads: dict[str, bytes]
+    commands: list[str]
+    jobs: list[SlurmJob]
+    accounting: list[dict[str, Any]]  # sacct records of jobs which left the queue
+    finished_outputs: set[str]
+
+    def __init__(self) -> None:
+        super().__init__(hostname="localhost", username="user", key_path=Path("key"))
+        self.uploads = {}
+        self.commands = []
+        self.jobs = []
+        self.accounting = []
+        self.finished_outputs = set()
+
+    @override
+    async def run_command(self, command: str, idempotent: bool = True) -> tuple[int, str, str]:
+        self.commands.append(command)
+        if command.startswith("sbatch"):
+            return 0, "5000;cluster\n", ""
+        if command.startswith("squeue"):
+            return 0, json.dumps({"jobs": [job.model_dump() for job in self.jobs]}), ""
+        if command.startswith("sacct"):
+            return 0, json.dumps({"jobs": self.accounting}), ""
+        if command.startswith("cat "):
+            return 0, self.uploads[command[4:]].decode(), ""
+        if command.startswith("test -f "):
+            reports_path = command.split(" ")[2]
+            return 0, "SUCCEEDED\n" if reports_path in self.finished_outputs else "FAILED\n", ""
+        return 0, "", ""
+
+    @override
+    async def scp_upload(self, local_file: Path, remote_path: Path) -> None:
+        self.uploads[str(remote_path)] = local_file.read_bytes()
+
+
+def test_slurm_job_run_status() -> None:
+    def job(state: str, return_code: int | None = None) -> SlurmJob:
+        exit_code = ExitCode(status=[], return_code=NumericSlurmValue(number=return_code)) if return_code is not None else None
+        return SlurmJob(job_id=1, name="job", account="acct", batch_flag=True, batch_host="node1", cluster="cluster",
+                        command="job.sbatch", user_name="user", job_state=[state], exit_code=exit_code)
+
+    assert slurm_job_run_status(job("PENDING")) == BiosimSimulationRunStatus.QUEUED
+    assert slurm_job_run_status(job("RUNNING")) == BiosimSimulationRunStatus.RUNNING
+    assert slurm_job_run_status(job("COMPLETED", return_code=0)) == BiosimSimulationRunStatus.SUCCEEDED
+    assert slurm_job_run_status(job("COMPLETED", return_code=1)) == BiosimSimulationRunStatus.FAILED
+    assert slurm_job_run_status(job("TIMEOUT")) == BiosimSimulationRunStatus.FAILED
+
+
+def test_slurm_array_task_ids() -> None:
+    assert _slurm_job(5003, "RUNNING", array_job_id=5000, array_task_id=3).array_task_ids == [3]
+    assert _slurm_job(5000, "PENDING", array_job_id=5000, array_task_string="4-6,9%2").array_task_ids == [4, 5, 6, 9]
+    assert _slurm_job(42, "RUNNING").array_task_ids == []
+
+
+@pytest.mark.asyncio
+async def test_biosim_service_slurm_array(omex_test_file: Path, simulator_version_copasi: BiosimulatorVersion,
+                                          simulator_version_tellurium: BiosimulatorVersion) -> None:
+    ssh_service = _ClusterSSHService()
+    slurm_service = SlurmService(ssh_service=ssh_service)
+    biosim_service = BiosimServiceSlurm(slurm_service=slurm_service, remote_work_dir=Path("work"))
+    # a snapshot taken before the submission does not know the jobs yet
+    await biosim_service.slurm_status_service.refresh()
+
+    sims = [(str(omex_test_file), "model.omex", simulator_version_copasi),
+            (str(omex_test_file), "model.omex", simulator_version_tellurium),
+            (str(omex_test_file), "model.omex", simulator_version_copasi)]
+    sim_runs = await biosim_service.run_biosim_sims(sims, max_concurrent=2)
+    run_name = sim_runs[0].id.split("_")[0]
+    assert [sim_run.id for sim_run in sim_runs] == [f"{run_name}_5000_{task_id}" for task_id in range(3)]
+
+    # one submission for all tasks, the shared archive is uploaded once
+    sbatch_commands = [command for command in ssh_service.commands if command.startswith("sbatch")]
+    assert sbatch_commands == [f"sbatch --parsable --array=0-2%2 work/{run_name}/job.sbatch"]
+    assert sorted(ssh_service.uploads) == [f"work/{run_name}/archive_0.omex", f"work/{run_name}/job.sbatch",
+                                           f"work/{run_name}/runs.json"]
+    script = ssh_service.uploads[f"work/{run_name}/job.sbatch"].decode()
+    assert f"#SBATCH --output=work/{run_name}/task_%a/slurm.out" in script
+    assert "ARCHIVES=(archive_0.omex archive_0.omex archive_0.omex)" in script
+    assert (await biosim_service.get_sim_run(sim_runs[0].id)).status == BiosimSimulationRunStatus.QUEUED
+    assert not any(command.startswith("test -f") for command in ssh_service.commands)
+
+    biosim_service.slurm_status_service.max_staleness_s = 1e-9
+
+    # per-task status from the array records of the squeue snapshot, pending tasks share one record
+    ssh_service.jobs = [_slurm_job(5001, "COMPLETED", array_job_id=5000, array_task_id=0),
+                        _slurm_job(5000, "PENDING", array_job_id=5000, array_task_string="1-2")]
+    statuses = [(await biosim_service.get_sim_run(sim_run.id)).status for sim_run in sim_runs]
+    assert statuses == [BiosimSimulationRunStatus.SUCCEEDED, BiosimSimulationRunStatus.QUEUED,
+                        BiosimSimulationRunStatus.QUEUED]
+
+    # tasks which left the queue report their final state from sacct, or else are resolved from their outputs,
+    # run metadata is recovered from runs.json
+    ssh_service.jobs = []
+    ssh_service.accounting = [{"job_id": 5003, "state": {"current": ["TIMEOUT"]}, "exit_code": None,
+                               "array": {"job_id": 5000, "task_id": {"set": True, "infinite": False, "number": 2}}}]
+    ssh_service.finished_outputs = {f"work/{run_name}/task_1/outputs/reports.h5",
+                                    f"work/{run_name}/task_2/outputs/reports.h5"}
+    other_worker_service = BiosimServiceSlurm(slurm_service=slurm_service, remote_work_dir=Path("work"))
+    sim_run_1 = await other_worker_service.get_sim_run(sim_runs[1].id)
+    assert sim_run_1.status == BiosimSimulationRunStatus.SUCCEEDED
+    assert sim_run_1.simulator_version == simulator_version_tellurium
+    assert (await other_worker_service.get_sim_run(sim_runs[2].id)).status == BiosimSimulationRunStatus.FAILED
+
+
+@pytest.mark.asyncio
+async def test_biosim_service_slurm_imported_runs(simulator_version_copasi: BiosimulatorVersion) -> None:
+    """ runs imported from biosimulations.org are not slurm jobs, they are forwarded to biosimulations.org """
+    imported_run = BiosimSimulationRun(id="61fd573874bc0ce059643515", name="model.omex",
+                                       simulator_version=simulator_version_copasi,
+                                       status=BiosimSimulationRunStatus.SUCCEEDED)
+    ssh_service = _ClusterSSHService()
+    biosim_service = BiosimServiceSlurm(slurm_service=SlurmService(ssh_service=ssh_service),
+                                        biosimulations_service=BiosimServiceMock(sim_runs={imported_run.id: imported_run}),
+                                        remote_work_dir=Path("work"))
+    assert await biosim_service.get_sim_run(imported_run.id) == imported_run
+    assert ssh_service.commands == []
+    assert BiosimServiceSlurm.is_slurm_run_id(f"{'0' * 32}_5000_2")
+    assert not BiosimServiceSlurm.is_slurm_run_id(imported_run.id)
+
+
+@pytest.mark.asyncio
+async def test_biosim_service_slurm_started_by_workers(monkeypatch: pytest.MonkeyPatch) -> None:
+    """ the api creates the service too, the status poller only runs once a worker starts the service """
+    monkeypatch.setattr(get_settings(), "biosim_service_backend", "slurm")
+    biosim_service = create_biosim_service()
+    assert isinstance(biosim_service, BiosimServiceSlurm)
+    assert biosim_service.slurm_status_service._refresh_task is None
+    biosim_service.start()
+    assert biosim_service.slurm_status_service._refresh_task is not None
+    await biosim_service.close()
+    assert biosim_service.slurm_status_service._refresh_task is None
+
+
+def test_container_image(simulator_version_copasi: BiosimulatorVersion) -> None:
+    assert container_image(simulator_version_copasi) == \
+           f"docker://ghcr.io/biosimulators/copasi@{simulator_version_copasi.image_digest}"
+
+
+def test_read_hdf5_reports(fixture_data_dir: Path, tmp_path: Path) -> None:
+    h5_path = tmp_path / "reports.h5"
+    with zipfile.ZipFile(fixture_data_dir / "modeldb-206365-outputs.zip") as outputs_zip:
+        h5_path.write_bytes(outputs_zip.read("outputs/reports.h5"))
+
+    hdf5_file: HDF5File = read_hdf5_file(h5_path=h5_path, file_id="run_id", uri="uri")
+    group_name = "Fig. 2/B/Bazh_PY_altKCC2_Ko_Cli_min_burst_Ko_Cli_fix_NEW.sedml"
+    assert [group.name for group in hdf5_file.groups] == [group_name]
+    report = hdf5_file.datasets[f"{group_name}/report"]
+    assert report.shape == [18, 1001]
+    assert len(report.sedml_labels) == 18
+
+    values = read_hdf5_data(h5_path=h5_path, dataset_name=report.name)
+    assert values.shape == [18, 1001]
+    assert len(values.values) == 18 * 1001
+
+
+@pytest.mark.skipif(len(get_settings().slurm_submit_key) == 0,
+                    reason="slurm ssh key file not supplied")
+@pytest.mark.asyncio
+async def test_biosim_service_slurm(biosim_service_slurm: BiosimServiceSlurm, omex_test_file: Path,
+                                    simulator_version_copasi: BiosimulatorVersion) -> None:
+    sim_run = await biosim_service_slurm.run_biosim_sim(local_omex_path=str(omex_test_file), omex_name=omex_test_file.name,
+                                                        simulator_version=simulator_version_copasi)
+    while sim_run.status not in [BiosimSimulationRunStatus.SUCCEEDED, BiosimSimulationRunStatus.FAILED]:
+        await asyncio.sleep(5)
+        sim_run = await biosim_service_slurm.get_sim_run(sim_run.id)
+    assert sim_run.status == BiosimSimulationRunStatus.SUCCEEDED
+
+    hdf5_file = await biosim_service_slurm.get_hdf5_metadata(sim_run.id)
+    assert len(hdf5_file.datasets) > 0
+    dataset = list(hdf5_file.datasets.values())[0]
+    values = await biosim_service_slurm.get_hdf5_data(sim_run.id, dataset.name)
+    assert values.shape == dataset.shape
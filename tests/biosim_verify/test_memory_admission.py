@@ -0,0 +1,53 @@
+import asyncio
+import math
+
+import pytest
+
+from biosim_server.biosim_verify.memory_admission import estimate_statistics_memory_bytes, MemoryBudget, \
+    MemoryBudgetExceeded
+from biosim_server.biosim_verify.models import VerifyWorkflowOutput
+
+
+def test_estimate_statistics_memory(runs_verify_workflow_output: VerifyWorkflowOutput) -> None:
+    assert runs_verify_workflow_output.workflow_results is not None
+    sim_run_info_list = runs_verify_workflow_output.workflow_results.sims_run_info
+    shapes = [dataset.shape for sim_run_info in sim_run_info_list
+              for dataset in sim_run_info.hdf5_file.datasets.values()]
+    total_values = sum(math.prod(shape) for shape in shapes)
+    largest_values = max(math.prod(shape) for shape in shapes)
+
+    estimate = estimate_statistics_memory_bytes(sim_run_info_list, include_outputs=False)
+    assert estimate == total_values * 32 + largest_values * 48
+    assert estimate_statistics_memory_bytes(sim_run_info_list, include_outputs=True) == estimate + total_values * 24
+    assert estimate_statistics_memory_bytes([], include_outputs=True) == 0
+
+
+@pytest.mark.asyncio
+async def test_memory_budget() -> None:
+    budget = MemoryBudget(capacity_bytes=100)
+    release = asyncio.Event()
+
+    async def hold(nbytes: int) -> None:
+        async with budget.reserve(nbytes, timeout_s=1.0):
+            await release.wait()
+
+    first = asyncio.create_task(hold(60))
+    await asyncio.sleep(0.01)
+    # does not fit next to the first reservation
+    with pytest.raises(MemoryBudgetExceeded):
+        async with budget.reserve(60, timeout_s=0.1):
+            pass
+    async with budget.reserve(40, timeout_s=0.1):
+        assert budget.reserved_bytes == 100 and budget.num_reservations == 2
+
+    # larger than the whole budget, only admitted when nothing else is running
+    with pytest.raises(MemoryBudgetExceeded):
+        async with budget.reserve(500, timeout_s=0.1):
+            pass
+    waiting = asyncio.create_task(hold(500))
+    await asyncio.sleep(0.05)
+    assert budget.num_reservations == 1
+
+    release.set()
+    await asyncio.gather(first, waiting)
+    assert budget.reserved_bytes == 0 and budget.num_reservations == 0
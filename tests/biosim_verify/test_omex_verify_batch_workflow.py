@@ -0,0 +1,51 @@
+import uuid
+
+import pytest
+from temporalio.client import Client
+from temporalio.common import RetryPolicy
+from temporalio.worker import UnsandboxedWorkflowRunner, Worker
+
+from biosim_server.biosim_verify.models import VerifyBatchWorkflowOutput, VerifyWorkflowOutput, VerifyWorkflowStatus
+from biosim_server.biosim_verify.omex_verify_batch_workflow import OmexVerifyBatchArchive, OmexVerifyBatchWorkflow, \
+    OmexVerifyBatchWorkflowInput
+from biosim_server.biosim_verify.omex_verify_workflow import OmexVerifyWorkflowInput
+from biosim_server.config import get_settings
+from biosim_server.worker.worker_main import WORKFLOWS
+from tests.fixtures.verify_activities_mock import VerifyActivitiesMock
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("batch_simulations", [False, True])
+async def test_omex_verify_batch_workflow(temporal_client: Client, omex_verify_workflow_input: OmexVerifyWorkflowInput,
+                                          batch_simulations: bool) -> None:
+    activities_mock = VerifyActivitiesMock(activity_duration_s=0.1)
+    archives = [OmexVerifyBatchArchive(omex_file=omex_verify_workflow_input.omex_file.model_copy(
+                    update={"file_hash_md5": f"hash{i}"}), filenames=[f"model{i}.omex"]) for i in range(5)]
+    batch_input = OmexVerifyBatchWorkflowInput(archives=archives,
+                                               requested_simulators=omex_verify_workflow_input.requested_simulators,
+                                               cache_buster=omex_verify_workflow_input.cache_buster,
+                                               compare_settings=omex_verify_workflow_input.compare_settings,
+                                               max_concurrency=2, batch_simulations=batch_simulations)
+    workflow_id = "omex-batch-verification-" + uuid.uuid4().hex
+    async with Worker(temporal_client, task_queue=get_settings().temporal_task_queue, workflows=WORKFLOWS,
+                      activities=[activities_mock.submit_biosim_simulation_run,
+                                  activities_mock.submit_biosim_simulation_runs,
+                                  activities_mock.get_existing_biosim_simulation_run,
+                                  activities_mock.generate_statistics],
+                      workflow_runner=UnsandboxedWorkflowRunner()):
+        batch_output: VerifyBatchWorkflowOutput = await temporal_client.execute_workflow(
+            OmexVerifyBatchWorkflow.run, args=[batch_input],
+            id=workflow_id, task_queue=get_settings().temporal_task_queue,
+            retry_policy=RetryPolicy(maximum_attempts=1))
+
+        assert batch_output.workflow_status == VerifyWorkflowStatus.COMPLETED
+        assert batch_output.progress.total == 5 and batch_output.progress.completed == 5
+        assert [result.filenames for result in batch_output.archive_results] == [[f"model{i}.omex"] for i in range(5)]
+        assert all(result.workflow_id == f"{workflow_id}-hash{i}" and result.workflow_error is None
+                   for i, result in enumerate(batch_output.archive_results))
+
+        # the full report of each archive is queried from its own workflow
+        archive_output = await temporal_client.get_workflow_handle(batch_output.archive_results[0].workflow_id) \
+            .query("get_output", result_type=VerifyWorkflowOutput)
+        assert archive_output.workflow_status == VerifyWorkflowStatus.COMPLETED
+        assert archive_output.workflow_results is not None
@@ -0,0 +1,159 @@
+import uuid
+from typing import AsyncGenerator
+
+import pytest
+import pytest_asyncio
+from temporalio.client import Client, WorkflowFailureError
+from temporalio.testing import ActivityEnvironment
+from temporalio.worker import UnsandboxedWorkflowRunner, Worker
+
+from biosim_server.biosim_omex import OmexFile
+from biosim_server.biosim_runs import BiosimulatorVersion, GetCachedBiosimSimulationRunsActivityInput, \
+    ListOmexFilesActivityInput, RegressionSweepArchiveResult, SaveRegressionSweepResultsActivityInput, \
+    get_cached_biosim_simulation_runs_activity, list_omex_files_activity, save_regression_sweep_results_activity
+from biosim_server.biosim_verify import CompareSettings, ComparisonStatistics
+from biosim_server.biosim_verify.models import GenerateStatisticsActivityOutput, RegressionSweepOutput, \
+    VerifyWorkflowStatus
+from biosim_server.biosim_verify.regression_sweep_workflow import RegressionSweepWorkflow, \
+    RegressionSweepWorkflowInput, mismatched_datasets
+from biosim_server.config import get_settings
+from biosim_server.dependencies import get_database_service, get_omex_database_service, set_database_service, \
+    set_omex_database_service
+from biosim_server.worker.worker_main import WORKFLOWS
+from tests.fixtures.database_memory import DatabaseServiceMemory
+from tests.fixtures.omex_database_memory import OmexDatabaseServiceMemory
+from tests.fixtures.verify_activities_mock import VerifyActivitiesMock
+
+
+class _Corpus:
+    """ three stored archives, the first two with a cached run of the previous simulator version """
+    omex_files: list[OmexFile]
+    previous_version: BiosimulatorVersion
+    new_version: BiosimulatorVersion
+
+    def __init__(self, activities_mock: VerifyActivitiesMock) -> None:
+        self.previous_version = activities_mock.statistics.sims_run_info[0].biosim_sim_run.simulator_version
+        self.new_version = self.previous_version.model_copy(update={"version": "99.0.0",
+                                                                    "image_digest": "sha256:new"})
+        self.omex_files = []
+
+
+@pytest_asyncio.fixture(scope="function")
+async def corpus() -> AsyncGenerator[_Corpus, None]:
+    saved_database, saved_omex_database = get_database_service(), get_omex_database_service()
+    database, omex_database = DatabaseServiceMemory(), OmexDatabaseServiceMemory()
+    set_database_service(database)
+    set_omex_database_service(omex_database)
+    activities_mock = VerifyActivitiesMock()
+    corpus = _Corpus(activities_mock)
+    for i in range(3):
+        omex_file = await omex_database.insert_omex_file(OmexFile(
+            file_hash_md5=f"hash{i}", uploaded_filename=f"model{i}.omex", bucket_name="bucket",
+            omex_gcs_path=f"verify/omex/hash{i}.omex", file_size=100))
+        corpus.omex_files.append(omex_file)
+        if i < 2:
+            await database.insert_biosimulator_workflow_run(activities_mock.biosim_workflow_run(
+                workflow_id="earlier-verification", omex_file=omex_file, simulator_version=corpus.previous_version,
+                cache_buster=f"imported biosimulations run_id {i}"))
+
+    yield corpus
+
+    set_database_service(saved_database)
+    set_omex_database_service(saved_omex_database)
+
+
+def test_mismatched_datasets() -> None:
+    def stats(is_close: list[bool] | None, error_message: str | None = None) -> ComparisonStatistics:
+        return ComparisonStatistics(dataset_name="d", simulator_version_i="a:1", simulator_version_j="a:2",
+                                    var_names=["x", "y"], is_close=is_close, error_message=error_message)
+    statistics = GenerateStatisticsActivityOutput(sims_run_info=[], comparison_statistics={
+        "close": [[stats([True, True]), stats([True, True])], [stats([True, True]), stats([True, True])]],
+        "not_close": [[stats([True, True]), stats([True, False])], [stats([True, False]), stats([True, True])]],
+        "not_comparable": [[stats([True, True]), stats(None, "shapes differ")],
+                           [stats(None, "shapes differ"), stats([True, True])]]})
+    assert mismatched_datasets(statistics) == ["not_close", "not_comparable"]
+
+
+@pytest.mark.asyncio
+async def test_regression_sweep_activities(corpus: _Corpus) -> None:
+    activity_environment = ActivityEnvironment()
+    first_page = await activity_environment.run(list_omex_files_activity, ListOmexFilesActivityInput(limit=2))
+    assert [omex_file.file_hash_md5 for omex_file in first_page.omex_files] == ["hash0", "hash1"]
+    last_page = await activity_environment.run(list_omex_files_activity, ListOmexFilesActivityInput(
+        after_database_id=first_page.omex_files[-1].database_id, limit=2))
+    assert [omex_file.file_hash_md5 for omex_file in last_page.omex_files] == ["hash2"]
+
+    # cached runs regardless of cache buster, only for the requested simulator version
+    cached_runs = await activity_environment.run(
+        get_cached_biosim_simulation_runs_activity,
+        GetCachedBiosimSimulationRunsActivityInput(file_hashes_md5=["hash0", "hash1", "hash2"],
+                                                   simulator_version=corpus.previous_version))
+    assert sorted(cached_runs.biosim_workflow_runs) == ["hash0", "hash1"]
+    cached_runs = await activity_environment.run(
+        get_cached_biosim_simulation_runs_activity,
+        GetCachedBiosimSimulationRunsActivityInput(file_hashes_md5=["hash0"], simulator_version=corpus.new_version))
+    assert cached_runs.biosim_workflow_runs == {}
+
+    # a retried save replaces the earlier result of the archive
+    result = RegressionSweepArchiveResult(sweep_workflow_id="sweep", file_hash_md5="hash0",
+                                          uploaded_filename="model0.omex", error_message="failed")
+    for _ in range(2):
+        await activity_environment.run(save_regression_sweep_results_activity,
+                                       SaveRegressionSweepResultsActivityInput(results=[result]))
+    database_service = get_database_service()
+    assert database_service is not None
+    assert await database_service.get_regression_sweep_results("sweep") == [result]
+    assert await database_service.get_regression_sweep_results("other-sweep") == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("batch_simulations", [False, True])
+async def test_regression_sweep_workflow(temporal_client: Client, corpus: _Corpus, compare_settings: CompareSettings,
+                                         batch_simulations: bool) -> None:
+    activities_mock = VerifyActivitiesMock()
+    sweep_input = RegressionSweepWorkflowInput(new_simulator_version=corpus.new_version,
+                                               previous_simulator_version=corpus.previous_version,
+                                               compare_settings=compare_settings, page_size=1,
+                                               pages_per_workflow_run=2, max_concurrent_simulations=1,
+                                               batch_simulations=batch_simulations)
+    async with Worker(temporal_client, task_queue=get_settings().temporal_task_queue, workflows=WORKFLOWS,
+                      activities=[activities_mock.submit_biosim_simulation_run,
+                                  activities_mock.submit_biosim_simulation_runs, activities_mock.generate_statistics,
+                                  list_omex_files_activity, get_cached_biosim_simulation_runs_activity,
+                                  save_regression_sweep_results_activity],
+                      workflow_runner=UnsandboxedWorkflowRunner()):
+        workflow_id = "regression-sweep-" + uuid.uuid4().hex
+        sweep_output: RegressionSweepOutput = await temporal_client.execute_workflow(
+            RegressionSweepWorkflow.run, args=[sweep_input], id=workflow_id,
+            task_queue=get_settings().temporal_task_queue)
+
+    assert sweep_output.workflow_status == VerifyWorkflowStatus.COMPLETED
+    # two pages per workflow run, the third archive is swept after continue-as-new
+    assert sweep_output.num_workflow_runs == 2
+    assert sweep_output.archives_swept == 3
+    assert sweep_output.archives_without_previous_run == 1
+    assert sweep_output.num_failures == 0
+    assert sweep_output.archives_equivalent + sweep_output.num_regressions == 2
+    assert sweep_output.last_database_id == corpus.omex_files[-1].database_id
+
+    # the regressions are stored rather than carried from one workflow run to the next
+    assert sweep_output.regressions == [] and sweep_output.failures == []
+    database_service = get_database_service()
+    assert database_service is not None
+    stored_results = await database_service.get_regression_sweep_results(workflow_id)
+    assert len(stored_results) == sweep_output.num_regressions
+    assert all(len(result.mismatched_datasets) > 0 for result in stored_results)
+
+
+@pytest.mark.asyncio
+async def test_regression_sweep_workflow_page_size(temporal_client: Client, corpus: _Corpus,
+                                                   compare_settings: CompareSettings) -> None:
+    sweep_input = RegressionSweepWorkflowInput(new_simulator_version=corpus.new_version,
+                                               previous_simulator_version=corpus.previous_version,
+                                               compare_settings=compare_settings, page_size=0)
+    async with Worker(temporal_client, task_queue=get_settings().temporal_task_queue, workflows=WORKFLOWS,
+                      activities=[list_omex_files_activity], workflow_runner=UnsandboxedWorkflowRunner()):
+        with pytest.raises(WorkflowFailureError):
+            await temporal_client.execute_workflow(
+                RegressionSweepWorkflow.run, args=[sweep_input], id="regression-sweep-" + uuid.uuid4().hex,
+                task_queue=get_settings().temporal_task_queue)
@@ -101,6 +101,11 @@ def assert_runs_verify_results(observed_results: VerifyWorkflowOutput,
     expected_results.workflow_id = observed_results.workflow_id
     expected_results.workflow_run_id = observed_results.workflow_run_id
     expected_results.timestamp = observed_results.timestamp
+    # durations vary between runs, check that the stages were recorded
+    assert observed_results.stage_timings is not None
+    observed_stages = {stage_timing.stage for stage_timing in observed_results.stage_timings}
+    assert {"run_import", "data_fetch", "compare", "generate_statistics"} <= observed_stages
+    expected_results.stage_timings = observed_results.stage_timings
     if expected_results.workflow_results and observed_results.workflow_results:
         for i in range(len(expected_results.workflow_results.sims_run_info)):
             expected_biosim_sim_run = expected_results.workflow_results.sims_run_info[i].biosim_sim_run
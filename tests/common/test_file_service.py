@@ -32,6 +32,14 @@ async def test_file_service_local(file_service_local: FileServiceLocal) -> None:
         content = f.read()
         assert content == expected_file_content
 
+    # stream the file
+    assert b"".join([chunk async for chunk in file_service.iter_file_contents(gcs_path)]) == expected_file_content
+
+    # list the file
+    listing = await file_service.get_listing("some/gcs")
+    assert gcs_path in [item.Key for item in listing]
+    assert [item async for item in file_service.iter_listing("some/gcs")] == listing
+
     os.remove(orig_file_path)
     os.remove(new_file_path)
 
@@ -64,3 +72,15 @@ async def test_file_service_gcs(file_service_gcs: FileServiceGCS,
 
     os.remove(orig_file_path)
     os.remove(new_file_path)
+
+
+@pytest.mark.asyncio
+async def test_file_service_gcs_pooled_client() -> None:
+    file_service = FileServiceGCS()
+    client = file_service.client
+    assert file_service.client is client
+    session = client.session.session
+    assert not session.closed
+
+    await file_service.close()
+    assert session.closed
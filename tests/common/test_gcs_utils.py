@@ -1,11 +1,16 @@
+import hashlib
 import os
+import uuid
 from datetime import datetime
 from pathlib import Path
 
 import pytest
 from gcloud.aio.auth import Token
 
-from biosim_server.common.storage import ListingItem, get_gcs_modified_date, download_gcs_file, get_listing_of_gcs_path
+from biosim_server.common.storage import ListingItem, get_gcs_modified_date, download_gcs_file, get_listing_of_gcs_path, \
+    download_gcs_file_parallel, upload_file_to_gcs_parallel, create_storage_client, close_storage_client, \
+    iter_listing_of_gcs_path, get_gcs_md5_hash
+from biosim_server.common.storage.gcs_aio import chunk_ranges
 from biosim_server.config import get_settings
 
 ROOT_DIR = Path(__file__).parent.parent.parent
@@ -47,3 +52,38 @@ async def test_get_listing_of_gcs_path(gcs_token: Token) -> None:
     files = await get_listing_of_gcs_path(gcs_path=GCS_PATH, token=gcs_token)
     assert len(files) > 0
     assert type(files[0]) is ListingItem
+
+    # a page size of 1 forces the iterator to follow nextPageToken for every item
+    paged_files = [item async for item in iter_listing_of_gcs_path(gcs_path=GCS_PATH, token=gcs_token, page_size=1)]
+    assert paged_files == files
+
+
+def test_chunk_ranges() -> None:
+    assert chunk_ranges(size=10, chunk_size=4) == [(0, 3), (4, 7), (8, 9)]
+    assert chunk_ranges(size=8, chunk_size=4) == [(0, 3), (4, 7)]
+    assert chunk_ranges(size=0, chunk_size=4) == []
+
+
+@pytest.mark.skipif(len(get_settings().storage_gcs_credentials_file) == 0,
+                    reason="gcs_credentials.json file not supplied")
+@pytest.mark.asyncio
+async def test_parallel_upload_download(temp_test_data_dir: Path, gcs_token: Token) -> None:
+    # 70 chunks of 1 KB forces more than one round of compose
+    expected_contents = os.urandom(70 * 1024 + 17)
+    local_path = temp_test_data_dir / "parallel_upload.bin"
+    local_path.write_bytes(expected_contents)
+    gcs_path = f"verify_test/test_parallel_upload_download/{uuid.uuid4().hex}.bin"
+
+    client = create_storage_client(token=gcs_token)
+    await upload_file_to_gcs_parallel(file_path=local_path, gcs_path=gcs_path, token=gcs_token, client=client,
+                                      threshold=0, chunk_size=1024, max_concurrency=8)
+    download_path = temp_test_data_dir / "parallel_download.bin"
+    await download_gcs_file_parallel(gcs_path=gcs_path, file_path=download_path, token=gcs_token, client=client,
+                                     threshold=0, chunk_size=4096, max_concurrency=8)
+    assert download_path.read_bytes() == expected_contents
+    # the composed object has no md5Hash of its own, the md5 is recorded at upload
+    assert await get_gcs_md5_hash(gcs_path=gcs_path, token=gcs_token, client=client) == \
+           hashlib.md5(expected_contents).hexdigest()
+
+    await client.delete(bucket=get_settings().storage_bucket, object_name=gcs_path)
+    await close_storage_client(client)
@@ -0,0 +1,90 @@
+import asyncio
+import hashlib
+import os
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import pytest
+
+from biosim_server.common.storage import LocalFileCache
+
+
+@pytest.mark.asyncio
+async def test_local_file_cache(tmp_path: Path) -> None:
+    cache = LocalFileCache(cache_dir=tmp_path / "omex_cache", max_bytes=250)
+    contents = {f"file{i}": os.urandom(100) for i in range(3)}
+    hashes = {name: hashlib.md5(data).hexdigest() for name, data in contents.items()}
+    fetch_count: dict[str, int] = {name: 0 for name in contents}
+
+    def fetcher(name: str) -> Callable[[Path], Awaitable[None]]:
+        async def fetch(temp_path: Path) -> None:
+            fetch_count[name] += 1
+            await asyncio.sleep(0.01)
+            temp_path.write_bytes(contents[name])
+        return fetch
+
+    # concurrent requests for the same key share one download
+    paths = await asyncio.gather(*[cache.get_or_fetch(hashes["file0"], fetcher("file0")) for _ in range(5)])
+    assert fetch_count["file0"] == 1
+    assert all(path.read_bytes() == contents["file0"] for path in paths)
+
+    # the copy is independent of the cache entry
+    dest_path = tmp_path / "copy.omex"
+    await cache.copy_to(hashes["file0"], fetcher("file0"), dest_path=dest_path)
+    dest_path.unlink()
+    assert cache.entry_path(hashes["file0"]).exists()
+    assert fetch_count["file0"] == 1
+
+    # adding a third 100 byte entry evicts the least recently used to stay under 250 bytes
+    await cache.get_or_fetch(hashes["file1"], fetcher("file1"))
+    os.utime(cache.entry_path(hashes["file1"]), (0, 0))
+    await cache.get_or_fetch(hashes["file2"], fetcher("file2"))
+    assert not cache.entry_path(hashes["file1"]).exists()
+    assert cache.entry_path(hashes["file0"]).exists()
+    assert cache.entry_path(hashes["file2"]).exists()
+
+    # downloads which don't match the content hash are rejected and not cached
+    with pytest.raises(IOError):
+        await cache.get_or_fetch(hashes["file1"], fetcher("file0"))
+    assert not cache.entry_path(hashes["file1"]).exists()
+    assert [p.name for p in cache.cache_dir.iterdir() if p.name.startswith(".tmp_")] == []
+
+
+@pytest.mark.asyncio
+async def test_local_file_cache_lock_handoff(tmp_path: Path) -> None:
+    cache = LocalFileCache(cache_dir=tmp_path / "omex_cache", max_bytes=1000)
+    contents = os.urandom(100)
+    file_hash_md5 = hashlib.md5(contents).hexdigest()
+    running = 0
+    max_running = 0
+    second_fetch_started = asyncio.Event()
+    release_second_fetch = asyncio.Event()
+
+    async def failing_fetch(temp_path: Path) -> None:
+        await asyncio.sleep(0.01)
+        raise IOError("download failed")
+
+    async def blocked_fetch(temp_path: Path) -> None:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        second_fetch_started.set()
+        await release_second_fetch.wait()
+        temp_path.write_bytes(contents)
+        running -= 1
+
+    # the second request waits for the lock while the first download fails, then downloads itself
+    first = asyncio.create_task(cache.get_or_fetch(file_hash_md5, failing_fetch))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(cache.get_or_fetch(file_hash_md5, blocked_fetch))
+    with pytest.raises(IOError):
+        await first
+    await second_fetch_started.wait()
+
+    # a third request arriving during the second download must wait for it rather than download concurrently
+    third = asyncio.create_task(cache.get_or_fetch(file_hash_md5, blocked_fetch))
+    await asyncio.sleep(0.01)
+    release_second_fetch.set()
+    assert (await second) == (await third) == cache.entry_path(file_hash_md5)
+    assert max_running == 1
+    assert cache._locks == {} and cache._lock_users == {}
@@ -1,10 +1,16 @@
+import asyncio
+import json
 import uuid
 from pathlib import Path
+from typing import Any
 
 import pytest
+from typing_extensions import override
 
 from biosim_server.common.hpc.models import SlurmJob
 from biosim_server.common.hpc.slurm_service import SlurmService
+from biosim_server.common.hpc.slurm_status import SlurmStatusService
+from biosim_server.common.ssh.ssh_service import SSHService
 from biosim_server.config import get_settings
 
 
@@ -41,4 +47,101 @@ async def test_slurm_job_submit(slurm_service: SlurmService, slurm_template_hell
     assert submitted_job[0].job_id == job_id
     assert submitted_job[0].name == "my_test_job"
 
-    local_sbatch_file.unlink()
\ No newline at end of file
+    local_sbatch_file.unlink()
+
+
+class _SqueueSSHService(SSHService):
+    """ answers squeue with a fixed job list (and sacct with fixed accounting records) instead of running them
+    on a login node """
+    jobs: list[SlurmJob]
+    accounting: list[dict[str, Any]]
+    commands: list[str]
+
+    def __init__(self, jobs: list[SlurmJob]):
+        super().__init__(hostname="localhost", username="testuser", key_path=Path("key"))
+        self.jobs = jobs
+        self.accounting = []
+        self.commands = []
+
+    @override
+    async def run_command(self, command: str, idempotent: bool = True) -> tuple[int, str, str]:
+        self.commands.append(command)
+        await asyncio.sleep(0.01)
+        if command.startswith("sacct"):
+            job_ids = {int(job_id) for job_id in command.split()[-1].split(",")}
+            return 0, json.dumps({"jobs": [job for job in self.accounting
+                                           if job["job_id"] in job_ids or job["array"]["job_id"] in job_ids]}), ""
+        return 0, json.dumps({"jobs": [job.model_dump() for job in self.jobs]}), ""
+
+
+def _sacct_record(job_id: int, state: str, array_job_id: int = 0, array_task_id: int | None = None) -> dict[str, Any]:
+    """ the parts of a 'sacct --json' job record which are read (layout of slurm 23.x) """
+    return {"job_id": job_id, "name": f"job{job_id}", "account": "acct", "cluster": "cluster", "nodes": "node1",
+            "user": "testuser", "submit_line": "sbatch job.sbatch", "state": {"current": [state], "reason": "None"},
+            "exit_code": {"status": ["EXITED"] if state == "COMPLETED" else ["ERROR"],
+                          "return_code": {"set": True, "infinite": False, "number": 0 if state == "COMPLETED" else 1}},
+            "array": {"job_id": array_job_id,
+                      "task_id": {"set": array_task_id is not None, "infinite": False, "number": array_task_id}}}
+
+
+@pytest.mark.asyncio
+async def test_slurm_status_snapshot() -> None:
+    jobs = [SlurmJob(job_id=job_id, name=f"job{job_id}", account="acct", batch_flag=True, batch_host="node1",
+                     cluster="cluster", command="job.sbatch", user_name="testuser", job_state=["RUNNING"])
+            for job_id in range(100, 110)]
+    ssh_service = _SqueueSSHService(jobs=jobs)
+    slurm_status_service = SlurmStatusService(slurm_service=SlurmService(ssh_service=ssh_service),
+                                              max_staleness_s=60, refresh_interval_s=60)
+
+    # many concurrent per-job lookups are served by a single squeue call for all of our jobs
+    results = await asyncio.gather(*[slurm_status_service.get_job(job_id) for job_id in range(100, 111)])
+    assert results == jobs + [None]
+    # the job missing from squeue is looked up in the accounting (unknown there as well)
+    assert ssh_service.commands == ["squeue --json --user=testuser", "sacct --json -j 110"]
+    assert await slurm_status_service.get_jobs([100, 200]) == {100: jobs[0], 200: None}
+    assert slurm_status_service.refresh_count == 1
+
+    # lookups older than the staleness bound trigger a new snapshot
+    ssh_service.jobs = [jobs[0].model_copy(update={"job_state": ["COMPLETED"]})]
+    slurm_status_service.max_staleness_s = 0.0
+    job = await slurm_status_service.get_job(100)
+    assert job is not None and job.job_state == ["COMPLETED"]
+    assert await slurm_status_service.get_job(101) is None
+    assert slurm_status_service.refresh_count == 3
+
+    # background refresh keeps the snapshot current without lookups
+    slurm_status_service.max_staleness_s = 60
+    slurm_status_service.refresh_interval_s = 0.01
+    slurm_status_service.start()
+    await asyncio.sleep(0.1)
+    await slurm_status_service.close()
+    assert slurm_status_service.refresh_count > 4
+
+
+@pytest.mark.asyncio
+async def test_slurm_status_finished_jobs() -> None:
+    jobs = [SlurmJob(job_id=job_id, name=f"job{job_id}", account="acct", batch_flag=True, batch_host="node1",
+                     cluster="cluster", command="job.sbatch", user_name="testuser", job_state=["RUNNING"])
+            for job_id in (100, 101)]
+    ssh_service = _SqueueSSHService(jobs=jobs)
+    slurm_status_service = SlurmStatusService(slurm_service=SlurmService(ssh_service=ssh_service),
+                                              max_staleness_s=60, refresh_interval_s=60)
+    slurm_status_service.max_staleness_s = 0.0
+    assert await slurm_status_service.get_job(100) == jobs[0]
+    assert await slurm_status_service.get_array_task(array_job_id=200, array_task_id=1) is None
+
+    # jobs which left squeue report their final state from sacct
+    ssh_service.jobs = []
+    ssh_service.accounting = [_sacct_record(100, "TIMEOUT"),
+                              _sacct_record(201, "OUT_OF_MEMORY", array_job_id=200, array_task_id=1)]
+    job = await slurm_status_service.get_job(100)
+    assert job is not None and job.job_state == ["TIMEOUT"]
+    assert job.exit_code is not None and job.exit_code.return_code.number == 1
+    task = await slurm_status_service.get_array_task(array_job_id=200, array_task_id=1)
+    assert task is not None and task.job_state == ["OUT_OF_MEMORY"]
+    assert "sacct --json -j 100,200" in ssh_service.commands
+
+    # finished jobs are not looked up again
+    num_commands = len(ssh_service.commands)
+    assert await slurm_status_service.get_job(100) == job
+    assert ssh_service.commands[num_commands:] == ["squeue --json --user=testuser"]
@@ -1,7 +1,13 @@
+import asyncio
+import os
 import uuid
 from pathlib import Path
+from typing import Any, AsyncGenerator
 
+import asyncssh
 import pytest
+import pytest_asyncio
+from typing_extensions import override
 
 from biosim_server.common.ssh.ssh_service import SSHService
 from biosim_server.config import get_settings
@@ -40,3 +46,174 @@ async def test_scp_upload_download(ssh_service: SSHService) -> None:
     local_path_2.unlink()
 
 
+class _LocalConnection:
+    """ in-process stand-in for an SSHClientConnection, runs nothing remotely """
+    closed: bool
+    lose_connection: bool
+
+    def __init__(self) -> None:
+        self.closed = False
+        self.lose_connection = False
+
+    async def run(self, command: str, check: bool) -> asyncssh.SSHCompletedProcess:
+        await asyncio.sleep(0.01)
+        if self.lose_connection:
+            self.closed = True
+            raise asyncssh.ConnectionLost("connection lost")
+        return asyncssh.SSHCompletedProcess(command=command, exit_status=0, returncode=0, stdout=command, stderr="")
+
+    def is_closed(self) -> bool:
+        return self.closed
+
+    def close(self) -> None:
+        self.closed = True
+
+    async def wait_closed(self) -> None:
+        pass
+
+
+@pytest.mark.asyncio
+async def test_ssh_connection_pool(monkeypatch: pytest.MonkeyPatch) -> None:
+    connections: list[_LocalConnection] = []
+
+    async def connect(**kwargs: Any) -> _LocalConnection:
+        connections.append(_LocalConnection())
+        return connections[-1]
+    monkeypatch.setattr(asyncssh, "connect", connect)
+
+    ssh_service = SSHService(hostname="localhost", username="user", key_path=Path("key"),
+                             max_connections=2, max_channels_per_connection=3, idle_timeout_s=60)
+
+    # concurrent commands are multiplexed as channels, opening at most max_connections connections
+    results = await asyncio.gather(*[ssh_service.run_command(f"echo {i}") for i in range(10)])
+    assert [stdout for _, stdout, _ in results] == [f"echo {i}" for i in range(10)]
+    assert len(connections) == 2
+
+    # sequential commands reuse an existing connection
+    await ssh_service.run_command("squeue")
+    assert len(connections) == 2
+
+    # a connection lost mid-command is discarded and the command is retried on another connection
+    connections[0].lose_connection = True
+    assert await ssh_service.run_command("hostname") == (0, "hostname", "")
+    assert len(connections) == 2
+
+    # unless the command is not idempotent, it may have run before the connection was lost
+    connections[1].lose_connection = True
+    with pytest.raises(asyncssh.ConnectionLost):
+        await ssh_service.run_command("sbatch job.sh", idempotent=False)
+    assert len(connections) == 2 and connections[1].closed
+
+    # connections closed by the peer are replaced by a new connection
+    connections[1].close()
+    assert await ssh_service.run_command("hostname") == (0, "hostname", "")
+    assert len(connections) == 3
+
+    await ssh_service.close()
+    assert all(conn.closed for conn in connections)
+
+
+@pytest.mark.asyncio
+async def test_ssh_connection_pool_idle(monkeypatch: pytest.MonkeyPatch) -> None:
+    connections: list[_LocalConnection] = []
+
+    async def connect(**kwargs: Any) -> _LocalConnection:
+        connections.append(_LocalConnection())
+        return connections[-1]
+    monkeypatch.setattr(asyncssh, "connect", connect)
+
+    # idle connections are closed in the background, without another command
+    ssh_service = SSHService(hostname="localhost", username="user", key_path=Path("key"), idle_timeout_s=0.05)
+    await ssh_service.run_command("hostname")
+    assert not connections[0].closed
+    await asyncio.sleep(0.2)
+    assert connections[0].closed and ssh_service._reaper_task is None
+    await ssh_service.run_command("hostname")
+    assert len(connections) == 2 and ssh_service._reaper_task is not None
+    await ssh_service.close()
+    assert connections[1].closed and ssh_service._reaper_task is None
+
+    # an explicit 0 is not replaced by the settings, connections are then closed once unused
+    ssh_service = SSHService(hostname="localhost", username="user", key_path=Path("key"), idle_timeout_s=0)
+    assert ssh_service.idle_timeout_s == 0
+    await ssh_service.run_command("hostname")
+    assert len(connections) == 3 and connections[2].closed
+    with pytest.raises(ValueError):
+        SSHService(hostname="localhost", username="user", key_path=Path("key"), max_connections=0)
+
+
+async def _run_locally(process: asyncssh.SSHServerProcess[str]) -> None:
+    assert process.command is not None
+    proc = await asyncio.create_subprocess_shell(process.command, stdout=asyncio.subprocess.PIPE,
+                                                 stderr=asyncio.subprocess.PIPE)
+    stdout, stderr = await proc.communicate()
+    process.stdout.write(stdout.decode())
+    process.stderr.write(stderr.decode())
+    process.exit(proc.returncode or 0)
+
+
+class _AcceptAllServer(asyncssh.SSHServer):
+    def begin_auth(self, username: str) -> bool:
+        return True
+
+    def public_key_auth_supported(self) -> bool:
+        return True
+
+    def validate_public_key(self, username: str, key: asyncssh.SSHKey) -> bool:
+        return True
+
+
+class _LocalSSHService(SSHService):
+    """ connects to the in-process sftp server, whose host key is generated per test """
+    port: int
+    client_key: asyncssh.SSHKey
+
+    def __init__(self, port: int, compression: bool):
+        super().__init__(hostname="127.0.0.1", username="user", key_path=Path("unused"), compression=compression)
+        self.port = port
+        self.client_key = asyncssh.generate_private_key("ssh-ed25519")
+
+    @override
+    def _connect_options(self) -> dict[str, Any]:
+        return super()._connect_options() | dict(port=self.port, known_hosts=None, client_keys=[self.client_key])
+
+
+@pytest_asyncio.fixture(scope="function")
+async def local_sftp_port() -> AsyncGenerator[int, None]:
+    server = await asyncssh.listen("127.0.0.1", 0, server_host_keys=[asyncssh.generate_private_key("ssh-ed25519")],
+                                   server_factory=_AcceptAllServer, sftp_factory=True, process_factory=_run_locally)
+    yield server.sockets[0].getsockname()[1]
+    server.close()
+    await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_ssh_download_many(local_sftp_port: int, tmp_path: Path) -> None:
+    remote_dir = tmp_path / "remote"
+    (remote_dir / "array" / "task_1" / "outputs").mkdir(parents=True)
+    remote_files = {remote_dir / f"report_{i}.h5": os.urandom(300_000 * (i + 1)) for i in range(4)}
+    remote_files[remote_dir / "array" / "task_0.log"] = b"task 0"
+    remote_files[remote_dir / "array" / "task_1" / "outputs" / "reports.h5"] = os.urandom(1000)
+    for remote_file, contents in remote_files.items():
+        remote_file.write_bytes(contents)
+
+    ssh_service = _LocalSSHService(port=local_sftp_port, compression=True)
+    local_dir = tmp_path / "local"
+    transfers = [(remote_dir / f"report_{i}.h5", local_dir / f"run_{i}" / "reports.h5") for i in range(4)]
+    transfers.append((remote_dir / "array", local_dir / "array"))
+    await ssh_service.download_many(transfers=transfers, verify_md5=True)
+
+    for remote_file, contents in remote_files.items():
+        if remote_file.parent == remote_dir:
+            local_file = local_dir / f"run_{remote_file.stem.split('_')[1]}" / "reports.h5"
+        else:
+            local_file = local_dir / remote_file.relative_to(remote_dir)
+        assert local_file.read_bytes() == contents
+    assert len(ssh_service._connections) <= ssh_service.max_connections
+
+    # a local copy which no longer matches the remote file fails the integrity check
+    (local_dir / "array" / "task_0.log").write_bytes(b"corrupted")
+    with pytest.raises(IOError):
+        await ssh_service._verify_md5(transfers)
+
+    await ssh_service.close()
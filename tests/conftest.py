@@ -1,3 +1,12 @@
+import os
+import shutil
+import tempfile
+
+# the omex, slurm result and mock gcs files of the tests are cached in a temporary directory rather than in the
+# ./local_cache default within the repository, set before the fixtures below read the settings
+TEST_LOCAL_CACHE_DIR = tempfile.mkdtemp(prefix="biosim_test_cache_")
+os.environ["STORAGE_LOCAL_CACHE_DIR"] = TEST_LOCAL_CACHE_DIR
+
 import pytest  # noqa: F401
 import pytest_asyncio  # noqa: F401
 from _pytest.config.argparsing import Parser
@@ -46,6 +55,7 @@ from tests.fixtures.slurm_fixtures import (  # noqa: F401
     slurm_service,
     ssh_service,
     slurm_template_hello,
+    biosim_service_slurm,
 )
 
 
@@ -58,4 +68,8 @@ def pytest_addoption(parser: Parser) -> None:
         help="Specify the workflow environment"
     )
 
+
+def pytest_sessionfinish(session: pytest.Session, exitstatus: int) -> None:
+    shutil.rmtree(TEST_LOCAL_CACHE_DIR, ignore_errors=True)
+
 # If you need to redefine or extend any fixtures, you can do so here.
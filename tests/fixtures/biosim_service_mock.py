@@ -1,5 +1,6 @@
 import logging
 import uuid
+from typing import AsyncIterator
 
 from typing_extensions import override
 
@@ -53,6 +54,23 @@ class BiosimServiceMock(BiosimService):
         self.sim_runs[sim_id] = sim_run
         return sim_run
 
+    @override
+    async def run_biosim_sim_stream(self, omex_stream: AsyncIterator[bytes], omex_name: str,
+                                    simulator_version: BiosimulatorVersion) -> BiosimSimulationRun:
+        num_bytes = 0
+        async for chunk in omex_stream:
+            num_bytes += len(chunk)
+        logger.info(f"Submitting MOCK simulation for {omex_name} streamed {num_bytes} bytes with simulator {simulator_version.id}")
+        sim_id = "mock_"+str(uuid.uuid4().hex)
+        sim_run = BiosimSimulationRun(
+            id=sim_id,
+            name=omex_name,
+            simulator_version=simulator_version,
+            status=BiosimSimulationRunStatus.RUNNING
+        )
+        self.sim_runs[sim_id] = sim_run
+        return sim_run
+
     @override
     async def get_hdf5_metadata(self, simulation_run_id: str) -> HDF5File:
         hdf5_file = self.hdf5_files[simulation_run_id]
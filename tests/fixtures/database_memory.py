@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import uuid
+
+from typing_extensions import override
+
+from biosim_server.biosim_runs import BiosimulatorWorkflowRun, DatabaseService
+from biosim_server.biosim_runs.models import RegressionSweepArchiveResult
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseServiceMemory(DatabaseService):
+    sim_workflow_runs: dict[str, BiosimulatorWorkflowRun]
+    sweep_results: dict[tuple[str, str], RegressionSweepArchiveResult]  # by (sweep_workflow_id, file_hash_md5)
+    latency_s: float
+
+    def __init__(self, latency_s: float = 0.0) -> None:
+        self.sim_workflow_runs = {}
+        self.sweep_results = {}
+        self.latency_s = latency_s
+
+    @override
+    async def insert_biosimulator_workflow_run(self, sim_workflow_run: BiosimulatorWorkflowRun) -> BiosimulatorWorkflowRun:
+        if sim_workflow_run.database_id is not None:
+            raise Exception("Cannot insert document that already has a database id")
+        await asyncio.sleep(self.latency_s)
+        inserted_sim_workflow_run = sim_workflow_run.model_copy(deep=True)
+        inserted_sim_workflow_run.database_id = uuid.uuid4().hex
+        # like mongodb, the stage timings of the activity are not stored
+        self.sim_workflow_runs[inserted_sim_workflow_run.database_id] = \
+            inserted_sim_workflow_run.model_copy(update={"stage_timings": None})
+        return inserted_sim_workflow_run
+
+    @override
+    async def get_biosimulator_workflow_runs(self, file_hash_md5: str, image_digest: str, cache_buster: str) \
+            -> list[BiosimulatorWorkflowRun]:
+        await asyncio.sleep(self.latency_s)
+        return [run.model_copy(deep=True) for run in self.sim_workflow_runs.values()
+                if run.file_hash_md5 == file_hash_md5 and run.image_digest == image_digest
+                and run.cache_buster == cache_buster]
+
+    @override
+    async def get_biosimulator_workflow_runs_for_files(self, file_hashes_md5: list[str], image_digest: str) \
+            -> list[BiosimulatorWorkflowRun]:
+        await asyncio.sleep(self.latency_s)
+        return [run.model_copy(deep=True) for run in self.sim_workflow_runs.values()
+                if run.file_hash_md5 in file_hashes_md5 and run.image_digest == image_digest]
+
+    @override
+    async def get_biosimulator_workflow_runs_by_biosim_runid(self, biosim_run_id: str) -> list[BiosimulatorWorkflowRun]:
+        await asyncio.sleep(self.latency_s)
+        return [run.model_copy(deep=True) for run in self.sim_workflow_runs.values()
+                if run.biosim_run is not None and run.biosim_run.id == biosim_run_id]
+
+    @override
+    async def delete_biosimulator_workflow_run(self, database_id: str) -> None:
+        if database_id not in self.sim_workflow_runs:
+            raise Exception("Delete failed")
+        del self.sim_workflow_runs[database_id]
+
+    @override
+    async def delete_all_biosimulator_workflow_runs(self) -> None:
+        self.sim_workflow_runs.clear()
+
+    @override
+    async def save_regression_sweep_results(self, results: list[RegressionSweepArchiveResult]) -> None:
+        await asyncio.sleep(self.latency_s)
+        for result in results:
+            self.sweep_results[(result.sweep_workflow_id, result.file_hash_md5)] = result.model_copy(deep=True)
+
+    @override
+    async def get_regression_sweep_results(self, sweep_workflow_id: str) -> list[RegressionSweepArchiveResult]:
+        await asyncio.sleep(self.latency_s)
+        return [result.model_copy(deep=True) for (workflow_id, _), result in self.sweep_results.items()
+                if workflow_id == sweep_workflow_id]
+
+    @override
+    async def close(self) -> None:
+        pass
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import shutil
 import uuid
@@ -5,7 +6,7 @@ from temporalio import workflow
 with workflow.unsafe.imports_passed_through():
     from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 
 import aiofiles
 from typing_extensions import override
@@ -36,7 +37,8 @@ class FileServiceLocal(FileService):
         shutil.rmtree(self.BASE_DIR)
 
     @override
-    async def download_file(self, gcs_path: str, file_path: Optional[Path]=None) -> tuple[str, str]:
+    async def download_file(self, gcs_path: str, file_path: Optional[Path]=None,
+                            file_hash_md5: Optional[str]=None) -> tuple[str, str]:
         logger.info(f"Downloading {gcs_path} to {file_path}")
         if file_path is None:
             file_path = get_local_cache_dir() / ("temp_file_"+uuid.uuid4().hex)
@@ -81,6 +83,13 @@ class FileServiceLocal(FileService):
         gcs_file_path = self.BASE_DIR / gcs_path
         return datetime.fromtimestamp(gcs_file_path.stat().st_mtime)
 
+    @override
+    async def get_object_hash(self, gcs_path: str) -> str | None:
+        gcs_file_path = self.BASE_DIR / gcs_path
+        if not gcs_file_path.exists():
+            return None
+        return hashlib.md5(gcs_file_path.read_bytes()).hexdigest()
+
     @override
     async def get_listing(self, gcs_path: str) -> List[ListingItem]:
         # get the listing of the directory in mock gcs
@@ -89,6 +98,20 @@ class FileServiceLocal(FileService):
                             LastModified=datetime.fromtimestamp(file.stat().st_mtime), ETag=generate_fake_etag(file))
                 for file in gcs_dir_path.rglob("*")]
 
+    @override
+    async def iter_listing(self, gcs_path: str) -> AsyncIterator[ListingItem]:
+        gcs_dir_path = self.BASE_DIR / gcs_path
+        for file in gcs_dir_path.rglob("*"):
+            yield ListingItem(Key=str(file.relative_to(self.BASE_DIR)), Size=file.stat().st_size,
+                              LastModified=datetime.fromtimestamp(file.stat().st_mtime), ETag=generate_fake_etag(file))
+
+    @override
+    async def iter_file_contents(self, gcs_path: str) -> AsyncIterator[bytes]:
+        gcs_file_path = self.BASE_DIR / gcs_path
+        async with aiofiles.open(gcs_file_path, mode='rb') as f:
+            while chunk := await f.read(64 * 1024):
+                yield chunk
+
     @override
     async def get_file_contents(self, gcs_path: str) -> bytes | None:
         # get the file contents from mock gcs
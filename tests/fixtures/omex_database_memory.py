@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import uuid
+
+from typing_extensions import override
+
+from biosim_server.biosim_omex import OmexDatabaseService, OmexFile
+
+logger = logging.getLogger(__name__)
+
+
+class OmexDatabaseServiceMemory(OmexDatabaseService):
+    omex_files: dict[str, OmexFile]
+    get_count: int
+    latency_s: float
+
+    def __init__(self, latency_s: float = 0.0) -> None:
+        self.omex_files = {}
+        self.get_count = 0
+        self.latency_s = latency_s
+
+    @override
+    async def insert_omex_file(self, omex_file: OmexFile) -> OmexFile:
+        if omex_file.database_id is not None:
+            raise Exception("Cannot insert document that already has a database id")
+        inserted_omex_file = omex_file.model_copy(deep=True)
+        inserted_omex_file.database_id = uuid.uuid4().hex
+        self.omex_files[inserted_omex_file.database_id] = inserted_omex_file
+        return inserted_omex_file.model_copy(deep=True)
+
+    @override
+    async def get_omex_file(self, file_hash_md5: str) -> OmexFile | None:
+        self.get_count += 1
+        await asyncio.sleep(self.latency_s)
+        for omex_file in self.omex_files.values():
+            if omex_file.file_hash_md5 == file_hash_md5:
+                return omex_file.model_copy(deep=True)
+        return None
+
+    @override
+    async def delete_omex_file(self, database_id: str) -> None:
+        if database_id not in self.omex_files:
+            raise Exception("Delete failed")
+        del self.omex_files[database_id]
+
+    @override
+    async def delete_all_omex_files(self) -> None:
+        self.omex_files.clear()
+
+    @override
+    async def list_omex_files(self) -> list[OmexFile]:
+        return [omex_file.model_copy(deep=True) for omex_file in self.omex_files.values()]
+
+    @override
+    async def list_omex_files_page(self, after_database_id: str | None, limit: int) -> list[OmexFile]:
+        database_ids = list(self.omex_files)
+        start = database_ids.index(after_database_id) + 1 if after_database_id is not None else 0
+        return [self.omex_files[database_id].model_copy(deep=True) for database_id in database_ids[start:start + limit]]
+
+    @override
+    async def close(self) -> None:
+        pass
@@ -4,6 +4,7 @@ from pathlib import Path
 import pytest
 import pytest_asyncio
 
+from biosim_server.biosim_runs.biosim_service_slurm import BiosimServiceSlurm
 from biosim_server.common.hpc.slurm_service import SlurmService
 from biosim_server.common.ssh.ssh_service import SSHService
 from biosim_server.config import get_settings
@@ -25,6 +26,13 @@ async def slurm_service(ssh_service: SSHService) -> AsyncGenerator[SlurmService]
     # slurm_service.close()  # nothing to close, ssh_session is closed in ssh_service.close()
 
 
+@pytest_asyncio.fixture(scope="function")
+async def biosim_service_slurm(slurm_service: SlurmService) -> AsyncGenerator[BiosimServiceSlurm]:
+    biosim_service = BiosimServiceSlurm(slurm_service=slurm_service)
+    yield biosim_service
+    await biosim_service.slurm_status_service.close()  # ssh_service is closed by its own fixture
+
+
 @pytest.fixture(scope="session")
 def slurm_template_hello() -> str:
     template = \
@@ -7,9 +7,12 @@ from temporalio.testing import WorkflowEnvironment
 from temporalio.worker import Worker, UnsandboxedWorkflowRunner
 
 from biosim_server.biosim_runs import get_existing_biosim_simulation_run_activity, \
-    submit_biosim_simulation_run_activity, OmexSimWorkflow
+    submit_biosim_simulation_run_activity, submit_biosim_simulation_runs_activity, OmexSimWorkflow, \
+    list_omex_files_activity, get_cached_biosim_simulation_runs_activity, save_regression_sweep_results_activity
 from biosim_server.biosim_verify.activities import generate_statistics_activity
+from biosim_server.biosim_verify.omex_verify_batch_workflow import OmexVerifyBatchWorkflow
 from biosim_server.biosim_verify.omex_verify_workflow import OmexVerifyWorkflow
+from biosim_server.biosim_verify.regression_sweep_workflow import RegressionSweepWorkflow
 from biosim_server.biosim_verify.runs_verify_workflow import RunsVerifyWorkflow
 from biosim_server.common.temporal import pydantic_data_converter
 from biosim_server.dependencies import get_temporal_client, set_temporal_client
@@ -45,9 +48,12 @@ async def temporal_verify_worker(temporal_client: Client) -> AsyncGenerator[Work
     async with Worker(
             temporal_client,
             task_queue="verification_tasks",
-            workflows=[OmexVerifyWorkflow, OmexSimWorkflow, RunsVerifyWorkflow],
+            workflows=[OmexVerifyWorkflow, OmexSimWorkflow, RunsVerifyWorkflow, OmexVerifyBatchWorkflow,
+                       RegressionSweepWorkflow],
             activities=[generate_statistics_activity, get_existing_biosim_simulation_run_activity,
-                        submit_biosim_simulation_run_activity],
+                        submit_biosim_simulation_run_activity, submit_biosim_simulation_runs_activity,
+                        list_omex_files_activity, get_cached_biosim_simulation_runs_activity,
+                        save_regression_sweep_results_activity],
             debug_mode=True,
             workflow_runner=UnsandboxedWorkflowRunner()
     ) as worker:
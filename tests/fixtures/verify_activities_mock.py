@@ -0,0 +1,80 @@
+import asyncio
+import uuid
+from pathlib import Path
+
+from temporalio import activity
+
+from biosim_server.biosim_omex import OmexFile
+from biosim_server.biosim_runs import BiosimSimulationRunStatus, BiosimulatorVersion, BiosimulatorWorkflowRun, \
+    GetExistingBiosimSimulationRunActivityInput, get_existing_biosim_simulation_run_activity, \
+    submit_biosim_simulation_run_activity, submit_biosim_simulation_runs_activity
+from biosim_server.biosim_runs.activities import GetExistingBiosimSimulationRunActivityOutput, \
+    SubmitBiosimSimulationRunActivityInput, SubmitBiosimSimulationRunsActivityInput, \
+    SubmitBiosimSimulationRunsActivityOutput
+from biosim_server.biosim_verify.models import GenerateStatisticsActivityInput, GenerateStatisticsActivityOutput, \
+    VerifyWorkflowOutput
+
+LOCAL_DATA_DIR = Path(__file__).parent / "local_data"
+
+
+class VerifyActivitiesMock:
+    """ activities with the names of the verification activities which return canned results after
+    activity_duration_s, the results have the size of those of the real activities """
+    activity_duration_s: float
+    statistics: GenerateStatisticsActivityOutput
+
+    def __init__(self, activity_duration_s: float = 0.0) -> None:
+        self.activity_duration_s = activity_duration_s
+        expected_output = VerifyWorkflowOutput.model_validate_json(
+            (LOCAL_DATA_DIR / "OmexVerifyWorkflowOutput_expected.json").read_text())
+        assert expected_output.workflow_results is not None
+        self.statistics = expected_output.workflow_results
+
+    def biosim_workflow_run(self, workflow_id: str, omex_file: OmexFile, simulator_version: BiosimulatorVersion,
+                             cache_buster: str) -> BiosimulatorWorkflowRun:
+        template = next((info for info in self.statistics.sims_run_info
+                         if info.biosim_sim_run.simulator_version.id == simulator_version.id),
+                        self.statistics.sims_run_info[0])
+        run_id = uuid.uuid4().hex
+        return BiosimulatorWorkflowRun(
+            workflow_id=workflow_id, file_hash_md5=omex_file.file_hash_md5, image_digest=simulator_version.image_digest,
+            cache_buster=cache_buster, omex_file=omex_file, simulator_version=simulator_version,
+            biosim_run=template.biosim_sim_run.model_copy(update={"id": run_id,
+                                                                  "simulator_version": simulator_version}),
+            hdf5_file=template.hdf5_file.model_copy(update={"id": run_id}))
+
+    @activity.defn(name=submit_biosim_simulation_run_activity.__name__)
+    async def submit_biosim_simulation_run(self, input: SubmitBiosimSimulationRunActivityInput) \
+            -> BiosimulatorWorkflowRun:
+        await asyncio.sleep(self.activity_duration_s)
+        return self.biosim_workflow_run(workflow_id=input.workflow_id, omex_file=input.omex_file,
+                                         simulator_version=input.simulator_version, cache_buster=input.cache_buster)
+
+    @activity.defn(name=submit_biosim_simulation_runs_activity.__name__)
+    async def submit_biosim_simulation_runs(self, input: SubmitBiosimSimulationRunsActivityInput) \
+            -> SubmitBiosimSimulationRunsActivityOutput:
+        await asyncio.sleep(self.activity_duration_s)
+        return SubmitBiosimSimulationRunsActivityOutput(biosim_workflow_runs=[
+            self.biosim_workflow_run(workflow_id=input.workflow_id, omex_file=omex_file,
+                                     simulator_version=simulator_version, cache_buster=input.cache_buster)
+            for omex_file, simulator_version in input.simulations])
+
+    @activity.defn(name=get_existing_biosim_simulation_run_activity.__name__)
+    async def get_existing_biosim_simulation_run(self, input: GetExistingBiosimSimulationRunActivityInput) \
+            -> GetExistingBiosimSimulationRunActivityOutput:
+        await asyncio.sleep(self.activity_duration_s)
+        sims_run_info = self.statistics.sims_run_info
+        template = sims_run_info[sum(input.biosim_run_id.encode()) % len(sims_run_info)]
+        omex_file = OmexFile(file_hash_md5=input.biosim_run_id, uploaded_filename="archive.omex", file_size=100,
+                             omex_gcs_path=f"simulations/{input.biosim_run_id}/archive.omex", bucket_name="bucket")
+        biosim_workflow_run = self.biosim_workflow_run(
+            workflow_id=input.workflow_id, omex_file=omex_file,
+            simulator_version=template.biosim_sim_run.simulator_version, cache_buster="0")
+        return GetExistingBiosimSimulationRunActivityOutput(status=BiosimSimulationRunStatus.SUCCEEDED,
+                                                            biosim_workflow_run=biosim_workflow_run)
+
+    @activity.defn(name="generate_statistics_activity")
+    async def generate_statistics(self, gen_stats_input: GenerateStatisticsActivityInput) \
+            -> GenerateStatisticsActivityOutput:
+        await asyncio.sleep(self.activity_duration_s)
+        return self.statistics.model_copy(update={"sims_run_info": gen_stats_input.sim_run_info_list})
@@ -0,0 +1,267 @@
+import argparse
+import asyncio
+import logging
+import math
+import os
+import random
+import resource
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from httpx import ASGITransport, AsyncClient
+from pydantic import BaseModel
+from temporalio.client import Client
+from temporalio.testing import WorkflowEnvironment
+
+from biosim_server.api.main import app
+from biosim_server.biosim_runs import BiosimServiceRest
+from biosim_server.biosim_verify.models import VerifyWorkflowOutput, VerifyWorkflowStatus
+from biosim_server.common.temporal import pydantic_data_converter
+from biosim_server.config import get_settings
+from biosim_server.dependencies import get_biosim_service, get_database_service, get_file_service, \
+    get_omex_database_service, get_temporal_client, set_biosim_service, set_database_service, set_file_service, \
+    set_omex_database_service, set_temporal_client
+from biosim_server.worker.worker_main import create_workers, run_workers
+from tests.fixtures.database_memory import DatabaseServiceMemory
+from tests.fixtures.omex_database_memory import OmexDatabaseServiceMemory
+from tests.load.stand_in_services import FileServiceLocalLatency, StandInConfig, StandInServer
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+LOCAL_DATA_DIR = Path(__file__).parent.parent / "fixtures" / "local_data"
+
+
+class LoadConfig(BaseModel):
+    num_requests: int = 50
+    concurrency: int = 10  # requests in flight, each one is submitted and then polled until its workflow is done
+    omex_fraction: float = 0.5  # the rest are /verify/runs requests
+    simulators: list[str] = ["copasi", "tellurium"]
+    unique_simulations: bool = True  # a new cache_buster per /verify/omex request, otherwise the runs are cached
+    run_id_pool_size: int = 10  # completed runs drawn from by /verify/runs, the first import of each is a cache miss
+    poll_interval_s: float = 1.0
+    request_timeout_s: float = 600.0
+    stand_in: StandInConfig = StandInConfig()
+
+
+class RequestResult(BaseModel):
+    endpoint: str
+    workflow_id: Optional[str] = None
+    workflow_status: Optional[VerifyWorkflowStatus] = None
+    submit_latency_s: float
+    completion_latency_s: Optional[float] = None
+    error: Optional[str] = None
+
+
+class LatencySummary(BaseModel):
+    count: int
+    p50_s: float
+    p99_s: float
+    max_s: float
+
+
+class LoadReport(BaseModel):
+    config: LoadConfig
+    duration_s: float
+    completed: int
+    failed: int
+    throughput_per_s: float  # completed workflows per second
+    submit_latency: dict[str, LatencySummary]  # by endpoint, time to the response of the POST
+    completion_latency: dict[str, LatencySummary]  # by endpoint, time until the workflow reported it was done
+    errors: dict[str, int]
+    cpu_s: float  # user + system time of this process (api, workers and stand-ins), not of the temporal server
+    max_rss_mb: float
+    stand_in_requests: dict[str, int]
+    stand_in_failures: dict[str, int]
+
+
+def percentile(values: list[float], q: float) -> float:
+    """ nearest-rank percentile, q in [0, 100] """
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(results: list[RequestResult], attribute: str) -> dict[str, LatencySummary]:
+    summaries: dict[str, LatencySummary] = {}
+    for endpoint in sorted({result.endpoint for result in results}):
+        values = [getattr(result, attribute) for result in results
+                  if result.endpoint == endpoint and getattr(result, attribute) is not None]
+        if values:
+            summaries[endpoint] = LatencySummary(count=len(values), p50_s=percentile(values, 50),
+                                                 p99_s=percentile(values, 99), max_s=max(values))
+    return summaries
+
+
+@contextmanager
+def _stand_in_settings(base_url: str) -> Iterator[None]:
+    settings = get_settings()
+    saved = {name: getattr(settings, name) for name in
+             ("simdata_api_base_url", "biosimulations_api_base_url", "biosimulators_api_base_url")}
+    saved_api_base_url = os.environ.get("API_BASE_URL")
+    for name in saved:
+        setattr(settings, name, base_url)
+    os.environ["API_BASE_URL"] = base_url  # read by BiosimServiceRest.get_sim_run
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(settings, name, value)
+        if saved_api_base_url is None:
+            os.environ.pop("API_BASE_URL", None)
+        else:
+            os.environ["API_BASE_URL"] = saved_api_base_url
+
+
+async def _verify(test_client: AsyncClient, config: LoadConfig, endpoint: str,
+                  params: dict[str, Any], files: dict[str, Any] | None) -> RequestResult:
+    start = time.monotonic()
+    try:
+        response = await test_client.post(endpoint, params=params, files=files)
+        submit_latency_s = time.monotonic() - start
+        if response.status_code != 200:
+            return RequestResult(endpoint=endpoint, submit_latency_s=submit_latency_s,
+                                 error=f"POST status {response.status_code}")
+        output = VerifyWorkflowOutput.model_validate_json(response.content)
+        while not output.workflow_status.is_done:
+            if time.monotonic() - start > config.request_timeout_s:
+                return RequestResult(endpoint=endpoint, workflow_id=output.workflow_id,
+                                     workflow_status=output.workflow_status, submit_latency_s=submit_latency_s,
+                                     error="timeout")
+            await asyncio.sleep(config.poll_interval_s)
+            response = await test_client.get(f"/verify/{output.workflow_id}")
+            if response.status_code == 200:
+                output = VerifyWorkflowOutput.model_validate_json(response.content)
+        return RequestResult(endpoint=endpoint, workflow_id=output.workflow_id, workflow_status=output.workflow_status,
+                             submit_latency_s=submit_latency_s, completion_latency_s=time.monotonic() - start,
+                             error=None if output.workflow_status == VerifyWorkflowStatus.COMPLETED
+                             else f"workflow {output.workflow_status.value}")
+    except Exception as e:
+        return RequestResult(endpoint=endpoint, submit_latency_s=time.monotonic() - start, error=type(e).__name__)
+
+
+async def run_load(config: LoadConfig, temporal_client: Client) -> LoadReport:
+    """ drive concurrent /verify/omex and /verify/runs traffic through the api and workers of this process, backed by
+    the stand-in services and the in-memory databases """
+    stand_in = StandInServer(config.stand_in, hdf5_json_file=LOCAL_DATA_DIR / "hdf5_file.json")
+    base_url = await stand_in.start()
+    file_service = FileServiceLocalLatency(stand_in)
+    file_service.init()
+    omex_test_file = LOCAL_DATA_DIR / "BIOMD0000000010_tellurium_Negative_feedback_and_ultrasen.omex"
+    omex_contents = omex_test_file.read_bytes()
+    saved_services = (get_temporal_client(), get_file_service(), get_database_service(), get_omex_database_service(),
+                      get_biosim_service())
+    set_temporal_client(temporal_client)
+    set_file_service(file_service)
+    set_database_service(DatabaseServiceMemory(latency_s=config.stand_in.latency_s))
+    set_omex_database_service(OmexDatabaseServiceMemory(latency_s=config.stand_in.latency_s))
+    set_biosim_service(BiosimServiceRest())
+
+    stop_workers = asyncio.Event()
+    workers_task: asyncio.Task[None] | None = None
+    try:
+        with _stand_in_settings(base_url):
+            workers_task = asyncio.create_task(run_workers(create_workers(temporal_client), stop_workers))
+
+            # completed runs (and their archives) for /verify/runs
+            simulator_versions = await BiosimServiceRest().get_simulator_versions()
+            run_simulators = [sv for sv in simulator_versions if sv.id in config.simulators]
+            run_ids: list[str] = []
+            for i in range(config.run_id_pool_size):
+                run_id = stand_in.add_completed_run(run_simulators[i % len(run_simulators)])
+                await file_service.upload_bytes(omex_contents, gcs_path=f"simulations/{run_id}/archive.omex")
+                run_ids.append(run_id)
+
+            rng = random.Random(config.stand_in.seed)
+            semaphore = asyncio.Semaphore(config.concurrency)
+
+            async def one_request(test_client: AsyncClient) -> RequestResult:
+                async with semaphore:
+                    if rng.random() < config.omex_fraction:
+                        cache_buster = uuid.uuid4().hex if config.unique_simulations else "0"
+                        return await _verify(test_client, config, "/verify/omex",
+                                             params={"simulators": config.simulators, "cache_buster": cache_buster},
+                                             files={"uploaded_file": (omex_test_file.name, omex_contents,
+                                                                      "application/zip")})
+                    return await _verify(test_client, config, "/verify/runs",
+                                         params={"biosimulations_run_ids": rng.sample(run_ids, 2)}, files=None)
+
+            usage_before = resource.getrusage(resource.RUSAGE_SELF)
+            start = time.monotonic()
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://load",
+                                   timeout=config.request_timeout_s) as test_client:
+                results = await asyncio.gather(*[one_request(test_client) for _ in range(config.num_requests)])
+            duration_s = time.monotonic() - start
+            usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    finally:
+        stop_workers.set()
+        if workers_task is not None:
+            await workers_task
+        await stand_in.stop()
+        await file_service.close()
+        set_temporal_client(saved_services[0])
+        set_file_service(saved_services[1])
+        set_database_service(saved_services[2])
+        set_omex_database_service(saved_services[3])
+        set_biosim_service(saved_services[4])
+
+    completed = [result for result in results if result.error is None]
+    errors: dict[str, int] = {}
+    for result in results:
+        if result.error is not None:
+            errors[result.error] = errors.get(result.error, 0) + 1
+    return LoadReport(
+        config=config, duration_s=duration_s, completed=len(completed), failed=len(results) - len(completed),
+        throughput_per_s=len(completed) / duration_s,
+        submit_latency=summarize(list(results), "submit_latency_s"),
+        completion_latency=summarize(completed, "completion_latency_s"),
+        errors=errors,
+        cpu_s=(usage_after.ru_utime + usage_after.ru_stime) - (usage_before.ru_utime + usage_before.ru_stime),
+        max_rss_mb=usage_after.ru_maxrss / 1024,  # kilobytes on linux
+        stand_in_requests=dict(stand_in.request_counts), stand_in_failures=dict(stand_in.failure_counts))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the api and workers against stand-in services, e.g. "
+                                                 "python -m tests.load.load_harness --requests 200 --concurrency 20")
+    parser.add_argument("--requests", type=int, default=LoadConfig().num_requests)
+    parser.add_argument("--concurrency", type=int, default=LoadConfig().concurrency)
+    parser.add_argument("--omex-fraction", type=float, default=LoadConfig().omex_fraction)
+    parser.add_argument("--cached-simulations", action="store_true", help="reuse simulation runs across requests")
+    parser.add_argument("--latency", type=float, default=StandInConfig().latency_s)
+    parser.add_argument("--jitter", type=float, default=StandInConfig().latency_jitter_s)
+    parser.add_argument("--failure-rate", type=float, default=StandInConfig().failure_rate)
+    parser.add_argument("--sim-failure-rate", type=float, default=StandInConfig().sim_failure_rate)
+    parser.add_argument("--queue-s", type=float, default=StandInConfig().queue_s)
+    parser.add_argument("--run-s", type=float, default=StandInConfig().run_s)
+    parser.add_argument("--temporal", default="", help="address of a temporal server, default: start a dev server")
+    parser.add_argument("--report", default="", help="also write the json report to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    config = LoadConfig(num_requests=args.requests, concurrency=args.concurrency, omex_fraction=args.omex_fraction,
+                        unique_simulations=not args.cached_simulations,
+                        stand_in=StandInConfig(latency_s=args.latency, latency_jitter_s=args.jitter,
+                                               failure_rate=args.failure_rate, sim_failure_rate=args.sim_failure_rate,
+                                               queue_s=args.queue_s, run_s=args.run_s))
+    if args.temporal:
+        env = WorkflowEnvironment.from_client(await Client.connect(args.temporal,
+                                                                   data_converter=pydantic_data_converter))
+    else:
+        env = await WorkflowEnvironment.start_local(data_converter=pydantic_data_converter)
+    try:
+        report = await run_load(config, env.client)
+    finally:
+        await env.shutdown()
+
+    report_json = report.model_dump_json(indent=2)
+    print(report_json)
+    if args.report:
+        Path(args.report).write_text(report_json)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
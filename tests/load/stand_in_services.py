@@ -0,0 +1,218 @@
+import asyncio
+import json
+import logging
+import math
+import random
+import re
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from aiohttp import web
+from pydantic import BaseModel
+from typing_extensions import override
+
+from biosim_server.biosim_runs import BiosimSimulationRunStatus, BiosimulatorVersion, HDF5File
+from tests.fixtures.biosim_service_mock import BiosimServiceMock
+from tests.fixtures.file_service_local import FileServiceLocal
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class StandInConfig(BaseModel):
+    latency_s: float = 0.05  # added to every stand-in call (http request, storage or database operation)
+    latency_jitter_s: float = 0.02  # uniformly distributed on top of latency_s
+    failure_rate: float = 0.0  # fraction of http requests answered with 503
+    queue_s: float = 1.0  # time a submitted simulation run stays QUEUED
+    run_s: float = 2.0  # then RUNNING, then SUCCEEDED
+    sim_failure_rate: float = 0.0  # fraction of submitted simulation runs which end FAILED
+    seed: int = 42
+
+
+class _StandInRun(BaseModel):
+    id: str
+    name: str
+    simulator_version: BiosimulatorVersion
+    submitted_at: float
+    fails: bool
+
+    def status(self, config: StandInConfig) -> BiosimSimulationRunStatus:
+        elapsed_s = time.monotonic() - self.submitted_at
+        if elapsed_s < config.queue_s:
+            return BiosimSimulationRunStatus.QUEUED
+        if elapsed_s < config.queue_s + config.run_s:
+            return BiosimSimulationRunStatus.RUNNING
+        return BiosimSimulationRunStatus.FAILED if self.fails else BiosimSimulationRunStatus.SUCCEEDED
+
+
+class StandInServer:
+    """ one local http server standing in for api.biosimulations.org (/runs), api.biosimulators.org (/simulators)
+    and simdata (/datasets), every simulation run reports the datasets of the hdf5 fixture with the same values """
+    config: StandInConfig
+    request_counts: Counter[str]
+    failure_counts: Counter[str]
+    base_url: str
+
+    def __init__(self, config: StandInConfig, hdf5_json_file: Path) -> None:
+        self.config = config
+        self.request_counts = Counter()
+        self.failure_counts = Counter()
+        self.base_url = ""
+        self._random = random.Random(config.seed)
+        self._runs: dict[str, _StandInRun] = {}
+        self._hdf5_template = HDF5File.model_validate_json(hdf5_json_file.read_text())
+        self._dataset_json: dict[str, bytes] = {}
+        self._simulator_versions: list[BiosimulatorVersion] = []
+        self._runner: web.AppRunner | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._simulator_versions = await BiosimServiceMock().get_simulator_versions()
+        app = web.Application(middlewares=[self._inject_latency_and_failures])
+        app.router.add_get("/simulators", self._get_simulators)
+        app.router.add_post("/runs", self._post_run)
+        app.router.add_get("/runs/{run_id}", self._get_run)
+        app.router.add_get("/datasets/{run_id}/metadata", self._get_metadata)
+        app.router.add_get("/datasets/{run_id}/data", self._get_data)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host=host, port=port)
+        await site.start()
+        bound_port = self._runner.addresses[0][1]
+        self.base_url = f"http://{host}:{bound_port}"
+        logger.info(f"stand-in services listening on {self.base_url}")
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def add_completed_run(self, simulator_version: BiosimulatorVersion) -> str:
+        """ a run which already SUCCEEDED, e.g. for /verify/runs """
+        run_id = uuid.uuid4().hex
+        self._runs[run_id] = _StandInRun(id=run_id, name=f"{run_id}.omex", simulator_version=simulator_version,
+                                         submitted_at=time.monotonic() - self.config.queue_s - self.config.run_s,
+                                         fails=False)
+        return run_id
+
+    async def delay(self) -> None:
+        await asyncio.sleep(self.config.latency_s + self._random.uniform(0, self.config.latency_jitter_s))
+
+    @web.middleware
+    async def _inject_latency_and_failures(self, request: web.Request,
+                                           handler: Callable[[web.Request], Awaitable[web.StreamResponse]]) \
+            -> web.StreamResponse:
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        operation = f"{request.method} {route}"
+        self.request_counts[operation] += 1
+        await self.delay()
+        if self._random.random() < self.config.failure_rate:
+            self.failure_counts[operation] += 1
+            return web.json_response({"error": "injected failure"}, status=503)
+        return await handler(request)
+
+    def _run_json(self, run: _StandInRun) -> dict[str, str]:
+        return {"id": run.id, "name": run.name, "simulator": run.simulator_version.id,
+                "simulatorVersion": run.simulator_version.version,
+                "simulatorDigest": run.simulator_version.image_digest, "status": run.status(self.config).value}
+
+    async def _get_simulators(self, request: web.Request) -> web.Response:
+        return web.json_response([
+            {"id": sv.id, "name": sv.name, "version": sv.version,
+             "image": {"url": sv.image_url, "digest": sv.image_digest},
+             "biosimulators": {"created": sv.created, "updated": sv.updated}}
+            for sv in self._simulator_versions])
+
+    async def _post_run(self, request: web.Request) -> web.Response:
+        parts = _parse_form_parts(await request.read(), request.headers.get("Content-Type", ""))
+        if "simulationRun" not in parts or not parts.get("file"):
+            return web.json_response({"error": "file and simulationRun are required"}, status=400)
+        simulation_run_request: dict[str, str] = json.loads(parts["simulationRun"])
+        simulator_version = next((sv for sv in self._simulator_versions
+                                  if sv.id == simulation_run_request["simulator"]
+                                  and sv.version == simulation_run_request["simulatorVersion"]), None)
+        if simulator_version is None:
+            return web.json_response({"error": "unknown simulator"}, status=400)
+        run = _StandInRun(id=uuid.uuid4().hex, name=simulation_run_request["name"],
+                          simulator_version=simulator_version, submitted_at=time.monotonic(),
+                          fails=self._random.random() < self.config.sim_failure_rate)
+        self._runs[run.id] = run
+        return web.json_response(self._run_json(run), status=201)
+
+    async def _get_run(self, request: web.Request) -> web.Response:
+        run = self._runs.get(request.match_info["run_id"])
+        if run is None:
+            return web.json_response({"error": "run not found"}, status=404)
+        return web.json_response(self._run_json(run))
+
+    async def _get_metadata(self, request: web.Request) -> web.Response:
+        run_id = request.match_info["run_id"]
+        if run_id not in self._runs:
+            return web.json_response({"error": "run not found"}, status=404)
+        hdf5_file = self._hdf5_template.model_copy(update={"id": run_id, "uri": f"{self.base_url}/{run_id}/reports.h5"})
+        return web.Response(body=hdf5_file.model_dump_json(), content_type="application/json")
+
+    async def _get_data(self, request: web.Request) -> web.Response:
+        dataset_name = request.query.get("dataset_name", "")
+        dataset = self._hdf5_template.datasets.get(dataset_name)
+        if request.match_info["run_id"] not in self._runs or dataset is None:
+            return web.json_response({"error": "dataset not found"}, status=404)
+        if dataset_name not in self._dataset_json:
+            # identical values for every run, so every comparison succeeds
+            num_values = math.prod(dataset.shape)
+            values = [math.sin(0.01 * i) + 1.0 for i in range(num_values)]
+            self._dataset_json[dataset_name] = json.dumps({"shape": dataset.shape, "values": values}).encode()
+        return web.Response(body=self._dataset_json[dataset_name], content_type="application/json")
+
+
+def _parse_form_parts(body: bytes, content_type: str) -> dict[str, bytes]:
+    """ fields of a multipart body by name, parsed by hand because the rest client labels every part
+    multipart/form-data (as api.biosimulations.org accepts) which aiohttp's reader takes for nested multiparts """
+    match = re.search(r'boundary="?([^";]+)"?', content_type)
+    if match is None:
+        return {}
+    parts: dict[str, bytes] = {}
+    for chunk in body.split(b"--" + match.group(1).encode())[1:-1]:
+        headers, _, content = chunk[2:-2].partition(b"\r\n\r\n")
+        name = re.search(rb'name="([^"]*)"', headers)
+        if name is not None:
+            parts[name.group(1).decode()] = content
+    return parts
+
+
+class FileServiceLocalLatency(FileServiceLocal):
+    """ the local file service in its own directory, adding the stand-in latency to the calls made by the workflows """
+    stand_in: StandInServer
+
+    def __init__(self, stand_in: StandInServer) -> None:
+        self.stand_in = stand_in
+        self.BASE_DIR = self.BASE_DIR_PARENT / ("load_" + uuid.uuid4().hex)
+
+    @override
+    async def download_file(self, gcs_path: str, file_path: Optional[Path] = None,
+                            file_hash_md5: Optional[str] = None) -> tuple[str, str]:
+        await self.stand_in.delay()
+        return await super().download_file(gcs_path=gcs_path, file_path=file_path, file_hash_md5=file_hash_md5)
+
+    @override
+    async def upload_bytes(self, file_contents: bytes, gcs_path: str) -> str:
+        await self.stand_in.delay()
+        return await super().upload_bytes(file_contents=file_contents, gcs_path=gcs_path)
+
+    @override
+    async def get_object_hash(self, gcs_path: str) -> str | None:
+        await self.stand_in.delay()
+        return await super().get_object_hash(gcs_path=gcs_path)
+
+    @override
+    async def iter_file_contents(self, gcs_path: str) -> AsyncIterator[bytes]:
+        await self.stand_in.delay()
+        async for chunk in super().iter_file_contents(gcs_path=gcs_path):
+            yield chunk
+
+    @override
+    async def get_file_contents(self, gcs_path: str) -> bytes | None:
+        await self.stand_in.delay()
+        return await super().get_file_contents(gcs_path=gcs_path)
@@ -0,0 +1,69 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from aiohttp import ClientResponseError
+from temporalio.client import Client
+
+from biosim_server.biosim_runs import BiosimServiceRest, BiosimSimulationRunStatus, BiosimulatorVersion
+from biosim_server.config import get_settings
+from tests.load.load_harness import LoadConfig, percentile, run_load
+from tests.load.stand_in_services import StandInConfig, StandInServer
+
+
+def test_percentile() -> None:
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([3.0], 99) == 3.0
+
+
+@pytest.mark.asyncio
+async def test_stand_in_services(hdf5_json_test_file: Path, omex_test_file: Path,
+                                 simulator_version_copasi: BiosimulatorVersion,
+                                 monkeypatch: pytest.MonkeyPatch) -> None:
+    stand_in = StandInServer(StandInConfig(latency_s=0.0, latency_jitter_s=0.0, queue_s=0.0, run_s=0.2),
+                             hdf5_json_file=hdf5_json_test_file)
+    base_url = await stand_in.start()
+    try:
+        settings = get_settings()
+        for name in ("simdata_api_base_url", "biosimulations_api_base_url", "biosimulators_api_base_url"):
+            monkeypatch.setattr(settings, name, base_url)
+        monkeypatch.setenv("API_BASE_URL", base_url)
+        biosim_service = BiosimServiceRest()
+
+        # the rest client works unchanged against the stand-ins
+        simulator_versions = await biosim_service.get_simulator_versions()
+        simulator_version = next(sv for sv in simulator_versions if sv.id == simulator_version_copasi.id
+                                 and sv.version == simulator_version_copasi.version)
+        sim_run = await biosim_service.run_biosim_sim(local_omex_path=str(omex_test_file), omex_name="test.omex",
+                                                      simulator_version=simulator_version)
+        assert (await biosim_service.get_sim_run(sim_run.id)).status == BiosimSimulationRunStatus.RUNNING
+        await asyncio.sleep(0.3)
+        assert (await biosim_service.get_sim_run(sim_run.id)).status == BiosimSimulationRunStatus.SUCCEEDED
+
+        hdf5_file = await biosim_service.get_hdf5_metadata(sim_run.id)
+        assert hdf5_file.id == sim_run.id
+        dataset = hdf5_file.groups[0].datasets[0]
+        data = await biosim_service.get_hdf5_data(sim_run.id, dataset_name=dataset.name)
+        assert data.shape == dataset.shape
+        assert stand_in.request_counts["POST /runs"] == 1
+
+        # injected failures surface as http errors
+        stand_in.config.failure_rate = 1.0
+        with pytest.raises(ClientResponseError) as exc_info:
+            await biosim_service.get_hdf5_metadata(sim_run.id)
+        assert exc_info.value.status == 503
+        assert stand_in.failure_counts["GET /datasets/{run_id}/metadata"] == 1
+    finally:
+        await stand_in.stop()
+
+
+@pytest.mark.asyncio
+async def test_load_harness(temporal_client: Client) -> None:
+    config = LoadConfig(num_requests=4, concurrency=2, poll_interval_s=0.5, request_timeout_s=120,
+                        stand_in=StandInConfig(latency_s=0.01, queue_s=0.5, run_s=0.5))
+    report = await run_load(config, temporal_client)
+    assert report.completed == 4, report.errors
+    assert report.throughput_per_s > 0
+    assert sum(summary.count for summary in report.completion_latency.values()) == 4
@@ -0,0 +1,47 @@
+import pytest
+from google.protobuf.timestamp_pb2 import Timestamp
+from temporalio.api.enums.v1 import EventType
+from temporalio.api.history.v1 import ActivityTaskCompletedEventAttributes, ActivityTaskStartedEventAttributes, \
+    HistoryEvent
+from temporalio.client import Client
+
+from tests.load.workflow_benchmark import BenchmarkConfig, _history_stats, run_benchmark
+
+
+def _event(event_id: int, event_type: EventType.ValueType, time_s: float, **attributes: object) -> HistoryEvent:
+    return HistoryEvent(event_id=event_id, event_type=event_type,
+                        event_time=Timestamp(seconds=int(time_s), nanos=int(round(time_s % 1 * 1e9))),
+                        **attributes)  # type: ignore[arg-type]
+
+
+def test_history_stats() -> None:
+    events = [
+        _event(1, EventType.EVENT_TYPE_WORKFLOW_EXECUTION_STARTED, 100.0),
+        _event(5, EventType.EVENT_TYPE_ACTIVITY_TASK_SCHEDULED, 100.25),
+        _event(6, EventType.EVENT_TYPE_ACTIVITY_TASK_STARTED, 100.5,
+               activity_task_started_event_attributes=ActivityTaskStartedEventAttributes(scheduled_event_id=5)),
+        _event(7, EventType.EVENT_TYPE_ACTIVITY_TASK_COMPLETED, 101.0,
+               activity_task_completed_event_attributes=ActivityTaskCompletedEventAttributes(scheduled_event_id=5)),
+        _event(11, EventType.EVENT_TYPE_WORKFLOW_EXECUTION_COMPLETED, 101.5),
+    ]
+    stats = _history_stats(events)
+    assert stats.num_events == 5
+    assert stats.num_bytes == sum(event.ByteSize() for event in events)
+    assert stats.latency_s == pytest.approx(1.5)
+    assert stats.activity_schedule_to_start_s == [pytest.approx(0.25)]
+    assert stats.activity_round_trip_s == [pytest.approx(0.75)]
+    assert stats.child_workflow_ids == []
+
+
+@pytest.mark.asyncio
+async def test_workflow_benchmark(temporal_client: Client) -> None:
+    report = await run_benchmark(BenchmarkConfig(num_workflows=3, activity_duration_s=0.1), temporal_client)
+    omex_benchmark, omex_batch_benchmark, runs_benchmark = report.workflows
+    assert omex_benchmark.completed == 3 and omex_batch_benchmark.completed == 3 and runs_benchmark.completed == 3
+    # a child workflow per simulator (and its submit activity), or a single submit activity for all of them
+    assert omex_benchmark.child_history is not None and omex_benchmark.child_history.count == 3 * 2
+    assert omex_benchmark.child_overhead is not None and omex_benchmark.activity_overhead.count == 3 * 3
+    assert omex_batch_benchmark.child_history is None and runs_benchmark.child_history is None
+    assert omex_batch_benchmark.activity_overhead.count == 3 * 2
+    assert runs_benchmark.activity_overhead.count == 3 * 3
+    assert runs_benchmark.history.events_mean > 0 and runs_benchmark.history.bytes_mean > 0
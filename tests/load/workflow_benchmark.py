@@ -0,0 +1,278 @@
+import argparse
+import asyncio
+import logging
+import resource
+import time
+import uuid
+from contextlib import AsyncExitStack
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence
+
+from pydantic import BaseModel
+from temporalio.api.enums.v1 import EventType
+from temporalio.api.history.v1 import HistoryEvent
+from temporalio.client import Client, WorkflowHandle
+from temporalio.testing import WorkflowEnvironment
+from temporalio.worker import UnsandboxedWorkflowRunner, Worker
+
+from biosim_server.biosim_omex import OmexFile
+from biosim_server.biosim_verify import CompareSettings
+from biosim_server.biosim_verify.models import VerifyWorkflowOutput, VerifyWorkflowStatus
+from biosim_server.biosim_verify.omex_verify_workflow import OmexVerifyWorkflow, OmexVerifyWorkflowInput
+from biosim_server.biosim_verify.runs_verify_workflow import RunsVerifyWorkflow, RunsVerifyWorkflowInput
+from biosim_server.common.temporal import pydantic_data_converter
+from biosim_server.config import get_settings
+from biosim_server.worker.worker_main import WORKFLOWS
+from tests.fixtures.verify_activities_mock import VerifyActivitiesMock
+from tests.load.load_harness import LatencySummary, percentile
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class BenchmarkConfig(BaseModel):
+    num_workflows: int = 100  # of each workflow type, all started at once
+    num_simulators: int = 2  # simulations per OmexVerifyWorkflow, a child workflow each or one batch activity
+    num_runs: int = 2  # run ids per RunsVerifyWorkflow
+    activity_duration_s: float = 0.0  # time spent in each mocked activity, 0 leaves only the orchestration overhead
+
+
+class HistorySummary(BaseModel):
+    count: int
+    events_mean: float
+    events_max: int
+    bytes_mean: float
+    bytes_max: int
+
+
+class WorkflowBenchmark(BaseModel):
+    workflow_type: str
+    completed: int
+    failed: int
+    duration_s: float  # from the first start request until the last result
+    workflows_per_s: float
+    cpu_s_per_workflow: float  # user + system time of the worker (this process) per workflow, not of the server
+    history: HistorySummary  # of the workflow itself
+    child_history: Optional[HistorySummary] = None  # of each child workflow
+    latency: LatencySummary  # started to completed, from the history event times
+    orchestration_overhead: LatencySummary  # latency minus the mocked activity time on the critical path
+    activity_schedule_to_start: LatencySummary  # time an activity task waited for a worker
+    activity_overhead: LatencySummary  # scheduled to completed minus the mocked activity time
+    child_overhead: Optional[LatencySummary] = None  # child initiated to completed minus its mocked activity time
+
+
+class BenchmarkReport(BaseModel):
+    config: BenchmarkConfig
+    workflows: list[WorkflowBenchmark]
+    max_rss_mb: float
+
+
+class _BenchmarkTaskQueues(BaseModel):
+    """ task queues of their own, so that workers with the real activities polling the configured queues of the same
+    temporal namespace don't pick up the benchmark tasks """
+    task_queue: str
+    compute_task_queue: str
+
+    @classmethod
+    def create(cls) -> "_BenchmarkTaskQueues":
+        """ separate queues for the compute activities only if the configured ones are separate """
+        settings = get_settings()
+        suffix = uuid.uuid4().hex[:8]
+        task_queue = f"benchmark_tasks_{suffix}"
+        compute_task_queue = f"benchmark_compute_tasks_{suffix}" \
+            if settings.temporal_task_queue != settings.temporal_compute_task_queue else task_queue
+        return cls(task_queue=task_queue, compute_task_queue=compute_task_queue)
+
+
+def _create_mock_workers(client: Client, mock_activities: VerifyActivitiesMock,
+                         task_queues: _BenchmarkTaskQueues) -> list[Worker]:
+    """ the workers of worker_main.create_workers (role 'all') with the mocked activities """
+    settings = get_settings()
+    io_activities: list[Callable[..., Any]] = [mock_activities.submit_biosim_simulation_run,
+                                               mock_activities.submit_biosim_simulation_runs,
+                                               mock_activities.get_existing_biosim_simulation_run]
+    compute_activities: list[Callable[..., Any]] = [mock_activities.generate_statistics]
+    worker_options: dict[str, Any] = dict(
+        max_concurrent_activities=settings.worker_max_concurrent_io_activities or None,
+        max_concurrent_workflow_tasks=settings.worker_max_concurrent_workflow_tasks or None,
+        workflow_runner=UnsandboxedWorkflowRunner())
+    if task_queues.task_queue == task_queues.compute_task_queue:
+        return [Worker(client, task_queue=task_queues.task_queue, workflows=WORKFLOWS,
+                       activities=io_activities + compute_activities, **worker_options)]
+    return [Worker(client, task_queue=task_queues.task_queue, workflows=WORKFLOWS, activities=io_activities,
+                   **worker_options),
+            Worker(client, task_queue=task_queues.compute_task_queue, activities=compute_activities)]
+
+
+def _event_time_s(event: HistoryEvent) -> float:
+    return event.event_time.seconds + event.event_time.nanos / 1e9
+
+
+class _HistoryStats(BaseModel):
+    num_events: int
+    num_bytes: int
+    latency_s: float
+    activity_schedule_to_start_s: list[float]
+    activity_round_trip_s: list[float]
+    child_round_trip_s: list[float]
+    child_workflow_ids: list[str]
+
+
+def _history_stats(events: Sequence[HistoryEvent]) -> _HistoryStats:
+    scheduled_s: dict[int, float] = {}
+    started_s: dict[int, float] = {}
+    initiated_s: dict[int, float] = {}
+    stats = _HistoryStats(num_events=len(events), num_bytes=sum(event.ByteSize() for event in events),
+                          latency_s=_event_time_s(events[-1]) - _event_time_s(events[0]),
+                          activity_schedule_to_start_s=[], activity_round_trip_s=[], child_round_trip_s=[],
+                          child_workflow_ids=[])
+    for event in events:
+        if event.event_type == EventType.EVENT_TYPE_ACTIVITY_TASK_SCHEDULED:
+            scheduled_s[event.event_id] = _event_time_s(event)
+        elif event.event_type == EventType.EVENT_TYPE_ACTIVITY_TASK_STARTED:
+            scheduled_event_id = event.activity_task_started_event_attributes.scheduled_event_id
+            started_s[scheduled_event_id] = _event_time_s(event)
+        elif event.event_type == EventType.EVENT_TYPE_ACTIVITY_TASK_COMPLETED:
+            scheduled_event_id = event.activity_task_completed_event_attributes.scheduled_event_id
+            stats.activity_schedule_to_start_s.append(started_s[scheduled_event_id] - scheduled_s[scheduled_event_id])
+            stats.activity_round_trip_s.append(_event_time_s(event) - scheduled_s[scheduled_event_id])
+        elif event.event_type == EventType.EVENT_TYPE_START_CHILD_WORKFLOW_EXECUTION_INITIATED:
+            initiated_s[event.event_id] = _event_time_s(event)
+        elif event.event_type == EventType.EVENT_TYPE_CHILD_WORKFLOW_EXECUTION_STARTED:
+            attributes = event.child_workflow_execution_started_event_attributes
+            stats.child_workflow_ids.append(attributes.workflow_execution.workflow_id)
+        elif event.event_type == EventType.EVENT_TYPE_CHILD_WORKFLOW_EXECUTION_COMPLETED:
+            initiated_event_id = event.child_workflow_execution_completed_event_attributes.initiated_event_id
+            stats.child_round_trip_s.append(_event_time_s(event) - initiated_s[initiated_event_id])
+    return stats
+
+
+def _latency_summary(values: list[float]) -> LatencySummary:
+    return LatencySummary(count=len(values), p50_s=percentile(values, 50), p99_s=percentile(values, 99),
+                          max_s=max(values))
+
+
+def _history_summary(stats: list[_HistoryStats]) -> HistorySummary:
+    return HistorySummary(count=len(stats), events_mean=sum(s.num_events for s in stats) / len(stats),
+                          events_max=max(s.num_events for s in stats),
+                          bytes_mean=sum(s.num_bytes for s in stats) / len(stats),
+                          bytes_max=max(s.num_bytes for s in stats))
+
+
+async def _benchmark_workflows(client: Client, config: BenchmarkConfig, task_queue: str, workflow_type: str,
+                               start_inputs: list[tuple[Any, Any]], critical_path_activities: int) \
+        -> WorkflowBenchmark:
+    """ start all workflows at once and wait for their results, then analyze their histories (and those of their
+    children), start_inputs are pairs of workflow run method and input """
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.monotonic()
+    handles: list[WorkflowHandle[Any, VerifyWorkflowOutput]] = await asyncio.gather(*[
+        client.start_workflow(run_method, args=[workflow_input], result_type=VerifyWorkflowOutput,
+                              task_queue=task_queue,
+                              id=f"benchmark-{workflow_type}-{uuid.uuid4()}")
+        for run_method, workflow_input in start_inputs])
+    outputs: list[VerifyWorkflowOutput | BaseException] = await asyncio.gather(
+        *[handle.result() for handle in handles], return_exceptions=True)
+    duration_s = time.monotonic() - start
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_s = (usage_after.ru_utime + usage_after.ru_stime) - (usage_before.ru_utime + usage_before.ru_stime)
+    completed = sum(1 for output in outputs if isinstance(output, VerifyWorkflowOutput)
+                    and output.workflow_status == VerifyWorkflowStatus.COMPLETED)
+
+    history_stats = [_history_stats((await handle.fetch_history()).events) for handle in handles]
+    child_stats = [_history_stats((await client.get_workflow_handle(child_id).fetch_history()).events)
+                   for stats in history_stats for child_id in stats.child_workflow_ids]
+    activity_duration_s = config.activity_duration_s
+    return WorkflowBenchmark(
+        workflow_type=workflow_type, completed=completed, failed=len(outputs) - completed, duration_s=duration_s,
+        workflows_per_s=completed / duration_s, cpu_s_per_workflow=cpu_s / len(outputs),
+        history=_history_summary(history_stats),
+        child_history=_history_summary(child_stats) if child_stats else None,
+        latency=_latency_summary([s.latency_s for s in history_stats]),
+        orchestration_overhead=_latency_summary([s.latency_s - critical_path_activities * activity_duration_s
+                                                 for s in history_stats]),
+        activity_schedule_to_start=_latency_summary([t for s in history_stats + child_stats
+                                                     for t in s.activity_schedule_to_start_s]),
+        activity_overhead=_latency_summary([t - activity_duration_s for s in history_stats + child_stats
+                                            for t in s.activity_round_trip_s]),
+        child_overhead=_latency_summary([t - activity_duration_s for s in history_stats
+                                         for t in s.child_round_trip_s]) if child_stats else None)
+
+
+async def run_benchmark(config: BenchmarkConfig, temporal_client: Client) -> BenchmarkReport:
+    """ the orchestration cost of the verification workflows: OmexVerifyWorkflow (child workflows as with the rest
+    backend, or one batch submit activity as with job arrays, then generate statistics) and RunsVerifyWorkflow
+    (sequential activities) with mocked activities, one workflow type after the other so that the cpu time can be
+    attributed """
+    mock_activities = VerifyActivitiesMock(config.activity_duration_s)
+    compare_settings = CompareSettings(user_description="benchmark", include_outputs=False, rel_tol=1e-4,
+                                       abs_tol_min=1e-3, abs_tol_scale=1e-5, observables=None)
+    simulator_versions = [info.biosim_sim_run.simulator_version for info in mock_activities.statistics.sims_run_info]
+    task_queues = _BenchmarkTaskQueues.create()
+    omex_file = OmexFile(file_hash_md5="benchmark", uploaded_filename="benchmark.omex", file_size=100,
+                         omex_gcs_path="benchmark/benchmark.omex", bucket_name="bucket")
+    omex_inputs, omex_batch_inputs = [[(OmexVerifyWorkflow.run, OmexVerifyWorkflowInput(
+        omex_file=omex_file, cache_buster=uuid.uuid4().hex, compare_settings=compare_settings,
+        requested_simulators=[simulator_versions[i % len(simulator_versions)] for i in range(config.num_simulators)],
+        compute_task_queue=task_queues.compute_task_queue, batch_simulations=batch_simulations))
+                                       for _ in range(config.num_workflows)] for batch_simulations in (False, True)]
+    runs_inputs = [(RunsVerifyWorkflow.run, RunsVerifyWorkflowInput(
+        biosimulations_run_ids=[uuid.uuid4().hex for _ in range(config.num_runs)], compare_settings=compare_settings,
+        compute_task_queue=task_queues.compute_task_queue))
+                   for _ in range(config.num_workflows)]
+
+    workers = _create_mock_workers(temporal_client, mock_activities, task_queues)
+    async with AsyncExitStack() as stack:
+        for worker in workers:
+            await stack.enter_async_context(worker)
+        # simulations in parallel child workflows, then generate statistics
+        omex_benchmark = await _benchmark_workflows(temporal_client, config, task_queues.task_queue, "omex_verify",
+                                                    omex_inputs, critical_path_activities=2)
+        # all simulations in one submit activity, then generate statistics
+        omex_batch_benchmark = await _benchmark_workflows(temporal_client, config, task_queues.task_queue,
+                                                          "omex_verify_batch", omex_batch_inputs,
+                                                          critical_path_activities=2)
+        # one activity per run id, then generate statistics
+        runs_benchmark = await _benchmark_workflows(temporal_client, config, task_queues.task_queue, "runs_verify",
+                                                    runs_inputs, critical_path_activities=config.num_runs + 1)
+    return BenchmarkReport(config=config, workflows=[omex_benchmark, omex_batch_benchmark, runs_benchmark],
+                           max_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the orchestration of the verification workflows with "
+                                                 "mocked activities, e.g. "
+                                                 "python -m tests.load.workflow_benchmark --workflows 500")
+    parser.add_argument("--workflows", type=int, default=BenchmarkConfig().num_workflows)
+    parser.add_argument("--simulators", type=int, default=BenchmarkConfig().num_simulators)
+    parser.add_argument("--runs", type=int, default=BenchmarkConfig().num_runs)
+    parser.add_argument("--activity-duration", type=float, default=BenchmarkConfig().activity_duration_s)
+    parser.add_argument("--time-skipping", action="store_true", help="start the time-skipping test server instead "
+                                                                     "of a dev server")
+    parser.add_argument("--temporal", default="", help="address of a temporal server, default: start a dev server")
+    parser.add_argument("--report", default="", help="also write the json report to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    config = BenchmarkConfig(num_workflows=args.workflows, num_simulators=args.simulators, num_runs=args.runs,
+                             activity_duration_s=args.activity_duration)
+    if args.temporal:
+        env = WorkflowEnvironment.from_client(await Client.connect(args.temporal,
+                                                                   data_converter=pydantic_data_converter))
+    elif args.time_skipping:
+        env = await WorkflowEnvironment.start_time_skipping(data_converter=pydantic_data_converter)
+    else:
+        env = await WorkflowEnvironment.start_local(data_converter=pydantic_data_converter)
+    try:
+        report = await run_benchmark(config, env.client)
+    finally:
+        await env.shutdown()
+
+    report_json = report.model_dump_json(indent=2)
+    print(report_json)
+    if args.report:
+        Path(args.report).write_text(report_json)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,121 @@
+import json
+import time
+from pathlib import Path
+
+import pytest
+from dotenv import dotenv_values
+from prometheus_client import CollectorRegistry, Counter, generate_latest, start_http_server
+from temporalio.client import Client
+
+import biosim_server.worker.worker_main
+from biosim_server.biosim_runs import submit_biosim_simulation_run_activity
+from biosim_server.biosim_verify.activities import generate_statistics_activity
+from biosim_server.config import Settings, get_settings
+from biosim_server.metrics import LocalMetricsCollector
+from biosim_server.worker.worker_launcher import check_health
+from biosim_server.worker.worker_main import create_workers, get_health_file, temporal_metrics_ports, write_health
+
+KUSTOMIZE_CONFIG_DIR = Path(__file__).parent.parent.parent / "kustomize" / "config"
+
+
+def _deployment_settings(config_dir: Path, *env_files: str) -> Settings:
+    """ the settings of a deployment whose config map is generated from env_files, without the environment of the
+    test (see kustomize/config/*/kustomization.yaml) """
+    values: dict[str, str] = {}
+    for env_file in env_files:
+        values.update({name.lower(): value for name, value in dotenv_values(config_dir / env_file).items()
+                       if value is not None})
+    return Settings.model_validate(values)
+
+
+@pytest.mark.asyncio
+async def test_create_workers(temporal_client: Client, monkeypatch: pytest.MonkeyPatch) -> None:
+    settings = get_settings()
+    monkeypatch.setattr(settings, "temporal_task_queue", "verification_tasks")
+
+    # same queue for both kinds of activities, a single worker does everything
+    monkeypatch.setattr(settings, "temporal_compute_task_queue", "verification_tasks")
+    assert [worker.task_queue for worker in create_workers(temporal_client, "all")] == ["verification_tasks"]
+
+    monkeypatch.setattr(settings, "temporal_compute_task_queue", "verify-compute")
+    assert [w.task_queue for w in create_workers(temporal_client, "all")] == ["verification_tasks", "verify-compute"]
+    assert [w.task_queue for w in create_workers(temporal_client, "verify-io")] == ["verification_tasks"]
+    assert [w.task_queue for w in create_workers(temporal_client, "verify-compute")] == ["verify-compute"]
+
+    with pytest.raises(ValueError):
+        create_workers(temporal_client, "unknown")
+
+
+@pytest.mark.parametrize("config_dir", sorted(path for path in KUSTOMIZE_CONFIG_DIR.iterdir() if path.is_dir()),
+                         ids=lambda path: path.name)
+def test_deployment_settings(config_dir: Path) -> None:
+    # the api names the task queues in the workflow inputs and decides on batch submission for the workers
+    api_settings = _deployment_settings(config_dir, "api.env", "shared.env")
+    worker_settings = _deployment_settings(config_dir, "worker.env", "shared.env")
+    assert api_settings.temporal_task_queue == worker_settings.temporal_task_queue
+    assert api_settings.temporal_compute_task_queue == worker_settings.temporal_compute_task_queue
+    assert api_settings.biosim_service_backend == worker_settings.biosim_service_backend
+
+
+@pytest.mark.asyncio
+async def test_create_workers_split_roles(temporal_client: Client, monkeypatch: pytest.MonkeyPatch) -> None:
+    config_dir = KUSTOMIZE_CONFIG_DIR / "biosim-gke"
+    api_settings = _deployment_settings(config_dir, "api.env", "shared.env")
+    worker_settings = _deployment_settings(config_dir, "worker.env", "shared.env")
+    assert worker_settings.temporal_task_queue != worker_settings.temporal_compute_task_queue
+
+    # the verify-io and verify-compute deployments with their own settings, the api's queues reach their activities
+    monkeypatch.setattr(biosim_server.worker.worker_main, "get_settings", lambda: worker_settings)
+    workers = create_workers(temporal_client, "verify-io") + create_workers(temporal_client, "verify-compute")
+    activities = {worker.task_queue: worker.config().get("activities") or [] for worker in workers}
+    assert submit_biosim_simulation_run_activity in activities[api_settings.temporal_task_queue]
+    assert generate_statistics_activity in activities[api_settings.temporal_compute_task_queue]
+    assert generate_statistics_activity not in activities[api_settings.temporal_task_queue]
+
+
+def test_worker_health(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(get_settings(), "worker_health_dir", str(tmp_path))
+
+    write_health(get_health_file(0), process_index=0, workers=[], status="running")
+    write_health(get_health_file(1), process_index=1, workers=[], status="running")
+    assert check_health(num_processes=2, max_age_s=30) == []
+
+    # a missing report, a stale heartbeat and a process which stopped its workers are all reported
+    problems = check_health(num_processes=3, max_age_s=30)
+    assert len(problems) == 1 and problems[0].startswith("worker 2: no health report")
+
+    health = json.loads(get_health_file(0).read_text())
+    health["updated_at"] = time.time() - 60
+    get_health_file(0).write_text(json.dumps(health))
+    write_health(get_health_file(1), process_index=1, workers=[], status="stopped")
+    problems = check_health(num_processes=2, max_age_s=30)
+    assert problems[0].startswith("worker 0") and "last report" in problems[0]
+    assert problems[1].startswith("worker 1") and "status stopped" in problems[1]
+
+
+def test_temporal_metrics_reexported(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(get_settings(), "worker_temporal_metrics_port", 9091)
+    assert temporal_metrics_ports(range(2)) == {0: 9091, 1: 9092}
+    monkeypatch.setattr(get_settings(), "worker_metrics_port", 0)
+    assert temporal_metrics_ports(range(2)) == {}
+
+    # two worker processes serving their temporal sdk metrics, the third one is not running
+    ports: dict[int, int] = {}
+    servers = []
+    for process_index in range(2):
+        registry = CollectorRegistry()
+        Counter("temporal_request", "Temporal requests", registry=registry).inc(process_index + 1)
+        server, _ = start_http_server(0, addr="127.0.0.1", registry=registry)
+        servers.append(server)
+        ports[process_index] = server.server_port
+    ports[2] = servers[0].server_port + 10000
+    try:
+        registry = CollectorRegistry()
+        registry.register(LocalMetricsCollector(ports, timeout_s=0.5))
+        lines = generate_latest(registry).decode().splitlines()
+    finally:
+        for server in servers:
+            server.shutdown()
+    assert lines.count("# TYPE temporal_request_total counter") == 1
+    assert 'temporal_request_total{worker_process="0"} 1.0' in lines
+    assert 'temporal_request_total{worker_process="1"} 2.0' in lines